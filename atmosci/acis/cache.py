@@ -0,0 +1,130 @@
+""" Disk cache for responses from ACIS web services.
+
+Responses are kept in files named for a digest of the normalized query,
+i.e. the query type and the query JSON with its keys sorted and all
+insignificant white space removed, so the same query always maps to the
+same file no matter how it was written. Entries expire after "ttl"
+seconds.
+"""
+
+import os
+import re
+import time
+import shutil
+import hashlib
+import tempfile
+
+from atmosci.acis.client import json
+
+DEFAULT_TTL = 86400 # responses are kept for one day
+
+# ACIS reports errors with a normal response holding an "error" key,
+# responses up to this size are parsed to look for one
+ERROR_CHECK_SIZE = 65536
+ERROR_RESPONSE = re.compile(r'\s*\{\s*"error"\s*:')
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+def normalizedQuery(query_type, json_string):
+    """ Returns: query type and query JSON in a canonical form """
+    query = json.loads(json_string)
+    return '%s?%s' % (query_type.strip('/'),
+                      json.dumps(query, sort_keys=True, separators=(',',':')))
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+class AcisResponseCache(object):
+    """ Keeps ACIS responses in files under cache_dir.
+
+    Arguments:
+        cache_dir: directory for the cached responses
+        ttl: number of seconds before a response expires, None for never
+    """
+
+    def __init__(self, cache_dir, ttl=DEFAULT_TTL):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def filepath(self, query_type, json_string):
+        key = hashlib.md5(normalizedQuery(query_type, json_string))
+        key = key.hexdigest()
+        return os.path.join(self.cache_dir, key[:2], '%s.json' % key)
+
+    def responseFile(self, query_type, json_string):
+        """ Returns: path to the cached response, None when the query is
+        not in the cache or the response has expired
+        """
+        filepath = self.filepath(query_type, json_string)
+        try:
+            modified = os.path.getmtime(filepath)
+        except OSError: return None
+        if self.ttl is not None and (time.time() - modified) > self.ttl:
+            return None
+        return filepath
+
+    def responseWriter(self, query_type, json_string):
+        """ Returns: CachedResponseWriter for a new response to the query """
+        return CachedResponseWriter(self.filepath(query_type, json_string))
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def clear(self):
+        if os.path.isdir(self.cache_dir):
+            shutil.rmtree(self.cache_dir)
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+class CachedResponseWriter(object):
+    """ Writes a response to a temporary file as it arrives. The file only
+    replaces the cached response when the whole response was written and
+    it is not an ACIS error response.
+    """
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        dirpath = os.path.dirname(filepath)
+        if not os.path.exists(dirpath):
+            try: os.makedirs(dirpath)
+            except OSError: # another process created it first
+                if not os.path.isdir(dirpath): raise
+        # a unique temporary file for every writer, so threads and
+        # processes running the same query never share one
+        fd, self._tmp_filepath = tempfile.mkstemp(suffix='.tmp', dir=dirpath,
+                                     prefix=os.path.basename(filepath) + '.')
+        self._file = os.fdopen(fd, 'wb')
+        self._head = [ ]
+        self._size = 0
+
+    def write(self, chunk):
+        if self._size <= ERROR_CHECK_SIZE: self._head.append(chunk)
+        self._size += len(chunk)
+        self._file.write(chunk)
+
+    def commit(self):
+        """ Returns: True when the response was cached, False when it was
+        discarded because it is an error response
+        """
+        if self.isErrorResponse():
+            self.discard()
+            return False
+        self._file.close()
+        # mkstemp creates files that only their owner can read
+        os.chmod(self._tmp_filepath, 0644)
+        os.rename(self._tmp_filepath, self.filepath)
+        return True
+
+    def isErrorResponse(self):
+        head = ''.join(self._head)
+        if self._size <= ERROR_CHECK_SIZE:
+            try:
+                response = json.loads(head)
+            except ValueError: return True # not a complete JSON response
+            return isinstance(response, dict) and 'error' in response
+        return ERROR_RESPONSE.match(head) is not None
+
+    def discard(self):
+        if not self._file.closed: self._file.close()
+        if os.path.exists(self._tmp_filepath):
+            os.remove(self._tmp_filepath)
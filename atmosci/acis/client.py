@@ -1,5 +1,5 @@
 
-import sys
+import os, sys
 import urllib, urllib2
 import datetime
 
@@ -8,12 +8,17 @@ try:
 except ImportError:
     import json
 
+import requests
+from requests.adapters import HTTPAdapter
+
 from atmosci.utils.timeutils import asDatetimeDate
 
 # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
 
 ALL_LOC_KEYS = ('basin','bbox','climdiv','county','cwa','sid','sids','state')
+CHUNK_SIZE = 262144 # bytes read from a response at a time
 DEFAULT_ELEMS = ['maxt','mint','pcpn']
+DEFAULT_TIMEOUT = 300 # seconds to wait for the server
 DEFAULT_URL = 'http://data.rcc-acis.org/'
 NONE_ERR = '"elems" may not be None. A valid element specification is required.'
 
@@ -21,17 +26,57 @@ NONE_ERR = '"elems" may not be None. A valid element specification is required.'
 
 def tightJson(value): return json.dumps(value, separators=(',', ':'))
 
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+_SESSION_ = None
+
+def acisSession():
+    """ Returns: requests session shared by all ACIS clients in the process,
+    so connections to the server are kept alive between queries. Forked
+    processes get their own session.
+    """
+    global _SESSION_
+    if _SESSION_ is None or _SESSION_[0] != os.getpid():
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        _SESSION_ = (os.getpid(), session)
+    return _SESSION_[1]
+
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+class CachedResponse(object):
+    """ Stands in for the HTTP response when a query is read from the
+    response cache
+    """
+
+    def __init__(self, url, filepath):
+        self.filepath = filepath
+        self.status_code = 200
+        self.url = url
+
+    def geturl(self): return self.url
+
+def responseUrl(response):
+    if hasattr(response, 'geturl'): return response.geturl()
+    return response.url
+
 # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
 
 class AcisWebServicesClient(object):
 
     def __init__(self, base_url=DEFAULT_URL, valid_elems=DEFAULT_ELEMS,
-                       loc_keys=ALL_LOC_KEYS, date_required=True, debug=False):
+                       loc_keys=ALL_LOC_KEYS, date_required=True, debug=False,
+                       cache=None, timeout=DEFAULT_TIMEOUT):
         self.base_url = base_url
+        # optional AcisResponseCache
+        self.cache = cache
         self.date_required = date_required
         self.debug = debug
         self.prev_query = None
         self.loc_keys = loc_keys
+        self.timeout = timeout
         self.valid_elems = valid_elems
         #!TODO : list of valid metadata and validation method 
 
@@ -54,56 +99,22 @@ class AcisWebServicesClient(object):
         raise NotImplementedError
 
     def submitQuery(self, query_type, json_string):
-        ERROR_MSG = 'Error processing response to query : %s %s'
-        debug = self.debug
-        if debug:
-            print '\n', self.__class__.__name__, 'submitQuery', query_type
-            print json_string
-        if not isinstance(json_string, basestring):
-            raise TypeError, '"json_string" argument must be a string'
-        try:
-            json_query_dict = json.loads(json_string)
-        except:
-            errmsg = '"json_string" argument is not a valid JSON string :\n%s'
-            raise ValueError, errmsg % json_string
-            
-        url = self.base_url
-        if url.endswith('/'):
-            if query_type.startswith('/'): url += query_type[1:]
-            else: url += query_type
-        else:
-            if query_type.startswith('/'): url += query_type
-            else: url += '/' + query_type
-
-        if debug:
-            print 'POST', url
-            print 'params =', json_string
-
-        post_params = urllib.urlencode({'params':json_string})
-        if debug: print '\nencoded json string\n', post_params
-        req = urllib2.Request(url, post_params,
-                              { 'Accept':'application/json' }
-                             )
-        if debug:
-            print 'request', req.get_full_url(), req.get_data()
-        url += ' json=' + post_params
-        try:
-            response = urllib2.urlopen(req)
-        except Exception as e:
-            setattr(e, 'details', ERROR_MSG % ('POST',url))
-            raise e
-
-        try:
-            response_string = response.read()
-        except Exception as e:
-            setattr(e, 'details', ERROR_MSG % ('POST',url))
-            raise e
-        if debug: print 'response', response_string
+        chunks, response = self._openQuery(query_type, json_string)
+        response_string = ''.join(chunks)
+        if self.debug: print 'response', response_string
+        return response_string, response
 
-        # track last successful query
-        self.prev_query = json_string
+    def streamQuery(self, query_type, json_string, chunk_size=CHUNK_SIZE):
+        """ Returns: iterator over the response to the query, chunk_size
+        bytes at a time, so large responses never have to be held in
+        memory all at once
+        """
+        return self._openQuery(query_type, json_string, chunk_size)[0]
 
-        return response_string, response
+    def streamRequest(self, query_type, chunk_size=CHUNK_SIZE,
+                            **request_dict):
+        query_json = self.jsonFromRequest(query_type, request_dict)
+        return self.streamQuery(query_type, query_json, chunk_size)
 
     # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
@@ -155,7 +166,8 @@ class AcisWebServicesClient(object):
                 ecode = 500
                 errmsg += 'server returned HTML, not valid JSON.\n'
                 errmsg += response_string
-            raise urllib2.HTTPError(response.geturl(),ecode,errmsg,None,None)
+            raise urllib2.HTTPError(responseUrl(response), ecode, errmsg,
+                                    None, None)
 
         server_error = 'SERVER ERROR : '
         errors = [ ]
@@ -181,13 +193,97 @@ class AcisWebServicesClient(object):
            return json.loads(response_string)
         except Exception as e:
             errmsg += 'unable to handle improperly formated JSON from server.\n'
-            errmsg += response.geturl() + '\n'
+            errmsg += responseUrl(response) + '\n'
             errmsg += 'Returned JSON = ' + response_string
             setattr(e, 'details', errmsg)
             raise e
 
     # - # - # - # - # - # - # - # - # - # - # - # - # - # - # - # - # - # - #
 
+    def _openQuery(self, query_type, json_string, chunk_size=CHUNK_SIZE):
+        """ Returns: (iterator over response chunks, response) """
+        ERROR_MSG = 'Error processing response to query : %s %s'
+        debug = self.debug
+        if debug:
+            print '\n', self.__class__.__name__, 'submitQuery', query_type
+            print json_string
+        if not isinstance(json_string, basestring):
+            raise TypeError, '"json_string" argument must be a string'
+        try:
+            json_query_dict = json.loads(json_string)
+        except:
+            errmsg = '"json_string" argument is not a valid JSON string :\n%s'
+            raise ValueError, errmsg % json_string
+            
+        url = self.base_url
+        if url.endswith('/'):
+            if query_type.startswith('/'): url += query_type[1:]
+            else: url += query_type
+        else:
+            if query_type.startswith('/'): url += query_type
+            else: url += '/' + query_type
+
+        if self.cache is not None:
+            filepath = self.cache.responseFile(query_type, json_string)
+            if filepath is not None:
+                if debug: print 'cached response', filepath
+                self.prev_query = json_string
+                return ( self._readCachedResponse(filepath, chunk_size),
+                         CachedResponse(url, filepath) )
+
+        if debug:
+            print 'POST', url
+            print 'params =', json_string
+
+        post_params = urllib.urlencode({'params':json_string})
+        if debug: print '\nencoded json string\n', post_params
+        details = ERROR_MSG % ('POST', url + ' json=' + post_params)
+        try:
+            # the session keeps the connection open for the next query
+            response = acisSession().post(url, data=post_params,
+                           headers={ 'Accept':'application/json',
+                           'Content-Type':'application/x-www-form-urlencoded' },
+                           stream=True, timeout=self.timeout)
+            response.raise_for_status()
+        except Exception as e:
+            setattr(e, 'details', details)
+            raise e
+
+        # track last successful query
+        self.prev_query = json_string
+
+        if self.cache is not None:
+            writer = self.cache.responseWriter(query_type, json_string)
+        else: writer = None
+        return self._readResponse(response, writer, chunk_size, details), \
+               response
+
+    def _readCachedResponse(self, filepath, chunk_size):
+        with open(filepath, 'rb') as cache_file:
+            chunk = cache_file.read(chunk_size)
+            while chunk:
+                yield chunk
+                chunk = cache_file.read(chunk_size)
+
+    def _readResponse(self, response, writer, chunk_size, details):
+        complete = False
+        try:
+            for chunk in response.iter_content(chunk_size):
+                if writer is not None: writer.write(chunk)
+                yield chunk
+            complete = True
+        except Exception as e:
+            setattr(e, 'details', details)
+            raise e
+        finally:
+            # the connection only goes back to the pool when it is closed
+            response.close()
+            if writer is not None:
+                if complete: writer.commit()
+                else: writer.discard()
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
     def _classSpecificRequirements(self, request_dict):
         return None
 
@@ -3,8 +3,12 @@ import datetime
 
 import numpy as N
 
+from atmosci.acis.cache import AcisResponseCache, DEFAULT_TTL
 from atmosci.acis.client import AcisWebServicesClient, json
 from atmosci.acis.gridinfo import acisGridNumber
+from atmosci.acis.gridstream import AcisGridStreamDecoder, dateOrdinals, \
+                                    stackGrids
+from atmosci.utils.timeutils import asDatetimeDate
 
 # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
 
@@ -16,11 +20,11 @@ VALID_ELEMS = ['maxt','mint','pcpn','cdd','cddNN','hdd','hddNN','gdd','gddNN']
 class AcisGridDataClient(AcisWebServicesClient):
 
     def __init__(self, base_url=DEFAULT_URL, valid_elems=VALID_ELEMS,
-                       debug=False):
+                       debug=False, cache=None):
         super(AcisGridDataClient, self).\
         __init__(base_url=base_url, valid_elems=valid_elems,
                  loc_keys=('bbox','loc','state'), date_required=True,
-                 debug=debug)
+                 debug=debug, cache=cache)
         #!TODO " list of valid metadata
 
     def request(self, grid_id, **request_dict):
@@ -30,6 +34,79 @@ class AcisGridDataClient(AcisWebServicesClient):
     def query(self, json_query_string):
         return self.submitQuery('GridData', json_query_string)
 
+    def streamGridData(self, grid_id, num_days=None, stacked=None,
+                             **request_dict):
+        """ Submits a request and decodes the grids in the response into
+        arrays while it is being read. Grids are decoded into the arrays
+        in stacked when it is given.
+
+        Returns: the response, with the same structure as json.loads
+                 returns but with arrays for grids, and a list of
+                 (num_days, y, x) arrays, one for each element, or None
+                 when num_days is None. See AcisGridStreamDecoder.
+        """
+        decoder = AcisGridStreamDecoder(num_days, stacked)
+        grid_num = acisGridNumber(grid_id)
+        for chunk in self.streamRequest('GridData', grid=grid_num,
+                                        **request_dict):
+            decoder.feed(chunk)
+        response = decoder.finish()
+        if 'error' in response:
+            raise ValueError, 'ACIS GridData error : %s' % response['error']
+        return response, decoder.stackedData()
+
+    def streamGridTiles(self, grid_id, start_date, end_date, tile_days,
+                              **request_dict):
+        """ Splits a request for a range of dates into requests for at most
+        tile_days each and merges the grids from all of them, in order, into
+        one (days, y, x) array for each element.
+
+        Returns: the merged response and a list of the merged arrays, the
+                 same as streamGridData
+        """
+        start_date = asDatetimeDate(start_date)
+        end_date = asDatetimeDate(end_date)
+        num_days = (end_date - start_date).days + 1
+
+        merged = None
+        response = None
+        num_merged = 0
+        for first_day in range(0, num_days, tile_days):
+            last_day = min(first_day + tile_days, num_days) - 1
+            request_dict['sdate'] = self.acisDateString(start_date +
+                                    datetime.timedelta(days=first_day))
+            request_dict['edate'] = self.acisDateString(start_date +
+                                    datetime.timedelta(days=last_day))
+            tile_size = last_day - first_day + 1
+            if merged is None:
+                response, stacked = \
+                self.streamGridData(grid_id, tile_size, **request_dict)
+                # metadata is the same for every tile
+                request_dict.pop('meta', None)
+                if stacked is None: return response, None
+                merged = [ ]
+                for grids in stacked:
+                    array = N.empty((num_days,) + grids.shape[1:], grids.dtype)
+                    array[:len(grids)] = grids
+                    merged.append(array)
+                days = response['data']
+            else:
+                # grids are decoded directly into the merged arrays
+                stacked = [array[num_merged:num_merged+tile_size]
+                           for array in merged]
+                days = self.streamGridData(grid_id, None, stacked,
+                                           **request_dict)[0]['data']
+                response['data'].extend(days)
+            num_merged += len(days)
+
+        if num_merged < num_days:
+            merged = [array[:num_merged] for array in merged]
+        # point the days in the response at the merged grids
+        for day_num, day in enumerate(response['data']):
+            for indx, array in enumerate(merged, start=1):
+                day[indx] = array[day_num]
+        return response, merged
+
     def _classSpecificRequirements(self, request_dict):
         return { 'grid':request_dict['grid'] }
 
@@ -37,6 +114,21 @@ class AcisGridDataClient(AcisWebServicesClient):
 
 class AcisGridDownloadMixin:
 
+    def acisGridDataClient(self, debug=False):
+        """ Returns: client for ACIS grid data. Responses are cached when
+        the config has an "acis_cache" directory path.
+        """
+        cache = None
+        config = getattr(self, 'config', None)
+        if config is not None:
+            cache_dir = config.get('dirpaths.acis_cache', None)
+            if cache_dir is not None:
+                ttl = config.get('acis_cache_ttl', DEFAULT_TTL)
+                cache = AcisResponseCache(cache_dir, ttl)
+        return AcisGridDataClient(debug=debug, cache=cache)
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
     def getAcisGridData(self, acis_grid_id, elems, start_date, end_date=None,
                               include_dates=True, **kwargs):
         debug = kwargs.get('debug',False)
@@ -63,13 +155,17 @@ class AcisGridDownloadMixin:
             errmsg += ' One of "point", "bbox" or "state" is required.'
             raise KeyError, errmsg
 
-        client = AcisGridDataClient(debug=debug)
+        client = self.acisGridDataClient(debug)
         _start_date = client.acisDateString(start_date)
         if end_date is not None:
             _end_date = client.acisDateString(end_date)
             request["sdate"] = _start_date
             request["edate"] = _end_date
-        else: request["date"] = _start_date
+            num_days = (client.acisStringToDate(_end_date) -
+                        client.acisStringToDate(_start_date)).days + 1
+        else:
+            request["date"] = _start_date
+            num_days = 1
 
         meta = kwargs.get('meta', None)
         if isinstance(meta, basestring):
@@ -83,10 +179,19 @@ class AcisGridDownloadMixin:
 
         # returns python dict { 'meta' = { "lat" : grid, 'lon' : grid }
         #                       'data' = [ [date string, grid] ]
-        query_result = json.loads(client.request(acis_grid_id, **request)[0])
+        # with grids decoded to arrays as the response is read
+        tile_days = kwargs.get('tile_days', None)
+        if tile_days is not None and num_days > tile_days:
+            del request['sdate'], request['edate']
+            query_result, stacked = \
+            client.streamGridTiles(acis_grid_id, _start_date, _end_date,
+                                   tile_days, **request)
+        else:
+            query_result, stacked = \
+            client.streamGridData(acis_grid_id, num_days, **request)
 
-        data_dict = \
-        self.unpackAcisQueryResults(query_result, elems, meta, include_dates)
+        data_dict = self.unpackAcisQueryResults(query_result, elems, meta,
+                                                include_dates, stacked)
         return data_dict
 
     # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
@@ -97,35 +202,32 @@ class AcisGridDownloadMixin:
     # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
     def unpackAcisQueryResults(self, query_result, elems, meta=False,
-                                     include_dates=True):
-        # unpack the grids
+                                     include_dates=True, stacked=None):
+        """ Converts the grids for each element in GridData results to a
+        single (days, y, x) array of floats, or a (y, x) array when there
+        is only one day, with NaN for missing values. Dates are returned
+        as a tuple of datetime.date in "dates" and as an array of ordinals
+        in "date_ordinals".
+
+        stacked, when given, is the list of (days, y, x) arrays that
+        AcisGridStreamDecoder filled while decoding query_result
+        """
         if isinstance(elems, basestring): _elems = elems.split(',')
         else: _elems = elems
-        data = [ ]
-        for result in query_result['data']:
-            date_result = [self.acisStringToDate(result[0]),]
-            for indx, grid in enumerate(result[1:]):
-                elem_name = _elems[indx]
-                date_result.append(self.unpackAcisGrid(elem_name, grid))
-            data.append(date_result)
-
-        if len(data) > 1:
-            # convert list of (date, elem, ...) tuples to date tuple,
-            # and a data tuple for each element
-            data = zip(*data)
-            # convert data tuples to arrays
-            for indx, grid in enumerate(data[1:],start=1):
-                data[indx] = N.array(grid)
-        else:
-            date = data[0][0]
-            data = [grid for grid in data[0][1:]]
-            data.insert(0,(date,))
+        days = query_result['data']
+        if stacked is None or len(stacked[0]) != len(days):
+            stacked = stackGrids(days, len(_elems))
 
         if include_dates:
-            data_dict = { 'dates': data[0], }
+            ordinals = dateOrdinals([day[0] for day in days])
+            data_dict = { 'dates': tuple([datetime.date.fromordinal(ordinal)
+                                          for ordinal in ordinals.tolist()]),
+                          'date_ordinals': ordinals, }
         else: data_dict = { }
-        for indx, elem_name in enumerate(_elems, start=1):
-            data_dict[elem_name] = data[indx]
+
+        for indx, elem_name in enumerate(_elems):
+            if len(days) > 1: data_dict[elem_name] = stacked[indx]
+            else: data_dict[elem_name] = stacked[indx][0]
 
         if meta is not None:
             meta_dict = query_result['meta']
@@ -141,6 +243,9 @@ class AcisGridDownloadMixin:
     # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
     def unpackAcisGrid(self, elem, grid):
+        # grids from AcisGridStreamDecoder are already unpacked
+        if isinstance(grid, N.ndarray) and grid.dtype.kind == 'f':
+            return grid
         narray = N.array(grid)
         #Ms_in_array = N.where(narray=='M')
         #if len(Ms_in_array[0]) > 0: narray[Ms_in_grid] = '-999'
@@ -0,0 +1,222 @@
+""" Decodes ACIS GridData responses into NumPy arrays as they are read.
+
+A GridData response is a JSON object like :
+
+    {"meta":{"lat":[[...],...],"lon":[[...],...]},
+     "data":[["2018-05-01",[[...],...],[[...],...]], ...]}
+
+json.loads turns every node of every grid into a Python float, and needs
+the whole response in memory before it can start. AcisGridStreamDecoder
+is fed the response one chunk at a time instead. Each value nested two
+levels deep, i.e. each day in "data" and each grid in "meta", is parsed
+as soon as it is complete, with the numbers in its grids converted
+directly to arrays by NumPy. Only the current day's text and the
+decoded arrays are ever held in memory.
+"""
+
+import re
+
+import numpy as N
+
+from atmosci.acis.client import json
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+# strings are matched whole so brackets inside them are ignored
+STRUCTURE = re.compile(r'"(?:[^"\\]|\\.)*"|[\[\]{}]')
+ROW_SEPARATOR = re.compile(r'\]\s*,\s*\[')
+PLACEHOLDER = '__decoded_value__%d'
+EPOCH_ORDINAL = 719163 # datetime.date(1970,1,1).toordinal()
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+def decodeGrid(text):
+    """ Returns: array of floats for a JSON grid (a list of lists of
+    numbers), with the ACIS missing value (-999) set to NaN
+    """
+    text = text.strip()
+    if not text.startswith('['):
+        value = N.array(json.loads(text), dtype=float)
+    else:
+        num_rows = len(ROW_SEPARATOR.findall(text)) + 1
+        value = N.fromstring(text.translate(None, '[]'), dtype=float, sep=',')
+        if text.startswith('[['): shape = (num_rows, -1)
+        else: shape = (-1,)
+        if len(value) % num_rows == 0:
+            value = value.reshape(shape)
+        else: value = None
+        # anything other than numbers, e.g. "M", stops N.fromstring early
+        if value is None or text.count(',') != value.size - 1:
+            value = N.array(json.loads(text))
+            if value.dtype.kind not in 'fi':
+                value[value == 'M'] = '-999'
+            value = value.astype(float)
+    value[value < -998] = N.nan
+    return value
+
+def decodeDay(text):
+    """ Returns: list with the date string followed by a grid for each
+    element in a day of GridData results
+    """
+    text = text.strip()[1:-1]
+    start = text.index('"')
+    end = text.index('"', start + 1)
+    date = text[start+1:end]
+    text = text[end+1:].lstrip()[1:] # skip the comma after the date
+
+    values = [date,]
+    if '[' not in text:
+        # elements are numbers instead of grids, e.g. single points
+        for value in text.split(','): values.append(decodeGrid(value))
+        return values
+
+    depth = 0
+    for match in STRUCTURE.finditer(text):
+        char = match.group()
+        if char == '[' or char == '{':
+            if depth == 0: start = match.start()
+            depth += 1
+        elif char == ']' or char == '}':
+            depth -= 1
+            if depth == 0: values.append(decodeGrid(text[start:match.end()]))
+    return values
+
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+def stackGrids(days, num_elems):
+    """ Returns: list with a (days, y, x) array of floats for each element
+    in the days of GridData results, with missing values set to NaN. The
+    grids may be nested lists, as json.loads returns them, or arrays.
+    """
+    stacked = [ ]
+    for indx in range(1, num_elems + 1):
+        grids = [day[indx] for day in days]
+        try:
+            grids = N.array(grids, dtype=float)
+        except ValueError: # "M" for missing
+            grids = N.array(grids)
+            grids[grids == 'M'] = '-999'
+            grids = grids.astype(float)
+        grids[grids < -998] = N.nan
+        stacked.append(grids)
+    return stacked
+
+def dateOrdinals(date_strings):
+    """ Returns: array of proleptic Gregorian ordinals, the same as
+    datetime.date.toordinal(), for a sequence of ACIS date strings
+    """
+    days = N.array(date_strings, dtype='datetime64[D]').astype(N.int32)
+    return days + EPOCH_ORDINAL
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+class AcisGridStreamDecoder(object):
+    """ Decodes a GridData response fed to it in chunks of any size.
+
+    Usage:
+        decoder = AcisGridStreamDecoder()
+        for chunk in client.streamRequest('GridData', **request):
+            decoder.feed(chunk)
+        response = decoder.finish()
+
+    finish() returns the response with the same structure as json.loads,
+    except that every grid is an array of floats with NaN for missing
+    values. When num_days is given, the grids for each element are also
+    stacked into a preallocated (num_days, y, x) array as the days arrive,
+    see stackedData(). Pass the arrays in stacked to have the grids decoded
+    into arrays you already have, e.g. part of a larger array.
+    """
+
+    def __init__(self, num_days=None, stacked=None):
+        if stacked is not None and num_days is None:
+            num_days = len(stacked[0])
+        self.num_days = num_days
+        self._capture = None
+        self._carry = ''
+        self._decoded = [ ]
+        self._depth = 0
+        self._skeleton = [ ]
+        self._stacked = stacked
+        self._num_stacked = 0
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def feed(self, chunk):
+        text = self._carry + chunk
+        # hold back a string that continues in the next chunk
+        if text.count('"') % 2 == 1:
+            last_quote = text.rindex('"')
+            self._carry = text[last_quote:]
+            text = text[:last_quote]
+        else: self._carry = ''
+        self._scan(text)
+
+    def finish(self):
+        carry = self._carry
+        self._carry = ''
+        if carry: self._scan(carry)
+        response = json.loads(''.join(self._skeleton))
+        return self._restore(response)
+
+    def stackedData(self):
+        """ Returns: list with a (num_days, y, x) array for each element,
+        None when num_days was not given
+        """
+        if self._stacked is None: return None
+        if self._num_stacked < self.num_days:
+            return [grids[:self._num_stacked] for grids in self._stacked]
+        return self._stacked
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def _scan(self, text):
+        start = 0
+        for match in STRUCTURE.finditer(text):
+            char = match.group()
+            if char == '[' or char == '{':
+                self._depth += 1
+                if self._depth == 3:
+                    # start of a day in "data" or a grid in "meta"
+                    self._skeleton.append(text[start:match.start()])
+                    self._skeleton.append('"%s"' % (PLACEHOLDER %
+                                                    len(self._decoded)))
+                    self._capture = [ ]
+                    start = match.start()
+            elif char == ']' or char == '}':
+                self._depth -= 1
+                if self._depth == 2:
+                    self._capture.append(text[start:match.end()])
+                    self._decodeCapture(''.join(self._capture))
+                    self._capture = None
+                    start = match.end()
+
+        if self._capture is not None: self._capture.append(text[start:])
+        else: self._skeleton.append(text[start:])
+
+    def _decodeCapture(self, text):
+        if text.lstrip()[1:].lstrip().startswith('"'): # a day of data
+            day = decodeDay(text)
+            if self.num_days is not None and len(day) > 1:
+                if self._stacked is None:
+                    self._stacked = [N.empty((self.num_days,) + grid.shape)
+                                     for grid in day[1:]]
+                if self._num_stacked < self.num_days:
+                    for indx, grid in enumerate(day[1:]):
+                        self._stacked[indx][self._num_stacked] = grid
+                        # the stacked array is the only copy
+                        day[indx+1] = self._stacked[indx][self._num_stacked]
+                    self._num_stacked += 1
+            self._decoded.append(day)
+        else: self._decoded.append(decodeGrid(text))
+
+    def _restore(self, value):
+        if isinstance(value, basestring):
+            if value.startswith(PLACEHOLDER[:-2]):
+                return self._decoded[int(value[len(PLACEHOLDER)-2:])]
+            return value
+        if isinstance(value, list):
+            return [self._restore(item) for item in value]
+        if isinstance(value, dict):
+            return dict([(key, self._restore(item))
+                         for key, item in value.items()])
+        return value
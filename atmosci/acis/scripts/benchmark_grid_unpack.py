@@ -0,0 +1,116 @@
+#! /usr/bin/env python
+""" Times unpacking ACIS GridData results for a multi-month regional grid
+into (days, y, x) arrays, the way unpackAcisQueryResults used to (a grid
+at a time from the lists json.loads returns), with stackGrids on the same
+lists, and from the arrays filled while the response was streamed. Also
+checks that a request split into tiles of days merges into the same
+arrays as the whole request. Uses the local stand-in ACIS server.
+"""
+
+import sys
+import time
+import datetime
+
+import numpy as N
+
+from atmosci.acis.client import acisSession, json
+from atmosci.acis.griddata import AcisGridDataClient, AcisGridDownloadMixin
+from atmosci.acis.gridstream import stackGrids
+from atmosci.acis.standin import AcisStandInServer
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+from optparse import OptionParser
+parser = OptionParser()
+parser.add_option('-b', action='store', dest='bbox',
+                  default='-82.75,37.125,-72.75,45.125',
+                  help='bounding box of the grid')
+parser.add_option('-d', action='store', type=int, dest='num_days',
+                  default=92, help='number of days in the request')
+parser.add_option('-t', action='store', type=int, dest='tile_days',
+                  default=31, help='number of days in each tile')
+options, args = parser.parse_args()
+
+START_DATE = datetime.date(2018, 5, 1)
+END_DATE = START_DATE + datetime.timedelta(days=options.num_days - 1)
+ELEMS = 'maxt,mint'
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+class GridDownloader(AcisGridDownloadMixin):
+    def acisGridDataClient(self, debug=False):
+        return AcisGridDataClient(base_url, debug=debug)
+
+def oldUnpack(query_result, elems):
+    """ the way unpackAcisQueryResults used to unpack grids """
+    downloader = GridDownloader()
+    data = [ ]
+    for result in query_result['data']:
+        date_result = [downloader.acisStringToDate(result[0]),]
+        for grid in result[1:]:
+            grid = N.array(grid).astype(float)
+            grid[grid < -998] = N.nan
+            date_result.append(grid)
+        data.append(date_result)
+    data = zip(*data)
+    for indx, grids in enumerate(data[1:], start=1):
+        data[indx] = N.array(grids)
+    return data
+
+def timed(function, *args):
+    start = time.time()
+    result = function(*args)
+    return time.time() - start, result
+
+def sameGrids(grid_1, grid_2):
+    return grid_1.shape == grid_2.shape and \
+           N.allclose(grid_1, grid_2, equal_nan=True)
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+failures = 0
+server = AcisStandInServer().start()
+base_url = server.url + '/'
+try:
+    client = AcisGridDataClient(base_url)
+    downloader = GridDownloader()
+    request = { 'bbox':options.bbox, 'elems':ELEMS,
+                'sdate':client.acisDateString(START_DATE),
+                'edate':client.acisDateString(END_DATE) }
+
+    query_result = json.loads(client.request(3, **request)[0])
+    old_time, old = timed(oldUnpack, query_result, ELEMS)
+    stack_time, stacked = timed(stackGrids, query_result['data'], 2)
+
+    response, streamed = client.streamGridData(3, options.num_days, **request)
+    unpack_time, data = timed(downloader.unpackAcisQueryResults, response,
+                              ELEMS, None, True, streamed)
+
+    tiled = downloader.getAcisGridData(3, ELEMS, START_DATE, END_DATE,
+                                       tile_days=options.tile_days,
+                                       bbox=options.bbox)
+
+    passed = True
+    for indx, elem in enumerate(ELEMS.split(',')):
+        passed = passed and sameGrids(old[indx+1], stacked[indx]) and \
+                 sameGrids(old[indx+1], data[elem]) and \
+                 sameGrids(old[indx+1], tiled[elem])
+    passed = passed and data['dates'] == old[0] and tiled['dates'] == old[0]
+    passed = passed and (data['date_ordinals'] ==
+                         [date.toordinal() for date in old[0]]).all()
+    if not passed: failures += 1
+
+    queries = len(server.requests)
+    print '%s : %d days of %d x %d grids' % ((ELEMS,) + data['maxt'].shape)
+    print '%-40s %10.4f seconds' % ('unpack lists a grid at a time', old_time)
+    print '%-40s %10.4f seconds' % ('stackGrids on lists', stack_time)
+    print '%-40s %10.4f seconds' % ('unpack streamed arrays', unpack_time)
+    print '%d day tiles merged in %d queries' % (options.tile_days,
+                                                 queries - 2)
+    print 'results match' if passed else 'results DO NOT match'
+
+finally:
+    acisSession().close()
+    server.stop()
+
+sys.exit(failures)
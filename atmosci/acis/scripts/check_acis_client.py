@@ -0,0 +1,257 @@
+#! /usr/bin/env python
+""" Exercises the ACIS grid data client against the local stand-in ACIS
+server : connections kept alive between queries, the response cache and
+its expiration, and grids decoded while the response streams in. Also
+compares the time and memory used to pull a regional grid for a range of
+days the way getAcisGridData used to, a new connection and json.loads
+of the whole response, with the streaming client and with the cache.
+"""
+
+import os
+import sys
+import time
+import shutil
+import urllib, urllib2
+import resource
+import tempfile
+import multiprocessing
+
+import numpy as N
+
+from atmosci.acis.cache import AcisResponseCache
+from atmosci.acis.client import acisSession, json
+from atmosci.acis.griddata import AcisGridDataClient, AcisGridDownloadMixin
+from atmosci.acis.gridstream import AcisGridStreamDecoder
+from atmosci.acis.standin import AcisStandInServer
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+from optparse import OptionParser
+parser = OptionParser()
+parser.add_option('-b', action='store', dest='bbox',
+                  default='-82.75,37.125,-72.75,45.125',
+                  help='bounding box of the grid used for timing')
+parser.add_option('-d', action='store', type=int, dest='num_days',
+                  default=30, help='number of days used for timing')
+options, args = parser.parse_args()
+
+START_DATE = '2018-05-01'
+SMALL_BBOX = '-76.5,42.0,-75.5,43.0'
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+def check(description, passed):
+    global failures
+    if not passed: failures += 1
+    print '%-60s %s' % (description, 'ok' if passed else 'FAILED')
+
+def endDate(num_days):
+    return (N.datetime64(START_DATE) + num_days - 1).item().strftime('%Y-%m-%d')
+
+def sameGrids(grid_1, grid_2):
+    return N.allclose(grid_1, grid_2, equal_nan=True) and \
+           grid_1.shape == grid_2.shape
+
+class GridDownloader(AcisGridDownloadMixin):
+    def __init__(self, cache=None): self.cache = cache
+    def acisGridDataClient(self, debug=False):
+        return AcisGridDataClient(base_url, debug=debug, cache=self.cache)
+
+def oldGetAcisGridData(elems, num_days, bbox):
+    """ the way getAcisGridData used to get data : a new connection for
+    every query and json.loads of the whole response
+    """
+    query = json.dumps({ 'bbox':bbox, 'sdate':START_DATE,
+                         'edate':endDate(num_days), 'grid':'3',
+                         'elems':[{'name':name} for name in elems.split(',')],
+                         'meta':'ll' })
+    request = urllib2.Request(base_url + 'GridData',
+                              urllib.urlencode({'params':query}),
+                              { 'Accept':'application/json' })
+    query_result = json.loads(urllib2.urlopen(request).read())
+    downloader = GridDownloader()
+    # unpackAcisGrid used to convert every grid, decoded or not
+    data = { }
+    for indx, elem in enumerate(elems.split(','), start=1):
+        grids = [ ]
+        for day in query_result['data']:
+            grid = N.array(day[indx]).astype(float)
+            grid[grid < -998] = N.nan
+            grids.append(grid)
+        data[elem] = N.array(grids)
+    return data
+
+def newGetAcisGridData(elems, num_days, bbox, cache=None):
+    return GridDownloader(cache).getAcisGridData(3, elems, START_DATE,
+                             endDate(num_days), bbox=bbox, meta=('ll',))
+
+def _measure_(function, args, queue):
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.time()
+    function(*args)
+    elapsed = time.time() - start
+    after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put((elapsed, (after - before) / 1024.))
+
+def measure(function, *args):
+    """ seconds and growth of peak memory (MB) in a fresh process """
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_measure_,
+                                      args=(function, args, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+failures = 0
+cache_dir = tempfile.mkdtemp()
+server = AcisStandInServer().start()
+base_url = server.url + '/'
+try:
+    client = AcisGridDataClient(base_url)
+    request = { 'bbox':SMALL_BBOX, 'sdate':START_DATE, 'edate':endDate(5),
+                'elems':'maxt,mint', 'meta':'ll' }
+
+    # streaming decoder gives the same grids as json.loads
+    response_string = client.request(3, **request)[0]
+    expected = json.loads(response_string)
+    response, stacked = client.streamGridData(3, 5, **request)
+    same = [day[0] for day in response['data']] == \
+           [day[0] for day in expected['data']]
+    for day, expected_day in zip(response['data'], expected['data']):
+        for grid, expected_grid in zip(day[1:], expected_day[1:]):
+            expected_grid = N.array(expected_grid, dtype=float)
+            expected_grid[expected_grid < -998] = N.nan
+            same = same and sameGrids(grid, expected_grid)
+    same = same and sameGrids(response['meta']['lat'],
+                              N.array(expected['meta']['lat']))
+    check('streamed grids match json.loads', same)
+    check('days stacked into (days, y, x) arrays',
+          stacked[0].shape == (5,) + response['data'][0][1].shape)
+
+    decoder = AcisGridStreamDecoder()
+    for indx in range(0, len(response_string), 7):
+        decoder.feed(response_string[indx:indx+7])
+    tiny = decoder.finish()
+    check('decoding 7 byte chunks gives the same grids',
+          all([sameGrids(grid_1, grid_2)
+               for day_1, day_2 in zip(tiny['data'], response['data'])
+               for grid_1, grid_2 in zip(day_1[1:], day_2[1:])]))
+
+    single = newGetAcisGridData('maxt', 1, SMALL_BBOX)
+    check('single day request returns 2D grids',
+          single['maxt'].ndim == 2 and len(single['dates']) == 1)
+
+    try:
+        client.streamGridData(3, None, state='NY', date=START_DATE,
+                              elems='maxt')
+        check('ACIS error response raises ValueError', False)
+    except ValueError:
+        check('ACIS error response raises ValueError', True)
+
+    # keep alive
+    server.reset()
+    for day in range(5):
+        client.streamGridData(3, None, bbox=SMALL_BBOX, elems='maxt',
+                              date=endDate(day + 1))
+    check('5 queries use a single connection',
+          len(server.requests) == 5 and server.connections == 1)
+
+    # response cache
+    cache = AcisResponseCache(cache_dir, ttl=60)
+    cached_client = AcisGridDataClient(base_url, cache=cache)
+    server.reset()
+    first = cached_client.streamGridData(3, 5, **request)[1]
+    second = cached_client.streamGridData(3, 5, **request)[1]
+    check('repeated query is answered from the cache',
+          len(server.requests) == 1 and
+          all([sameGrids(grid_1, grid_2)
+               for grid_1, grid_2 in zip(first, second)]))
+
+    query = json.loads(server.queries[0])
+    reordered = json.dumps(dict(reversed(sorted(query.items()))), indent=2)
+    cached_client.query(reordered)
+    check('same query written differently hits the cache',
+          len(server.requests) == 1)
+
+    cache.ttl = 0
+    time.sleep(0.01)
+    cached_client.streamGridData(3, 5, **request)
+    check('expired response is requested again', len(server.requests) == 2)
+    cache.ttl = 60
+
+    chunks = cached_client.streamRequest('GridData', chunk_size=64,
+                                         grid=3, bbox=SMALL_BBOX,
+                                         date=START_DATE, elems='pcpn')
+    chunks.next()
+    chunks.close()
+    filepath = cache.filepath('GridData', server.queries[-1])
+    leftovers = [name for name in os.listdir(os.path.dirname(filepath))
+                 if name.endswith('.tmp')]
+    check('response that was not read completely is not cached',
+          not os.path.exists(filepath) and not leftovers)
+
+    num_requests = len(server.requests)
+    for attempt in range(2):
+        try: cached_client.streamGridData(3, None, state='NY',
+                                          date=START_DATE, elems='maxt')
+        except ValueError: pass
+        cached_client.request(3, state='NY', date=START_DATE, elems='mint')
+    error_files = [cache.filepath('GridData', query)
+                   for query in server.queries[num_requests:]]
+    check('error responses are not cached',
+          len(server.requests) == num_requests + 4 and
+          not any([os.path.exists(filepath) for filepath in error_files]))
+
+    # two writers for the same query in one process, e.g. two threads
+    query = json.dumps({ 'grid':'3', 'date':START_DATE, 'elems':'maxt' })
+    bodies = ['{"data":[["%s",[[%d,%d]]]]}' % (START_DATE, num, num)
+              for num in (1, 2)]
+    writers = [cache.responseWriter('GridData', query) for body in bodies]
+    for indx in range(0, len(bodies[0]), 5):
+        for writer, body in zip(writers, bodies):
+            writer.write(body[indx:indx+5])
+    committed = [writer.commit() for writer in writers]
+    with open(cache.filepath('GridData', query)) as file_obj:
+        cached = file_obj.read()
+    check('concurrent writers of one query do not corrupt the cache',
+          committed == [True, True] and cached == bodies[1])
+
+    # time and memory to pull a regional grid
+    acisSession().close()
+    cache.clear()
+    elems = 'maxt,mint'
+    old_time, old_memory = measure(oldGetAcisGridData, elems,
+                                   options.num_days, options.bbox)
+    new_time, new_memory = measure(newGetAcisGridData, elems,
+                                   options.num_days, options.bbox)
+    newGetAcisGridData(elems, options.num_days, options.bbox, cache)
+    cached_time, cached_memory = measure(newGetAcisGridData, elems,
+                   options.num_days, options.bbox, cache)
+
+    old = oldGetAcisGridData(elems, options.num_days, options.bbox)
+    new = newGetAcisGridData(elems, options.num_days, options.bbox, cache)
+    check('getAcisGridData matches the old download',
+          all([sameGrids(old[elem], new[elem]) for elem in elems.split(',')]))
+
+    shape = new['maxt'].shape
+    print '\n%s : %d days of %d x %d grids' % ((elems,) + shape)
+    print '%-28s %8s %12s' % ('', 'seconds', 'peak MB')
+    print '%-28s %8.2f %12.1f' % ('json.loads', old_time, old_memory)
+    print '%-28s %8.2f %12.1f' % ('streamed', new_time, new_memory)
+    print '%-28s %8.2f %12.1f' % ('streamed from the cache', cached_time,
+                                  cached_memory)
+    print '%-28s %8s %12.1f' % ('size of the arrays', '',
+           sum([new[elem].nbytes for elem in elems.split(',')]) / 1048576.)
+
+finally:
+    acisSession().close()
+    server.stop()
+    shutil.rmtree(cache_dir)
+
+if failures > 0:
+    print '\n%d checks FAILED' % failures
+    sys.exit(1)
+print '\nall checks passed'
@@ -0,0 +1,158 @@
+""" Local stand-in for the ACIS web services, so ACIS clients can be
+exercised without network access. It answers GridData queries for a
+bounding box with synthetic grids computed from the query, so the same
+query always gets the same response, and records every query along with
+the client connection it arrived on.
+"""
+
+import time
+import socket
+import urlparse
+import datetime
+
+import numpy as N
+
+from atmosci.acis.client import json, tightJson
+from atmosci.utils.httpserver import SampleFileRequestHandler, \
+                                     SampleFileServer
+
+SPACING = 0.041667 # ACIS 5 km grid spacing
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+def _dates_(query):
+    if 'date' in query: return [query['date'],]
+    start = datetime.date(*[int(part) for part in query['sdate'].split('-')])
+    end = datetime.date(*[int(part) for part in query['edate'].split('-')])
+    return [(start + datetime.timedelta(days=day)).strftime('%Y-%m-%d')
+            for day in range((end - start).days + 1)]
+
+def _gridJson_(grid):
+    rows = [','.join(['%.2f' % value for value in row]) for row in grid]
+    return '[[%s]]' % '],['.join(rows)
+
+def gridDataResponse(query):
+    """ Returns: synthetic GridData response for a query, in JSON """
+    if 'bbox' not in query:
+        return tightJson({'error':'the stand-in only supports bbox queries'})
+    min_lon, min_lat, max_lon, max_lat = \
+        [float(value) for value in query['bbox'].split(',')]
+    lons = N.arange(min_lon, max_lon + (SPACING / 2.), SPACING)
+    lats = N.arange(min_lat, max_lat + (SPACING / 2.), SPACING)
+    lons, lats = N.meshgrid(lons, lats)
+
+    elems = query['elems']
+    if isinstance(elems, basestring): elems = elems.split(',')
+    names = [elem['name'] if isinstance(elem, dict) else elem
+             for elem in elems]
+
+    meta = query.get('meta', '')
+    if isinstance(meta, basestring): meta = meta.split(',')
+    meta_json = [ ]
+    if 'll' in meta or 'lat' in meta:
+        meta_json.append('"lat":%s' % _gridJson_(lats))
+    if 'll' in meta or 'lon' in meta:
+        meta_json.append('"lon":%s' % _gridJson_(lons))
+    if 'elev' in meta:
+        meta_json.append('"elev":%s' % _gridJson_((lats - 30.) * 100.))
+
+    days = [ ]
+    for date in _dates_(query):
+        # values depend on the date, so any date range gets the same grids
+        day = datetime.date(*[int(part) for part in date.split('-')])
+        day = day.toordinal() % 60
+        grids = [ ]
+        for indx, name in enumerate(names):
+            grid = 40. + (lats - min_lat) * 3. - (lons - min_lon) + \
+                   (day * 0.5) + (indx * 10.)
+            # nodes in the ocean have no data
+            grid[(lons > (max_lon - 1.)) & (lats < (min_lat + 1.))] = -999.
+            grids.append(_gridJson_(grid))
+        days.append('["%s",%s]' % (date, ','.join(grids)))
+
+    parts = [ ]
+    if meta_json: parts.append('"meta":{%s}' % ','.join(meta_json))
+    parts.append('"data":[%s]' % ',\n'.join(days))
+    return '{%s}' % ','.join(parts)
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+class AcisStandInRequestHandler(SampleFileRequestHandler):
+
+    # keep connections alive between requests
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        SampleFileRequestHandler.setup(self)
+        with self.server.lock: self.server.open_connections.add(self.request)
+
+    def finish(self):
+        with self.server.lock:
+            self.server.open_connections.discard(self.request)
+        SampleFileRequestHandler.finish(self)
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get('Content-Length', 0))
+        params = urlparse.parse_qs(self.rfile.read(length))
+        query = params.get('params', ['{}'])[0]
+        with server.lock:
+            server.requests.append((self.path, query, self.client_address))
+        if server.delay > 0: time.sleep(server.delay)
+
+        if self.path.strip('/') != 'GridData':
+            self.send_error(404)
+            return
+
+        body = gridDataResponse(json.loads(query))
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        with server.lock: server.bytes_sent += len(body)
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+class AcisStandInServer(SampleFileServer):
+    """ Serves ACIS GridData queries at http://127.0.0.1:port/ from a
+    background thread. Port 0 picks any free port.
+
+    Arguments:
+        delay: seconds to wait before responding to each query
+
+    Usage:
+        with AcisStandInServer() as server:
+            client = AcisGridDataClient(server.url + '/')
+    """
+
+    def __init__(self, port=0, delay=0.):
+        SampleFileServer.__init__(self, None, port, False, delay,
+                                  handler=AcisStandInRequestHandler)
+
+    def start(self):
+        SampleFileServer.start(self)
+        self._server.open_connections = set()
+        return self
+
+    def stop(self):
+        # handlers of kept alive connections are waiting for the next
+        # request, hang up on them
+        if self._server is not None:
+            with self._server.lock:
+                for connection in self._server.open_connections:
+                    try: connection.shutdown(socket.SHUT_RDWR)
+                    except socket.error: pass
+        SampleFileServer.stop(self)
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    @property
+    def connections(self):
+        """ number of different client connections used for queries """
+        return len(set([request[2] for request in self.requests]))
+
+    @property
+    def queries(self):
+        return [request[1] for request in self.requests]
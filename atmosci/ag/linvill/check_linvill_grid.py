@@ -0,0 +1,137 @@
+#! /usr/bin/env python
+""" Checks the Linvill grid model against the single point models and
+times hourly temperature generation for a regional grid over a season.
+
+Day lengths and hourly temperatures are compared with LinvillDaylenModel
+at every node and day. Hourly temperatures are also compared with
+tempRangeToHourly in point.py wherever both calculate the same day
+length; point.py adds one to the climatological day and does not move
+January and February to the end of the year, so its day length differs
+by an hour on some days.
+"""
+
+import sys
+import time
+import datetime
+
+import numpy as N
+
+from atmosci.ag.linvill import LinvillDaylenModel, Linvill3DGridModel
+from atmosci.ag.linvill.point import tempRangeToHourly
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+from optparse import OptionParser
+parser = OptionParser()
+parser.add_option('-d', action='store', type=int, dest='num_days',
+                  default=120, help='number of days in the season')
+parser.add_option('-x', action='store', type=int, dest='num_lons',
+                  default=241, help='number of longitudes in the region')
+parser.add_option('-y', action='store', type=int, dest='num_lats',
+                  default=193, help='number of latitudes in the region')
+options, args = parser.parse_args()
+
+# a season that crosses the end of the year
+START_DATE = datetime.datetime(2017, 10, 1)
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+def dailyTemps(num_days, lats):
+    """ daily temperature extremes (F) that vary by day and latitude """
+    days = N.arange(num_days, dtype=float).reshape((-1,) + (1,) * lats.ndim)
+    mint = 20. + (45. - lats) * 1.5 + N.cos(days * 0.2) * 8.
+    maxt = mint + 12. + N.sin(days * 0.3) * 6.
+    return maxt, mint
+
+def pointDayLength(date, lat):
+    """ day length the way point.py calculates it """
+    clim_day = int(30.6 * date.month + date.day + 1 - 91.3)
+    lat_rad = point_model.latToRadians(lat)
+    if lat > 40: return point_model._daylightAtLatGT40(clim_day, lat_rad)
+    return point_model._daylightAtLatLE40(clim_day, lat_rad)
+
+def check(description, passed):
+    global failures
+    if not passed: failures += 1
+    print '%-60s %s' % (description, 'ok' if passed else 'FAILED')
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+failures = 0
+point_model = LinvillDaylenModel()
+grid_model = Linvill3DGridModel()
+
+# small grid spanning the 40 degree split, every day of a full year
+lats = N.linspace(30., 48., 37).reshape(-1, 1) + N.zeros((1, 3))
+num_days = 365
+maxt, mint = dailyTemps(num_days, lats)
+daylens = grid_model.dayLengthArray(START_DATE,
+                                    START_DATE + datetime.timedelta(364),
+                                    grid_model.latToRadians(lats))
+hourly = grid_model.hourlyTempGrids(daylens, maxt, mint)
+
+daylens_match = True
+model_match = True
+point_match = True
+point_compared = 0
+for day in range(num_days):
+    date = START_DATE + datetime.timedelta(day)
+    for y in range(lats.shape[0]):
+        lat = lats[y, 0]
+        daylen = point_model.dayLength(date, point_model.latToRadians(lat))
+        daylens_match = daylens_match and daylen == daylens[day, y, 0]
+        expected = point_model.hourlyTempsForDay(daylen, maxt[day, y, 0],
+                                                 mint[day, y, 0])
+        model_match = model_match and \
+                      N.allclose(hourly[day, :, y, 0], expected, atol=1e-9)
+        if pointDayLength(date, lat) == daylen:
+            point = tempRangeToHourly(date, lat, mint[day, y, 0],
+                                      maxt[day, y, 0])
+            point_compared += 1
+            point_match = point_match and \
+                          N.allclose(hourly[day, :, y, 0], point, atol=1e-9)
+
+check('day lengths match LinvillDaylenModel.dayLength', daylens_match)
+check('hourly temps match LinvillDaylenModel.hourlyTempsForDay',
+      model_match)
+check('hourly temps match point.py (%d of %d days with same day length)' %
+      (point_compared, num_days * lats.shape[0]), point_match)
+
+# one day and one node give the same results as many
+one = grid_model.tempGridsToHourly(START_DATE, lats[:1, :1], maxt[:1, :1, :1],
+                                   mint[:1, :1, :1])
+check('single day at a single node', N.allclose(one[0, :, 0, 0],
+                                                hourly[0, :, 0, 0]))
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+# full region for a season
+lats = N.linspace(37.125, 45.125, options.num_lats).reshape(-1, 1) + \
+       N.zeros((1, options.num_lons))
+maxt, mint = dailyTemps(options.num_days, lats)
+
+start = time.time()
+hourly = grid_model.tempGridsToHourly(START_DATE, lats, maxt, mint,
+                                      dtype=N.float32)
+grid_time = time.time() - start
+
+# scalar model at a sample of nodes, scaled up to the full region
+sample = 200
+start = time.time()
+for node in range(sample):
+    day, y = node % options.num_days, node % options.num_lats
+    date = START_DATE + datetime.timedelta(day)
+    daylen = point_model.dayLength(date, point_model.latToRadians(lats[y, 0]))
+    point_model.hourlyTempsForDay(daylen, maxt[day, y, 0], mint[day, y, 0])
+scalar_time = (time.time() - start) * (maxt.size / float(sample))
+
+print '\n%d days of %d x %d grids, %d hourly temps' % (maxt.shape +
+                                                       (hourly.size,))
+print '%-32s %10.2f seconds' % ('Linvill3DGridModel', grid_time)
+print '%-32s %10.2f seconds (estimated)' % ('LinvillDaylenModel per node',
+                                             scalar_time)
+
+if failures > 0:
+    print '\n%d checks FAILED' % failures
+    sys.exit(1)
+print '\nall checks passed'
@@ -1,16 +1,21 @@
-
-from dateutil.relativedelta import relativedelta
-ONE_DAY = relativedelta(days=1)
 import numpy as N
 
 from .array import LinvillArrayModel
+from .model import LAT40_RADS # 40 degrees latitude converted to radians
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+# maximum number of hourly values computed at once, limits the size of
+# the temporary arrays when converting long runs of days on large grids
+BLOCK_SIZE = 4000000
 
 # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
 
 class Linvill3DGridModel(LinvillArrayModel):
     """ Class to calculate the length of a day (or group of days) and
     estimate hourly temperatures at each latitude in a grid of latitudes.
-    
+    All days and grid nodes are calculated at once with array operations.
+
     Based on the model described in :
         Linvill, Dale E. (1990), "Calculating Chilling Hours and Chill
         Units from Daily Maximum and Minimum Temperature Observations"
@@ -37,53 +42,134 @@ class Linvill3DGridModel(LinvillArrayModel):
         3D numpy array, dtype=int, shape=(num days, rad_lats.shape)
                 length of day for each date at each grid node.
         """
-        # convert date to factored climatoligcal day
-        clim_days = \
-        self.climatologicalDayGrid(first_date, last_date, rad_lats.shape)
+        clim_days = self.climatologicalDayArray(first_date, last_date)
+        # seasonal factor for each day, broadcast against the grid
+        seasonal = N.cos((clim_days * 0.0172) - 1.95)
+        seasonal = seasonal.reshape((-1,) + (1,) * rad_lats.ndim)
+
+        # latitude factor for each grid node
+        tan_lats = N.tan(rad_lats)
+        gt40 = rad_lats > LAT40_RADS
+        lat_factors = N.where(gt40, (tan_lats**2 * 1.7643) + 1.6164,
+                                    tan_lats * 3.34)
+        offsets = N.where(gt40, 12.25, 12.14)
 
-        # daylight hours
-        daylens = N.zeroslike(clim_days)
+        # drop the decimal hours before returning
+        return ((seasonal * lat_factors) + offsets).astype(int)
 
-        # adjust grid nodes > 40 degrees latitude
-        nodes = N.where(rad_lats > LAT40_RADS)
-        if len(nodes[0]) > 0:
-            daylens[nodes] = \
-            self._daylightAtLatsGT40(clim_day_factor,rad_lats[nodes])
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
-        # adjust grid nodes <= 40 degrees latitude
-        nodes = N.where(rad_lats <= LAT40_RADS)
-        if len(nodes[0]) > 0:
-            daylens[nodes] = \
-            self._daylightAtLatsGT40(clim_day_factor,rad_lats[nodes])
+    def climatologicalDayArray(self, first_date, last_date):
+        """ Determine climatological day for each date in a range of
+        calendar dates, which may span more than one year.
 
-        # drop the decimal hours before returning
-        return daylens.astype(int)
+        Returns
+        =======
+        1D numpy array, dtype=int, size=num days in range
+              climatological day corresponding to each date in range
+        """
+        dates = N.arange(N.datetime64(first_date, 'D'),
+                         N.datetime64(last_date, 'D') + 1)
+        first_of_month = dates.astype('datetime64[M]')
+        months = (first_of_month.astype(int) % 12) + 1
+        days = (dates - first_of_month).astype(int) + 1
+        # January and February are at the end of the Linvill year
+        months = N.where(months < 3, months + 12, months)
+        return ((months * 30.6) + days - 91.3).astype(int)
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def sunriseSunsetArrays(self, daylens):
+        """ Determine the time of sunrise and sunset in hours of local
+        solar time, assuming that daylight is centered on solar noon.
+
+        Returns
+        =======
+        tuple of numpy arrays, dtype=float, same shape as daylens
+              hour of sunrise and hour of sunset
+        """
+        half_days = daylens * 0.5
+        return 12. - half_days, 12. + half_days
 
     # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
-    def climatologicalDayGrid(self, first_date, last_date, grid_shape):
-        clim_days = tuple(climatologicalDaysInRange(first_date, last_date))
-        template_grid = N.array(grid_shape, dtype=float)
-        clim_day_grid = \
-        N.array((clim_days.size,) + grid_shape, dtype=float)
+    def hourlyTempGrids(self, daylens, maxt, mint, units='F', dtype=float):
+        """ Estimate the temperature at each hour of the day for multiple
+        days at each node in a grid.
 
-        for indx, clim_day in enumerate(clim_days):
-            template_grid.fill(clim_day)
-            clim_day_grid[indx] = template_grid
-        return clim_day_grid
+        Arguments
+        =========
+        daylens : 3D numpy array, dtype=int
+                  number of hours in the day at each node for each day
+        maxt : 3D numpy array
+               maximum temprature for each day at each node
+        mint : 3D numpy array
+               minimum temprature for each day at each node
+        units : str
+                units for input temperatures.
+                must be one of 'F' for Fahrenheit, 'C' for Celsius
+        dtype : numpy dtype of the returned array
+        NOTE: daylens, maxt and mint arrays must all be the same shape
+
+        Returns
+        =======
+        4D numpy array, shape=(num days, 24, grid shape)
+              estimated temperatures for 24 hours at each node
+
+        NOTE: calculations are done in degrees Celsius and returned
+              temperatures are always in Celsius
+        """
+        hourly = N.empty((daylens.shape[0], 24) + daylens.shape[1:], dtype)
+        grid_size = max(daylens[0].size, 1)
+        block_days = max(BLOCK_SIZE / (24 * grid_size), 1)
+        for first in range(0, daylens.shape[0], block_days):
+            days = slice(first, first + block_days)
+            self._hourlyTempsForBlock(daylens[days], maxt[days], mint[days],
+                                      units, hourly[days])
+        return hourly
 
     # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
-    def tempGridsToHourly(self, start_date, lats, maxt, mint, units='F'):
-        hourly_shape = (maxt.shape[0], 24) + maxt.shape[1:]
-        print maxt.shape, hourly_shape
-        hourly_grid = N.empty(hourly_shape, dtype=float)
-        date = start_date
-        for day in range(maxt.shape[0]):
-            print 'day', day
-            daylen = self.dayLength(date, lats[day])
-            hourly_grid[day] = \
-                self.hourlyTempsForDay(daylen, maxt[day], mint[day], units)
-            date += ONE_DAY
-        return hourly_grid
+    def tempGridsToHourly(self, start_date, lats, maxt, mint, units='F',
+                                dtype=float):
+        """ Estimate hourly temperatures from grids of daily maximum and
+        minimum temperatures for consecutive days beginning at start_date.
+
+        Arguments
+        =========
+        lats : 2D numpy array, grid of latitudes in degrees
+        maxt, mint : 3D numpy arrays, shape=(num days, lats.shape)
+
+        Returns
+        =======
+        4D numpy array, shape=(num days, 24, lats.shape), in Celsius
+        """
+        last_date = N.datetime64(start_date, 'D') + (maxt.shape[0] - 1)
+        daylens = self.dayLengthArray(start_date, last_date,
+                                      self.latToRadians(lats))
+        return self.hourlyTempGrids(daylens, maxt, mint, units, dtype)
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
+    def _hourlyTempsForBlock(self, daylens, maxt, mint, units, hourly):
+        # add an hour axis to every daily grid
+        daylens = daylens[:, N.newaxis]
+        _maxt, _mint = self.maxMinTempAsCelsius(maxt[:, N.newaxis],
+                                                mint[:, N.newaxis], units)
+        temp_diff = _maxt - _mint
+        hours = N.arange(24).reshape((1, 24) + (1,) * (daylens.ndim - 2))
+        daylens_plus_4 = daylens + 4.
+
+        # daytime temperatures, Linvill assumes the minimum temperature
+        # occurs at the first hour of the day (sin(0) == 0)
+        hourly[...] = N.sin((N.pi * hours) / daylens_plus_4) * temp_diff
+        hourly += _mint
+
+        # night time temperatures decay from the temperature at sunset
+        sunset_temps = \
+        (N.sin((N.pi * (daylens - 1)) / daylens_plus_4) * temp_diff) + _mint
+        with N.errstate(divide='ignore', invalid='ignore'):
+            degrees_per_hour = (sunset_temps - _mint) / (24 - daylens)
+        night_hours = N.maximum(hours - daylens + 1, 1)
+        night_temps = sunset_temps - (degrees_per_hour * N.log(night_hours))
+        N.copyto(hourly, night_temps, where=hours >= daylens)
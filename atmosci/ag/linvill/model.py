@@ -99,10 +99,10 @@ class LinvillDaylenModel(object):
         int : length of day
         """
         clim_day = self.climatologicalDay(date)
-        if lat_rads > LAT40_RADS:
-            return self._daylightAtLatGT40(clim_day, lat_rads)
+        if lat_rad > LAT40_RADS:
+            return self._daylightAtLatGT40(clim_day, lat_rad)
         # latitude is less than or equal to 40 degrees 
-        else: return self._daylightAtLatLE40(clim_day, lat_rads)
+        else: return self._daylightAtLatLE40(clim_day, lat_rad)
 
     # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
@@ -251,8 +251,8 @@ class LinvillDaylenModel(object):
         NOTE: All calculations are done in degrees Celsius and
         returned temperatures are always in degrees Celsius.
         """
-        temps = [ self.hourlyTempsForDay(daylen[i], maxt[i], mint[i], units)
-                  for i in range(len(daylen)) ]
+        temps = [ self.hourlyTempsForDay(daylens[i], maxts[i], mints[i], units)
+                  for i in range(len(daylens)) ]
         return N.array(temps)
 
     # - - - # - - - # - - - # - - - # - - - # - - - # - - - # - - - # - - - #
@@ -316,7 +316,7 @@ class LinvillDaylenModel(object):
         int, scalar : number of whole daylight hours
         """
         daylight = ( N.cos( (clim_day * 0.0172) - 1.95 ) *
-                     (N.tan(rad_lats) * 3.34) ) + 12.14
+                     (N.tan(lat_rad) * 3.34) ) + 12.14
         if isinstance(daylight, N.ndarray):
             return daylight.astype(int)
         else: return int(daylight)
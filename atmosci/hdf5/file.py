@@ -8,7 +8,7 @@ import h5py
 import numpy as N
 from atmosci.utils.data import safedict, dictToWhere, listToWhere
 from atmosci.utils.timeutils import asDatetime
-from atmosci.utils.units import convertUnits
+from atmosci.units import convertUnits
 
 from atmosci.hdf5.mixin import Hdf5DataReaderMixin, Hdf5DataWriterMixin
 
@@ -16,6 +16,52 @@ from atmosci.hdf5.mixin import Hdf5DataReaderMixin, Hdf5DataWriterMixin
 
 from atmosci.hdf5.mixin import BOGUS_VALUE
 
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+def scaledDataPacker(dtype, scale=1., offset=0., missing=None):
+    """ Returns a function that packs float data into a dataset of type
+    dtype. Integer datasets store round((data - offset) / scale) with NaN
+    replaced by missing. Float datasets are simply cast to dtype.
+    """
+    dtype = N.dtype(dtype)
+    if dtype.kind == 'f':
+        def packData(data):
+            return N.asarray(data).astype(dtype)
+        return packData
+
+    info = N.iinfo(dtype)
+    min_value = info.min
+    max_value = info.max
+    # keep the missing value sentinel out of the valid data range
+    if missing is not None:
+        if missing == min_value: min_value += 1
+        elif missing == max_value: max_value -= 1
+
+    def packData(data):
+        packed = N.array(data, dtype=float)
+        invalid = N.isnan(packed)
+        if offset: packed -= offset
+        if scale != 1.: packed /= scale
+        N.around(packed, out=packed)
+        N.clip(packed, min_value, max_value, out=packed)
+        if missing is not None: packed[invalid] = missing
+        return packed.astype(dtype)
+    return packData
+
+def scaledDataUnpacker(scale=1., offset=0., missing=None):
+    """ Returns a function that unpacks integer or float32 data to float
+    with missing values set to NaN.
+    """
+    def unpackData(data):
+        unpacked = N.array(data, dtype=float)
+        if scale != 1.: unpacked *= scale
+        if offset: unpacked += offset
+        if missing is not None and not N.isnan(missing):
+            unpacked[N.asarray(data) == missing] = N.nan
+        return unpacked
+    return unpackData
+
+
 # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
 
 class Hdf5FileReader(Hdf5DataReaderMixin, object):
@@ -377,12 +423,36 @@ class Hdf5FileReader(Hdf5DataReaderMixin, object):
 
     # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
-    def registerDataPacker(dataset_path, function):
+    def registerDataPacker(self, dataset_path, function):
         self._packers[dataset_path] = function
 
-    def registerDataUnpacker(dataset_path, function):
+    def registerDataUnpacker(self, dataset_path, function):
         self._unpackers[dataset_path] = function
 
+    def registerScaledDataset(self, dataset_path):
+        """ Registers a packer/unpacker pair for a dataset that is stored
+        as scaled integers (scale_factor and/or add_offset attributes) or
+        as float32 with an "unpack" attribute.
+
+        Returns True if the dataset's data will be unpacked, else False.
+        """
+        attrs = self.datasetAttributes(dataset_path)
+        scale = attrs.get('scale_factor', None)
+        offset = attrs.get('add_offset', None)
+        dtype = self.datasetType(dataset_path)
+        if scale is None and offset is None:
+            if dtype.kind != 'f' or dtype.itemsize >= 8: return False
+            if 'unpack' not in attrs: return False
+
+        if scale is None: scale = 1.
+        if offset is None: offset = 0.
+        missing = attrs.get('missing', None)
+        self._packers[dataset_path] = \
+            scaledDataPacker(dtype, scale, offset, missing)
+        self._unpackers[dataset_path] = \
+            scaledDataUnpacker(scale, offset, missing)
+        return True
+
 
     # - - - # - - - # - - - # - - - # - - - # - - - # - - - # - - - # - - - #
 
@@ -432,7 +502,9 @@ class Hdf5FileReader(Hdf5DataReaderMixin, object):
         units = self.datasetAttribute(dataset_path, 'units', None)
         if units is not None:
             if out_units != units:
-                return convertUnits(data, units, out_units)
+                # data was just read from the file, convert it in place
+                return convertUnits(data, units, out_units, inplace=True)
+            return data
         else:
             errmsg = '"%s" dataset has no attribute named "units"'
             raise AttributeError, errmsg % dataset_path
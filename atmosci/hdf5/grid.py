@@ -7,6 +7,7 @@ import math
 import numpy as N
 
 from atmosci.hdf5.file import Hdf5FileReader, Hdf5FileManager
+from atmosci.utils.gridindex import gridNodeIndex
 
 # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
 
@@ -82,6 +83,19 @@ class Hdf5GridFileMixin:
     def indexOfClosestNode(self, lon, lat):
         return self._indexOfClosestNode(lon, lat)
 
+    def indexesOfClosestNodes(self, lons, lats):
+        """ Returns arrays with the indexes of the grid nodes closest to
+        each of the lon/lat coordinate points. Indexes for points that are
+        outside the node search radius are -1.
+        """
+        y, x, distances = self.nodeIndex().nearestNodes(lons, lats)
+        radius = self.node_search_radius
+        outside = (N.abs(self.lons[y,x] - lons) > radius) | \
+                  (N.abs(self.lats[y,x] - lats) > radius)
+        y[outside] = -1
+        x[outside] = -1
+        return y, x
+
     def index2ll(self, y, x):
         """ Returns the lon/lat coordinates of grid node at the y/x index
         """
@@ -95,6 +109,15 @@ class Hdf5GridFileMixin:
             return self.nodeIndexer(lon, lat)
         else: return self._indexOfClosestNode(lon, lat)
 
+    def nodeIndex(self):
+        """ Returns the spatial index used to find grid nodes closest to
+        lon/lat coordinates. It is built once for each grid.
+        """
+        if getattr(self, '_node_index', None) is None:
+            self._node_index = gridNodeIndex(self.lons, self.lats,
+                                             self._nodeIndexCachePath_())
+        return self._node_index
+
     # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
     def setAreaMask(self, mask_name='mask'):
@@ -201,17 +224,17 @@ class Hdf5GridFileMixin:
         # the data ... this implementation is decent for grids in the
         # continental U.S. with small node spacing (~ 5km or less) such
         # as the ACIS 5 km Lambert Conformal grids supplied by NRCC.
-        # It should really be implemented in a subclass using a method
-        # that is specific to the grid type in use.
-
-        # try for anexact fit
-        indexes = N.where( (self.lons == target_lon) &
-                           (self.lats == target_lat) )
-        if len(indexes[0]) > 0:
-            return indexes[0][0], indexes[1][0]
+        # Without a tolerance, the node index picks the search method
+        # that suits the grid (see atmosci.utils.gridindex).
 
         # search using user-requested tolerance
         if tolerance is not None:
+            # try for anexact fit
+            indexes = N.where( (self.lons == target_lon) &
+                               (self.lats == target_lat) )
+            if len(indexes[0]) > 0:
+                return indexes[0][0], indexes[1][0]
+
             # first try to find a uique node within the tolerance
             indexes = N.where( (self.lons >= (target_lon - tolerance)) &
                                (self.lons <= (target_lon + tolerance)) )
@@ -235,11 +258,13 @@ class Hdf5GridFileMixin:
 
         # search using radius specified in the file attributes
         else:
+            y, x = self.nodeIndex().nearestNode(target_lon, target_lat)
             radius = self.node_search_radius
-            indexes = N.where( (self.lons >= (target_lon - radius)) &
-                               (self.lons <= (target_lon + radius)) &
-                               (self.lats >= (target_lat - radius)) &
-                               (self.lats <= (target_lat + radius)) )
+            if abs(self.lons[y,x] - target_lon) > radius \
+            or abs(self.lats[y,x] - target_lat) > radius:
+                errmsg = 'No grid node within %s degrees of (%s, %s)'
+                raise ValueError, errmsg % (radius, target_lon, target_lat)
+            return y, x
 
         # find node that is least distance from target coordinates
         distances = \
@@ -322,6 +347,13 @@ class Hdf5GridFileMixin:
 
     # - - - # - - - # - - - # - - - # - - - # - - - # - - - # - - - # - - - #
 
+    def _nodeIndexCachePath_(self):
+        # only files that are the source of a grid, e.g. static files,
+        # keep their node index on disk
+        return None
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
     def _clearManagerAttributes_(self):
         Hdf5DataFileManager._clearManagerAttributes_(self)
 
@@ -329,6 +361,7 @@ class Hdf5GridFileMixin:
 
     def _loadGridFileAttributes_(self):
         Hdf5FileReader._loadManagerAttributes_(self)
+        self._node_index = None
         self.unsetGridBounds()
         self._initCoordinateLimits()
         self._loadGridExtentAttributes_()
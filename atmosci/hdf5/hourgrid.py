@@ -246,7 +246,7 @@ class Hdf5HourlyGridReaderMethods(TimeZoneManagementMethods):
             NumPy array containing the retrieved data.
         """
         index = self.indexForTime(dataset_path, hour, **kwargs)
-        data = self.getDataset(dataset_path).value[index,:,:]
+        data = self.getDataset(dataset_path)[index,:,:]
         return self._processDataOut(dataset_path, data, **kwargs)
 
     # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
@@ -282,7 +282,7 @@ class Hdf5HourlyGridReaderMethods(TimeZoneManagementMethods):
         """
         y, x = self.ll2index(lon, lat)
         index = self.indexForTime(dataset_path, hour, **kwargs)
-        data = self.getDataset(dataset_path).value[index, y, x]
+        data = self.getDataset(dataset_path)[index, y, x]
         return self._processDataOut(dataset_path, data, **kwargs)
 
     # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
@@ -524,7 +524,7 @@ class Hdf5HourlyGridReaderMethods(TimeZoneManagementMethods):
         start, end = \
             self.indexesForTimes(dataset_path, start_time, end_time, **kwargs)
         y, x = self.ll2index(lon, lat)
-        data = self.getDataset(dataset_path).value[start:end, y, x]
+        data = self.getDataset(dataset_path)[start:end, y, x]
         return self._processDataOut(dataset_path, data, **kwargs)
 
     # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
@@ -646,7 +646,7 @@ class Hdf5HourlyGridReaderMethods(TimeZoneManagementMethods):
         """
         start, end = \
             self.indexesForTimes(dataset_path, start_time, end_time, **kwargs)
-        data = self.getDataset(dataset_path).value[start:end, :, :]
+        data = self.getDataset(dataset_path)[start:end, :, :]
         return self._processDataOut(dataset_path, data, **kwargs)
 
     # - - - # - - - # - - - # - - - # - - - # - - - # - - - # - - - # - - - #
@@ -660,37 +660,37 @@ class Hdf5HourlyGridReaderMethods(TimeZoneManagementMethods):
         if ndims == 3:
             if max_y == min_y:
                 if max_x == min_x: # retrieve data for one node
-                    return dataset.value[:, min_y, min_x]
+                    return dataset[:, min_y, min_x]
                 elif max_x < shape[2]:
-                    return dataset.value[:, min_y, min_x:max_x]
+                    return dataset[:, min_y, min_x:max_x]
                 else: # max_x >= dataset.shape[2]
-                    return dataset.value[:, min_y, min_x:]
+                    return dataset[:, min_y, min_x:]
             elif max_y < shape[1]:
                 if max_x == min_x:
-                    return dataset.value[:, min_y:max_y, min_x]
+                    return dataset[:, min_y:max_y, min_x]
                 elif max_x < shape[2]:
-                    return dataset.value[:, min_y:max_y, min_x:max_x]
+                    return dataset[:, min_y:max_y, min_x:max_x]
                 else: # max_x >= dataset.shape[2]
-                    return dataset.value[:, min_y:max_y, min_x:]
+                    return dataset[:, min_y:max_y, min_x:]
             else: # max_y >= dataset.shape[1]
                 if max_x == min_x:
-                    return dataset.value[:, min_y:, min_x]
+                    return dataset[:, min_y:, min_x]
                 elif max_x < shape[2]:
-                    return dataset.value[:, min_y:, min_x:max_x]
+                    return dataset[:, min_y:, min_x:max_x]
                 else: # max_x >= dataset.shape[2]
-                    return dataset.value[:, min_y:, min_x:]
+                    return dataset[:, min_y:, min_x:]
 
         elif ndims == 2:
             if max_y < shape[0]:
                 if max_x < shape[1]:
-                    return dataset.value[min_y:max_y, min_x:max_x]
+                    return dataset[min_y:max_y, min_x:max_x]
                 else:
-                    return dataset.value[min_y:max_y, min_x:]
+                    return dataset[min_y:max_y, min_x:]
             else:
                 if max_x < shape[1]:
-                    return dataset.value[min_y:, min_x:max_x]
+                    return dataset[min_y:, min_x:max_x]
                 else:
-                    return dataset.value[min_y:, min_x:]
+                    return dataset[min_y:, min_x:]
         
     # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
@@ -721,9 +721,9 @@ class Hdf5HourlyGridReaderMethods(TimeZoneManagementMethods):
     def _dataAtNode(self, dataset, y, x):
         shape = dataset.shape
         if len(shape) == 3:
-            return dataset.value[:, y, x]
+            return dataset[:, y, x]
         elif len(shape) == 2:
-            return dataset.value[y, x]
+            return dataset[y, x]
 
     # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
@@ -737,69 +737,69 @@ class Hdf5HourlyGridReaderMethods(TimeZoneManagementMethods):
         if end == start: # single date
             if max_y == min_y:
                 if max_x == min_x: # retrieve data for one node
-                    return dataset.value[start, min_y, min_x]
+                    return dataset[start, min_y, min_x]
                 elif max_x < dataset.shape[2]:
-                    return dataset.value[start, min_y, min_x:max_x]
+                    return dataset[start, min_y, min_x:max_x]
                 else: # max_x >= dataset.shape[2]
-                    return dataset.value[start, min_y, min_x:]
+                    return dataset[start, min_y, min_x:]
             elif max_y < dataset.shape[1]:
                 if max_x == min_x:
-                    return dataset.value[start, min_y:max_y, min_x]
+                    return dataset[start, min_y:max_y, min_x]
                 elif max_x < dataset.shape[2]:
-                    return dataset.value[start, min_y:max_y, min_x:max_x]
+                    return dataset[start, min_y:max_y, min_x:max_x]
                 else: # max_x >= dataset.shape[2]
-                    return dataset.value[start, min_y:max_y, min_x:]
+                    return dataset[start, min_y:max_y, min_x:]
             else: # max_y >= dataset.shape[1]
                 if max_x == min_x:
-                    return dataset.value[start, min_y:, min_x]
+                    return dataset[start, min_y:, min_x]
                 elif max_x < dataset.shape[2]:
-                    return dataset.value[start, min_y:, min_x:max_x]
+                    return dataset[start, min_y:, min_x:max_x]
                 else: # max_x >= dataset.shape[2]
-                    return dataset.value[start, min_y:, min_x:]
+                    return dataset[start, min_y:, min_x:]
         elif end < dataset.shape[0]:
             if max_y == min_y:
                 if max_x == min_x: # retrieve data for one node
-                    return dataset.value[start:end, min_y, min_x]
+                    return dataset[start:end, min_y, min_x]
                 elif max_x < dataset.shape[2]:
-                    return dataset.value[start:end, min_y, min_x:max_x]
+                    return dataset[start:end, min_y, min_x:max_x]
                 else: # max_x >= dataset.shape[2]
-                    return dataset.value[start:end, min_y, min_x:]
+                    return dataset[start:end, min_y, min_x:]
             elif max_y < dataset.shape[1]:
                 if max_x == min_x:
-                    return dataset.value[start:end, min_y:max_y, min_x]
+                    return dataset[start:end, min_y:max_y, min_x]
                 elif max_x < dataset.shape[2]:
-                    return dataset.value[start:end, min_y:max_y, min_x:max_x]
+                    return dataset[start:end, min_y:max_y, min_x:max_x]
                 else: # max_x >= dataset.shape[2]
-                    return dataset.value[start:end, min_y:max_y, min_x:]
+                    return dataset[start:end, min_y:max_y, min_x:]
             else: # max_y >= dataset.shape[1]
                 if max_x == min_x:
-                    return dataset.value[start:end, min_y:, min_x]
+                    return dataset[start:end, min_y:, min_x]
                 elif max_x < dataset.shape[2]:
-                    return dataset.value[start:end, min_y:, min_x:max_x]
+                    return dataset[start:end, min_y:, min_x:max_x]
                 else: # max_x >= dataset.shape[2]
-                    return dataset.value[start:end, min_y:, min_x:]
+                    return dataset[start:end, min_y:, min_x:]
         else: # end > dataset.shape[0] ... retrieve all dates to end of dataset
             if max_y == min_y:
                 if max_x == min_x: # retrieve data for one node
-                    return dataset.value[start:, min_y, min_x]
+                    return dataset[start:, min_y, min_x]
                 elif max_x < dataset.shape[2]:
-                    return dataset.value[start:, min_y, min_x:max_x]
+                    return dataset[start:, min_y, min_x:max_x]
                 else: # max_x >= dataset.shape[2]
-                    return dataset.value[start:, min_y, min_x:]
+                    return dataset[start:, min_y, min_x:]
             elif max_y < dataset.shape[1]:
                 if max_x == min_x:
-                    return dataset.value[start:, min_y:max_y, min_x]
+                    return dataset[start:, min_y:max_y, min_x]
                 elif max_x < dataset.shape[2]:
-                    return dataset.value[start:, min_y:max_y, min_x:max_x]
+                    return dataset[start:, min_y:max_y, min_x:max_x]
                 else: # max_x >= dataset.shape[2]
-                    return dataset.value[start:, min_y:max_y, min_x:]
+                    return dataset[start:, min_y:max_y, min_x:]
             else: # max_y >= dataset.shape[1]
                 if max_x == min_x:
-                    return dataset.value[start:, min_y:, min_x]
+                    return dataset[start:, min_y:, min_x]
                 elif max_x < dataset.shape[2]:
-                    return dataset.value[start:, min_y:, min_x:max_x]
+                    return dataset[start:, min_y:, min_x:max_x]
                 else: # max_x >= dataset.shape[2]
-                    return dataset.value[start:, min_y:, min_x:]
+                    return dataset[start:, min_y:, min_x:]
 
     # - - - # - - - # - - - # - - - # - - - # - - - # - - - # - - - # - - - #
 
@@ -830,6 +830,9 @@ class Hdf5HourlyGridReaderMethods(TimeZoneManagementMethods):
             timezone = self.datasetAttribute(path, 'timezone', None)
             if timezone is None: timezone_map[path] = DEFAULT_TZINFO
             else: timezone_map[path] = tzutils.asTimezoneObj(timezone)
+            # datasets stored as scaled integers or float32 are unpacked
+            # to float with NaN for missing values
+            self.registerScaledDataset(path)
         self.timezone_cache = timezone_map
 
         self.time_attr_cache = { }
@@ -906,8 +909,7 @@ class Hdf5HourlyGridManagerMethods(Hdf5HourlyGridReaderMethods):
         """
         index = self.indexForTime(dataset_path, start_time, **kwargs)
         y, x = self.ll2index(lon, lat)
-        processed = self._processDataIn(dataset_path, data, **kwargs)
-        self._insertAtNode(dataset_path, processed, index, x, y, **kwargs)
+        self._insertAtNode(dataset_path, data, index, x, y, **kwargs)
 
     # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
@@ -936,8 +938,7 @@ class Hdf5HourlyGridManagerMethods(Hdf5HourlyGridReaderMethods):
 
         """
         time_index = self.indexForTime(dataset_path, start_time, **kwargs)
-        processed = self._processDataIn(dataset_path, data, **kwargs)
-        self._insertTimeSlice(dataset_path, processed, time_index, **kwargs)
+        self._insertTimeSlice(dataset_path, data, time_index, **kwargs)
 
     # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
@@ -973,8 +974,7 @@ class Hdf5HourlyGridManagerMethods(Hdf5HourlyGridReaderMethods):
         min_y, min_x = self.ll2index(min_lon, min_lat)
         max_y, max_x = self.ll2index(max_lon, max_lat)
         time_index = self.indexForTime(dataset_path, start_time, **kwargs)
-        processed = self._processDataIn(dataset_path, data, **kwargs)
-        self._insert3DSlice(dataset_path, processed, time_index,
+        self._insert3DSlice(dataset_path, data, time_index,
                             min_y, max_y, min_x, max_x, **kwargs)
 
     # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
@@ -1073,14 +1073,18 @@ class Hdf5HourlyGridManagerMethods(Hdf5HourlyGridReaderMethods):
 
     # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
-    def _insert3DSlice(self, data, start_index, min_y, max_y, min_x, max_x,
-                             **kwargs):
-        if data.dims == 2: end_index = start_index
-        elif data.dims == 3: end_index = start_index + data.shape[0]
+    # NOTE: data passed to the _insert methods has not been packed, they
+    #       pack it with _processDataIn just before it is written
+
+    def _insert3DSlice(self, dataset_path, data, start_index, min_y, max_y,
+                             min_x, max_x, **kwargs):
+        if data.ndim == 2: end_index = start_index
+        elif data.ndim == 3: end_index = start_index + data.shape[0]
         else:
             errmsg = 'Cannot insert %dD data into a 3D dataset.'
-            raise ValueError, errmsg % data.dims
+            raise ValueError, errmsg % data.ndim
 
+        data = self._processDataIn(dataset_path, data, **kwargs)
         dataset = self.getDataset(dataset_path)
         if end_index == start_index: # single date
             return self._insertHourInBounds(dataset_path, data, start_index,
@@ -1103,7 +1107,8 @@ class Hdf5HourlyGridManagerMethods(Hdf5HourlyGridReaderMethods):
     def _insertAtNode(self, dataset_path, data, time_index, x, y, **kwargs):
         end_index = time_index + data.shape[0]
         dataset = self.getDataset(dataset_path)
-        dataset[time_index:end_index, y, x] = data
+        dataset[time_index:end_index, y, x] = \
+            self._processDataIn(dataset_path, data, **kwargs)
 
         # always track time updated
         timestamp = kwargs.get('timestamp', self.timestamp)
@@ -1163,7 +1168,7 @@ class Hdf5HourlyGridManagerMethods(Hdf5HourlyGridReaderMethods):
 
     # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
-    def _insertHoursInBounds(self, dataset, data, start_index, end_index,
+    def _insertHoursInBounds(self, dataset_path, data, start_index, end_index,
                                    min_y, max_y, min_x, max_x, **kwargs):
         dataset = self.getDataset(dataset_path)
         if max_y == min_y:
@@ -1177,7 +1182,7 @@ class Hdf5HourlyGridManagerMethods(Hdf5HourlyGridReaderMethods):
             if max_x == min_x:
                 dataset[start_index:end_index, min_y:max_y, min_x] = data
             elif max_x < dataset.shape[2]:
-                dataset[start_index, min_y:max_y, min_x:max_x] = data
+                dataset[start_index:end_index, min_y:max_y, min_x:max_x] = data
             else: # max_x >= dataset.shape[2]
                 dataset[start_index:end_index, min_y:max_y, min_x:] = data
         else: # max_y >= dataset.shape[1]
@@ -1202,7 +1207,8 @@ class Hdf5HourlyGridManagerMethods(Hdf5HourlyGridReaderMethods):
             raise TypeError, errmsg % dataset_path
         errmsg = 'Cannot insert data with %dD data into %dD dataset.'
 
-        dataset = self.getDatasetShape(dataset_path)
+        data = self._processDataIn(dataset_path, data, **kwargs)
+        dataset = self.getDataset(dataset_path)
         dataset_dims = len(dataset.shape)
         if dataset_dims == 3:
             if data.ndim == 3:
@@ -1213,7 +1219,7 @@ class Hdf5HourlyGridManagerMethods(Hdf5HourlyGridReaderMethods):
             else:
                 raise ValueError, errmsg % (data.ndim, dataset_dims)
         elif dataset_dims == 1:
-            if isinstance(data_in, N.ndarray):
+            if isinstance(data, N.ndarray):
                 if data.ndim == 1:
                     if len(data) > 1:
                         end_index = time_index + len(data)
@@ -1235,8 +1241,9 @@ class Hdf5HourlyGridManagerMethods(Hdf5HourlyGridReaderMethods):
 
     # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
-    def _insertToEndInBounds(self, dataset, data, start_index, min_y, max_y,
-                                   min_x, max_x, **kwargs):
+    def _insertToEndInBounds(self, dataset_path, data, start_index, min_y,
+                                   max_y, min_x, max_x, **kwargs):
+        dataset = self.getDataset(dataset_path)
         if max_y == min_y:
             if max_x == min_x: # retrieve data for one node
                 dataset[start_index:, min_y, min_x] = data
@@ -1250,7 +1257,7 @@ class Hdf5HourlyGridManagerMethods(Hdf5HourlyGridReaderMethods):
             elif max_x < dataset.shape[2]:
                 dataset[start_index:, min_y:max_y, min_x:max_x] = data
             else: # max_x >= dataset.shape[2]
-                dataset.value[start_index:, min_y:max_y, min_x:] = data
+                dataset[start_index:, min_y:max_y, min_x:] = data
         else: # max_y >= dataset.shape[1]
             if max_x == min_x:
                 dataset[start_index:, min_y:, min_x] = data
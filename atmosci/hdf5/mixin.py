@@ -96,6 +96,8 @@ class Hdf5DataReaderMixin:
 
     def _getData_(self, parent, dataset_name, **kwargs):
         dataset = self._getDataset_(parent, dataset_name)
+        # subsets are passed directly to h5py as a hyperslab selection so
+        # that only the requested portion of the dataset is read from disk
         # index subset in kwargs
         if 'indexes' in kwargs:
             index_strings = [ ]
@@ -104,15 +106,15 @@ class Hdf5DataReaderMixin:
                     index_strings.append(':'.join([str(it) for it in indx]))
                 else: index_strings.append(str(indx))
             subset = ','.join(index_strings)
-            return eval('dataset.value[%s]' % subset)
+            return eval('dataset[%s]' % subset)
         # index to single element
         elif 'index' in kwargs:
             indx = int(kwargs['index'])
             dimensions = len(dataset.shape)
             if dimensions > 1:
                 indexes = ','.join([':' for dim in range(dimensions-1)])
-                return eval('dataset.value[%d,%s]' % (indx, indexes))
-            else: return dataset.value[indx]
+                return eval('dataset[%d,%s]' % (indx, indexes))
+            else: return dataset[indx]
         # no indexes, return entire dataset
         else: return dataset.value
 
@@ -0,0 +1,112 @@
+""" Process-wide pool of open Hdf5 file readers.
+"""
+
+import os
+import atexit
+from collections import OrderedDict
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+class Hdf5ReaderPool(object):
+    """ Keeps file readers open so that repeated requests for the same file
+    do not pay for another h5py open and attribute parse.
+
+    Readers are kept in least recently used order and the oldest one is
+    closed when the pool is full. A reader is reopened when the file's
+    modification time or path changes, so readers never return stale data
+    after a manager updates the file.
+
+    IMPORTANT: readers returned by the pool are shared. Callers must NOT
+    close them. Call release(filepath) before opening a file for writing.
+    """
+
+    def __init__(self, max_readers=16):
+        self.max_readers = max_readers
+        self._readers = OrderedDict()
+        self.hits = 0
+        self.opens = 0
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def __contains__(self, key):
+        return key in self._readers
+
+    def __len__(self):
+        return len(self._readers)
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def closeAll(self):
+        for key in self._readers.keys(): self._discard(key)
+
+    def forget(self):
+        """ drop all readers without closing them. Used by forked worker
+        processes so they never share file handles with their parent.
+        """
+        self._readers.clear()
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def reader(self, key, filepath, openReader):
+        """
+        Arguments:
+            key: hashable key for the file, e.g. (filetype, year, month)
+            filepath: full path to the file
+            openReader: function that returns a new reader for the file,
+                        it is only called when the file is not in the pool
+                        or the pooled reader is out of date.
+        Returns:
+            open reader for the file
+        """
+        mtime = os.path.getmtime(filepath)
+        entry = self._readers.get(key, None)
+        if entry is not None:
+            reader, reader_path, reader_mtime = entry
+            if reader_path == filepath and reader_mtime == mtime \
+            and reader.file is not None:
+                # move to the most recently used position
+                del self._readers[key]
+                self._readers[key] = entry
+                self.hits += 1
+                return reader
+            self._discard(key)
+
+        while len(self._readers) >= self.max_readers:
+            self._discard(self._readers.keys()[0])
+
+        reader = openReader()
+        self._readers[key] = (reader, filepath, mtime)
+        self.opens += 1
+        return reader
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def release(self, filepath):
+        """ close any pooled reader for filepath """
+        for key, (reader, reader_path, mtime) in self._readers.items():
+            if reader_path == filepath: self._discard(key)
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def _discard(self, key):
+        reader = self._readers.pop(key)[0]
+        try:
+            reader.close()
+        except:
+            pass
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+_POOLS_ = [ ]
+
+def readerPool(max_readers=16):
+    """ Returns a new pool that will be closed when the process exits """
+    pool = Hdf5ReaderPool(max_readers)
+    _POOLS_.append(pool)
+    return pool
+
+def _closePools_():
+    for pool in _POOLS_: pool.closeAll()
+atexit.register(_closePools_)
@@ -0,0 +1,143 @@
+#! /usr/bin/env python
+""" Compares full-dataset reads (dataset.value[...]) with hyperslab reads
+(dataset[...]) on a synthetic monthly hourly grid file that uses the same
+layout as the turf weather files : one gzip compressed chunk per hour.
+"""
+
+import os, sys
+import datetime
+import tempfile
+import time
+
+import h5py
+import numpy as N
+
+from atmosci.hdf5.hourgrid import Hdf5HourlyGridFileReader
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+from optparse import OptionParser
+parser = OptionParser()
+parser.add_option('-d', action='store', type='int', dest='num_days',
+                  default=31)
+parser.add_option('-i', action='store', type='int', dest='iterations',
+                  default=3)
+parser.add_option('-k', action='store_true', dest='keep_file', default=False)
+parser.add_option('-x', action='store', type='int', dest='num_lons',
+                  default=280)
+parser.add_option('-y', action='store', type='int', dest='num_lats',
+                  default=240)
+options, args = parser.parse_args()
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+def bytesReadByProcess():
+    # Linux only : total bytes passed through read() calls by this process
+    try:
+        with open('/proc/self/io') as io_stats:
+            for line in io_stats:
+                if line.startswith('rchar:'): return int(line.split()[1])
+    except IOError: pass
+    return None
+
+def buildSyntheticFile(filepath, num_hours, num_lats, num_lons):
+    lons, lats = N.meshgrid(N.linspace(-82.7, -66.9, num_lons),
+                            N.linspace(37.2, 47.6, num_lats))
+    start_time = datetime.datetime(2018,7,1,0)
+    end_time = start_time + datetime.timedelta(hours=num_hours-1)
+
+    hdf5_file = h5py.File(filepath, 'w')
+    hdf5_file.attrs['timezone'] = 'UTC'
+    hdf5_file.attrs['start_time'] = start_time.strftime('%Y-%m-%d:%H')
+    hdf5_file.attrs['end_time'] = end_time.strftime('%Y-%m-%d:%H')
+    hdf5_file.create_dataset('lon', data=lons)
+    hdf5_file.create_dataset('lat', data=lats)
+    dataset = hdf5_file.create_dataset('TMP', (num_hours,num_lats,num_lons),
+                                       dtype=float, compression='gzip',
+                                       chunks=(1,num_lats,num_lons))
+    dataset.attrs['timezone'] = 'UTC'
+    dataset.attrs['start_time'] = hdf5_file.attrs['start_time']
+    dataset.attrs['end_time'] = hdf5_file.attrs['end_time']
+    diurnal = N.sin(N.linspace(0., 2.*N.pi, 24, endpoint=False))
+    for hour in range(num_hours):
+        dataset[hour] = 20. + (8. * diurnal[hour % 24]) + (lats - 37.2)
+    hdf5_file.close()
+    return start_time
+
+def timeRead(read_function, iterations):
+    rchar = bytesReadByProcess()
+    start = time.time()
+    for count in range(iterations):
+        data = read_function()
+    elapsed = (time.time() - start) / iterations
+    if rchar is not None: rchar = (bytesReadByProcess() - rchar) / iterations
+    return data, elapsed, rchar
+
+def report(label, full, partial):
+    full_data, full_time, full_bytes = full
+    part_data, part_time, part_bytes = partial
+    assert(N.array_equal(full_data, part_data)), 'results differ : ' + label
+    print '\n%s : result shape %s' % (label, str(part_data.shape))
+    print '    full read  : %9.4f sec' % full_time,
+    if full_bytes is not None: print '%14d bytes' % full_bytes
+    else: print
+    print '    hyperslab  : %9.4f sec' % part_time,
+    if part_bytes is not None: print '%14d bytes' % part_bytes
+    else: print
+    if part_time > 0: print '    speedup    : %9.1fx' % (full_time / part_time)
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+num_hours = options.num_days * 24
+num_lats = options.num_lats
+num_lons = options.num_lons
+iterations = options.iterations
+
+if len(args) > 0: filepath = os.path.abspath(args[0])
+else:
+    fd, filepath = tempfile.mkstemp(suffix='.h5')
+    os.close(fd)
+
+print 'building synthetic %d x %d x %d file : %s' % (num_hours, num_lats,
+                                                     num_lons, filepath)
+start_time = buildSyntheticFile(filepath, num_hours, num_lats, num_lons)
+print 'file size on disk : %d bytes' % os.path.getsize(filepath)
+
+reader = Hdf5HourlyGridFileReader(filepath)
+dataset = reader.getDataset('TMP')
+
+day = 14
+start = day * 24
+end = start + 24
+y = num_lats / 2
+x = num_lons / 2
+lon = reader.lons[y,x]
+lat = reader.lats[y,x]
+first_hour = start_time + datetime.timedelta(hours=start)
+last_hour = start_time + datetime.timedelta(hours=end-1)
+
+# one day at one node : reader.sliceAtNode
+full = timeRead(lambda : dataset.value[start:end, y, x], iterations)
+partial = timeRead(lambda : reader.sliceAtNode('TMP', first_hour, last_hour,
+                                  lon, lat, timezone='UTC'), iterations)
+report('one day at one node', full, partial)
+
+# one hour at all nodes : reader.dataForHour
+full = timeRead(lambda : dataset.value[start, :, :], iterations)
+partial = timeRead(lambda : reader.dataForHour('TMP', first_hour,
+                                               timezone='UTC'), iterations)
+report('one hour at all nodes', full, partial)
+
+# one day at all nodes : reader.timeSlice
+full = timeRead(lambda : dataset.value[start:end, :, :], iterations)
+partial = timeRead(lambda : reader.timeSlice('TMP', first_hour, last_hour,
+                                             timezone='UTC'), iterations)
+report('one day at all nodes', full, partial)
+
+# all hours at one node : reader._dataAtNode
+full = timeRead(lambda : dataset.value[:, y, x], iterations)
+partial = timeRead(lambda : reader._dataAtNode(dataset, y, x), iterations)
+report('all hours at one node', full, partial)
+
+reader.close()
+if not options.keep_file: os.remove(filepath)
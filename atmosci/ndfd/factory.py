@@ -11,11 +11,9 @@ import os
 import datetime
 ONE_DAY = datetime.timedelta(days=1)
 
-import socket, urllib, urllib2
-from BaseHTTPServer import BaseHTTPRequestHandler 
-
 from atmosci.utils import tzutils
 from atmosci.utils.config import ConfigObject
+from atmosci.utils.downloads import DownloadManager, DownloadRequest
 from atmosci.utils.timeutils import lastDayOfMonth
 
 from atmosci.seasonal.methods.access  import BasicFileAccessorMethods
@@ -363,75 +361,69 @@ class NdfdGribFileFactory(NdfdGribFactoryMethods, NDFDFactoryMethods, object):
 
     def downloadForecast(self, target_date, variable, period, region='conus',
                                source='nws', debug=False):
-        download_attempts = self.download_attempts
+        request = self.forecastDownloadRequest(target_date, variable, period,
+                                               region, source)
+        if debug:
+            print '\nAttempting to download :', request.url
+            print 'to :', request.filepath
+        result = self.downloadManager().download(request)
+        return self._downloadStatus_(result, debug)
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def downloadForecasts(self, target_date, variable_periods, region='conus',
+                                source='nws', debug=False):
+        """ downloads grib files for several (variable, period) pairs
+        concurrently.
+
+        Returns: list with the same status tuple as downloadForecast for
+                 each pair
+        """
+        download_requests = [self.forecastDownloadRequest(target_date,
+                                  variable, period, region, source)
+                             for variable, period in variable_periods]
+        results = self.downloadManager().downloadAll(download_requests)
+        return [self._downloadStatus_(result, debug) for result in results]
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
+    def downloadManager(self, max_workers=4, max_per_host=2):
+        """ Returns: DownloadManager shared by all downloads from this
+                     factory, retries use the project download settings.
+        """
+        manager = getattr(self, 'download_manager', None)
+        if manager is None:
+            manager = DownloadManager(max_workers, max_per_host,
+                                      self.download_attempts,
+                                      self.wait_times[0],
+                                      max(self.wait_times))
+            self.download_manager = manager
+        return manager
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def forecastDownloadRequest(self, target_date, variable, period,
+                                      region='conus', source='nws'):
         uri_args = { 'region':region.lower(), 'timespan': period, 'variable': variable }
         uri = self.ndfd_source_uri % uri_args
-        
-        if debug: print '\nAttempting to download :', uri
-        local_filename = self.ndfdGribFilename(variable, period)
+        url = os.path.join(self.ndfd_server, uri)
         local_filepath = self.ndfdGribFilepath(target_date, variable, period,
                                                region, source)
-        if debug: print 'to :', local_filepath
-            
-        url = os.path.join(self.ndfd_server, uri)
-        if debug: print '\nNDFD server url :', url
-
-        attempt = 0
-        while True:
-            req = urllib2.Request(url)
-            wait_time = self.wait_times[attempt]
-
-            try:
-                response = urllib2.urlopen(req)
-            
-            except urllib2.URLError as e:
-                why = (e.code, e.reason)
-                msg = 'Download failed with HTTP error code %s (%s)'
-                return e.code, local_filepath, url, msg % why
-
-            except urllib2.HTTPError as e:
-                if attempt < download_attempts:
-                    attempt += 1
-                    time.sleep(wait_time)
-                    continue
-                else:
-                    msg = 'Download failed HTTP error code %s after %d attempts : %s'
-                    info = (e.code, download_attempts, 
-                            BaseHTTPRequestHandler.responses[e.code])
-                    return e.code, local_filename, url, msg % info
-
-            except socket.timeout as e:
-                if attempt < download_attempts:
-                    attempt += 1
-                    time.sleep(wait_time)
-                    continue
-                else:
-                    msg = 'Socket timeout after %s attempts. Probable network error.'
-                    return 504, local_filename, url, msg % download_attempts
-
-            except Exception as e:
-                raise e
-
-            else:
-                target_size = self.targetGribSize(variable, period)
-                acceptable_size = target_size * self.grib_size_tolerance
-                packet_size = int(response.headers['content-length'])
-                if debug:
-                    print 'size of response packet =', packet_size
-
-                if packet_size >= acceptable_size:
-                    file_obj = open(local_filepath,'wb')
-                    file_obj.write(response.read())
-                    file_obj.close()
-                    if debug: path = local_filepath
-                    else: path = local_filename
-                    return 200, path, url, 'Data was saved to file'
-
-                else:
-                    msg = 'HTTP response contains %d bytes, expecting at least %d bytes.'
-                    info = (packet_size, acceptable_size)
-                    return 999, local_filename, url, msg % info
+        target_size = self.targetGribSize(variable, period)
+        acceptable_size = target_size * self.grib_size_tolerance
+        return DownloadRequest(url, local_filepath, key=(variable, period),
+                               min_size=acceptable_size)
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def _downloadStatus_(self, result, debug):
+        if result.ok:
+            if debug: path = result.filepath
+            else: path = os.path.basename(result.filepath)
+            return 200, path, result.url, 'Data was saved to file'
+        status = 999 if result.status is None else result.status
+        return (status, os.path.basename(result.filepath), result.url,
+                'Download failed : %s' % result.message)
 
 
 # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
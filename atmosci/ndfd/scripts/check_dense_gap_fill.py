@@ -0,0 +1,145 @@
+#! /usr/bin/env python
+""" Verifies that the dense NDFD fill methods produce exactly the same
+values and sources as the record fill methods in GridFillMethods applied
+one gap at a time. Uses random grids with missing nodes and forecast
+steps of 1, 3 and 6 hours, like the NDFD horizon, plus irregular steps.
+Also compares the time each approach takes.
+"""
+
+import sys
+import time
+import datetime
+
+import numpy as N
+
+from atmosci.utils.config import ConfigObject
+
+from atmosci.ndfd.smart_grib import DenseFillMethods, GridFillMethods, \
+                                    SOURCE_CODE, hoursInTimespan, maxSpan
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+from optparse import OptionParser
+parser = OptionParser()
+parser.add_option('-r', action='store', type=int, dest='num_rows', default=60)
+parser.add_option('-c', action='store', type=int, dest='num_cols', default=80)
+parser.add_option('-s', action='store', type=int, dest='seed', default=1234)
+options, args = parser.parse_args()
+
+FIRST_HOUR = datetime.datetime(2018, 7, 1, 12)
+FILL_VALUE = -1.
+
+# forecast steps between grib messages for each test case
+STEPS = { 'hourly':(1,) * 12,
+          'ndfd':(1,) * 36 + (3,) * 6 + (6,) * 10,
+          'tail':(3,) * 4 + (6,) * 4,
+          'irregular':(1, 2, 5, 1, 1, 4, 9, 2, 3),
+          'single':( ),
+        }
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+def check(description, passed):
+    global failures
+    if not passed: failures += 1
+    print '%-60s %s' % (description, 'ok' if passed else 'FAILED')
+
+def identical(grid1, grid2):
+    if grid1.shape != grid2.shape: return False
+    return ((grid1 == grid2) | (N.isnan(grid1) & N.isnan(grid2))).all()
+
+def varConfig(method, span):
+    varconfig = ConfigObject('variable', None)
+    varconfig.fill_method = method
+    varconfig.fill_value = FILL_VALUE
+    varconfig.span = span
+    return varconfig
+
+def spanConfig(varconfig, span):
+    return varConfig(varconfig.fill_method, span)
+
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+def denseArrays(msg_hours, varconfig, random):
+    num_hours = msg_hours[-1] + maxSpan(varconfig)
+    shape = (num_hours, options.num_rows, options.num_cols)
+    data = N.empty(shape, dtype=float)
+    data.fill(N.nan)
+    sources = N.zeros(num_hours, dtype=N.int8)
+    for hour in msg_hours:
+        grid = N.around(random.uniform(-5., 30., shape[1:]), 2)
+        grid[random.uniform(size=shape[1:]) < 0.05] = N.nan
+        # small values are zeroed by the spread method
+        grid[random.uniform(size=shape[1:]) < 0.1] = 0.005
+        data[hour] = grid
+        sources[hour] = SOURCE_CODE['ndfd']
+    return data, sources
+
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+def fillByRecords(data, sources, msg_hours, varconfig, decimals=2):
+    """ fills one gap at a time with the record fill methods """
+    fill = GridFillMethods[varconfig.fill_method]
+    num_hours = len(sources)
+    for indx, hour in enumerate(msg_hours):
+        base_time = FIRST_HOUR + datetime.timedelta(hours=hour)
+        fcast1 = ('ndfd', base_time, data[hour])
+        if indx+1 < len(msg_hours):
+            next_hour = msg_hours[indx+1]
+            if next_hour - hour < 2: continue
+            end_time = FIRST_HOUR + datetime.timedelta(hours=next_hour)
+            fcast2 = ('ndfd', end_time, data[next_hour])
+            span = next_hour - hour
+        else:
+            next_hour = num_hours
+            fcast2 = None
+            if len(msg_hours) > 1: span = hour - msg_hours[indx-1]
+            else: span = maxSpan(varconfig)
+
+        # record methods only support a single span
+        if isinstance(varconfig.span, tuple):
+            config = spanConfig(varconfig, span)
+        else: config = varconfig
+
+        for source, fcast_time, grid in fill(fcast1, fcast2, config, decimals):
+            fill_hour = hour + hoursInTimespan(fcast_time, base_time,
+                                               inclusive=False)
+            if fill_hour < next_hour:
+                data[fill_hour] = grid
+                sources[fill_hour] = SOURCE_CODE[source]
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+failures = 0
+record_time = 0.
+dense_time = 0.
+random = N.random.RandomState(options.seed)
+
+for method in sorted(DenseFillMethods.keys()):
+    for span in (1, 3, 6, (1, 3, 6)):
+        for case in sorted(STEPS.keys()):
+            msg_hours = [0,] + list(N.cumsum(STEPS[case]))
+            varconfig = varConfig(method, span)
+            data, sources = denseArrays(msg_hours, varconfig, random)
+            expected_data = data.copy()
+            expected_sources = sources.copy()
+
+            start = time.time()
+            fillByRecords(expected_data, expected_sources, msg_hours, varconfig)
+            record_time += time.time() - start
+
+            start = time.time()
+            DenseFillMethods[method](data, sources, msg_hours, varconfig)
+            dense_time += time.time() - start
+
+            check('%s fill, span %s, %s steps' % (method, str(span), case),
+                  identical(data, expected_data)
+                  and (sources == expected_sources).all())
+
+print '\n    one gap at a time : %.3f seconds, dense : %.3f seconds' % \
+      (record_time, dense_time)
+
+if failures > 0:
+    print '\n%d checks FAILED' % failures
+    sys.exit(1)
+print '\nall checks passed'
@@ -162,13 +162,160 @@ def hoursInTimespan(time1, time2, inclusive=True):
 
 # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
-def reshapeGrid(grib_msg, missing_value, grib_indexes, grid_shape_2D,
-                grid_mask, decimals=2):
-    values = grib_msg.values[grib_indexes].reshape(grid_shape_2D)
-    if N.ma.is_masked(values): values = values.data
-    values[N.where(values >= missing_value)] = N.nan
-    values[N.where(grid_mask == True)] = N.nan
-    return N.around(values,decimals)
+def hourlyTimes(first_hour, num_hours):
+    """ time index parallel to the first axis of a dense forecast array """
+    return [first_hour + datetime.timedelta(hours=hr)
+            for hr in range(num_hours)]
+
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+def maxSpan(varconfig):
+    span = varconfig.get('span', 1)
+    if isinstance(span, tuple): return max(span)
+    return span
+
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+# source of the data at each hour in a dense forecast array,
+# code 0 is an hour without data
+SOURCE_CODES = ('', 'ndfd', 'ndfd avg', 'ndfd constant', 'ndfd copy',
+                'ndfd scaled', 'ndfd spread')
+SOURCE_CODE = dict([(source, code) for code, source in enumerate(SOURCE_CODES)])
+
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+#
+# dense fill methods : fill every gap in a dense forecast array at once
+#
+# Each produces exactly the same values as the corresponding record fill
+# method in GridFillMethods applied one gap at a time. The grid for each
+# message is computed once and broadcast to all hours it fills, so all
+# gaps of the same length are handled in a single operation. Values never
+# replace the next message. The last message is extrapolated only by
+# methods that allow it.
+#
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+def messageGaps(msg_hours, num_hours, varconfig):
+    """
+    Returns arrays with one value for each grib message : hours until
+    the next message (or the end of the array for the last message) and
+    the span of the message.
+
+    Variables with a tuple of spans use the length of each step, and
+    the last message gets the span of the step before it.
+    """
+    gaps = N.diff(N.append(msg_hours, num_hours))
+    span = varconfig.get('span', 1)
+    if isinstance(span, tuple):
+        if len(gaps) > 1: spans = N.append(gaps[:-1], gaps[-2])
+        else: spans = N.array([max(span),])
+    else: spans = N.array([span,] * len(msg_hours))
+    return gaps, spans
+
+#  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -
+
+def fillRuns(msg_hours, first, last):
+    """
+    Groups messages that fill the same hours relative to the message,
+    from first to last - 1, so each group can be filled at once.
+
+    Returns list of (message indexes, hours to fill) where hours to fill
+    has shape (num messages in group, num hours filled by each message)
+    """
+    runs = [ ]
+    for run in sorted(set(zip(first, last))):
+        if run[1] <= run[0]: continue
+        indexes = N.nonzero((first == run[0]) & (last == run[1]))[0]
+        hours = msg_hours[indexes,N.newaxis] + N.arange(run[0], run[1])
+        runs.append((indexes, hours))
+    return runs
+
+#  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -
+
+def denseFillWithAverage(data, sources, msg_hours, varconfig, decimals=2):
+    # every hour in the gap, including the first, gets the first message
+    # divided by the length of the gap ... no extrapolation
+    msg_hours = N.asarray(msg_hours)
+    gaps, spans = messageGaps(msg_hours, len(sources), varconfig)
+    last = N.where(gaps > 1, gaps, 0)
+    last[-1] = 0
+    for indexes, hours in fillRuns(msg_hours, N.zeros_like(last), last):
+        grids = data[msg_hours[indexes]]
+        grids /= gaps[indexes,N.newaxis,N.newaxis]
+        N.around(grids, decimals, out=grids)
+        data[hours] = grids[:,N.newaxis]
+        sources[hours] = SOURCE_CODE['ndfd avg']
+
+#  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -
+
+def denseFillWithConstant(data, sources, msg_hours, varconfig, decimals=2):
+    # hours after each message within its span set to the fill value
+    msg_hours = N.asarray(msg_hours)
+    gaps, spans = messageGaps(msg_hours, len(sources), varconfig)
+    last = N.minimum(spans, gaps)
+    for indexes, hours in fillRuns(msg_hours, N.ones_like(last), last):
+        data[hours] = varconfig.fill_value
+        sources[hours] = SOURCE_CODE['ndfd constant']
+
+#  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -
+
+def denseFillWithCopy(data, sources, msg_hours, varconfig, decimals=2):
+    # hours after each message within its span get the message values
+    msg_hours = N.asarray(msg_hours)
+    gaps, spans = messageGaps(msg_hours, len(sources), varconfig)
+    last = N.minimum(spans, gaps)
+    for indexes, hours in fillRuns(msg_hours, N.ones_like(last), last):
+        data[hours] = data[msg_hours[indexes]][:,N.newaxis]
+        sources[hours] = SOURCE_CODE['ndfd copy']
+
+#  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -
+
+def denseScaledFill(data, sources, msg_hours, varconfig, decimals=2):
+    # linear steps from each message toward the next ... no extrapolation
+    msg_hours = N.asarray(msg_hours)
+    gaps, spans = messageGaps(msg_hours, len(sources), varconfig)
+    last = gaps.copy()
+    last[-1] = 0
+    for indexes, hours in fillRuns(msg_hours, N.ones_like(last), last):
+        base_grids = data[msg_hours[indexes]]
+        steps = data[msg_hours[indexes+1]] - base_grids
+        steps /= gaps[indexes,N.newaxis,N.newaxis]
+        N.around(steps, decimals, out=steps)
+        # all messages in the group at once, one offset at a time, keeps
+        # temporary arrays to the size of the group
+        for column in range(hours.shape[1]):
+            grids = steps * (column + 1)
+            grids += base_grids
+            data[hours[:,column]] = grids
+        sources[hours] = SOURCE_CODE['ndfd scaled']
+
+#  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -
+
+def denseSpreadFill(data, sources, msg_hours, varconfig, decimals=2):
+    # each message divided equally among all hours in its span
+    msg_hours = N.asarray(msg_hours)
+    gaps, spans = messageGaps(msg_hours, len(sources), varconfig)
+    last = N.minimum(spans, gaps)
+    last[:-1][gaps[:-1] < 2] = 0
+    for indexes, hours in fillRuns(msg_hours, N.zeros_like(last), last):
+        grids = data[msg_hours[indexes]]
+        with N.errstate(invalid='ignore'):
+            zeros = grids < 0.01
+        grids /= spans[indexes,N.newaxis,N.newaxis]
+        N.around(grids, decimals, out=grids)
+        grids[zeros] = 0
+        data[hours] = grids[:,N.newaxis]
+        sources[hours] = SOURCE_CODE['ndfd spread']
+
+#  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -
+
+DenseFillMethods = {
+    'avg': denseFillWithAverage,
+    'constant': denseFillWithConstant,
+    'copy': denseFillWithCopy,
+    'scaled': denseScaledFill,
+    'spread': denseSpreadFill,
+}
 
 
 # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
@@ -190,130 +337,122 @@ class SmartNdfdGribFileReader(NdfdGribFileFactory):
                             grid_region, grid_source, fill_gaps=False,
                             graceful_fail=False, debug=False):
         """
-        Returns a sequence containing (relative hour, full forecast date,
-        numpy array) tuples for each message in the grib files for each
-        timezone in the list. Arrays are cleaned so that both masked and
-        missing values are set to N.nan. The shape of each returned array
-        is the same (num_lons x num_lats)
+        Returns a sequence containing (source, full forecast time, numpy
+        array) tuples for each hour with data in the grib file. Arrays
+        are cleaned so that both masked and missing values are set to
+        N.nan. The shape of each returned array is the same
+        (num_lats x num_lons).
+
+        Records are views into the arrays returned by denseDataForRegion.
 
         Assumes file contains a range of times for a single variable.
         """
-        data_records = [ ]
+        units, times, sources, data = \
+            self.denseDataForRegion(fcast_date, variable, timespan,
+                                    grib_region, grid_region, grid_source,
+                                    fill_gaps, graceful_fail, debug)
+        data_records = [ (SOURCE_CODES[sources[indx]], times[indx], data[indx])
+                         for indx in N.nonzero(sources)[0] ]
+        return units, data_records
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def denseDataForRegion(self, fcast_date, variable, timespan, grib_region,
+                                 grid_region, grid_source, fill_gaps=False,
+                                 graceful_fail=False, debug=False):
+        """
+        Decodes all messages in the grib file for a variable into a
+        single array with one entry for each hour from the first valid
+        time in the file to the last hour with data.
 
-        # parameters for reshaping the grib arrays
+        Returns units, list of hourly UTC times, array of source codes
+        for each hour (see SOURCE_CODES) and the data array, shape is
+        (num_hours, num_lats, num_lons). Masked and missing values are
+        N.nan, hours without data are N.nan with source code 0.
+
+        When fill_gaps is True and the variable has a fill method, the
+        hours between messages are filled using that method.
+        """
+        # parameters for extracting the grid from the grib arrays
         grid_shape_2D, grib_indexes, grid_mask = \
             self.gribToGridParameters(grid_source, grid_region)
 
         # check whether varible supports filling gaps between records
         varconfig = self.variableConfig(variable, timespan)
         fill_method = varconfig.get('fill_method',None)
+        fill_gaps = fill_gaps and fill_method is not None
 
-        # code for filling gaps between records
-        if fill_gaps and fill_method is not None:
-            prev_record = None
-            if debug:
-                info = (timespan, variable, str(fcast_date))
-                print '\nReading %s %s grib file for %s' % info
+        if debug:
+            info = (timespan, variable, str(fcast_date))
+            print '\nReading %s %s grib file for %s' % info
 
-            # retrieve pointers to all messages in the file
-            self.openGribFile(fcast_date, variable, timespan, grib_region)
+        # retrieve pointers to all messages in the file
+        self.openGribFile(fcast_date, variable, timespan, grib_region)
+        try:
             messages = self.gribs.select()
             first_msg = messages[0]
             missing = float(first_msg.missingValue)
             units = first_msg.units
 
-            # fill the gap between this timespan and the previous one
-            if not prev_record is None:
-                grid = reshapeGrid(first_msg, missing, grib_indexes,
-                                   grid_shape_2D, grid_mask)
-                next_record = ('ndfd',asUTCTime(first_msg.validDate),grid)
-                data_records.extend(self.fillTimeGap(prev_record,
-                                         next_record, varconfig))
-
-            # update with records for the current timespan
-            data = self.dataWithoutGaps(messages, varconfig, grib_indexes,
-                                        grid_shape_2D, grid_mask, debug)
-            data_records.extend(data)
-
-            # track last record in previous timespan
-            msg = messages[-1]
-            grid = reshapeGrid(msg, missing, grib_indexes, grid_shape_2D,
-                               grid_mask)
-            prev_record = ('ndfd', asUTCTime(msg.validDate), grid)
-
+            # position of each message on the hourly time axis
+            first_hour = asUTCTime(first_msg.validDate)
+            msg_hours = [ hoursInTimespan(asUTCTime(msg.validDate), first_hour,
+                                          inclusive=False)
+                          for msg in messages ]
+
+            # room for fill methods that extend past the last message
+            num_hours = msg_hours[-1] + 1
+            if fill_gaps: num_hours += maxSpan(varconfig) - 1
+
+            data = N.empty((num_hours,)+tuple(grid_shape_2D), dtype=float)
+            data.fill(N.nan)
+            sources = N.zeros(num_hours, dtype=N.int8)
+
+            # decode each message directly into its hour in the array
+            grib_subset = None
+            for msg, hour in zip(messages, msg_hours):
+                values = N.ma.getdata(msg.values)
+                if grib_subset is None:
+                    grib_subset = N.ravel_multi_index(grib_indexes,
+                                                      values.shape)
+                N.take(values.reshape(-1), grib_subset,
+                       out=data[hour].reshape(-1), mode='clip')
+                sources[hour] = SOURCE_CODE['ndfd']
+        finally:
             self.closeGribfile()
-        
-        # code that preserves gaps between records
-        else:
-            if debug:
-                info = (variable, timespan, str(fcast_date))
-                print '\nReading %s %s grib file for %s' % info
-
-            # retrieve pointers to all messages in the file
-            self.openGribFile(fcast_date, variable, timespan, grib_region)
-            messages = self.gribs.select()
-            first_msg = messages[0]
-            missing = float(first_msg.missingValue)
-            units = first_msg.units
 
-            for msg in messages:
-                grid = reshapeGrid(msg, missing, grib_indexes,
-                                   grid_shape_2D, grid_mask)
-                this_time =  asUTCTime(msg.validDate)
-                data_records.append(('ndfd', this_time, grid))
-                if debug:
-                    stats = (N.nanmin(grid), N.nanmax(grid))
-                    print 'value stats :', msg.validDate, stats
-            self.closeGribfile()
+        # clean all hours at once
+        with N.errstate(invalid='ignore'):
+            data[data >= missing] = N.nan
+        data[:, N.asarray(grid_mask == True)] = N.nan
+        N.around(data, 2, out=data)
 
-        return units, data_records
+        if debug:
+            print 'processed %d grib messages :' % len(messages)
+            for hour in msg_hours:
+                with N.errstate(invalid='ignore'):
+                    stats = (N.nanmin(data[hour]), N.nanmax(data[hour]))
+                print '    stats :', first_hour + datetime.timedelta(hours=hour), stats
 
-    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+        if fill_gaps:
+            self.fillDenseGaps(data, sources, msg_hours, varconfig)
 
-    def dataWithoutGaps(self, messages, varconfig, grib_indexes,
-                              grid_shape_2D, grid_mask, debug=False):
-        data_records = [ ]
+        # drop unused hours at the end of the array
+        num_hours = N.nonzero(sources)[0][-1] + 1
+        times = hourlyTimes(first_hour, num_hours)
+        return units, times, sources[:num_hours], data[:num_hours]
 
-        first_msg = messages[0]
-        missing = float(first_msg.missingValue)
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
-        prev_grid = reshapeGrid(first_msg, missing, grib_indexes,
-                                grid_shape_2D, grid_mask)
-        prev_time = asUTCTime(first_msg.validDate)
-        prev_record = ('ndfd', prev_time, prev_grid)
-        if debug:
-            print 'processing %d grib messages :' % len(messages)
-            stats = (N.nanmin(prev_grid), N.nanmax(prev_grid))
-            print '    stats :', first_msg.validDate, stats
-
-        open_gap = False
-        for msg in messages[1:]:
-            grid = reshapeGrid(msg, missing, grib_indexes, grid_shape_2D,
-                               grid_mask)
-            this_time =  asUTCTime(msg.validDate)
-            this_record = ('ndfd', this_time, grid)
-            if debug:
-                stats = (N.nanmin(grid), N.nanmax(grid))
-                print '    stats :', msg.validDate, stats
-
-            gap = hoursInTimespan(prev_time, this_time, inclusive=False)
-            if gap > 1:
-                records = \
-                    self.fillTimeGap(prev_record, this_record, varconfig)
-                # add the gap records
-                data_records.extend(records)
-            else: # no gap, add previous record
-                data_records.append(prev_record)
-
-            prev_record = this_record
-            prev_time = this_time
-
-        # at this point prev_record == last this_record
-        records = self.fillTimeGap(prev_record, None, varconfig)
-        if len(records) > 0: data_records.extend(records)
-        else: data_records.append(prev_record)
-
-        return data_records
+    def fillDenseGaps(self, data, sources, msg_hours, varconfig, decimals=2):
+        """
+        Fills the hours between messages in a dense forecast array, in
+        place, using the variable's fill method. msg_hours is the index
+        of each grib message in the array.
+        """
+        fill = DenseFillMethods.get(varconfig.fill_method, None)
+        if fill is not None:
+            fill(data, sources, msg_hours, varconfig, decimals)
 
     # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
@@ -355,24 +494,11 @@ class SmartNdfdGribFileReader(NdfdGribFileFactory):
 
         Assumes file contains a range of time periods for a single variable.
         """
-        varconfig = self.variableConfig(variable, timespan)
-
-        records = self.dataForRegion(fcast_date, variable, timespans,
-                       grib_region, grid_region, grid_source, fill_gaps,
-                       graceful_fail, debug)
-
-        first_hour = records[0][1]
-        last_hour = records[-1][1]
-        num_hours = hoursInTimespan(last_hour, first_hour, inclusive=True)
-
-        grid_shape_2d = records[0][-1].shape
-        grid = N.empty((num_hours,)+grid_shape_2D, dtype=float)
-        grid.fill(N.nan)
-
-        for index, record in enumerate(records):
-            grid[index,:,:] = record[-1]
-        
-        return first_hour, varconfig.units, grid
+        units, times, sources, grid = \
+            self.denseDataForRegion(fcast_date, variable, timespan,
+                                    grib_region, grid_region, grid_source,
+                                    fill_gaps, graceful_fail, debug)
+        return times[0], units, grid
 
     # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
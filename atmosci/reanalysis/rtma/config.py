@@ -219,6 +219,24 @@ RTMA_SOURCES.ncep.variables.SPFH.pygrib = 'Specific humidity'
 RTMA_SOURCES.ncep.variables.UGRD.pygrib = '10 metre U wind component'
 RTMA_SOURCES.ncep.variables.VGRD.pygrib = '10 metre V wind component'
 
+# names (VARIABLE:level) used in the .idx inventory files on NCEP servers,
+# required for partial downloads of individual grib messages
+RTMA_SOURCES.ncep.variables.APCP.inventory = 'APCP:surface'
+RTMA_SOURCES.ncep.variables.CEIL.inventory = 'CEIL:cloud ceiling'
+RTMA_SOURCES.ncep.variables.DPT.inventory = 'DPT:2 m above ground'
+RTMA_SOURCES.ncep.variables.GUST.inventory = 'GUST:10 m above ground'
+RTMA_SOURCES.ncep.variables.HGT.inventory = 'HGT:surface'
+RTMA_SOURCES.ncep.variables.PCPN.inventory = 'APCP:surface'
+RTMA_SOURCES.ncep.variables.PRES.inventory = 'PRES:surface'
+RTMA_SOURCES.ncep.variables.SPFH.inventory = 'SPFH:2 m above ground'
+RTMA_SOURCES.ncep.variables.TCDC.inventory = 'TCDC:entire atmosphere (considered as a single layer)'
+RTMA_SOURCES.ncep.variables.TMP.inventory = 'TMP:2 m above ground'
+RTMA_SOURCES.ncep.variables.UGRD.inventory = 'UGRD:10 m above ground'
+RTMA_SOURCES.ncep.variables.VGRD.inventory = 'VGRD:10 m above ground'
+RTMA_SOURCES.ncep.variables.VIS.inventory = 'VIS:surface'
+RTMA_SOURCES.ncep.variables.WDIR.inventory = 'WDIR:10 m above ground'
+RTMA_SOURCES.ncep.variables.WIND.inventory = 'WIND:10 m above ground'
+
 # NCEP servers only supply 2 files. One for precip and one for eveything else
 # source data file name uses only UTC hour
 RTMA_SOURCES.ncep.source_file_map = {
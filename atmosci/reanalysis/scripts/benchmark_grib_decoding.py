@@ -0,0 +1,77 @@
+#! /usr/bin/env python
+""" Compares decoding reanalysis grib files one hour at a time with
+dataFromGrib to the batched decoder used by timeSlice, both in a single
+process and spread across worker processes. Verifies that all versions
+return identical grids.
+"""
+
+import time
+import datetime
+import warnings
+
+import numpy as N
+
+from atmosci.utils import tzutils
+
+from atmosci.reanalysis.smart_grib import SmartReanalysisGribReader
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+usage = 'usage: %prog analysis variable year month day [num_days] [options]'
+
+from optparse import OptionParser
+parser = OptionParser(usage)
+parser.add_option('-r', action='store', dest='grid_region', default='NE')
+parser.add_option('-s', action='store', dest='grid_source', default='acis')
+parser.add_option('-w', action='store', type=int, dest='workers', default=4)
+options, args = parser.parse_args()
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+analysis = args[0]
+variable = args[1].upper()
+date = datetime.datetime(int(args[2]), int(args[3]), int(args[4]))
+if len(args) > 5: num_days = int(args[5])
+else: num_days = 1
+
+reader = SmartReanalysisGribReader(analysis, grid_source=options.grid_source,
+                                   grid_region=options.grid_region)
+start_time = tzutils.asUtcTime(date, 'UTC')
+end_time = start_time + datetime.timedelta(hours=num_days*24 - 1)
+
+warnings.filterwarnings('ignore')
+
+# one hour per call, the way timeSlice used to read files
+hours = [start_time + datetime.timedelta(hours=hour)
+         for hour in range(num_days*24)]
+start = time.time()
+hourly = N.empty((len(hours),)+reader.grid_dimensions, dtype=float)
+hourly.fill(N.nan)
+for indx, hour in enumerate(hours):
+    found, data = reader.dataFromGrib(variable, hour)
+    if found: hourly[indx] = data
+hourly_time = time.time() - start
+
+start = time.time()
+units, batched, failed = reader.timeSlice(variable, start_time, end_time)
+batched_time = time.time() - start
+
+start = time.time()
+units, parallel, failed = reader.timeSlice(variable, start_time, end_time,
+                                           workers=options.workers)
+parallel_time = time.time() - start
+
+def identical(a, b):
+    # timeSlice drops missing hours from the end of the time span
+    a = a[:b.shape[0]]
+    return N.array_equal(N.isnan(a), N.isnan(b)) \
+           and N.array_equal(a[N.isfinite(a)], b[N.isfinite(b)])
+
+print '\n%d hours of %s %s, %d missing' % (batched.shape[0], analysis,
+                                           variable, len(failed))
+print '%-20s %10s' % ('version', 'seconds')
+print '%-20s %10.2f' % ('hourly', hourly_time)
+print '%-20s %10.2f' % ('batched', batched_time)
+print '%-20s %10.2f' % ('%d workers' % options.workers, parallel_time)
+print '\nbatched identical : %s' % identical(hourly, batched)
+print 'workers identical : %s' % identical(hourly, parallel)
@@ -0,0 +1,215 @@
+#! /usr/bin/env python
+""" Exercises atmosci.utils.downloads.DownloadManager against the local
+stand-in HTTP server : concurrent downloads with a per host limit,
+retries after refused requests, resuming responses that were cut short,
+checksum verification, missing files and partial grib downloads. Also
+compares the time to download a batch of files from a slow server one
+at a time and concurrently.
+"""
+
+import os
+import sys
+import time
+import shutil
+import struct
+import hashlib
+import tempfile
+
+from atmosci.utils.downloads import DownloadManager, DownloadRequest
+from atmosci.utils.gributils import countGribMessages
+from atmosci.utils.httpserver import SampleFileServer
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+from optparse import OptionParser
+parser = OptionParser()
+parser.add_option('-d', action='store', type=float, dest='delay', default=0.2,
+       help='seconds the server waits before each response')
+parser.add_option('-n', action='store', type=int, dest='num_files', default=12)
+parser.add_option('-p', action='store', type=int, dest='max_per_host',
+                  default=4)
+parser.add_option('-w', action='store', type=int, dest='max_workers',
+                  default=8)
+options, args = parser.parse_args()
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+def check(description, passed):
+    global failures
+    if not passed: failures += 1
+    print '%-60s %s' % (description, 'ok' if passed else 'FAILED')
+
+def fileContents(filepath):
+    with open(filepath, 'rb') as file_obj: return file_obj.read()
+
+def md5(content): return hashlib.md5(content).hexdigest()
+
+def gribMessage(body):
+    """ GRIB2 indicator section, body and end section """
+    return 'GRIB\x00\x00\x00\x02' + struct.pack('>Q', len(body) + 20) + \
+           body + '7777'
+
+def newManager(**kwargs):
+    kwargs.setdefault('backoff', 0.01)
+    return DownloadManager(**kwargs)
+
+def fileRequests(server, filenames, **kwargs):
+    return [DownloadRequest('/'.join((server.url, filename)),
+                            os.path.join(local_dir, filename), **kwargs)
+            for filename in filenames]
+
+def clearLocalDir():
+    for filename in os.listdir(local_dir):
+        os.remove(os.path.join(local_dir, filename))
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+failures = 0
+server_dir = tempfile.mkdtemp()
+local_dir = tempfile.mkdtemp()
+
+try:
+    contents = { }
+    for num in range(options.num_files):
+        filename = 'sample_%02d.grb2' % num
+        contents[filename] = os.urandom(200000 + num * 1013)
+        with open(os.path.join(server_dir, filename), 'wb') as file_obj:
+            file_obj.write(contents[filename])
+    filenames = sorted(contents.keys())
+
+    # a small grib file with an inventory for partial downloads
+    messages = [gribMessage(os.urandom(5000 + num)) for num in range(3)]
+    inventory = ('1:0:d=2018070112:TMP:2 m above ground:anl:',
+                 '2:%d:d=2018070112:DPT:2 m above ground:anl:' % len(messages[0]),
+                 '3:%d:d=2018070112:PRES:surface:anl:' % len(''.join(messages[:2])))
+    with open(os.path.join(server_dir, 'data.grb2'), 'wb') as file_obj:
+        file_obj.write(''.join(messages))
+    with open(os.path.join(server_dir, 'data.grb2.idx'), 'w') as file_obj:
+        file_obj.write('\n'.join(inventory) + '\n')
+
+    # concurrent downloads, limited per host
+    with SampleFileServer(server_dir, delay=options.delay) as server:
+        manager = newManager(max_workers=options.max_workers,
+                             max_per_host=options.max_per_host)
+        checksums = [{ 'checksum':('md5', md5(contents[filename])) }
+                     for filename in filenames]
+        download_requests = [DownloadRequest('/'.join((server.url, filename)),
+                                 os.path.join(local_dir, filename), **kwargs)
+                             for filename, kwargs in zip(filenames, checksums)]
+        start = time.time()
+        results = manager.downloadAll(download_requests)
+        concurrent_time = time.time() - start
+        check('%d files downloaded and verified concurrently' % len(filenames),
+              all([result.ok for result in results])
+              and all([fileContents(result.filepath) == contents[filename]
+                       for result, filename in zip(results, filenames)]))
+        check('never more than %d requests at once to one host' % options.max_per_host,
+              server.max_active <= options.max_per_host)
+        check('results returned in request order',
+              [result.key for result in results] == \
+              [request.key for request in download_requests])
+        manager.close()
+
+        clearLocalDir()
+        manager = newManager(max_workers=1)
+        start = time.time()
+        manager.downloadAll(fileRequests(server, filenames))
+        serial_time = time.time() - start
+        manager.close()
+        print '    one at a time : %.2f seconds, concurrent : %.2f seconds' % \
+              (serial_time, concurrent_time)
+
+    # refused requests are retried with backoff
+    clearLocalDir()
+    with SampleFileServer(server_dir, failures=2) as server:
+        with newManager(attempts=4) as manager:
+            result = manager.download(fileRequests(server, filenames[:1])[0])
+        check('succeeds on third attempt after two 503 responses',
+              result.ok and result.attempts == 3
+              and fileContents(result.filepath) == contents[filenames[0]])
+
+        clearLocalDir()
+        server.reset()
+        with newManager(attempts=2) as manager:
+            result = manager.download(fileRequests(server, filenames[:1])[0])
+        check('gives up after the maximum number of attempts',
+              not result.ok and result.status == 503
+              and not os.path.exists(result.filepath))
+
+    # responses that are cut short are resumed from the partial file
+    clearLocalDir()
+    with SampleFileServer(server_dir, truncate=1) as server:
+        with newManager() as manager:
+            result = manager.download(fileRequests(server, filenames[:1])[0])
+        headers = [header for path, header in server.requests]
+        size = len(contents[filenames[0]])
+        check('truncated response resumed with a byte range request',
+              result.ok and result.attempts == 2
+              and headers[1] == 'bytes=%d-' % (size / 2)
+              and fileContents(result.filepath) == contents[filenames[0]])
+        check('resumed download only transferred the missing bytes',
+              server.bytes_sent == size)
+
+    # timeout and chunk size of a request do not change the shared manager
+    clearLocalDir()
+    with SampleFileServer(server_dir, delay=0.5) as server:
+        with newManager(attempts=1, timeout=5.) as manager:
+            short, default = fileRequests(server, filenames[:2])
+            short.timeout = 0.1
+            short.chunk_size = 1000
+            short_result = manager.download(short)
+            default_result = manager.download(default)
+            check('request timeout and chunk size leave the manager as is',
+                  not short_result.ok and default_result.ok
+                  and manager.timeout == 5. and manager.chunk_size == 1048576)
+
+    # verification failures, missing files and partial grib downloads
+    clearLocalDir()
+    with SampleFileServer(server_dir) as server:
+        with newManager(attempts=2) as manager:
+            request = fileRequests(server, filenames[:1],
+                                   checksum=('md5', '0' * 32))[0]
+            result = manager.download(request)
+            check('checksum mismatch rejects the file',
+                  not result.ok and not os.path.exists(result.filepath)
+                  and not os.path.exists(result.filepath + '.part'))
+
+            server.reset()
+            result = manager.download(fileRequests(server, ('missing.grb2',))[0])
+            check('missing file is not retried',
+                  result.status == 404 and result.attempts == 1)
+
+            request = fileRequests(server, ('data.grb2',),
+                          grib_messages=('TMP:2 m above ground',
+                                         'PRES:surface'))[0]
+            result = manager.download(request)
+            check('only the requested grib messages are downloaded',
+                  result.ok and result.partial
+                  and fileContents(result.filepath) == messages[0] + messages[2])
+            check('partial grib file holds 2 complete messages',
+                  countGribMessages(result.filepath) == 2)
+
+            # files left by an interrupted download are not complete
+            with open(result.filepath, 'wb') as file_obj:
+                file_obj.write(messages[0] + messages[2][:1000])
+            truncated = countGribMessages(result.filepath)
+            open(result.filepath, 'wb').close()
+            check('truncated and empty grib files have fewer messages',
+                  truncated == 1 and countGribMessages(result.filepath) == 0)
+
+            request = fileRequests(server, ('data.grb2',),
+                          grib_messages=('APCP:surface',))[0]
+            result = manager.download(request)
+            check('full grib file when a message is not in the inventory',
+                  result.ok and not result.partial
+                  and fileContents(result.filepath) == ''.join(messages)
+                  and countGribMessages(result.filepath) == 3)
+
+finally:
+    shutil.rmtree(server_dir)
+    shutil.rmtree(local_dir)
+
+if failures > 0:
+    print '\n%d checks FAILED' % failures
+    sys.exit(1)
+print '\nall checks passed'
@@ -0,0 +1,118 @@
+#! /usr/bin/env python
+""" Verifies partial grib downloads against a local stand-in HTTP server.
+
+Builds a sample grib file from fake messages, along with an NCEP style
+.idx inventory, using the RTMA inventory names from the config. Then
+checks that the byte range downloader returns exactly the requested
+messages, and that it declines (so callers fall back to a full
+download) when there is no inventory, a message is not in the inventory
+or the server ignores Range headers.
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+
+from atmosci.utils.gributils import downloadGribMessages, parseGribInventory
+from atmosci.utils.httpserver import SampleFileServer
+
+from atmosci.reanalysis.rtma.config import CONFIG
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+from optparse import OptionParser
+parser = OptionParser()
+parser.add_option('-k', action='store', type=int, dest='kbytes', default=512,
+       help='approximate size of each sample message in kilobytes')
+options, args = parser.parse_args()
+
+VARIABLES = CONFIG.sources.rtma.ncep.variables
+FILE_VARIABLES = ('HGT','PRES','TMP','DPT','UGRD','VGRD','SPFH','WDIR','WIND',
+                  'GUST','VIS','CEIL','TCDC')
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+def buildSampleGrib(dirpath, filename, with_inventory=True):
+    messages = { }
+    inventory = [ ]
+    offset = 0
+    with open(os.path.join(dirpath, filename), 'wb') as grib_file:
+        for num, variable in enumerate(FILE_VARIABLES):
+            size = options.kbytes * 1024 + num * 37
+            message = 'GRIB' + os.urandom(size) + '7777'
+            grib_file.write(message)
+            messages[variable] = message
+            name = VARIABLES[variable].inventory
+            inventory.append('%d:%d:d=2018070112:%s:anl:' % (num+1, offset, name))
+            offset += len(message)
+    if with_inventory:
+        with open(os.path.join(dirpath, filename + '.idx'), 'w') as idx_file:
+            idx_file.write('\n'.join(inventory) + '\n')
+    return messages, offset
+
+def check(description, passed):
+    global failures
+    if not passed: failures += 1
+    print '%-56s %s' % (description, 'ok' if passed else 'FAILED')
+
+def fetch(server, filename, variables, filepath):
+    names = [VARIABLES[variable].inventory for variable in variables]
+    url = '/'.join((server.url, filename))
+    return downloadGribMessages(url, names, filepath)
+
+def fileContents(filepath):
+    with open(filepath, 'rb') as file_obj: return file_obj.read()
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+failures = 0
+server_dir = tempfile.mkdtemp()
+local_dir = tempfile.mkdtemp()
+try:
+    messages, file_size = buildSampleGrib(server_dir, 'sample.grb2')
+    buildSampleGrib(server_dir, 'no_inventory.grb2', False)
+    local_filepath = os.path.join(local_dir, 'subset.grb2')
+
+    inventory = parseGribInventory('1:0:d=2018070112:UGRD:10 m above ground:anl:\n'
+                                   '1.2:0:d=2018070112:VGRD:10 m above ground:anl:\n'
+                                   '2:100:d=2018070112:TMP:2 m above ground:anl:\n')
+    check('sub-messages share the range of their parent',
+          inventory[1] == (0, 99, 'VGRD:10 m above ground')
+          and inventory[2][1] is None)
+
+    with SampleFileServer(server_dir) as server:
+        variables = ('TMP', 'DPT', 'TCDC')
+        num_bytes = fetch(server, 'sample.grb2', variables, local_filepath)
+        expected = ''.join([messages[variable] for variable in variables])
+        check('TMP, DPT and TCDC messages downloaded',
+              num_bytes == len(expected)
+              and fileContents(local_filepath) == expected)
+        check('adjacent messages merged into one range request',
+              len(server.requests) == 3)
+        info = (server.bytes_sent, file_size, 100. * server.bytes_sent / file_size)
+        print '    %d of %d bytes transferred (%.1f%%)' % info
+
+        os.remove(local_filepath)
+        server.reset()
+        check('no inventory declines partial download',
+              fetch(server, 'no_inventory.grb2', variables, local_filepath) is None
+              and not os.path.exists(local_filepath))
+        check('message missing from inventory declines partial download',
+              fetch(server, 'sample.grb2', ('APCP',), local_filepath) is None
+              and not os.path.exists(local_filepath))
+
+    with SampleFileServer(server_dir, byte_ranges=False) as server:
+        check('server without byte ranges declines partial download',
+              fetch(server, 'sample.grb2', ('TMP',), local_filepath) is None
+              and not os.path.exists(local_filepath)
+              and not os.path.exists(local_filepath + '.part'))
+
+finally:
+    shutil.rmtree(server_dir)
+    shutil.rmtree(local_dir)
+
+if failures > 0:
+    print '\n%d checks FAILED' % failures
+    sys.exit(1)
+print '\nall checks passed'
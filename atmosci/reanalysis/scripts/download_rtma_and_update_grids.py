@@ -8,8 +8,9 @@ ONE_HOUR = datetime.timedelta(hours=1)
 SCRIPT_START = datetime.datetime.now()
 
 import numpy as N
-import urllib
 
+from atmosci.utils.downloads import DownloadManager, DownloadRequest
+from atmosci.utils.gributils import countGribMessages
 from atmosci.utils.timeutils import elapsedTime
 from atmosci.utils.tzutils import asUTCTime
 
@@ -48,6 +49,9 @@ UTC_FORMAT = '%Y.%m.%d:%HUTC'
 DATA_GRID_SIZE = 50000000
 APCP_GRID_SIZE = 400000
 
+# only these messages are needed from the DATA file by updateDataGrids
+DATA_MESSAGES = ('TMP', 'DPT')
+
 
 # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
 
@@ -61,14 +65,17 @@ parser.add_option('-d', action='store_true', dest='dev_mode', default=False)
 parser.add_option('-m', action='store_true', dest='only_missing', default=False)
 parser.add_option('-u', action='store_true', dest='utc_date', default=True)
 parser.add_option('-v', action='store_true', dest='verbose', default=False)
+parser.add_option('-w', action='store', type=int, dest='max_workers', default=4)
 parser.add_option('-z', action='store_true', dest='debug', default=False)
 
 parser.add_option('--data', action='store_false', dest='download_data', default=True)
+parser.add_option('--full', action='store_false', dest='partial_download', default=True)
 parser.add_option('--pcpn', action='store_false', dest='download_pcpn', default=True)
 
 parser.add_option('--grib_region', action='store', dest='grib_region', default='conus')
 parser.add_option('--grib_server', action='store', dest='grib_server', default='nomads')
 parser.add_option('--grib_source', action='store', dest='grib_source', default='ncep')
+parser.add_option('--per_host', action='store', type=int, dest='max_per_host', default=2)
 
 options, args = parser.parse_args()
 
@@ -80,6 +87,7 @@ grib_region = options.grib_region
 grib_server = options.grib_server
 grib_source = options.grib_source
 max_backward = options.max_backward
+partial_download = options.partial_download
 num_hours = options.num_hours
 only_missing = options.only_missing
 utc_date = options.utc_date
@@ -119,96 +127,67 @@ def determineTimespan(factory, end_hour, variable, region, max_backward, verbose
 
 # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
-def downloadData(factory, utc_time, grib_server, verbose=False, debug=False):
-    utc_time_str = utc_time.strftime(UTC_FORMAT)
-    utc_times = utcTimes(utc_time)
-
-    #rtma_dirpath = RTMA_SUBDIR_PATH % utc_times
-    #if debug: print 'dirpath', os.path.isdir(rtma_dirpath), rtma_dirpath
-    #if not os.path.isdir(rtma_dirpath): os.makedirs(rtma_dirpath)
-
-    #rtma_dirpath = RTMA_SUBDIR_PATH % utc_times
-    #if debug: print 'dirpath', os.path.isdir(rtma_dirpath), rtma_dirpath
-    #if not os.path.isdir(rtma_dirpath): os.makedirs(rtma_dirpath)
-
+def dataRequest(factory, utc_time, grib_server):
     # download main data file
-    #local_filepath = DATA_FILEPATH % utc_times
     local_filepath = factory.gribFilepath(utc_time, 'data', 'conus')
 
     # don't download a file it already exists and contain enough data
+    # downloads only appear at local_filepath once they are complete,
+    # but a file may be left empty or truncated by an earlier failure
     if os.path.exists(local_filepath):
-        should_download = os.path.getsize(local_filepath) < DATA_GRID_SIZE
-    else: should_download = True
-
-    if should_download:
-        remote_url = DATA_URLS[grib_server] % utc_times
-        if verbose:
-            print '\ndownloading :', remote_url
-            print 'to :', local_filepath
-        try:
-            (destfile, info) = urllib.urlretrieve(remote_url, local_filepath)
-            if debug: print '\nurllib.urlretrieve.info :\n', info
-        except Exception as e:
-            errmsg = '*** download of "%s" failed : %s' 
-            print errmsg % (remote_url.split('prod')[1], str(e))
-            should_remove = os.path.exists(local_filepath) and \
-                            os.path.getsize(local_filepath) < DATA_GRID_SIZE
-            if should_remove: os.remove(local_filepath)
-        else:
-            filesize = os.path.getsize(local_filepath)
-            should_remove = os.path.exists(local_filepath) and \
-                            os.path.getsize(local_filepath) < DATA_GRID_SIZE
-            if should_remove:
-                msg = 'Data download failed for %s\n Downloaded data file was too small (%d bytes),' 
-                msg += ' should have been at least %d bytes.'
-                print msg % (utc_time_str, filesize, DATA_GRID_SIZE)
-                os.remove(local_filepath)
-            else:
-                return local_filepath
-
-    return None
+        if os.path.getsize(local_filepath) >= DATA_GRID_SIZE: return None
+        # a partial download holds exactly one message for each variable
+        if partial_download and \
+           countGribMessages(local_filepath) == len(DATA_MESSAGES):
+            return None
+
+    remote_url = DATA_URLS[grib_server] % utcTimes(utc_time)
+    if partial_download:
+        variables = factory.grib_source.variables
+        names = [variables[var].inventory for var in DATA_MESSAGES]
+    else: names = None
+    return DownloadRequest(remote_url, local_filepath, key=utc_time,
+                           grib_messages=names, min_size=DATA_GRID_SIZE)
 
 # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
-def downloadPcpn(factory, utc_time, grib_server, verbose=False, debug=False):
-    utc_time_str = utc_time.strftime(UTC_FORMAT)
-    utc_times = utcTimes(utc_time)
+def downloadHours(factory, manager, download_hours, requestForHour, updateGrids, file_type):
+    download_requests = [ ]
+    for utc_hour in download_hours:
+        request = requestForHour(factory, utc_hour, grib_server)
+        if request is not None: download_requests.append(request)
+    if verbose:
+        info = (len(download_requests), file_type, manager.max_workers)
+        print '\ndownloading %d %s files using %d workers' % info
+
+    def downloadDone(result):
+        utc_hour = result.key
+        info = (reanalysis_name, file_type, utc_hour.strftime(UTC_FORMAT))
+        if result.ok:
+            print '\nProcessing %s %s download for %s' % info
+            if verbose:
+                print '    downloaded %d bytes from %s' % (result.num_bytes, result.url)
+            updateGrids(factory, utc_hour, result.filepath, debug)
+        else:
+            print '\n*** %s %s download failed for %s' % info
+            print '    %s' % result.message
+
+    results = manager.downloadAll(download_requests, downloadDone)
+    return len([result for result in results if result.ok])
 
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+def pcpnRequest(factory, utc_time, grib_server):
     # download the precip file
     local_filepath = factory.gribFilepath(utc_time, 'APCP', 'conus')
 
     # don't download a file it already exists and contain enough data
-    if os.path.exists(local_filepath):
-        should_download = os.path.getsize(local_filepath) < APCP_GRID_SIZE
-    else: should_download = True
-
-    if should_download:
-        remote_url = NOMADS_ACPC_URL % utc_times
-        if verbose:
-            print '\ndownloading :', remote_url
-            print 'to :', local_filepath
-        try:
-            (destfile,info) = urllib.urlretrieve(remote_url, local_filepath)
-            if verbose: print info
-        except Exception as e:
-            errmsg = '*** download of "%s" failed : %s' 
-            print errmsg % (remote_url.split('prod')[1], str(e))
-            should_remove = os.path.exists(local_filepath) and \
-                            os.path.getsize(local_filepath) < APCP_GRID_SIZE
-            if should_remove: os.remove(local_filepath)
-        else:
-            filesize = os.path.getsize(local_filepath)
-            should_remove = os.path.exists(local_filepath) and \
-                            os.path.getsize(local_filepath) < APCP_GRID_SIZE
-            if should_remove:
-                msg = 'Precip download failed for %s\n Downloaded data file was too small (%d bytes),' 
-                msg += ' should have been at least %d bytes.'
-                print msg % (utc_time_str, filesize, DATA_GRID_SIZE)
-                os.remove(local_filepath)
-            else:
-                return local_filepath
-
-    return None
+    if os.path.exists(local_filepath) \
+    and os.path.getsize(local_filepath) >= APCP_GRID_SIZE: return None
+
+    remote_url = NOMADS_ACPC_URL % utcTimes(utc_time)
+    return DownloadRequest(remote_url, local_filepath, key=utc_time,
+                           min_size=APCP_GRID_SIZE)
 
 # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
@@ -296,6 +275,12 @@ factory = ReanalysisDownloadFactory(reanalysis, grib_source, grib_server)
 if dev_mode: factory.useDirpathsForMode('dev')
 factory._initStaticResources_()
 
+# all downloads share one keep-alive session and a pool of workers
+download = factory.project.download
+manager = DownloadManager(options.max_workers, options.max_per_host,
+                          download.attempts, download.wait_times[0],
+                          max(download.wait_times))
+
 # start with data file downloads
 data_count = 0
 
@@ -335,14 +320,7 @@ if download_data:
         warnings.filterwarnings('ignore',"Mean of empty slice")
         # MUST ALSO TURN OFF WARNING FILTERS AT END OF SCRIPT !!!!!
 
-        for utc_hour in download_hours:
-            info = (reanalysis_name, utc_hour.strftime('%Y-%m-%d:%H'))
-            print '\nProcessing %s DATA download for %s' % info
-            grib_filepath = downloadData(factory, utc_hour, grib_server, verbose, debug)
-            if grib_filepath is not None:
-                data_count += 1
-                if debug: print '    saved DATA grib file to :', grib_filepath
-                updateDataGrids(factory, utc_hour, grib_filepath, debug)
+        data_count = downloadHours(factory, manager, download_hours, dataRequest, updateDataGrids, 'DATA')
 
         # turn annoying numpy warnings back on
         warnings.resetwarnings()
@@ -393,14 +371,7 @@ if download_pcpn:
         warnings.filterwarnings('ignore',"Mean of empty slice")
         # MUST ALSO TURN OFF WARNING FILTERS AT END OF SCRIPT !!!!!
 
-        for utc_hour in download_hours:
-            info = (reanalysis_name, utc_hour.strftime('%Y-%m-%d:%H'))
-            print '\nProcessing %s PCPN download for %s' % info
-            grib_filepath = downloadPcpn(factory, utc_hour, grib_server, verbose, debug)
-            if grib_filepath is not None:
-                pcpn_count += 1
-                if debug: print '    saved PCPN grib file to :', grib_filepath
-                updatePrecpGrid(factory, utc_hour, grib_filepath, debug)
+        pcpn_count = downloadHours(factory, manager, download_hours, pcpnRequest, updatePrecpGrid, 'PCPN')
 
         # turn annoying numpy warnings back on
         warnings.resetwarnings()
@@ -414,6 +385,7 @@ if download_pcpn:
         print '\nSearched from %s back %d hours. No %s grib files were found.' % info
 
 # downloads are all complete
+manager.close()
 total_count = data_count + pcpn_count
 if total_count > 0:
     info = (total_count, reanalysis_name, elapsedTime(SCRIPT_START, True))
@@ -65,6 +65,9 @@ parser.add_option('-d', action='store_true', dest='dev_mode', default=False,
 parser.add_option('-u', action='store_false', dest='utc_file', default=True,
        help='boolean: grid file uses UTC timezone (default=True)')
 
+parser.add_option('-w', action='store', type=int, dest='workers', default=1,
+       help='number of processes used to decode grib files (default=1)')
+
 parser.add_option('-v', action='store_true', dest='verbose', default=False,
        help='boolean: print verbose output (default=False)')
 
@@ -303,7 +306,7 @@ if verbose:
     for period in periods:
         print '    %s to %s' % (repr(period[0]),repr(period[1]))
 
-kwargs = { 'debug':debug, 'verbose':verbose }
+kwargs = { 'debug':debug, 'verbose':verbose, 'workers':options.workers }
 missing_times = [ ]
 total_hours = 0
 
@@ -88,6 +88,9 @@ parser.add_option('-d', action='store_true', dest='dev_mode', default=False,
 parser.add_option('-u', action='store_false', dest='utc_file', default=True,
        help='boolean: grid file uses UTC timezone (default=True)')
 
+parser.add_option('-w', action='store', type=int, dest='workers', default=1,
+       help='number of processes used to decode grib files (default=1)')
+
 parser.add_option('-v', action='store_true', dest='verbose', default=False,
        help='boolean: print verbose output (default=False)')
 
@@ -292,7 +295,7 @@ if dev_mode: grid_factory.useDirpathsForMode('dev')
 grib_reader = SmartReanalysisGribReader(analysis_source)
 if dev_mode: grib_reader.useDirpathsForMode('dev')
 
-kwargs = { 'debug':debug, 'verbose':verbose }
+kwargs = { 'debug':debug, 'verbose':verbose, 'workers':options.workers }
 
 
 # update all grids except RHUM
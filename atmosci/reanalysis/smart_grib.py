@@ -1,14 +1,14 @@
 
 import os
 import datetime
+import multiprocessing
 ONE_HOUR = datetime.timedelta(hours=1)
 
-import requests
-
 import numpy as N
 import pygrib
 
 from atmosci.utils import tzutils
+from atmosci.utils.downloads import DownloadManager, DownloadRequest
 from atmosci.utils.timeutils import lastDayOfMonth
 
 from atmosci.seasonal.methods.static  import StaticFileAccessorMethods
@@ -18,6 +18,20 @@ from atmosci.reanalysis.factory import ReanalysisGribFactoryMethods, \
                                        ReanalysisFactoryMethods
 
 
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+# grib reader used by worker processes, inherited when the pool forks
+_GRIB_DECODER_ = None
+
+def _decodeGribHours_(args):
+    variable, grib_hours = args
+    decoder = _GRIB_DECODER_
+    data = N.empty((len(grib_hours),)+decoder.grid_dimensions, dtype=float)
+    data.fill(N.nan)
+    units, failed = decoder.decodeGribHours(variable, grib_hours, data)
+    return units, data, failed
+
+
 # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
 
 class SmartReanalysisGribMethods:
@@ -25,6 +39,9 @@ class SmartReanalysisGribMethods:
     def completeInitialization(self, **kwargs):
         self.data_mask = None
         self.grib_indexes = None
+        self.grib_mask = None
+        self.grib_subset = None
+        self.grib_subset_shape = None
         self.grib_region = kwargs.get('grib_region', 'conus')
         self.shared_grib_dir = kwargs.get('shared_grib_dir', True)
         self.setGridParameters(kwargs.get('grid_source','acis'),
@@ -70,29 +87,17 @@ class SmartReanalysisGribMethods:
             print '         validityDate :', message.validityDate
             print '           data units :', units
 
-        data = message.values[self.grib_indexes]
         missing_value = float(message.missingValue)
+        data = self.gribSubset(message.values, missing_value)
         reader.close()
         del message
         del reader
 
-        if N.ma.is_masked(data): data = data.data
-        if debug: print '      retrieved shape :', data.shape
-        data = data.reshape(self.grid_shape)
-        if debug: print '           grid shape :', data.shape
-
-        data[N.where(data >= missing_value)] = N.nan
-
         if debug:
-            print '... before applying mask'
+            print '           grid shape :', data.shape
             print '        missing value :', missing_value
-            print '         missing data :', len(N.where(N.isnan(data))[0])
-            print '           valid data :', len(N.where(N.isfinite(data))[0])
             print '\n        data extremes :', N.nanmin(data), N.nanmean(data), N.nanmax(data)
 
-        # apply the regional boundary mask
-        data[N.where(self.data_mask == True)] = N.nan
-
         if debug:
             print '... after applying mask'
             print '         missing data :', len(N.where(N.isnan(data))[0])
@@ -105,6 +110,63 @@ class SmartReanalysisGribMethods:
 
     # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
+    def decodeGribHours(self, variable, grib_hours, data):
+        """ decode the grib file for each hour directly into the
+        corresponding row of data, a preallocated (hours, y, x) array.
+        Rows for hours that cannot be read are left untouched.
+
+        Returns: units, list of (why, hour, filepath) for failed hours
+        """
+        units = None
+        failed = [ ]
+        for indx, grib_hour in enumerate(grib_hours):
+            found, reader = self._readerForHour(variable, grib_hour)
+            if not found:
+                failed.append(('grib file not found',) + reader)
+                continue
+
+            try:
+                message = reader.messageFor(variable)
+            except Exception as e:
+                failed.append(('variable not in grib file', grib_hour,
+                               reader.filepath))
+                reader.close()
+                continue
+
+            if units is None: units = message.units
+            self.gribSubset(message.values, float(message.missingValue),
+                            data[indx])
+            reader.close()
+            del message
+
+        return units, failed
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def gribSubset(self, values, missing_value, out=None):
+        """ extracts the grid nodes from the full array of values in a
+        grib message. Missing values and nodes outside the regional
+        boundary mask are set to NaN. When out is passed, it must be a
+        contiguous float array with the grid dimensions.
+        """
+        if self.grib_indexes is None: self._initStaticResources_()
+        if self.grib_subset_shape != values.shape:
+            self._initGribSubset_(values.shape)
+
+        if out is None: out = N.empty(self.grid_shape, dtype=float)
+        flat = out.reshape(-1)
+        values = N.ma.getdata(values).reshape(-1)
+        N.take(values, self.grib_subset, out=flat, mode='clip')
+
+        with N.errstate(invalid='ignore'):
+            invalid = flat >= missing_value
+        invalid |= self.grib_mask
+        flat[invalid] = N.nan
+
+        return out
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
     def lastAvailableGribHour(self, variable, reference_time):
         year = reference_time.year
         month = reference_time.month
@@ -133,14 +195,11 @@ class SmartReanalysisGribMethods:
 
     def slices(self, data_start_time, data_end_time, hours_per_slice=24):
 
-        prev_month = data_start_time.month
-        num_hours = tzutils.hoursInTimespan(data_start_time, data_end_time)
         if data_end_time.month == data_start_time.month:
             return ((data_start_time, data_end_time),)
 
         slices = [ ]
         slice_start = data_start_time
-        slice_month = slice_start_month
 
         while slice_start.month < data_end_time.month:
             last_day = lastDayOfMonth(slice_start.year,slice_start.month)
@@ -177,27 +236,15 @@ class SmartReanalysisGribMethods:
             data = N.empty((num_hours,)+self.grid_dimensions, dtype=float)
             data.fill(N.nan)
 
-            units = None
-            date_indx = 0
-            grib_time = grib_start_time
-            while units is None and grib_time <= grib_end_time:
-                success, package = self.dataFromGrib(variable, grib_time,
-                                        return_units=True, **kwargs)
-                if success:
-                    units, data_for_hour = package
-                    data[date_indx,:,:] = data_for_hour
-                else: failed.append(package)
-
-                grib_time += ONE_HOUR
-                date_indx += 1
-
-            while grib_time <= grib_end_time:
-                OK, package = self.dataFromGrib(variable, grib_time, **kwargs)
-                if OK: data[date_indx,:,:] = package
-                else: failed.append(package)
-
-                grib_time += ONE_HOUR
-                date_indx += 1
+            grib_hours = [grib_start_time + datetime.timedelta(hours=hour)
+                          for hour in range(num_hours)]
+            workers = kwargs.get('workers', 1)
+            if workers > 1 and num_hours > 24:
+                units = self._decodeInWorkers_(variable, grib_hours, data,
+                                               workers, failed)
+            else:
+                units, failed = \
+                    self.decodeGribHours(variable, grib_hours, data)
 
         else:
             success, package = self.dataFromGrib(variable, grib_start_time,
@@ -225,6 +272,40 @@ class SmartReanalysisGribMethods:
 
     # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
+    def _decodeInWorkers_(self, variable, grib_hours, data, workers, failed):
+        global _GRIB_DECODER_
+        # one day of hourly files per task
+        tasks = [(variable, grib_hours[first:first+24])
+                 for first in range(0, len(grib_hours), 24)]
+        units = None
+        _GRIB_DECODER_ = self
+        pool = multiprocessing.Pool(min(workers, len(tasks)))
+        try:
+            first = 0
+            for task_units, task_data, task_failed in \
+            pool.imap(_decodeGribHours_, tasks):
+                last = first + task_data.shape[0]
+                data[first:last] = task_data
+                if units is None: units = task_units
+                failed.extend(task_failed)
+                first = last
+        finally:
+            pool.close()
+            pool.join()
+            _GRIB_DECODER_ = None
+        return units
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def _initGribSubset_(self, source_shape):
+        # flat indexes into the source grid and flat boundary mask are
+        # computed once, then reused for every grib message
+        self.grib_subset = N.ravel_multi_index(self.grib_indexes, source_shape)
+        self.grib_mask = N.asarray(self.data_mask == True).reshape(-1)
+        self.grib_subset_shape = source_shape
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
     def _initStaticResources_(self):
         reader = \
             self.staticFileReader(self.grid_source, self.grid_region)
@@ -232,6 +313,7 @@ class SmartReanalysisGribMethods:
         # get the region boundary mask
         self.data_mask = reader.getData('cus_mask')
         reader.close()
+        self.grib_subset_shape = None
 
 
 # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
@@ -302,193 +384,86 @@ class ReanalysisDownloadFactory(SmartReanalysisGribMethods,
             return False, (grib_time, reader.filepath)
 
         units = message.units
-        data = message.values[self.grib_indexes]
-        missing_value = float(message.missingValue)
+        # set all missing values and nodes outside the boundary to NaN
+        data = self.gribSubset(message.values, float(message.missingValue))
         del message
 
-        if N.ma.is_masked(data): data = data.data
-        data = data.reshape(self.grid_shape)
-        # set all missing values to NaN
-        data[N.where(data >= missing_value)] = N.nan
-        # apply the regional boundary mask
-        data[N.where(self.data_mask == True)] = N.nan
-
         return True, (units, data)
 
     # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
     def downloadChunkedGrib(self, utc_time, variable, region, acceptable_size, 
                                   timeout, chunk_size, debug=False):
-        download_attempts = self.project.download.attempts
-        wait_times = self.project.download.wait_times
+        request = self.gribDownloadRequest(utc_time, variable, region,
+                                           acceptable_size, timeout=timeout,
+                                           chunk_size=chunk_size)
+        return self._downloadGrib_(self.downloadManager(), request, debug)
 
-        url_template = self.gribUrlTemplate(variable)
-        url = url_template % tzutils.tzaTimeStrings(utc_time, 'utc')
-        if debug: print '\nAttempting to download :', url
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
-        filename = self.gribFilename(utc_time, variable, region)
-        filepath = self.gribFilepath(utc_time, variable, region)
-        if debug: print 'to :', filepath
-
-        attempt = 0
-        while True:
-            packet_size = 0
-            wait_time = wait_times[attempt]
-            attempt += 1
-
-            try: 
-                if timeout > 0:
-                    req = requests.get(url, stream=True, timeout=timeout)
-                else: req = requests.get(url, stream=True)
-
-                expected_size = int(req.headers['content-length'])
-                if expected_size >= acceptable_size:
-                    packet_size = 0
-                    with open(filepath,'wb') as file_obj:
-                        for data in req.iter_content(chunk_size):
-                            packet_size += len(data)
-                            file_obj.write(data)
-
-                    if packet_size >= expected_size:
-                        return 200, filepath, url, variable
-
-            except requests.exceptions.Timeout as e:
-                if attempt < download_attempts:
-                    time.sleep(wait_time)
-                    continue
-                else:
-                    status = req.status_code
-                    msg = '%d : socket timeout. Download failed after %s attempts to download "%s" :: %s.'
-                    info = (status, download_attempts, variable, str(e))
-                    return status, filename, url, msg % info
-
-            except requests.exceptions.ConnectionError as e:
-                if attempt < download_attempts:
-                    time.sleep(wait_time)
-                    continue
-                else:
-                    status = req.status_code
-                    msg = 'Download of "%s" failed after %d attempts. Unable to connect to server :: %s'
-                    info = (variable, download_attempts, str(e))
-                    return status, filename, url, msg % info
-
-            except requests.exceptions.HTTPError as e:
-                if attempt < download_attempts:
-                    time.sleep(wait_time)
-                    continue
-                else:
-                    status = req.status_code
-                    if packet_size > 0:
-                        msg = '"%s" download failed with HTTP error code %s after %d attempts'
-                        msg += ' (%d bytes downloaded) :: %s'
-                        info = (variable, status, download_attempts, packet_size, str(e))
-                    else:
-                        msg = '"%s" download failed with HTTP error code %s after %d attempts :: %s'
-                        info = (variable, status, download_attempts, str(e))
-                    return status, filename, url, msg % info
-
-            except requests.exceptions.RequestException as e:
-                status = req.status_code
-                why = (e.code, e.reason, packet_size)
-                msg = 'Download failed with HTTP error code %s (%s), %d bytes downloaded'
-                return e.code, filename, url, msg % why
+    def downloadGribFile(self, utc_time, variable, region, acceptable_size, 
+                               timeout, debug=False):
+        request = self.gribDownloadRequest(utc_time, variable, region,
+                                           acceptable_size, timeout=timeout)
+        return self._downloadGrib_(self.downloadManager(), request, debug)
 
-            except Exception as e:
-                raise e
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
-            else:
-                if os.path.exists(filepath): os.remove(filepath)
-                print 'response package :\n', req.text, '\n'
+    def downloadGribMessages(self, utc_time, variable, region, grib_variables,
+                                   acceptable_size, timeout, debug=False):
+        """ downloads only the messages for grib_variables from the grib
+        file that contains variable, using the file's .idx inventory and
+        HTTP byte range requests. Falls back to downloading the full file
+        when the server cannot supply the messages separately.
 
-                if attempt == download_attempts:
-                    msg = 'HTTP response for %s contains %d bytes, expecting at least %d bytes.'
-                    msg += '\nThe incomplete file was deleted :\n    %s'
-                    info = (variable, expected_size, acceptable_size, filepath)
-                    return 999, filename, url, msg % info
+        Returns: same as downloadGribFile
+        """
+        request = self.gribDownloadRequest(utc_time, variable, region,
+                                           acceptable_size, grib_variables,
+                                           timeout)
+        return self._downloadGrib_(self.downloadManager(), request, debug)
 
     # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
-    def downloadGribFile(self, utc_time, variable, region, acceptable_size, 
-                               timeout, debug=False):
-        download_attempts = self.project.download.attempts
-        wait_times = self.project.download.wait_times
+    def downloadManager(self, max_workers=4, max_per_host=2):
+        """ Returns: DownloadManager shared by all downloads from this
+                     factory, retries use the project download settings.
+                     Settings for a single download, e.g. timeout, belong
+                     on its DownloadRequest.
+        """
+        manager = getattr(self, 'download_manager', None)
+        if manager is None:
+            download = self.project.download
+            manager = DownloadManager(max_workers, max_per_host,
+                                      download.attempts,
+                                      download.wait_times[0],
+                                      max(download.wait_times))
+            self.download_manager = manager
+        return manager
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
+    def gribDownloadRequest(self, utc_time, variable, region,
+                                  acceptable_size=None, grib_variables=None,
+                                  timeout=None, chunk_size=None):
+        """ Returns: DownloadRequest for the grib file that contains
+        variable. When grib_variables is passed, only their messages are
+        requested. timeout and chunk_size apply to this request only.
+        """
         url_template = self.gribUrlTemplate(variable)
         url = url_template % tzutils.tzaTimeStrings(utc_time, 'utc')
-        if debug: print '\nAttempting to download :', url
-
-        filename = self.gribFilename(utc_time, variable, region)
         filepath = self.gribFilepath(utc_time, variable, region)
-        if debug: print 'to :', filepath
-
-        attempt = 0
-        while True:
-            packet_size = 0
-            wait_time = wait_times[attempt]
-            attempt += 1
-
-            try: 
-                if timeout > 0:
-                    req = requests.get(url, stream=True, timeout=timeout)
-                else: req = requests.get(url, stream=True)
-
-                packet_size = int(req.headers['content-length'])
-                if packet_size >= acceptable_size:
-                    file_obj = open(filepath,'wb')
-                    file_obj.write(req.content)
-                    file_obj.close()
-                    return 200, filepath, url, variable
-
-            except requests.exceptions.Timeout as e:
-                if attempt < download_attempts:
-                    time.sleep(wait_time)
-                    continue
-                else:
-                    status = req.status_code
-                    msg = '%d : socket timeout. Download failed after %s attempts to download "%s" :: %s.'
-                    info = (status, download_attempts, variable, str(e))
-                    return status, filename, url, msg % info
-
-            except requests.exceptions.ConnectionError as e:
-                if attempt < download_attempts:
-                    time.sleep(wait_time)
-                    continue
-                else:
-                    status = req.status_code
-                    msg = 'Download of "%s" failed after %d attempts. Unable to connect to server :: %s'
-                    info = (variable, download_attempts, str(e))
-                    return status, filename, url, msg % info
-
-            except requests.exceptions.HTTPError as e:
-                if attempt < download_attempts:
-                    time.sleep(wait_time)
-                    continue
-                else:
-                    status = req.status_code
-                    if packet_size > 0:
-                        msg = '"%s" download failed with HTTP error code %s after %d attempts'
-                        msg += ' (%d bytes downloaded) :: %s'
-                        info = (variable, status, download_attempts, packet_size, str(e))
-                    else:
-                        msg = '"%s" download failed with HTTP error code %s after %d attempts :: %s'
-                        info = (variable, status, download_attempts, str(e))
-                    return status, filename, url, msg % info
-
-            except requests.exceptions.RequestException as e:
-                status = req.status_code
-                why = (e.code, e.reason, packet_size)
-                msg = 'Download failed with HTTP error code %s (%s), %d bytes downloaded'
-                return e.code, filename, url, msg % why
 
-            except Exception as e:
-                raise e
+        names = None
+        if grib_variables:
+            variables = self.grib_source.variables
+            names = [variables[grib_var.upper()].get('inventory', None)
+                     for grib_var in grib_variables]
+            if None in names: names = None
 
-            else:
-                if attempt == download_attempts:
-                    msg = 'HTTP response for "%s" contains %d bytes, expecting at least %d bytes.'
-                    msg += ' No data was saved.'
-                    info = (variable, packet_size, acceptable_size)
-                    return 999, filename, url, msg % info
+        return DownloadRequest(url, filepath, key=(utc_time, variable),
+                               grib_messages=names, min_size=acceptable_size,
+                               timeout=timeout, chunk_size=chunk_size)
 
     # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
@@ -527,6 +502,21 @@ class ReanalysisDownloadFactory(SmartReanalysisGribMethods,
 
     # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
+    def _downloadGrib_(self, manager, request, debug):
+        if debug: print '\nAttempting to download :', request.url
+        result = manager.download(request)
+        if result.ok:
+            if debug:
+                info = (result.num_bytes, result.filepath)
+                print 'downloaded %d bytes to :\n    %s' % info
+            return 200, result.filepath, result.url, request.key[1]
+
+        status = 999 if result.status is None else result.status
+        filename = os.path.basename(result.filepath)
+        return status, filename, result.url, result.message
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
     def _registerAccessClasses(self):
         self._registerGribAccessClasses()
         self._registerGridAccessClasses()
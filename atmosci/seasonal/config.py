@@ -85,6 +85,9 @@ CFGBASE.project.start_day = (1,1)
 #    missing_data = missing value in raw data when added to file
 #                   also used as missing value for extracted data
 #    missing_packed = value used for missing when stored in the file
+#    scale_factor = multiplier used to unpack integer data (optional)
+#    add_offset = value added to integer data after scaling (optional)
+#    shuffle = apply HDF5 byte shuffle filter before compression (optional)
 #
 #    units = units for values in raw data
 #    packed_units = units for values in stored data
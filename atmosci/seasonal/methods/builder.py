@@ -176,6 +176,8 @@ class FileBuilderMethods:
             if "compression" in dataset:
                 attrs['compression'] = dataset.compression
             else: attrs['compression'] = 'gzip'
+            # byte shuffle makes packed integer data compress much better
+            if dataset.get('shuffle', False): attrs['shuffle'] = True
 
         data = kwargs.get('%s_data' % dataset_name, kwargs.get('data', None))
         if data is None:
@@ -441,6 +443,12 @@ class FileBuilderMethods:
         multiplier = dataset_config.get('multiplier', None)
         if multiplier: attrs['multiplier'] = multiplier
 
+        # packed value = round((data - add_offset) / scale_factor)
+        scale_factor = dataset_config.get('scale_factor', None)
+        if scale_factor is not None: attrs['scale_factor'] = scale_factor
+        add_offset = dataset_config.get('add_offset', None)
+        if add_offset is not None: attrs['add_offset'] = add_offset
+
         units = dataset_config.get('units', None)
         if units is not None:
             if multiplier:
@@ -468,7 +476,30 @@ class FileBuilderMethods:
 
     # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
+    def _resolveChunkLayout(self, layout, shape):
+        """ Converts a chunk layout to a chunk shape for a dataset.
+
+        Each item in the layout may be an int (clipped to the size of the
+        dimension), None (the full dimension) or the name of a builder
+        attribute such as 'num_days'. Returns None when the layout does
+        not have the same number of dimensions as the dataset.
+        """
+        if isinstance(layout, basestring): layout = eval(layout)
+        if len(layout) != len(shape): return None
+        chunks = [ ]
+        for indx, dim in enumerate(layout):
+            if dim is None: size = shape[indx]
+            elif isinstance(dim, basestring):
+                size = getattr(self, dim, shape[indx])
+            else: size = int(dim)
+            chunks.append(max(1, min(size, shape[indx])))
+        return tuple(chunks)
+
     def _resolveDatasetChunks(self, dataset, shape, view, **kwargs):
+        layout = kwargs.get('chunk_layout', None)
+        if layout is not None:
+            chunks = self._resolveChunkLayout(layout, shape)
+            if chunks is not None: return chunks
         chunks = kwargs.get('chunks',None)
         if chunks is not None: return chunks
         chunks = dataset.get('chunks', None)
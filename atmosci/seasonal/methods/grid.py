@@ -88,7 +88,7 @@ class GridFileReaderMethods:
         if to_units is not None:
             from_units = self.getDatasetUnits(dataset_path)
             if from_units is not None:
-                data = convertUnits(data, from_units, to_units)
+                data = convertUnits(data, from_units, to_units, inplace=True)
         return data
 
     # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
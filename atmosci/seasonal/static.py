@@ -16,6 +16,10 @@ class StaticGridFileMethods:
                           self.getData('%s.x_indexes' % grib_source).flatten()]
         return source_shape, source_indexes
 
+    def _nodeIndexCachePath_(self):
+        # the node index for the grid is kept alongside the static file
+        return '%s.nodeindex' % self.filepath
+
 
 # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
 
@@ -1,7 +1,11 @@
 """ Unit conversion utilities
 """
+import ast
+
 import numpy as N
 
+FIVE_NINTHS = 5./9.
+
 # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
 
 UNIT_KEY_MAP = { 
@@ -18,6 +22,7 @@ UNIT_KEY_MAP = {
             'ft/s/s'    : 'ft/s^2',
             'ft s-2'    : 'ft/s^2',
             'ft s**-2'  : 'ft/s^2',
+            'hpa'       : 'hPa',
             'in2'       : 'in^2',
             'in**2'     : 'in^2',
             'in3'       : 'in^3',
@@ -28,6 +33,7 @@ UNIT_KEY_MAP = {
             'kg m^-2'   : 'kg/m^2',
             'kg m**-2'  : 'kg/m^2',
             'kg/m**-2'  : 'kg/m^2',
+            'kg/m2'     : 'kg/m^2',
             'km2'       : 'km^2',
             'km**2'     : 'km^2',
             'km/hr'     : 'kph',
@@ -44,8 +50,10 @@ UNIT_KEY_MAP = {
             'mi/hr'     : 'mph',
             'mile'      : 'mi',
             'miles'     : 'mi',
+            'miles/hour': 'mph',
             'N/m2'      : 'N/m^2',
             'N/m**2'    : 'N/m^2',
+            'watt/meter2' : 'watt/m^2',
 }
 
 FORMULAS = {
@@ -279,20 +287,20 @@ FORMULAS = {
     , 'C_to_F'       : ('eq', '(x * 1.8) + 32.0')
     , 'C_to_K'       : ('eq', 'x + 273.15')
     , 'C_to_R'       : ('eq', '(x * 1.8) + 491.67')
-    , 'F_to_C'       : ('eq', '(x - 32.) * 0.555556')
-    , 'F_to_K'       : ('eq', '((x - 32.) * 0.555556) + 273.15')
+    , 'F_to_C'       : ('eq', '(x - 32.) * 5. / 9.')
+    , 'F_to_K'       : ('eq', '((x - 32.) * 5. / 9.) + 273.15')
     , 'F_to_R'       : ('eq', 'x + 459.67')
     , 'K_to_C'       : ('eq', 'x - 273.15')
     , 'K_to_F'       : ('eq', '((x - 273.15) * 1.8) + 32.0')
     , 'K_to_R'       : ('*', 1.8)
-    , 'R_to_C'       : ('eq', '(x - 491.67) * 0.555556')
+    , 'R_to_C'       : ('eq', '(x - 491.67) * 5. / 9.')
     , 'R_to_F'       : ('eq', 'x - 459.67')
-    , 'R_to_K'       : ('*', 0.555556)
+    , 'R_to_K'       : ('*', FIVE_NINTHS)
     # temperature - unit difference 
     , 'dC_to_dF'     : ('*', 1.8)
     , 'dC_to_dK'     : ('==','x')
-    , 'dF_to_dC'     : ('*', 0.555556)
-    , 'dF_to_dK'     : ('*', 0.555556)
+    , 'dF_to_dC'     : ('*', FIVE_NINTHS)
+    , 'dF_to_dK'     : ('*', FIVE_NINTHS)
     , 'dK_to_dC'     : ('==','x')
     , 'dK_to_dF'     : ('*', 1.8)
     # vertical velocity & pressure tendency
@@ -330,6 +338,105 @@ def solve(x, equation): return eval(equation)
 def subtract(x, factor): return x - factor
 OPERATORS = { '+':add, '-':subtract, '*':multiply, '==':equals, 'eq':solve  }
 
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+#
+# Every formula is compiled once, when this module is loaded, into either
+# a (scale, offset) pair or, for the rare equation that is not linear, a
+# function. A bad formula is therefore reported when the module is loaded
+# instead of the first time data is converted.
+#
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+def _linearTerms_(node):
+    """ returns (scale, offset) of a linear expression in x or None """
+    if isinstance(node, ast.Name):
+        if node.id == 'x': return (1., 0.)
+        return None
+    if isinstance(node, ast.Num): return (0., float(node.n))
+    if isinstance(node, ast.UnaryOp):
+        terms = _linearTerms_(node.operand)
+        if terms is None: return None
+        if isinstance(node.op, ast.USub): return (-terms[0], -terms[1])
+        if isinstance(node.op, ast.UAdd): return terms
+        return None
+    if not isinstance(node, ast.BinOp): return None
+
+    left = _linearTerms_(node.left)
+    right = _linearTerms_(node.right)
+    if left is None or right is None: return None
+    if isinstance(node.op, ast.Add):
+        return (left[0] + right[0], left[1] + right[1])
+    if isinstance(node.op, ast.Sub):
+        return (left[0] - right[0], left[1] - right[1])
+    if isinstance(node.op, ast.Mult):
+        if left[0] == 0.: return (left[1] * right[0], left[1] * right[1])
+        if right[0] == 0.: return (left[0] * right[1], left[1] * right[1])
+        return None
+    if isinstance(node.op, ast.Div) and right[0] == 0.:
+        return (left[0] / right[1], left[1] / right[1])
+    return None
+
+def compileFormula(formula):
+    """ Returns: (scale, offset) for linear formulas, function for others
+    """
+    operation, arg = formula
+    if operation == '*': return (float(arg), 0.)
+    if operation == '+': return (1., float(arg))
+    if operation == '-': return (1., -float(arg))
+    if operation == '==': return (1., 0.)
+    if operation == 'eq':
+        terms = _linearTerms_(ast.parse(arg, mode='eval').body)
+        if terms is not None: return terms
+        return eval(compile('lambda x: %s' % arg, '<%s>' % arg, 'eval'))
+    errmsg = 'Unsupported conversion operation "%s"'
+    raise ValueError, errmsg % str(operation)
+
+COMPILED_FORMULAS = dict([(key, compileFormula(formula))
+                          for key, formula in FORMULAS.items()])
+
+# units that each unit can be converted directly to
+CONVERSION_GRAPH = { }
+for _key_ in FORMULAS:
+    if '_to_' in _key_:
+        _from_, _to_ = _key_.split('_to_')
+        CONVERSION_GRAPH.setdefault(_from_, [ ]).append(_to_)
+del _key_, _from_, _to_
+
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+def conversionChain(from_units, to_units):
+    """ Returns: list of the FORMULAS keys that convert from_units to
+    to_units, the direct formula when there is one, otherwise the
+    shortest chain of formulas
+    """
+    from_units = UNIT_KEY_MAP.get(from_units, from_units)
+    to_units = UNIT_KEY_MAP.get(to_units, to_units)
+    if from_units == to_units: return [ ]
+    key = '%s_to_%s' % (from_units, to_units)
+    if key in FORMULAS: return [key,]
+
+    # breadth first search so the chain uses as few formulas as possible
+    previous = { from_units : None }
+    queue = [from_units,]
+    while queue:
+        next_queue = [ ]
+        for units in queue:
+            for next_units in sorted(CONVERSION_GRAPH.get(units, ())):
+                if next_units in previous: continue
+                previous[next_units] = units
+                if next_units == to_units:
+                    chain = [ ]
+                    while previous[next_units] is not None:
+                        chain.insert(0, '%s_to_%s' % (previous[next_units],
+                                                      next_units))
+                        next_units = previous[next_units]
+                    return chain
+                next_queue.append(next_units)
+        queue = next_queue
+
+    errmsg = 'No formula found to convert "%s" to "%s"'
+    raise ValueError, errmsg % (from_units, to_units)
+
 # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
 def conversionFormula(from_units, to_units):
@@ -352,11 +459,8 @@ def conversionOperator(from_units, to_units):
 # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
 def isSupportedConversion(from_units, to_units):
-    from_units = UNIT_KEY_MAP.get(from_units, from_units)
-    to_units = UNIT_KEY_MAP.get(to_units, to_units)
-    if from_units != to_units:
-        formula = FORMULAS.get('%s_to_%s' % (from_units,to_units), None)
-        if formula is None: return False
+    try: unitConverter(from_units, to_units)
+    except ValueError: return False
     return True
 
 # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
@@ -369,44 +473,132 @@ def sanitizeUnits(units):
     if '*' in _units: return tuple(_units.split('*'))
     else: return (_units, None)
 
-# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
 
-def convertUnits(data, data_units, out_units):
-    if data_units == out_units: return data
+class UnitConverter(object):
+    """ Converts data from one set of units to another. The whole chain of
+    formulas, including any scale on either set of units (e.g. "F*10"),
+    is fused into as few steps as possible, one (scale, offset) step when
+    every formula is linear. Use unitConverter() to get one so that each
+    pair of units is only compiled once.
+    """
 
-    # check for scaled unit conversions
-    from_units, from_scale = sanitizeUnits(data_units)
-    to_units, to_scale = sanitizeUnits(out_units)
+    def __init__(self, from_units, to_units):
+        self.from_units = from_units
+        self.to_units = to_units
 
-    is_array = isinstance(data, N.ndarray)
-    if from_scale is not None:
-        if is_array:
-            if data.dtype.kind == 'f': data /= float(from_scale)
-            elif data.dtype.kind == 'i': data /= int(from_scale)
-        else:
-            if type(data) == float: data /= float(from_scale)
-            elif type(data) == int: data /= int(from_scale)
+        _from_units, from_scale = sanitizeUnits(from_units)
+        _to_units, to_scale = sanitizeUnits(to_units)
+        self.chain = tuple(conversionChain(_from_units, _to_units))
+        self.from_scale = from_scale
 
-    from_units = UNIT_KEY_MAP.get(from_units, from_units)
-    to_units = UNIT_KEY_MAP.get(to_units, to_units)
-    if from_units != to_units:
-        convert, arg = conversionOperator(from_units, to_units)
-        result = convert(data, arg)
-
-    if to_scale is not None:
-        if is_array:
-            if data.dtype.kind == 'f': result *= float(to_scale)
-            elif data.dtype.kind == 'i': result *= int(to_scale)
+        steps = [COMPILED_FORMULAS[key] for key in self.chain]
+        if to_scale is not None: steps.append((float(to_scale), 0.))
+        # steps that are used when the scale of from_units has already
+        # been removed from the data
+        self.unit_steps = self._fuse(steps)
+        if from_scale is not None:
+            steps.insert(0, (1. / float(from_scale), 0.))
+        self.steps = self._fuse(steps)
+
+    def _fuse(self, steps):
+        fused = [ ]
+        for step in steps:
+            if fused and isinstance(step, tuple) \
+            and isinstance(fused[-1], tuple):
+                scale, offset = fused[-1]
+                fused[-1] = (step[0] * scale, (step[0] * offset) + step[1])
+            else: fused.append(step)
+        return tuple([step for step in fused if step != (1., 0.)])
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def __call__(self, data, inplace=False):
+        """ converts data, a number or an array. When inplace is True,
+        arrays of floats are converted in place and returned.
+        """
+        if isinstance(data, N.ndarray) and data.dtype.kind == 'f':
+            steps = self.steps
         else:
-            if type(data) == float: result *= float(from_scale)
-            elif type(data) == int: result *= int(from_scale)
-    return result
+            # integer data, keep the integer division used for scaled units
+            steps = self.unit_steps
+            if self.from_scale is not None:
+                if isinstance(data, N.ndarray):
+                    if data.dtype.kind == 'i':
+                        data = data // int(self.from_scale)
+                elif type(data) == float: data /= float(self.from_scale)
+                elif type(data) == int: data /= int(self.from_scale)
+            inplace = False
+
+        for step in steps:
+            if isinstance(step, tuple):
+                scale, offset = step
+                if inplace:
+                    if scale != 1.: data *= scale
+                    if offset != 0.: data += offset
+                else:
+                    # first step makes a new array, the rest can reuse it
+                    if scale == 1.: data = data + offset
+                    else:
+                        data = data * scale
+                        if offset != 0.:
+                            if isinstance(data, N.ndarray): data += offset
+                            else: data = data + offset
+                    inplace = isinstance(data, N.ndarray)
+            else:
+                data = step(data)
+                inplace = False
+        return data
+
+    def __repr__(self):
+        return '%s(%s -> %s : %s)' % (self.__class__.__name__,
+                self.from_units, self.to_units, ' -> '.join(self.chain))
+
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+CONVERTERS = { }
+
+def unitConverter(from_units, to_units):
+    """ Returns: compiled UnitConverter for the pair of units, raises
+    ValueError when there is no way to convert between them
+    """
+    converter = CONVERTERS.get((from_units, to_units), None)
+    if converter is None:
+        converter = UnitConverter(from_units, to_units)
+        CONVERTERS[(from_units, to_units)] = converter
+    return converter
+
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+def validateConversions(conversions):
+    """ Compiles a converter for each (from_units, to_units) pair so that
+    conversions that will be needed later are checked up front. Raises
+    ValueError listing every pair that cannot be converted.
+    """
+    unsupported = [ ]
+    for from_units, to_units in conversions:
+        if from_units == to_units: continue
+        try: unitConverter(from_units, to_units)
+        except ValueError:
+            unsupported.append('"%s" to "%s"' % (from_units, to_units))
+    if unsupported:
+        errmsg = 'Unsupported unit conversions : %s'
+        raise ValueError, errmsg % ', '.join(unsupported)
+
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+def convertUnits(data, data_units, out_units, inplace=False):
+    """ Converts data, a number or an array, from data_units to out_units.
+    When inplace is True, arrays of floats are converted in place.
+    """
+    if data_units == out_units: return data
+    return unitConverter(data_units, out_units)(data, inplace)
 
 # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
 def conversionFunction(from_units, to_units):
     if from_units is not None and to_units is not None:
-        def convert(data): return convertUnits(data, from_units, to_units)
+        converter = unitConverter(from_units, to_units)
+        def convert(data): return converter(data)
         return convert
     return None
-
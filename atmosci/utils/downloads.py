@@ -0,0 +1,346 @@
+""" Concurrent file downloads over a shared, keep-alive HTTP session.
+
+A DownloadManager runs DownloadRequests on a bounded pool of threads.
+Every request goes through the same requests.Session, so connections
+to each server are reused. The number of simultaneous requests to any
+one host is limited separately from the size of the pool.
+
+Failed attempts are retried with exponential backoff. Data is written
+to a ".part" file that is only renamed to the requested path once it
+has been verified, and an interrupted download resumes from the end of
+the ".part" file when the server supports byte ranges.
+"""
+
+import os
+import time
+import random
+import hashlib
+import threading
+import urlparse
+from multiprocessing.pool import ThreadPool
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from atmosci.utils import gributils
+
+RETRY_STATUS = (408, 429, 500, 502, 503, 504)
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+class DownloadError(IOError):
+
+    def __init__(self, message, status=None, retry=True):
+        IOError.__init__(self, message)
+        self.status = status
+        self.retry = retry
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+class DownloadRequest(object):
+    """ A single file to download.
+
+    Arguments:
+        url: url of the remote file
+        filepath: path of the local file
+        key: optional key used to identify the request in results,
+             defaults to the url
+        byte_ranges: download only these (first, last) byte ranges
+        grib_messages: download only these messages ('VARIABLE:level')
+                       from a grib file with an .idx inventory. The full
+                       file is downloaded when they are not available.
+        size: exact size of the complete file in bytes
+        min_size: smallest acceptable size for a complete file
+        checksum: (hashlib algorithm name, hex digest) of the complete file
+        timeout: seconds to wait for the server to respond to this
+                 request, defaults to the manager's timeout
+        chunk_size: number of bytes read at a time for this request,
+                    defaults to the manager's chunk_size
+    """
+
+    def __init__(self, url, filepath, key=None, byte_ranges=None,
+                       grib_messages=None, size=None, min_size=None,
+                       checksum=None, timeout=None, chunk_size=None):
+        self.url = url
+        self.filepath = filepath
+        self.key = url if key is None else key
+        self.byte_ranges = byte_ranges
+        self.grib_messages = grib_messages
+        self.size = size
+        self.min_size = min_size
+        self.checksum = checksum
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+
+    @property
+    def host(self): return urlparse.urlparse(self.url).netloc
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+class DownloadResult(object):
+    """ Outcome of a DownloadRequest """
+
+    def __init__(self, request, status, num_bytes, attempts, partial,
+                       message, elapsed):
+        self.request = request
+        self.status = status
+        self.num_bytes = num_bytes
+        self.attempts = attempts
+        self.partial = partial
+        self.message = message
+        self.elapsed = elapsed
+
+    @property
+    def filepath(self): return self.request.filepath
+
+    @property
+    def key(self): return self.request.key
+
+    @property
+    def ok(self): return self.status in (200, 206)
+
+    @property
+    def url(self): return self.request.url
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+class DownloadManager(object):
+    """ Downloads files concurrently with connection reuse, per host
+    concurrency limits, retries with exponential backoff, resumable
+    partial files and size/checksum verification.
+
+    Arguments:
+        max_workers: maximum number of simultaneous downloads
+        max_per_host: maximum number of simultaneous requests to any host
+        attempts: maximum number of attempts for each file
+        backoff: seconds to wait after the first failed attempt, doubled
+                 after each additional failure
+        max_backoff: longest wait between attempts
+        timeout: seconds to wait for the server to respond
+    """
+
+    def __init__(self, max_workers=4, max_per_host=2, attempts=4, backoff=2.,
+                       max_backoff=60., timeout=60., chunk_size=1048576):
+        self.max_workers = max(1, max_workers)
+        self.max_per_host = max(1, max_per_host)
+        self.attempts = max(1, attempts)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.max_workers,
+                              pool_maxsize=self.max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._host_limits = { }
+        self._lock = threading.Lock()
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def download(self, request):
+        """ Downloads a single file, retrying failed attempts.
+
+        Returns: DownloadResult
+        """
+        start = time.time()
+        host_limit = self.hostLimit(request.host)
+        use_ranges = True
+        attempt = 0
+        while True:
+            attempt += 1
+            byte_ranges = None
+            with host_limit:
+                try:
+                    if use_ranges: byte_ranges = self.byteRanges(request)
+                    else: byte_ranges = None
+                    if byte_ranges:
+                        status = 206
+                        num_bytes = self._downloadRanges_(request, byte_ranges)
+                    else:
+                        status, num_bytes = self._downloadFile_(request)
+                    return DownloadResult(request, status, num_bytes, attempt,
+                                          bool(byte_ranges), 'OK',
+                                          time.time() - start)
+
+                except DownloadError as e:
+                    error = e
+                except requests.exceptions.RequestException as e:
+                    error = DownloadError(str(e))
+                except IOError as e:
+                    # byte range download failed, next try the full file
+                    if byte_ranges: use_ranges = False
+                    error = DownloadError(str(e))
+
+            if not error.retry or attempt >= self.attempts:
+                message = '%s (after %d attempts)' % (str(error), attempt)
+                return DownloadResult(request, error.status, 0, attempt,
+                                      False, message, time.time() - start)
+
+            # wait outside the host limit so other requests can proceed
+            wait = min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+            time.sleep(wait * random.uniform(0.5, 1.))
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def downloadAll(self, download_requests, downloadDone=None):
+        """ Downloads all files on the worker pool.
+
+        Arguments:
+            download_requests: sequence of DownloadRequest
+            downloadDone: optional function called with each DownloadResult
+                          as soon as the download finishes
+        Returns: list of DownloadResult in the same order as the requests
+        """
+        download_requests = list(download_requests)
+        if not download_requests: return [ ]
+
+        num_workers = min(self.max_workers, len(download_requests))
+        pool = ThreadPool(num_workers)
+        results = [None] * len(download_requests)
+        try:
+            indexed = pool.imap_unordered(self._downloadIndexed_,
+                                          enumerate(download_requests))
+            for indx, result in indexed:
+                results[indx] = result
+                if downloadDone is not None: downloadDone(result)
+        finally:
+            pool.close()
+            pool.join()
+        return results
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def byteRanges(self, request):
+        """ byte ranges to download for the request, None for the full file """
+        if request.byte_ranges: return request.byte_ranges
+        if request.grib_messages:
+            inventory = gributils.gribInventory(request.url,
+                                                self.requestTimeout(request),
+                                                self.session)
+            if inventory is not None:
+                try:
+                    return gributils.gribByteRanges(inventory,
+                                                    request.grib_messages)
+                except LookupError:
+                    pass
+        return None
+
+    def chunkSize(self, request):
+        """ bytes read at a time for the request """
+        if request.chunk_size: return request.chunk_size
+        return self.chunk_size
+
+    def hostLimit(self, host):
+        with self._lock:
+            limit = self._host_limits.get(host, None)
+            if limit is None:
+                limit = threading.BoundedSemaphore(self.max_per_host)
+                self._host_limits[host] = limit
+        return limit
+
+    def requestTimeout(self, request):
+        """ seconds to wait for the server to respond to the request """
+        if request.timeout is not None and request.timeout > 0:
+            return request.timeout
+        return self.timeout
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def verifyFile(self, filepath, request):
+        """ Returns: None when the file satisfies the size and checksum
+                     requirements of the request, otherwise the reason
+                     that it does not.
+        """
+        size = os.path.getsize(filepath)
+        if request.size is not None and size != request.size:
+            return 'file contains %d bytes, expected %d' % (size, request.size)
+        if request.min_size is not None and size < request.min_size:
+            info = (size, request.min_size)
+            return 'file contains %d bytes, expected at least %d' % info
+        if request.checksum is not None:
+            algorithm, expected = request.checksum
+            digest = hashlib.new(algorithm)
+            chunk_size = self.chunkSize(request)
+            with open(filepath, 'rb') as file_obj:
+                for data in iter(lambda: file_obj.read(chunk_size), ''):
+                    digest.update(data)
+            if digest.hexdigest().lower() != expected.lower():
+                return '%s checksum does not match' % algorithm
+        return None
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def _downloadIndexed_(self, indexed_request):
+        indx, request = indexed_request
+        return indx, self.download(request)
+
+    def _downloadFile_(self, request):
+        part_filepath = request.filepath + '.part'
+        if os.path.exists(part_filepath):
+            offset = os.path.getsize(part_filepath)
+        else: offset = 0
+
+        headers = { }
+        if offset > 0: headers['Range'] = 'bytes=%d-' % offset
+        response = self.session.get(request.url, headers=headers, stream=True,
+                                    timeout=self.requestTimeout(request))
+        status = response.status_code
+        if status == 416 and offset > 0:
+            # the partial file is no longer valid, start over
+            response.close()
+            os.remove(part_filepath)
+            raise DownloadError('partial file could not be resumed', status)
+        if status == 200: offset = 0
+        elif status != 206 or offset == 0:
+            response.close()
+            raise DownloadError('HTTP status %d : %s' % (status, request.url),
+                                status, status in RETRY_STATUS)
+
+        expected = response.headers.get('content-length', None)
+        if expected is not None: expected = int(expected) + offset
+
+        mode = 'ab' if offset > 0 else 'wb'
+        size = offset
+        with open(part_filepath, mode) as file_obj:
+            for data in response.iter_content(self.chunkSize(request)):
+                file_obj.write(data)
+                size += len(data)
+
+        # incomplete files are kept so the next attempt can resume
+        if expected is not None and size < expected:
+            info = (size, expected, request.url)
+            raise DownloadError('received %d of %d bytes : %s' % info, status)
+
+        self._verifyAndRename_(part_filepath, request)
+        return 200, size
+
+    def _downloadRanges_(self, request, byte_ranges):
+        # messages are small, so failed range downloads are not resumed
+        return gributils.downloadByteRanges(request.url, byte_ranges,
+                         request.filepath, self.requestTimeout(request),
+                         self.session, self.chunkSize(request))
+
+    def _verifyAndRename_(self, part_filepath, request):
+        why = self.verifyFile(part_filepath, request)
+        if why is not None:
+            os.remove(part_filepath)
+            raise DownloadError('%s : %s' % (why, request.url))
+        os.rename(part_filepath, request.filepath)
@@ -0,0 +1,190 @@
+""" Partial downloads of GRIB2 files using the .idx inventory files that
+NCEP publishes alongside each grib file on its servers.
+
+Each line of an inventory describes one message in the grib file :
+    message_number:byte_offset:d=YYYYMMDDHH:VARIABLE:level:forecast:
+
+GRIB2 messages are self contained, so the bytes for any set of messages
+can be concatenated into a valid grib file.
+"""
+
+import os
+import struct
+
+import requests
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+def parseGribInventory(inventory_text):
+    """
+    Returns: list of (first byte, last byte, 'VARIABLE:level') for each
+             message in the inventory. Last byte is None for the final
+             message in the file.
+    """
+    messages = [ ]
+    for line in inventory_text.splitlines():
+        parts = line.strip().split(':')
+        if len(parts) < 5: continue
+        messages.append((int(parts[1]), '%s:%s' % (parts[3], parts[4])))
+
+    # sub-messages share the byte offset of their parent message
+    offsets = sorted(set([first for first, name in messages]))
+    next_offset = dict(zip(offsets[:-1], offsets[1:]))
+
+    inventory = [ ]
+    for first, name in messages:
+        if first in next_offset: last = next_offset[first] - 1
+        else: last = None
+        inventory.append((first, last, name))
+    return inventory
+
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+def gribByteRanges(inventory, message_names):
+    """ Returns: sorted list of (first byte, last byte) for the messages
+    in message_names, with adjacent messages merged into a single range.
+
+    Raises LookupError when any of the names is not in the inventory.
+    """
+    ranges = [ ]
+    found = set()
+    for first, last, name in inventory:
+        if name in message_names:
+            ranges.append((first, last))
+            found.add(name)
+
+    missing = [name for name in message_names if name not in found]
+    if missing:
+        raise LookupError, 'not in grib inventory : %s' % ', '.join(missing)
+
+    ranges.sort()
+    merged = [list(ranges[0])]
+    for first, last in ranges[1:]:
+        prev_last = merged[-1][1]
+        if prev_last is None: continue
+        if first <= prev_last + 1:
+            if last is None or last > prev_last: merged[-1][1] = last
+        else: merged.append([first, last])
+    return [tuple(byte_range) for byte_range in merged]
+
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+def countGribMessages(filepath):
+    """ Counts the complete messages at the start of a local grib file,
+    using the total length in each message's indicator section. Counting
+    stops at the first message that is truncated or is not a grib message,
+    so a file left by an interrupted download has fewer messages than
+    were requested.
+
+    Returns: number of complete messages, 0 for a missing or empty file
+    """
+    if not os.path.exists(filepath): return 0
+    file_size = os.path.getsize(filepath)
+    count = 0
+    offset = 0
+    with open(filepath, 'rb') as file_obj:
+        while offset + 16 <= file_size:
+            file_obj.seek(offset)
+            indicator = file_obj.read(16)
+            if indicator[:4] != 'GRIB': break
+            edition = ord(indicator[7])
+            if edition == 2: length = struct.unpack('>Q', indicator[8:16])[0]
+            elif edition == 1:
+                length = struct.unpack('>I', '\x00' + indicator[4:7])[0]
+            else: break
+            if length < 20 or offset + length > file_size: break
+            file_obj.seek(offset + length - 4)
+            if file_obj.read(4) != '7777': break
+            count += 1
+            offset += length
+    return count
+
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+def gribInventory(grib_url, timeout=None, session=None):
+    """
+    Returns: parsed inventory for the grib file at grib_url or None when
+             the server does not have an inventory for the file.
+    """
+    requester = requests if session is None else session
+    kwargs = { }
+    if timeout: kwargs['timeout'] = timeout
+    try:
+        response = requester.get(grib_url + '.idx', **kwargs)
+    except requests.exceptions.RequestException:
+        return None
+    if response.status_code != 200: return None
+
+    try:
+        inventory = parseGribInventory(response.text)
+    except ValueError:
+        return None
+    if len(inventory) == 0: return None
+    return inventory
+
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+def downloadByteRanges(url, byte_ranges, filepath, timeout=None, session=None,
+                       chunk_size=1048576):
+    """ Downloads each byte range with an HTTP Range request and writes
+    them, in order, to filepath. The file only appears at filepath after
+    every range has been downloaded completely.
+
+    Returns: number of bytes written
+
+    Raises IOError when the server ignores the Range header or a
+    response is incomplete.
+    """
+    requester = requests if session is None else session
+    part_filepath = filepath + '.part'
+    num_bytes = 0
+    try:
+        with open(part_filepath, 'wb') as file_obj:
+            for first, last in byte_ranges:
+                if last is None: header = 'bytes=%d-' % first
+                else: header = 'bytes=%d-%d' % (first, last)
+                kwargs = { 'headers':{'Range':header}, 'stream':True }
+                if timeout: kwargs['timeout'] = timeout
+                response = requester.get(url, **kwargs)
+                if response.status_code != 206:
+                    response.close()
+                    errmsg = 'byte range request failed with status %d : %s'
+                    raise IOError, errmsg % (response.status_code, url)
+
+                size = 0
+                for data in response.iter_content(chunk_size):
+                    file_obj.write(data)
+                    size += len(data)
+                if last is not None and size != (last - first + 1):
+                    errmsg = 'received %d of %d bytes in range %s : %s'
+                    raise IOError, errmsg % (size, last-first+1, header, url)
+                num_bytes += size
+        os.rename(part_filepath, filepath)
+
+    except:
+        if os.path.exists(part_filepath): os.remove(part_filepath)
+        raise
+
+    return num_bytes
+
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+def downloadGribMessages(grib_url, message_names, filepath, timeout=None,
+                         session=None):
+    """ Downloads only the messages in message_names from the grib file
+    at grib_url.
+
+    Returns: number of bytes downloaded or None when a partial download
+             is not possible (no inventory, a message is not in the
+             inventory or the server does not support byte ranges).
+             Callers should download the full file instead.
+    """
+    inventory = gribInventory(grib_url, timeout, session)
+    if inventory is None: return None
+    try:
+        byte_ranges = gribByteRanges(inventory, message_names)
+        return downloadByteRanges(grib_url, byte_ranges, filepath, timeout,
+                                  session)
+    except (LookupError, IOError, requests.exceptions.RequestException):
+        return None
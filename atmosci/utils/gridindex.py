@@ -0,0 +1,193 @@
+""" Spatial indexes that find the nodes of a 2D lon/lat grid closest to
+coordinate points without scanning the whole grid.
+
+Grids where every row has the same latitude and every column the same
+longitude (e.g. the ACIS HiRes grids) are searched one axis at a time with
+a binary search and give exactly the same node as a full scan of the grid.
+Any other grid (e.g. the Lambert Conformal NDFD and RTMA grids) uses a KD
+tree of the node coordinates. Distances are in decimal degrees, the same
+as the distance used by Hdf5GridFileMixin.distanceBetweenNodes.
+"""
+
+import os
+import cPickle
+import hashlib
+
+import numpy as N
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+def gridSignature(lons, lats):
+    """ Returns: (shape, md5 digest) that identifies a lon/lat grid
+    """
+    digest = hashlib.md5()
+    digest.update(N.ascontiguousarray(lons, dtype=float).tostring())
+    digest.update(N.ascontiguousarray(lats, dtype=float).tostring())
+    return (lons.shape, digest.hexdigest())
+
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+def _axisOrder_(axis):
+    """ Returns: sorted axis values and the grid index of each, None when the
+    axis is not strictly monotonic
+    """
+    if len(axis) == 1: return axis, N.zeros(1, dtype=int)
+    diffs = N.diff(axis)
+    if N.all(diffs > 0): return axis, N.arange(len(axis))
+    if N.all(diffs < 0): return axis[::-1], N.arange(len(axis))[::-1]
+    return None, None
+
+def _axisSearch_(axis, order, values):
+    """ Returns: grid index of the axis value closest to each of the values
+    and the distance to it, the lowest index when two are equally close
+    """
+    last = len(axis) - 1
+    upper = N.searchsorted(axis, values)
+    lower = N.clip(upper - 1, 0, last)
+    upper = N.clip(upper, 0, last)
+    lower_dist = N.abs(axis[lower] - values)
+    upper_dist = N.abs(axis[upper] - values)
+    lower = order[lower]
+    upper = order[upper]
+    use_lower = (lower_dist < upper_dist) | \
+                ((lower_dist == upper_dist) & (lower < upper))
+    return ( N.where(use_lower, lower, upper),
+             N.where(use_lower, lower_dist, upper_dist) )
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+class GridNodeIndex(object):
+    """ Finds the nodes of a 2D lon/lat grid that are closest to coordinate
+    points. Use gridNodeIndex() to get one so that the index for a grid is
+    only built once.
+
+    Arguments:
+        lons: 2D array of grid node longitudes
+        lats: 2D array of grid node latitudes
+    """
+
+    def __init__(self, lons, lats):
+        lons = N.asarray(lons, dtype=float)
+        lats = N.asarray(lats, dtype=float)
+        self.shape = lons.shape
+        self.signature = gridSignature(lons, lats)
+
+        lon_axis = lons[0,:]
+        lat_axis = lats[:,0]
+        rectilinear = N.all(lons == lon_axis) and \
+                      N.all(lats == lat_axis[:,N.newaxis])
+        if rectilinear:
+            self._lon_axis, self._lon_order = _axisOrder_(lon_axis)
+            self._lat_axis, self._lat_order = _axisOrder_(lat_axis)
+            rectilinear = self._lon_axis is not None \
+                          and self._lat_axis is not None
+        self.rectilinear = rectilinear
+
+        self._lons = lons
+        self._lats = lats
+        self._tree = None
+        if not rectilinear: self._buildTree()
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def __call__(self, lon, lat):
+        return self.nearestNode(lon, lat)
+
+    def nearestNode(self, lon, lat):
+        """ Returns: (y, x) indexes of the node closest to one point
+        """
+        y, x, distance = self.nearestNodes((lon,), (lat,))
+        return int(y[0]), int(x[0])
+
+    def nearestNodes(self, lons, lats):
+        """ Finds the node closest to each of any number of points.
+
+        Returns: arrays of y indexes, x indexes and distances to the nodes
+        """
+        lons = N.asarray(lons, dtype=float)
+        lats = N.asarray(lats, dtype=float)
+        if self.rectilinear:
+            x, lon_dist = _axisSearch_(self._lon_axis, self._lon_order, lons)
+            y, lat_dist = _axisSearch_(self._lat_axis, self._lat_order, lats)
+            distances = N.sqrt((lon_dist * lon_dist) + (lat_dist * lat_dist))
+            return y, x, distances
+
+        distances, nodes = self._tree.query(N.column_stack((lons.ravel(),
+                                                            lats.ravel())))
+        y, x = N.unravel_index(self._nodes[nodes], self.shape)
+        return ( y.reshape(lons.shape), x.reshape(lons.shape),
+                 distances.reshape(lons.shape) )
+
+    def kNearestNodes(self, lons, lats, k):
+        """ Finds the k nodes closest to each of any number of points.
+
+        Returns: arrays of y indexes, x indexes and distances to the nodes,
+                 each with one row per point, nodes ordered by distance
+        """
+        if self._tree is None: self._buildTree()
+        lons = N.asarray(lons, dtype=float).ravel()
+        lats = N.asarray(lats, dtype=float).ravel()
+        distances, nodes = self._tree.query(N.column_stack((lons, lats)), k)
+        distances = distances.reshape((len(lons), k))
+        y, x = N.unravel_index(self._nodes[nodes.reshape((len(lons), k))],
+                               self.shape)
+        return y, x, distances
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def _buildTree(self):
+        from scipy.spatial import cKDTree
+        valid = N.isfinite(self._lons) & N.isfinite(self._lats)
+        self._nodes = N.where(valid.ravel())[0]
+        self._tree = cKDTree(N.column_stack((self._lons[valid],
+                                             self._lats[valid])))
+
+    def __getstate__(self):
+        # the grids are only needed to build the tree
+        state = dict(self.__dict__)
+        state['_lons'] = None
+        state['_lats'] = None
+        return state
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+NODE_INDEXES = { }
+
+def gridNodeIndex(lons, lats, cache_filepath=None):
+    """ Returns: GridNodeIndex for the grid, built only once per process.
+    When cache_filepath is given, indexes that use a KD tree are saved to
+    that file and loaded from it by later processes.
+    """
+    signature = gridSignature(lons, lats)
+    node_index = NODE_INDEXES.get(signature, None)
+    if node_index is not None: return node_index
+
+    if cache_filepath is not None and os.path.exists(cache_filepath):
+        try:
+            with open(cache_filepath, 'rb') as cache_file:
+                node_index = cPickle.load(cache_file)
+        except Exception:
+            node_index = None
+        # the file is stale when the grid has changed
+        if node_index is not None and node_index.signature != signature:
+            node_index = None
+
+    if node_index is None:
+        node_index = GridNodeIndex(lons, lats)
+        if cache_filepath is not None and not node_index.rectilinear:
+            # write to a temporary file so readers never see a partial one
+            tmp_filepath = '%s.%d.tmp' % (cache_filepath, os.getpid())
+            try:
+                with open(tmp_filepath, 'wb') as cache_file:
+                    cPickle.dump(node_index, cache_file,
+                                 cPickle.HIGHEST_PROTOCOL)
+                os.rename(tmp_filepath, cache_filepath)
+            except (IOError, OSError):
+                # the cache is only an optimization, e.g. read only dirs
+                if os.path.exists(tmp_filepath): os.remove(tmp_filepath)
+
+    NODE_INDEXES[signature] = node_index
+    return node_index
+
+def clearNodeIndexes():
+    NODE_INDEXES.clear()
@@ -0,0 +1,189 @@
+""" Small threaded HTTP server that serves files from a local directory.
+It supports single byte range requests and keeps a record of requests,
+so download code can be exercised without network access. It can also
+simulate a slow or unreliable server : delayed responses, failed
+requests and responses that are cut short.
+"""
+
+import os
+import re
+import sys
+import socket
+import time
+import threading
+import BaseHTTPServer
+import SocketServer
+
+RANGE_HEADER = re.compile(r'bytes=(\d+)-(\d*)$')
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+class SampleFileRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.active += 1
+            server.max_active = max(server.active, server.max_active)
+        try:
+            self._respond_(server)
+        finally:
+            with server.lock: server.active -= 1
+
+    def _respond_(self, server):
+        path = self.path.split('?')[0].lstrip('/')
+        filepath = os.path.join(server.root_dir, *path.split('/'))
+        range_header = self.headers.get('Range', None)
+        with server.lock:
+            server.requests.append((self.path, range_header))
+            num_requests = server.path_counts.get(path, 0) + 1
+            server.path_counts[path] = num_requests
+
+        if server.delay > 0: time.sleep(server.delay)
+
+        # the first "failures" requests for each file are refused
+        if num_requests <= server.failures:
+            self.send_error(503)
+            return
+
+        if not os.path.isfile(filepath):
+            self.send_error(404)
+            return
+
+        with open(filepath, 'rb') as file_obj: content = file_obj.read()
+        size = len(content)
+
+        if range_header is not None and server.byte_ranges:
+            match = RANGE_HEADER.match(range_header)
+            if match is None or int(match.group(1)) >= size:
+                self.send_error(416)
+                return
+            first = int(match.group(1))
+            if match.group(2): last = min(int(match.group(2)), size-1)
+            else: last = size - 1
+            body = content[first:last+1]
+            self.send_response(206)
+            self.send_header('Content-Range',
+                             'bytes %d-%d/%d' % (first, last, size))
+        else:
+            body = content
+            self.send_response(200)
+
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+
+        # the next "truncate" responses for each file stop half way
+        if num_requests <= server.failures + server.truncate:
+            body = body[:len(body)/2]
+            self.close_connection = 1
+        self.wfile.write(body)
+        with server.lock: server.bytes_sent += len(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _ThreadedHTTPServer(SocketServer.ThreadingMixIn,
+                          BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # clients are allowed to hang up before reading the whole response
+        if not isinstance(sys.exc_info()[1], socket.error):
+            BaseHTTPServer.HTTPServer.handle_error(self, request, client_address)
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+class SampleFileServer(object):
+    """ Serves files in root_dir at http://127.0.0.1:port/ from a
+    background thread. Port 0 picks any free port.
+
+    Arguments:
+        byte_ranges: honor Range headers
+        delay: seconds to wait before responding to each request
+        failures: number of requests for each file that are refused
+                  with status 503 before it is served
+        truncate: number of responses for each file, after the refused
+                  ones, that are cut short with the connection closed
+
+    Usage:
+        with SampleFileServer(dirpath) as server:
+            requests.get(server.url + '/filename')
+    """
+
+    def __init__(self, root_dir, port=0, byte_ranges=True, delay=0.,
+                       failures=0, truncate=0,
+                       handler=SampleFileRequestHandler):
+        self.root_dir = root_dir
+        self.port = port
+        self.byte_ranges = byte_ranges
+        self.delay = delay
+        self.failures = failures
+        self.truncate = truncate
+        self.handler = handler
+        self._server = None
+        self._thread = None
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    @property
+    def bytes_sent(self): return self._server.bytes_sent
+
+    @property
+    def max_active(self):
+        """ largest number of requests handled at the same time """
+        return self._server.max_active
+
+    @property
+    def requests(self): return self._server.requests
+
+    @property
+    def url(self): return 'http://127.0.0.1:%d' % self.port
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def reset(self):
+        """ clear the record of requests """
+        with self._server.lock:
+            del self._server.requests[:]
+            self._server.path_counts.clear()
+            self._server.bytes_sent = 0
+            self._server.max_active = 0
+
+    def start(self):
+        server = _ThreadedHTTPServer(('127.0.0.1', self.port), self.handler)
+        server.root_dir = self.root_dir
+        server.byte_ranges = self.byte_ranges
+        server.delay = self.delay
+        server.failures = self.failures
+        server.truncate = self.truncate
+        server.lock = threading.Lock()
+        server.requests = [ ]
+        server.path_counts = { }
+        server.bytes_sent = 0
+        server.active = 0
+        server.max_active = 0
+        self.port = server.server_address[1]
+        self._server = server
+        self._thread = threading.Thread(target=server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
@@ -20,11 +20,25 @@ RELATIVE_INDEXES = {  9 : ( (-1, -1, -1,  0, 0, 0,  1, 1, 1),
 
 # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
 
-def indexOfClosestNode(target_lon, target_lat, lon_grid, lat_grid, radius):
+def indexOfClosestNode(target_lon, target_lat, lon_grid, lat_grid, radius,
+                       node_index=None):
+    """ node_index, when given, is the atmosci.utils.gridindex.GridNodeIndex
+    for the grid, which is used instead of searching the whole grid.
+    Raises ValueError when there is no node within radius of the target.
+    """
+    errmsg = 'No grid node within %s degrees of (%s, %s)'
+    if node_index is not None:
+        y, x = node_index.nearestNode(target_lon, target_lat)
+        if abs(lon_grid[y,x] - target_lon) > radius \
+        or abs(lat_grid[y,x] - target_lat) > radius:
+            raise ValueError, errmsg % (radius, target_lon, target_lat)
+        return y, x
     indexes = N.where( (lon_grid >= (target_lon-radius)) &
                        (lon_grid <= (target_lon+radius)) &
                        (lat_grid >= (target_lat-radius)) &
                        (lat_grid <= (target_lat+radius)) )
+    if len(indexes[0]) == 0:
+        raise ValueError, errmsg % (radius, target_lon, target_lat)
     lon_diffs = lon_grid[indexes] - target_lon
     lat_diffs = lat_grid[indexes] - target_lat
     distances = N.sqrt( (lon_diffs * lon_diffs) + (lat_diffs * lat_diffs) )
@@ -32,8 +46,9 @@ def indexOfClosestNode(target_lon, target_lat, lon_grid, lat_grid, radius):
     return indexes[0][indx], indexes[1][indx]
 
 def indexesOfNeighborNodes(target_lon, target_lat, relative_nodes,
-                           lon_grid, lat_grid, radius):
-    y, x = indexOfClosestNode(target_lon,target_lat,lon_grid,lat_grid,radius)
+                           lon_grid, lat_grid, radius, node_index=None):
+    y, x = indexOfClosestNode(target_lon, target_lat, lon_grid, lat_grid,
+                              radius, node_index)
 
     if relative_nodes in (9,13,25):
         y_indexes = [y+offset for offset in RELATIVE_INDEXES[relative_nodes][0]]
@@ -51,8 +66,8 @@ def indexesOfNeighborNodes(target_lon, target_lat, relative_nodes,
                 y_indexes = [y+1, y+1, y, y]
                 x_indexes = [x+1, x, x, x+1]
             else: # on east/west edge of two grids
-                y_indexes = [ y+closest_y for y in RELATIVE_INDEXES[9][0] ]
-                x_indexes = [ x+closest_x for x in RELATIVE_INDEXES[9][1] ]
+                y_indexes = [ y+offset for offset in RELATIVE_INDEXES[9][0] ]
+                x_indexes = [ x+offset for offset in RELATIVE_INDEXES[9][1] ]
 
         elif target_lon > near_lon: # west half of grid
             if target_lat < near_lat: # north west quadrant of grid
@@ -62,12 +77,12 @@ def indexesOfNeighborNodes(target_lon, target_lat, relative_nodes,
                 y_indexes = [y+1, y+1, y, y]
                 x_indexes = [x, x+1, x+1, x]
             else: # on east/west edge of two grids
-                y_indexes = [ y+closest_y for y in RELATIVE_INDEXES[9][0] ]
-                x_indexes = [ x+closest_x for x in RELATIVE_INDEXES[9][1] ]
+                y_indexes = [ y+offset for offset in RELATIVE_INDEXES[9][0] ]
+                x_indexes = [ x+offset for offset in RELATIVE_INDEXES[9][1] ]
 
         else: # on north/south edge of two grids
-            y_indexes = [ y+closest_y for y in RELATIVE_INDEXES[9][0] ]
-            x_indexes = [ x+closest_x for x in RELATIVE_INDEXES[9][1] ]
+            y_indexes = [ y+offset for offset in RELATIVE_INDEXES[9][0] ]
+            x_indexes = [ x+offset for offset in RELATIVE_INDEXES[9][1] ]
 
     return [ y_indexes, x_indexes ]
 
@@ -1,5 +1,7 @@
 
 import os, sys
+import cPickle
+import hashlib
 import warnings
 
 from dateutil.relativedelta import relativedelta
@@ -15,6 +17,7 @@ import matplotlib
 matplotlib.use("Agg")
 from matplotlib import pyplot
 from matplotlib import cm
+from matplotlib.image import pil_to_array
 from mpl_toolkits.basemap import Basemap
 from matplotlib.colors import ListedColormap
 from matplotlib.patches import Rectangle, PathPatch
@@ -74,6 +77,7 @@ MAP_OPTIONS = { 'area': 'northeast',       # northeast, westny, eastny, ny, etc.
                 'metalocation': RESOURCE_DIR, 
                 'shapelocation': RESOURCE_DIR, # location of template or shapefiles (old basemap)
                 'shape_resolution':'i',
+                'map_cache_dir': None,     # directory for pickled basemaps and ocean masks
                 }
 
 MAP_TITLE_OFFSETS = { 'default':       (0.05, 0.10),
@@ -90,6 +94,233 @@ MAP_TITLE_OFFSETS = { 'default':       (0.05, 0.10),
                       'wv_state':      (0.48, 0.09),
                     }
 
+# number of interpolated nodes per grid node in each direction
+HIRES_FACTOR = 5
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+#
+# Map resources that are the same for every map drawn for a region : the
+# Basemap, projected grid coordinates, ocean masks and images. They are
+# built once per process and kept in MAP_CACHE. When "map_cache_dir" is
+# set in the map options, Basemaps and ocean masks are also pickled there
+# so that later runs can load them instead of building them again.
+#
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+MAP_CACHE = { }
+
+def cachedMapResource(resource_type, key, builder, cache_dir=None):
+    cache_key = (resource_type, key)
+    resource = MAP_CACHE.get(cache_key, None)
+    if resource is not None: return resource
+
+    filepath = None
+    if cache_dir is not None:
+        digest = hashlib.md5(repr(key)).hexdigest()
+        filename = '%s-%s.pickle' % (resource_type, digest)
+        filepath = os.path.join(cache_dir, filename)
+        if os.path.exists(filepath):
+            try:
+                with open(filepath, 'rb') as cache_file:
+                    resource = cPickle.load(cache_file)
+            except Exception: # unreadable cache file, rebuild it
+                resource = None
+
+    if resource is None:
+        resource = builder()
+        if filepath is not None:
+            if not os.path.exists(cache_dir):
+                try: os.makedirs(cache_dir)
+                except OSError: pass # created by another process
+            # write to a temporary file so that other processes never
+            # read a partial file
+            tmp_filepath = '%s.tmp%d' % (filepath, os.getpid())
+            with open(tmp_filepath, 'wb') as cache_file:
+                cPickle.dump(resource, cache_file, cPickle.HIGHEST_PROTOCOL)
+            os.rename(tmp_filepath, filepath)
+
+    MAP_CACHE[cache_key] = resource
+    return resource
+
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - 
+
+def clearMapCache():
+    MAP_CACHE.clear()
+
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - 
+
+def gridSignature(lats, lons):
+    digest = hashlib.md5(N.ascontiguousarray(lats, dtype=float).tostring())
+    digest.update(N.ascontiguousarray(lons, dtype=float).tostring())
+    return (lats.shape, digest.hexdigest())
+
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - 
+
+def basemapKey(_basemap_):
+    return (_basemap_.projection, _basemap_.resolution,
+            float(_basemap_.llcrnrlon), float(_basemap_.llcrnrlat),
+            float(_basemap_.urcrnrlon), float(_basemap_.urcrnrlat))
+
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - 
+
+def cachedBasemap(lon_min, lat_min, lon_max, lat_max, resolution,
+                  cache_dir=None):
+    bounds = (float(lon_min), float(lat_min), float(lon_max), float(lat_max))
+    def buildBasemap():
+        return Basemap(llcrnrlon=lon_min, llcrnrlat=lat_min,
+                       urcrnrlon=lon_max, urcrnrlat=lat_max,
+                       projection='merc', resolution=resolution,
+                       lat_ts=(lat_max+lat_min)/2.0)
+    # Basemaps with coastlines are slow to build, so they go to disk
+    if resolution is None: cache_dir = None
+    return cachedMapResource('basemap', ('merc', resolution) + bounds,
+                             buildBasemap, cache_dir)
+
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - 
+
+def cachedImage(filepath):
+    """ image file as an array, the same array that imshow would create
+    from the file """
+    def loadImage():
+        return pil_to_array(PIL.Image.open(filepath))
+    return cachedMapResource('image', filepath, loadImage)
+
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - 
+
+def hiResCoordinates(lats, lons, factor=HIRES_FACTOR):
+    def buildCoordinates():
+        nlats = factor * lats.shape[0]
+        nlons = factor * lats.shape[1]
+        interp_lons = N.linspace(N.min(lons), N.max(lons), nlons)
+        interp_lats = N.linspace(N.min(lats), N.max(lats), nlats)
+        return tuple(N.meshgrid(interp_lons, interp_lats))
+    key = gridSignature(lats, lons) + (factor,)
+    return cachedMapResource('hires', key, buildCoordinates)
+
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - 
+
+def oceanMask(lats, lons, resolution, factor=HIRES_FACTOR, cache_dir=None):
+    """ boolean mask of the high resolution grid, True for ocean nodes """
+    from mpl_toolkits.basemap import maskoceans
+    def buildMask():
+        interp_lons, interp_lats = hiResCoordinates(lats, lons, factor)
+        masked = maskoceans(interp_lons, interp_lats,
+                            N.zeros(interp_lons.shape), resolution=resolution,
+                            grid=1.25, inlands=False)
+        return N.ma.getmaskarray(masked)
+    key = gridSignature(lats, lons) + (factor, resolution)
+    return cachedMapResource('oceanmask', key, buildMask, cache_dir)
+
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - 
+
+def interpolationOperator(lats, lons, factor=HIRES_FACTOR, cache_dir=None):
+    """ sparse matrix for the bilinear interpolation that Basemap interp()
+    does from a grid to its high resolution grid. The product of the
+    matrix and a flattened data grid is the flattened high resolution grid.
+    Each row has the four weights in the order interp() adds them, so the
+    results are exactly the same as interp() """
+    def buildOperator():
+        from scipy import sparse
+        xin = lons[0]
+        yin = lats[:,0]
+        if xin[-1]-xin[0] < 0 or yin[-1]-yin[0] < 0:
+            raise ValueError, 'grid longitudes and latitudes must increase'
+        xout, yout = hiResCoordinates(lats, lons, factor)
+
+        delx = xin[1:]-xin[0:-1]
+        dely = yin[1:]-yin[0:-1]
+        regular = max(delx)-min(delx) < 1.e-4 and max(dely)-min(dely) < 1.e-4
+        xcoords = _axisCoordinates_(xin, xout, regular)
+        ycoords = _axisCoordinates_(yin, yout, regular)
+
+        nx = len(xin)
+        ny = len(yin)
+        xcoords = N.clip(xcoords, 0, nx-1).ravel()
+        ycoords = N.clip(ycoords, 0, ny-1).ravel()
+        xi = xcoords.astype(N.int32)
+        yi = ycoords.astype(N.int32)
+        xip1 = N.clip(xi+1, 0, nx-1)
+        yip1 = N.clip(yi+1, 0, ny-1)
+        delx = xcoords - xi.astype(N.float32)
+        dely = ycoords - yi.astype(N.float32)
+
+        weights = N.column_stack(((1.-delx)*(1.-dely), delx*dely,
+                                  (1.-delx)*dely, delx*(1.-dely)))
+        columns = N.column_stack((yi*nx + xi, yip1*nx + xip1,
+                                  yip1*nx + xi, yi*nx + xip1))
+        num_nodes = xcoords.size
+        indptr = N.arange(0, 4*num_nodes+1, 4)
+        return sparse.csr_matrix((weights.ravel(), columns.ravel(), indptr),
+                                 shape=(num_nodes, nx*ny))
+
+    key = gridSignature(lats, lons) + (factor,)
+    return cachedMapResource('interp', key, buildOperator, cache_dir)
+
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - 
+
+def _axisCoordinates_(axis, values, regular):
+    """ fractional index of values along one axis of the grid """
+    if regular:
+        return (len(axis)-1)*(values-axis[0])/(axis[-1]-axis[0])
+    # irregular (but still rectilinear) grid
+    axis = N.asarray(axis, dtype=float)
+    flat = values.ravel()
+    indexes = N.searchsorted(axis, flat) - 1
+    inside = N.clip(indexes, 0, len(axis)-2)
+    coords = inside + (flat-axis[inside]) / (axis[inside+1]-axis[inside])
+    coords[indexes < 0] = -1
+    coords[indexes >= len(axis)-1] = len(axis)
+    return coords.reshape(values.shape)
+
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - 
+
+def interpolateToHiRes(operator, grid, shape):
+    """ interpolate a data grid with an interpolationOperator. As with
+    interp(), nodes are masked where any of the four grid nodes that they
+    are interpolated from is masked. """
+    if not N.ma.isMA(grid):
+        return operator.dot(N.ravel(grid)).reshape(shape)
+
+    from scipy import sparse
+    interp_grid = operator.dot(grid.filled(0).ravel()).reshape(shape)
+    # any masked node, regardless of its weight
+    nodes = sparse.csr_matrix((N.ones(operator.nnz), operator.indices,
+                               operator.indptr), shape=operator.shape)
+    masked = nodes.dot(N.ma.getmaskarray(grid).ravel().astype(float))
+    return N.ma.masked_array(interp_grid, mask=masked.reshape(shape) > 0)
+
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - 
+
+def projectedGrid(_basemap_, lats, lons, factor=1):
+    """ map x, y coordinates of grid nodes, factor > 1 projects the high
+    resolution grid used for interpolated maps """
+    def projectGrid():
+        if factor > 1:
+            _lons_, _lats_ = hiResCoordinates(lats, lons, factor)
+            return _basemap_(_lons_, _lats_)
+        return _basemap_(lons, lats)
+    key = basemapKey(_basemap_) + gridSignature(lats, lons) + (factor,)
+    return cachedMapResource('projected', key, projectGrid)
+
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - 
+
+def prepareMapResources(lats, lons, interpolate=False, **options):
+    """ builds the cached resources needed to draw maps of a grid, e.g.
+    before forking processes that will draw them """
+    map_options = mapSetup(options)
+    _basemap_, xy_extremes = mapBasemap(lats, lons, **map_options)
+    projectedGrid(_basemap_, lats, lons)
+    if interpolate:
+        cache_dir = map_options.get('map_cache_dir', None)
+        projectedGrid(_basemap_, lats, lons, HIRES_FACTOR)
+        interpolationOperator(lats, lons, cache_dir=cache_dir)
+        if map_options.get('mask_coastlines', True):
+            oceanMask(lats, lons, map_options['shape_resolution'],
+                      cache_dir=cache_dir)
+    for filepath in mapImageFilepaths(**map_options):
+        cachedImage(filepath)
+    return _basemap_
 
 # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
 
@@ -238,6 +469,13 @@ def basemapSetup(lats, lons, **map_options):
     fig = pyplot.figure(figsize=(map_options['size_tup']))
     axes = fig.gca()
 
+    _base_map_, xy_extremes = mapBasemap(lats, lons, **map_options)
+
+    return _base_map_, fig, axes, xy_extremes
+
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - 
+
+def mapBasemap(lats, lons, **map_options):
     # initialize basmap
     if map_options['area'].find("gulfmaine") < 0:
         lon_min = N.nanmin(lons)
@@ -250,16 +488,14 @@ def basemapSetup(lats, lons, **map_options):
         lat_max = 49.5
         lon_max = -59.0
 
-    _base_map_ = Basemap(llcrnrlon=lon_min, llcrnrlat=lat_min, 
-                         urcrnrlon=lon_max, urcrnrlat=lat_max,
-                         projection='merc',
-                         resolution=map_options['shape_resolution'],
-                         lat_ts=(lat_max+lat_min)/2.0)
+    _base_map_ = cachedBasemap(lon_min, lat_min, lon_max, lat_max,
+                               map_options['shape_resolution'],
+                               map_options.get('map_cache_dir', None))
     x_max, y_max = _base_map_(lon_max,lat_max)
     x_min, y_min = _base_map_(lon_min,lat_min)
     xy_extremes = (x_min, x_max, y_min, y_max)
 
-    return _base_map_, fig, axes, xy_extremes
+    return _base_map_, xy_extremes
 
 # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - 
 
@@ -275,7 +511,10 @@ def finishMap(fig, axes, fig1, **map_options):
 # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - 
 
 def finishPlot(**options):
-    pyplot.savefig(options['outputfile'], bbox_inches='tight', pad_inches=0.02)
+    # pyplot.savefig redraws the whole figure after saving it, which is
+    # wasted on a figure that is about to be closed
+    pyplot.gcf().savefig(options['outputfile'], bbox_inches='tight',
+                         pad_inches=0.02)
     if options['pltshow']: pyplot.show()
     else: pyplot.close()
 
@@ -286,33 +525,31 @@ def hiResMap(grid, lats, lons, **options):
     mapSetup(options, lats, lons)
 
     _lons_, _lats_, _grid_ = highResolutionGrid(lats, lons, grid, **options)
-    x, y = _basemap_(_lons_, _lats_)
+    x, y = projectedGrid(_basemap_, lats, lons, HIRES_FACTOR)
 
     return map_options, _basemap_, fig, axes, xy_extremes, x, y, _grid_
 
 # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - 
 
 def highResolutionGrid(lats, lons, grid, **options):
-    from mpl_toolkits.basemap import interp
-    from mpl_toolkits.basemap import maskoceans
     # interpolate data to higher resolution grid in order to better match
     # the builtin land/sea mask. Output looks less 'blocky' near coastlines.
     ##      rbf = Rbf(lons[0], lats[:,0], map_val, epsilon=2)       ##
-    nlats = 5 * lats.shape[0]
-    nlons = 5 * lats.shape[1]
-    interp_lons = N.linspace(N.min(lons), N.max(lons),nlons)
-    interp_lats = N.linspace(N.min(lats), N.max(lats),nlats)
-    interp_lons, interp_lats = N.meshgrid(interp_lons, interp_lats)
-
-    # interpolated high resolution data grid
-    interp_grid = interp(grid, lons[0], lats[:,0], interp_lons, interp_lats)
+    cache_dir = options.get('map_cache_dir', None)
+    interp_lons, interp_lats = hiResCoordinates(lats, lons)
+
+    # interpolated high resolution data grid, the interpolation weights
+    # are only computed once per grid
+    operator = interpolationOperator(lats, lons, cache_dir=cache_dir)
+    interp_grid = interpolateToHiRes(operator, grid, interp_lons.shape)
     ##map_val to rbf
 
-    # interpolate land/sea mask to data grid, then mask nodes in ocean
+    # mask nodes in ocean, the land/sea mask is only computed once per grid
     if options.get('mask_coastlines', True):
-        interp_grid = maskoceans(interp_lons, interp_lats, interp_grid,
-                                 resolution=options['shape_resolution'],
-                                 grid=1.25, inlands=False)
+        ocean = oceanMask(lats, lons, options['shape_resolution'],
+                          cache_dir=cache_dir)
+        interp_grid = N.ma.masked_array(interp_grid,
+                          mask=ocean | N.ma.getmaskarray(interp_grid))
         interp_grid[interp_grid == -999] = N.nan
 
     return interp_lons, interp_lats, interp_grid
@@ -334,25 +571,17 @@ def mapInit(lats, lons, **map_options):
             extent = (x_max-0.30*xdiff, x_max-0.01*xdiff,
                       y_min+0.01*ydiff, y_min+0.15*ydiff)
         
-        img = PIL.Image.open(logo)
-        pyplot.imshow(img, extent=extent, zorder=zorder)
+        pyplot.imshow(cachedImage(logo), extent=extent, zorder=zorder)
 
     # add title
     if 'title' in map_options:
         addMapTitle(fig, xy_extremes=xy_extremes, **map_options)
 
     # add area template image
-    area_template = map_options.get('area_template',None)
-    if area_template is None:
-        area = map_options.get('area', map_options.get('region',None))
-        if area is not None:
-            filename = "%s_template.png" % area
-            path = os.path.join(map_options['shapelocation'], filename)
-        else: path = None
-    else: path = os.path.join(map_options['shapelocation'], area_template)
+    path = areaTemplatePath(**map_options)
     if path is not None:
-        img = PIL.Image.open(path)
-        pyplot.imshow(img, extent=(x_min+.0015*(x_max-x_min),x_max,y_min,y_max),
+        pyplot.imshow(cachedImage(path),
+                      extent=(x_min+.0015*(x_max-x_min),x_max,y_min,y_max),
                       zorder=3)
 
     # add box around the map
@@ -363,6 +592,28 @@ def mapInit(lats, lons, **map_options):
 
 # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - 
 
+def areaTemplatePath(**map_options):
+    area_template = map_options.get('area_template',None)
+    if area_template is None:
+        area = map_options.get('area', map_options.get('region',None))
+        if area is not None:
+            filename = "%s_template.png" % area
+            return os.path.join(map_options['shapelocation'], filename)
+        return None
+    return os.path.join(map_options['shapelocation'], area_template)
+
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - 
+
+def mapImageFilepaths(**map_options):
+    filepaths = [ ]
+    logo = map_options.get('logo', None)
+    if logo is not None: filepaths.append(logo)
+    path = areaTemplatePath(**map_options)
+    if path is not None: filepaths.append(path)
+    return filepaths
+
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - 
+
 def mapSetup(options, lats=None, lons=None):
     map_options = resolveMapOptions(**options)
 
@@ -615,6 +866,7 @@ def addScatterToMap(map_options, _basemap_, fig, data, lats=None, lons=None,
                     x=None, y=None, markercolor=None):
     marker_size = map_options.get('marker_size', 10)
     if markercolor is None:
+        markercolors = map_options.get('markercolors', None)
         if markercolors is None:
             cmap = map_options.get('cmap','jet')
         else: cmap = matplotlib.colors.ListedColormap(markercolors)
@@ -636,7 +888,7 @@ def drawScatterMap(grid, lats, lons, **map_options):
     cmap_options = resolveColorMapOptions(**options)
     options.update(cmap_options)
 
-    fig1 = addToScatterMap(options, _basemap_, fig, _grid_, x=x, y=y)
+    fig1 = addScatterToMap(options, _basemap_, fig, _grid_, x=x, y=y)
 
     if options.get('finish',True): finishMap(fig, axes, fig1, **map_options)
     else: return options, _basemap_, fig, axes, fig1, xy_extremes
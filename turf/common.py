@@ -21,8 +21,8 @@ def calcTimespanAvg(data, timestep=24, timespan=24, start_indx=0,
     """
     Calculate the average data value for each timespan in the data.
 
-    Will loop through as many time spans as are present in the data.
-    TIMESPANS DO NOT OVERLAP
+    All time spans present in the data are reduced in a single NumPy call.
+    Time spans overlap when timestep is less than timespan.
 
     Arguments:
       data: hourly data of any type
@@ -48,35 +48,21 @@ def calcTimespanAvg(data, timestep=24, timespan=24, start_indx=0,
           However, returned arrays will have the same missing value as
           the input array (i.e. the value specified in the "mising" arg).
     """
-    periods, data_avg = createTimePeriodArray(data.shape, dtype, timestep, 
-                                              timespan, start_indx, N.nan)
-
-    if data.ndim == 3:
-        for n, (start, end) in enumerate(periods):
-            period_data = data[start:end,:,:]
-            period_data = setMissingToNan(period_data, missing)
-            if periods > 1:
-                data_avg[n,:,:] = N.nanmean(period_data, axis=0)
-            else: # return 2D result for a single time period
-                data_avg = N.nanmean(period_data, axis=0)
-
-    elif data.ndim == 2:
-        for n, (start, end) in enumerate(periods):
-            period_data = data[:,start:end]
-            period_data = setMissingToNan(period_data, missing)
-            if periods > 1:
-                data_avg[:,n] = N.nanmean(period_data, axis=1)
-            else: # return 1D result for a single time period
-                data_avg = N.nanmean(period_data, axis=1)
-
-    else: # data.ndim == 1
-        for n, (start, end) in enumerate(periods):
-            period_data = data[start:end]
-            period_data = setMissingToNan(period_data, missing)
-            if periods > 1:
-                data_avg[n] = N.nanmean(period_data)
-            else: # return integer result for a single time period
-                data_avg = N.nanmean(period_data)
+    if data.dtype.kind == 'f':
+        valid = ~N.isnan(data)
+        if missing is not None and not N.isnan(missing):
+            valid &= data != missing
+        data = N.where(valid, data, 0)
+    else:
+        valid = N.ones(data.shape, dtype=bool)
+        data = data.astype(float)
+    data_sum = reduceTimespans(N.add, data, timestep, timespan, start_indx)
+    count = reduceTimespans(N.add, valid, timestep, timespan, start_indx,
+                            dtype=int)
+    with N.errstate(invalid='ignore', divide='ignore'):
+        data_avg = (data_sum / count).astype(dtype)
+    # periods without any valid values are missing
+    if data_avg.dtype.kind == 'f': data_avg[count == 0] = N.nan
 
     return setNanToMissing(data_avg, missing)
 
@@ -87,8 +73,8 @@ def calcTimespanMax(data, timestep=24, timespan=24, start_indx=0,
     """
     Calculate the maximum data value for each timespan in the data.
 
-    Will loop through as many time spans as are present in the data.
-    TIMESPANS DO NOT OVERLAP
+    All time spans present in the data are reduced in a single NumPy call.
+    Time spans overlap when timestep is less than timespan.
 
     Arguments:
       data: hourly data of any type
@@ -113,36 +99,8 @@ def calcTimespanMax(data, timestep=24, timespan=24, start_indx=0,
           However, returned arrays will have the same missing value as
           the input array (i.e. the value specified in the "mising" arg).
     """
-    periods, data_max = createTimePeriodArray(data.shape, data.dtype,
-                                  timestep, timespan, start_indx, N.nan)
-
-    if data.ndim == 3:
-        for n, (start, end) in enumerate(periods):
-            period_data = data[start:end,:,:]
-            period_data = setMissingToNan(period_data, missing)
-            if periods > 1:
-                data_max[n,:,:] = N.nanmax(period_data, axis=0)
-            else: # return 2D result for a single time period
-                data_max = N.nanmax(period_data, axis=0)
-
-    elif data.ndim == 2:
-        for n, (start, end) in enumerate(periods):
-            period_data = data[:,start:end]
-            period_data = setMissingToNan(period_data, missing)
-            if periods > 1:
-                data_max[:,n] = N.nanmax(period_data, axis=1)
-            else: # return 1D result for a single time period
-                data_max = N.nanmax(period_data, axis=1)
-    
-    else: # data.ndim == 1
-        for n, (start, end) in enumerate(periods):
-            period_data = data[start:end]
-            period_data = setMissingToNan(period_data, missing)
-            if periods > 1:
-                data_max[n] = N.nanmax(period_data)
-            else: # return 1D result for a single time period
-                data_max = N.nanmax(period_data)
-
+    if data.dtype.kind == 'f': data = setMissingToNan(data.copy(), missing)
+    data_max = reduceTimespans(N.fmax, data, timestep, timespan, start_indx)
     return setNanToMissing(data_max, missing)
 
 # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
@@ -152,8 +110,8 @@ def calcTimespanMin(data, timestep=24, timespan=24, start_indx=0,
     """
     Calculate the minimum data value for each timespan in the data.
 
-    Will loop through as many time spans as are present in the data.
-    TIMESPANS DO NOT OVERLAP
+    All time spans present in the data are reduced in a single NumPy call.
+    Time spans overlap when timestep is less than timespan.
 
     Arguments:
       data: hourly data of any type
@@ -178,36 +136,8 @@ def calcTimespanMin(data, timestep=24, timespan=24, start_indx=0,
           However, returned arrays will have the same missing value as
           the input array (i.e. the value specified in the "mising" arg).
     """
-    periods, data_min = createTimePeriodArray(data.shape, data.dtype,
-                                  timestep, timespan, start_indx, N.nan)
-
-    if data.ndim == 3:
-        for n, (start, end) in enumerate(periods):
-            period_data = data[start:end,:,:]
-            period_data = setMissingToNan(period_data, missing)
-            if periods > 1:
-                data_min[n,:,:] = N.nanmin(period_data, axis=0)
-            else: # return 2D result for a single time period
-                data_min = N.nanmin(period_data, axis=0)
-
-    elif data.ndim == 2:
-        for n, (start, end) in enumerate(periods):
-            period_data = data[:,start:end]
-            period_data = setMissingToNan(period_data, missing)
-            if periods > 1:
-                data_min[:,n] = N.nanmin(period_data, axis=1)
-            else: # return 1D result for a single time period
-                data_min = N.nanmin(period_data, axis=1)
-    
-    else: # data.ndim == 1
-        for n, (start, end) in enumerate(periods):
-            period_data = data[start:end]
-            period_data = setMissingToNan(period_data, missing)
-            if periods > 1:
-                data_min[n] = N.nanmin(period_data)
-            else: # return 1D result for a single time period
-                data_min = N.nanmin(period_data)
-
+    if data.dtype.kind == 'f': data = setMissingToNan(data.copy(), missing)
+    data_min = reduceTimespans(N.fmin, data, timestep, timespan, start_indx)
     return setNanToMissing(data_min, missing)
 
 # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
@@ -217,8 +147,8 @@ def calcTimespanSum(data, timestep=24, timespan=24, start_indx=0,
     """
     Calculate the sum of data values for each timespan in the data.
 
-    Will loop through as many time spans as are present in the data.
-    TIMESPANS DO NOT OVERLAP
+    All time spans present in the data are reduced in a single NumPy call.
+    Time spans overlap when timestep is less than timespan.
 
     Arguments:
       data: hourly data of any type
@@ -243,36 +173,13 @@ def calcTimespanSum(data, timestep=24, timespan=24, start_indx=0,
           However, returned arrays will have the same missing value as
           the input array (i.e. the value specified in the "mising" arg).
     """
-    periods, data_sum = createTimePeriodArray(data.shape, data.dtype,
-                                  timestep, timespan, start_indx, N.nan)
-
-    if data.ndim == 3:
-        for n, (start, end) in enumerate(periods):
-            period_data = data[start:end,:,:]
-            period_data = setMissingToNan(period_data, missing)
-            if periods > 1:
-                data_sum[n,:,:] = N.nansum(period_data, axis=0)
-            else: # return 2D result for a single time period
-                data_sum = N.nansum(period_data, axis=0)
-
-    elif data.ndim == 2:
-        for n, (start, end) in enumerate(periods):
-            period_data = data[:,start:end]
-            period_data = setMissingToNan(period_data, missing)
-            if periods > 1:
-                data_sum[:,n] = N.nansum(period_data, axis=1)
-            else: # return 1D result for a single time period
-                data_sum = N.nansum(period_data, axis=1)
-    
-    else: # data.ndim == 1
-        for n, (start, end) in enumerate(periods):
-            period_data = data[start:end]
-            period_data = setMissingToNan(period_data, missing)
-            if periods > 1:
-                data_sum[n] = N.nansum(data[start:end])
-            else: # return integer result for a single time period
-                return N.nansum(data[start:end])
-
+    if data.dtype.kind == 'f':
+        invalid = N.isnan(data)
+        if missing is not None and not N.isnan(missing):
+            invalid |= data == missing
+        data = N.where(invalid, 0, data)
+    data_sum = reduceTimespans(N.add, data, timestep, timespan, start_indx,
+                               dtype=data.dtype)
     return setNanToMissing(data_sum, missing)
 
 # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
@@ -283,8 +190,8 @@ def countTimespanEQ(data, threshold, timestep=24, timespan=24, start_indx=0,
     Count the number of timespans when values in data are equal to a
     threshold during the specified timespan.
 
-    Will loop through as many time spans as are present in the data.
-    TIMESPANS DO NOT OVERLAP
+    All time spans present in the data are reduced in a single NumPy call.
+    Time spans overlap when timestep is less than timespan.
 
     Arguments:
       data: hourly data of any type
@@ -309,42 +216,10 @@ def countTimespanEQ(data, threshold, timestep=24, timespan=24, start_indx=0,
 
     NOTE: All counts are done using N.nan as the missing data value.
     """
-    periods, count = createTimePeriodArray(data.shape, dtype, timestep,
-                                           timespan, start_indx, 0)
-
-    if data.ndim == 3:
-        shape = (timespan,) + data.shape[1:]
-        data_counter = N.zeros(shape, dtype=dtype)
-        for n, (start, end) in enumerate(periods):
-            data_counter[N.where(data[start:end,:,:] == threshold)] = 1
-            if periods > 1:
-                count[n,:,:] = N.sum(data_counter, axis=0)
-            else: # return 2D result for a single time period
-                return N.sum(data_counter, axis=0)
-            data_counter.fill(0)
-
-    elif data.ndim == 2:
-        shape = (timespan, data.shape[1])
-        data_counter = N.zeros(shape,dtype=dtype)
-        for n, (start, end) in enumerate(periods):
-            data_counter[N.where(data[:,start:end] == threshold)] = 1
-            if periods > 1:
-                count[:,n] = N.sum(data_counter, axis=1)
-            else: # return 1D result for a single time period
-                return N.sum(data_counter, axis=1)
-            data_counter.fill(0)
-    
-    else: # data.ndim == 1
-        data_counter = N.zeros(timespan,dtype=dtype)
-        for n, (start, end) in enumerate(periods):
-            data_counter[N.where(data[start:end] == threshold)] = 1
-            if periods > 1:
-                count[n] = N.sum(data_counter)
-            else: # return integer result for a single time period
-                return N.sum(data_counter)
-            data_counter.fill(0)
-
-    return count
+    with N.errstate(invalid='ignore'):
+        counter = data == threshold
+    return reduceTimespans(N.add, counter, timestep, timespan, start_indx,
+                           dtype=dtype)
 
 # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
@@ -354,8 +229,8 @@ def countTimespanGE(data, threshold, timestep=24, timespan=24, start_indx=0,
     Count the number of timespans when values in data are greater than or
     equal to a threshold during the specified timespan. 
 
-    Will loop through as many time spans as are present in the data.
-    TIMESPANS DO NOT OVERLAP
+    All time spans present in the data are reduced in a single NumPy call.
+    Time spans overlap when timestep is less than timespan.
 
     Arguments:
       data: hourly data of any type
@@ -380,42 +255,10 @@ def countTimespanGE(data, threshold, timestep=24, timespan=24, start_indx=0,
 
     NOTE: All counts are done using N.nan as the missing data value.
     """
-    periods, count = createTimePeriodArray(data.shape, dtype, timestep,
-                                           timespan, start_indx, 0)
-
-    if data.ndim == 3:
-        shape = (timespan,) + data.shape[1:]
-        data_counter = N.zeros(shape,dtype=dtype)
-        for n, (start, end) in enumerate(periods):
-            data_counter[N.where(data[start:end,:,:] >= threshold)] = 1
-            if periods > 1:
-                count[n,:,:] = N.sum(data_counter, axis=0)
-            else: # return 2D result for a single time period
-                return N.sum(data_counter, axis=0)
-            data_counter.fill(0)
-
-    elif data.ndim == 2:
-        shape = (timespan, data.shape[1])
-        data_counter = N.zeros(shape,dtype=dtype)
-        for n, (start, end) in enumerate(periods):
-            data_counter[N.where(data[:,start:end] >= threshold)] = 1
-            if periods > 1:
-                count[:,n] = N.sum(data_counter, axis=1)
-            else: # return 1D result for a single time period
-                return N.sum(data_counter, axis=1)
-            data_counter.fill(0)
-    
-    else: # data.ndim == 1
-        data_counter = N.zeros(timespan,dtype=dtype)
-        for n, (start, end) in enumerate(periods):
-            data_counter[N.where(data[start:end] >= threshold)] = 1
-            if periods > 1:
-                count[n] = N.sum(data_counter)
-            else: # return integer result for a single time period
-                return N.sum(data_counter)
-            data_counter.fill(0)
-
-    return count
+    with N.errstate(invalid='ignore'):
+        counter = data >= threshold
+    return reduceTimespans(N.add, counter, timestep, timespan, start_indx,
+                           dtype=dtype)
 
 # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
@@ -425,8 +268,8 @@ def countTimespanGT(data, threshold, timestep=24, timespan=24, start_indx=0,
     Count the number of timespans when values in data are greater than a
     threshold during the specified timespan.
 
-    Will loop through as many time spans as are present in the data.
-    TIMESPANS DO NOT OVERLAP
+    All time spans present in the data are reduced in a single NumPy call.
+    Time spans overlap when timestep is less than timespan.
 
     Arguments:
       data: hourly data of any type
@@ -451,42 +294,10 @@ def countTimespanGT(data, threshold, timestep=24, timespan=24, start_indx=0,
 
     NOTE: All counts are done using N.nan as the missing data value.
     """
-    periods, count = createTimePeriodArray(data.shape, dtype, timestep,
-                                           timespan, start_indx, 0)
-
-    if data.ndim == 3:
-        shape = (timespan,) + data.shape[1:]
-        data_counter = N.zeros(shape, dtype=dtype)
-        for n, (start, end) in enumerate(periods):
-            data_counter[N.where(data[start:end,:,:] > threshold)] = 1
-            if periods > 1:
-                count[n,:,:] = N.sum(data_counter, axis=0)
-            else: # return 2D result for a single time period
-                return N.sum(data_counter, axis=0)
-            data_counter.fill(0)
-
-    elif data.ndim == 2:
-        shape = (timespan, data.shape[1])
-        data_counter = N.zeros(shape,dtype=dtype)
-        for n, (start, end) in enumerate(periods):
-            data_counter[N.where(data[:,start:end] > threshold)] = 1
-            if periods > 1:
-                count[:,n] = N.sum(data_counter, axis=1)
-            else: # return 1D result for a single time period
-               return N.sum(data_counter, axis=1)
-            data_counter.fill(0)
-    
-    else: # data.ndim == 1
-        data_counter = N.zeros(timespan,dtype=dtype)
-        for n, (start, end) in enumerate(periods):
-            data_counter[N.where(data[start:end] > threshold)] = 1
-            if periods > 1:
-                count[n] = N.sum(data_counter)
-            else: # return integer result for a single time period
-                return N.sum(data_counter)
-            data_counter.fill(0)
-
-    return count
+    with N.errstate(invalid='ignore'):
+        counter = data > threshold
+    return reduceTimespans(N.add, counter, timestep, timespan, start_indx,
+                           dtype=dtype)
 
 # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
@@ -496,8 +307,8 @@ def countTimespanLE(data, threshold, timestep=24, timespan=24, start_indx=0,
     Count the number of timespans when values in data are less than or
     equal to a threshold during the specified timespan. 
 
-    Will loop through as many time spans as are present in the data.
-    TIMESPANS DO NOT OVERLAP
+    All time spans present in the data are reduced in a single NumPy call.
+    Time spans overlap when timestep is less than timespan.
 
     Arguments:
       data: hourly data of any type
@@ -522,42 +333,10 @@ def countTimespanLE(data, threshold, timestep=24, timespan=24, start_indx=0,
 
     NOTE: All counts are done using N.nan as the missing data value.
     """
-    periods, count = createTimePeriodArray(data.shape, dtype, timestep,
-                                           timespan, start_indx, 0)
-
-    if data.ndim == 3:
-        shape = (timespan,) + data.shape[1:]
-        data_counter = N.zeros(shape,dtype=dtype)
-        for n, (start, end) in enumerate(periods):
-            data_counter[N.where(data[start:end,:,:] <= threshold)] = 1
-            if periods > 1:
-                count[n,:,:] = N.sum(data_counter, axis=0)
-            else: # return 2D result for a single time period
-                return N.sum(data_counter, axis=0)
-            data_counter.fill(0)
-
-    elif data.ndim == 2:
-        shape = (timespan, data.shape[1])
-        data_counter = N.zeros(shape,dtype=dtype)
-        for n, (start, end) in enumerate(periods):
-            data_counter[N.where(data[:,start:end] <= threshold)] = 1
-            if periods > 1:
-                count[:,n] = N.sum(data_counter, axis=1)
-            else: # return 1D result for a single time period
-                return N.sum(data_counter, axis=1)
-            data_counter.fill(0)
-    
-    else: # data.ndim == 1
-        data_counter = N.zeros(timespan,dtype=dtype)
-        for n, (start, end) in enumerate(periods):
-            data_counter[N.where(data[start:end] <= threshold)] = 1
-            if periods > 1:
-                count[n] = N.sum(data_counter)
-            else: # return integer result for a single time period
-                return N.sum(data_counter)
-            data_counter.fill(0)
-
-    return count
+    with N.errstate(invalid='ignore'):
+        counter = data <= threshold
+    return reduceTimespans(N.add, counter, timestep, timespan, start_indx,
+                           dtype=dtype)
 
 # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
@@ -567,8 +346,8 @@ def countTimespanLT(data, threshold, timestep=24, timespan=24, start_indx=0,
     Count the number of timespans when values in data are less than a
     threshold during the specified timespan.
 
-    Will loop through as many time spans as are present in the data.
-    TIMESPANS DO NOT OVERLAP
+    All time spans present in the data are reduced in a single NumPy call.
+    Time spans overlap when timestep is less than timespan.
 
     Arguments:
       data: hourly data of any type
@@ -593,42 +372,160 @@ def countTimespanLT(data, threshold, timestep=24, timespan=24, start_indx=0,
 
     NOTE: All counts are done using N.nan as the missing data value.
     """
-    periods, count = createTimePeriodArray(data.shape, dtype, timestep,
-                                           timespan, start_indx, 0)
-
-    if data.ndim == 3:
-        shape = (timespan,) + data.shape[1:]
-        data_counter = N.zeros(shape,dtype=dtype)
-        for n, (start, end) in enumerate(periods):
-            data_counter[N.where(data[start:end,:,:] < threshold)] = 1
-            if periods > 1:
-                count[n,:,:] = N.sum(data_counter, axis=0)
-            else: # return 2D result for a single time period
-                return N.sum(data_counter, axis=0)
-            data_counter.fill(0)
-
-    elif data.ndim == 2:
-        shape = (timespan, data.shape[1])
-        data_counter = N.zeros(shape,dtype=dtype)
-        for n, (start, end) in enumerate(periods):
-            data_counter[N.where(data[:,start:end] < threshold)] = 1
-            if periods > 1:
-                count[:,n] = N.sum(data_counter, axis=1)
-            else: # return 1D result for a single time period
-               return N.sum(data_counter, axis=1)
-            data_counter.fill(0)
-    
-    else: # data.ndim == 1
-        data_counter = N.zeros(timespan,dtype=dtype)
-        for n, (start, end) in enumerate(periods):
-            data_counter[N.where(data[start:end] < threshold)] = 1
-            if periods > 1:
-                count[n] = N.sum(data_counter)
-            else: # return integer result for a single time period
-                return N.sum(data_counter)
-            data_counter.fill(0)
-
-    return count
+    with N.errstate(invalid='ignore'):
+        counter = data < threshold
+    return reduceTimespans(N.add, counter, timestep, timespan, start_indx,
+                           dtype=dtype)
+
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+def reduceTimespans(ufunc, data, timestep, timespan, start_indx,
+                    dtype=None):
+    """
+    Apply a NumPy ufunc reduction to every time period of length timespan
+    in the data with a single call. Contiguous periods (timestep equal to
+    timespan) use ufunc.reduce on a [period, time] reshape of the data.
+    Overlapping sums use the difference of cumulative sums and overlapping
+    maximums and minimums a block sliding window, so their cost does not
+    grow with timespan. All others use ufunc.reduceat. Time periods start
+    at start_indx and every timestep times after that. Only complete time
+    periods are reduced. Periods may overlap (timestep < timespan) or skip times
+    (timestep > timespan).
+
+    Arguments:
+      ufunc: NumPy ufunc used for the reduction (e.g. N.add, N.fmax)
+      data: 3D [time, y, x], 2D [locations, times] or 1D [time] array
+      timestep: number of times between the start of each time period
+      timespan: number of times in each time period
+      start_indx: time index to use as start of first time period
+      dtype: NumPy data type used for the reduction, default is the
+             type of the input data
+
+    Returns: NumPy array with the same shape as the data except the
+             time axis contains one value for each time period
+    """
+    if data.ndim not in (1, 2, 3):
+        raise ValueError, '%d dimension arrays are not supported,' % data.ndim
+    time_axis = 1 if data.ndim == 2 else 0
+    num_times = data.shape[time_axis]
+
+    starts = N.arange(start_indx, num_times - timespan + 1, timestep)
+    if len(starts) == 0:
+        errmsg = 'Data shape (%s) does not cover even one timespan (%d)'
+        raise ValueError, errmsg % (str(data.shape), timespan)
+
+    if timestep == timespan:
+        # contiguous periods : split the time axis into [period, time]
+        first = [slice(None),] * data.ndim
+        first[time_axis] = slice(start_indx, starts[-1] + timespan)
+        data = data[tuple(first)]
+        shape = data.shape[:time_axis] + (len(starts), timespan) \
+              + data.shape[time_axis+1:]
+        return ufunc.reduce(data.reshape(shape), axis=time_axis+1,
+                            dtype=dtype)
+
+    if timestep < timespan:
+        kind = N.dtype(dtype or data.dtype).kind
+        if ufunc is N.add and kind in 'iu':
+            # overlapping integer sums (e.g. counts over a moving window)
+            # are the exact difference of two cumulative sums
+            sums = _cumulativeSpanSums_(data, starts, timespan, time_axis,
+                                        'i8')
+            return sums.astype(dtype or data.dtype)
+        if ufunc is N.add and kind == 'f':
+            return _floatSpanSums_(data, starts, timespan, time_axis, dtype)
+        if ufunc in (N.fmax, N.fmin, N.maximum, N.minimum):
+            return _slidingSpanReduce_(ufunc, data, starts, timespan,
+                                       time_axis, dtype)
+
+    # reduceat reduces data[indexes[i]:indexes[i+1]], so interleaving the
+    # period starts and ends gives the periods at the even positions. When
+    # an end is not less than the next start, reduceat returns a single
+    # value for that position and it is simply discarded.
+    indexes = N.empty(2*len(starts) - 1, dtype=N.intp)
+    indexes[0::2] = starts
+    indexes[1::2] = starts[:-1] + timespan
+    # last period ends at the end of the data passed to reduceat
+    period_slice = [slice(None),] * data.ndim
+    period_slice[time_axis] = slice(None, starts[-1] + timespan)
+    reduced = ufunc.reduceat(data[tuple(period_slice)], indexes,
+                             axis=time_axis, dtype=dtype)
+
+    period_slice[time_axis] = slice(None, None, 2)
+    return N.ascontiguousarray(reduced[tuple(period_slice)])
+
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+def _periodSlice_(starts, offset, time_axis, ndim):
+    """ slice of the time axis at offset from each period start """
+    period_slice = [slice(None),] * ndim
+    period_slice[time_axis] = slice(starts[0] + offset,
+                                    starts[-1] + offset + 1,
+                                    starts[1] - starts[0] if len(starts) > 1
+                                    else 1)
+    return tuple(period_slice)
+
+def _cumulativeSpanSums_(data, starts, timespan, time_axis, accum_dtype):
+    """ sum of each period as the difference of cumulative sums """
+    shape = list(data.shape)
+    shape[time_axis] += 1
+    totals = N.zeros(shape, dtype=accum_dtype)
+    cumulative = [slice(None),] * data.ndim
+    cumulative[time_axis] = slice(1, None)
+    N.cumsum(data, axis=time_axis, dtype=accum_dtype,
+             out=totals[tuple(cumulative)])
+    return totals[_periodSlice_(starts, timespan, time_axis, data.ndim)] \
+         - totals[_periodSlice_(starts, 0, time_axis, data.ndim)]
+
+def _floatSpanSums_(data, starts, timespan, time_axis, dtype):
+    """ overlapping float sums, a period containing NaN sums to NaN the
+    same as it does with ufunc.reduceat
+    """
+    dtype = dtype or data.dtype
+    nans = N.isnan(data)
+    has_nans = nans.any()
+    if has_nans: data = N.where(nans, 0, data)
+    # cumulative sums of the deviation from the mean at each location
+    # grow much more slowly than cumulative sums of the data, which keeps
+    # the rounding error close to that of summing each period directly
+    mean = N.mean(data, axis=time_axis, dtype=float, keepdims=True)
+    sums = _cumulativeSpanSums_(data - mean, starts, timespan, time_axis,
+                                float)
+    sums += mean * timespan
+    if has_nans:
+        num_nans = _cumulativeSpanSums_(nans, starts, timespan, time_axis,
+                                        'i4')
+        sums[num_nans > 0] = N.nan
+    return sums.astype(dtype, copy=False)
+
+def _slidingSpanReduce_(ufunc, data, starts, timespan, time_axis, dtype):
+    """ van Herk/Gil-Werman sliding window for max and min : the time axis
+    is split into blocks of timespan times, so every period is the end of
+    one block followed by the start of the next. Each period is then the
+    reduction of one value accumulated backward through its first block
+    and one accumulated forward through the next, whatever the timespan.
+    """
+    data = N.moveaxis(data, time_axis, 0)
+    num_times = starts[-1] + timespan
+    num_blocks = -(-num_times // timespan)
+    forward = N.empty((num_blocks * timespan,) + data.shape[1:],
+                      dtype=dtype or data.dtype)
+    forward[:num_times] = data[:num_times]
+    # padding is never part of a complete period
+    forward[num_times:] = data[num_times-1]
+    backward = forward.copy()
+
+    shape = (num_blocks, timespan) + data.shape[1:]
+    blocks = forward.reshape(shape)
+    for indx in range(1, timespan):
+        ufunc(blocks[:,indx-1], blocks[:,indx], out=blocks[:,indx])
+    blocks = backward.reshape(shape)
+    for indx in range(timespan-2, -1, -1):
+        ufunc(blocks[:,indx+1], blocks[:,indx], out=blocks[:,indx])
+
+    reduced = ufunc(backward[_periodSlice_(starts, 0, 0, data.ndim)],
+                    forward[_periodSlice_(starts, timespan-1, 0, data.ndim)])
+    return N.ascontiguousarray(N.moveaxis(reduced, 0, time_axis))
 
 # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
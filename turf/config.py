@@ -31,6 +31,8 @@ CONFIG.project.data_timezone = 'UTC'
 CONFIG.project.end_day = (10,31)
 CONFIG.project.fcast_days = 6
 CONFIG.project.local_timezone = 'US/Eastern'
+# max worker processes for model runs, 0 = one per processor
+CONFIG.project.max_workers = 0
 CONFIG.project.obs_days = 15
 CONFIG.project.region = 'NE'
 CONFIG.project.root = 'turf'
@@ -67,6 +67,7 @@ CONFIG.dirpaths.project = '/data2/weather-data/gdd'
 CONFIG.filenames.gddapp = '%(year)d-GDD-ACIS-HiRes-Daily.h5'
 CONFIG.filenames.gdd = '%(year)s-Accumulated-GDD.h5'
 CONFIG.filenames.json = '%(year)s-%(node)s-%(control)s.json'
+CONFIG.filenames.export = '%(year)s-%(control)s-Nodes.%(format)s'
 
 CONFIG.filetypes.gdd = { 
        'scope':'year', 'period':'date', 
@@ -77,6 +78,7 @@ CONFIG.filetypes.gdd = {
 
 CONFIG.subdir_paths.gdd = ('%(region)s','%(year)d','grids')
 CONFIG.subdir_paths.gddapp = ('gdd','%(region)s','acis_hires','por')
+CONFIG.subdir_paths.export = ('%(region)s','%(year)d','export')
 CONFIG.subdir_paths.json = ('%(region)s','%(year)d','json','%(control)s')
 CONFIG.subdir_paths.maps = ('%(region)s','%(year)d','maps','%(control)s')
 
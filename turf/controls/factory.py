@@ -111,6 +111,23 @@ class TurfControlsJsonFileMethods:
 
     # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
+    def exportFilepath(self, year, control, region, export_format='h5'):
+        """ path to the columnar export file for all nodes in the region """
+        root_dir = self.config.dirpaths.turf
+        args = { 'control': control.fullname,
+                 'format': export_format,
+                 'region':self.regionToDirpath(region),
+                 'year':year }
+        export_dirpath = \
+            os.path.join(root_dir, self.subdirTemplate('export') % args)
+        if not os.path.isdir(export_dirpath): os.makedirs(export_dirpath)
+
+        args['region'] = self.regionToFilepath(region)
+        filename = self.config.filenames.export % args
+        return os.path.join(export_dirpath, filename)
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
     def jsonFileDirpath(self, year, control, region, source=None):
         root_dir = self.config.dirpaths.turf
         template = os.path.join(self.subdirTemplate('json'))
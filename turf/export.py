@@ -0,0 +1,337 @@
+""" Columnar export of daily data at every grid node in a region.
+
+Instead of one small JSON file for each grid node, all nodes are written
+to a single file containing :
+    dates : JSON date descriptor, same as the per node files
+    days : ISO date string for each day in the series
+    nodes : node key used in per node file names (i.e. "76543-42123")
+    lats, lons : coordinates of each node, rounded to 3 decimals
+    y, x : grid indexes of each node
+    node_index : grid with the row number of each node, -1 elsewhere
+    data : one matrix per series, shape is (num_nodes, num_days), so the
+           series for a node is a single contiguous row
+
+Supported formats are "json", "npz" (NumPy) and "h5" (HDF5). The file
+only appears at the requested path after it is complete.
+"""
+
+import os
+import datetime
+import json
+
+import numpy as N
+
+EXPORT_FORMATS = ('h5', 'json', 'npz')
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+def exportFormat(filepath):
+    fmt = os.path.splitext(filepath)[1].lstrip('.').lower()
+    if fmt not in EXPORT_FORMATS:
+        errmsg = 'Unsupported columnar export format "%s", must be one of %s'
+        raise ValueError, errmsg % (fmt, ', '.join(EXPORT_FORMATS))
+    return fmt
+
+def _jsonValue_(value):
+    if isinstance(value, float) and N.isnan(value): return None
+    return value
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+class ColumnarExport(object):
+    """ Collects the node coordinates and data matrices for one model in
+    one region, then writes them to a single file.
+
+    Arguments:
+        name: name of the model (threat or control)
+        group: "threats" or "controls"
+        start_date: datetime.date of the first day in the data
+        num_days: number of days in each series
+        json_dates: JSON string with the date descriptor
+    """
+
+    def __init__(self, name, group, start_date, num_days, json_dates):
+        self.name = name
+        self.group = group
+        self.start_date = start_date
+        self.num_days = num_days
+        self.json_dates = json_dates
+        self.data = { }
+        self.decimals = { }
+        self.grid_shape = None
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    @property
+    def days(self):
+        return [ (self.start_date + datetime.timedelta(days=day)).isoformat()
+                 for day in range(self.num_days) ]
+
+    @property
+    def num_nodes(self): return len(self.y)
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def setNodes(self, grid_shape, y, x, lats, lons, node_keys):
+        """ y, x : grid indexes of the nodes to export
+            lats, lons : coordinates of the nodes
+            node_keys : sequence of node key strings
+        """
+        self.grid_shape = tuple(grid_shape)
+        self.y = N.asarray(y, dtype='<i4')
+        self.x = N.asarray(x, dtype='<i4')
+        self.lats = N.around(N.asarray(lats, dtype=float), 3)
+        self.lons = N.around(N.asarray(lons, dtype=float), 3)
+        self.nodes = [str(key) for key in node_keys]
+
+    def addData(self, key, matrix, decimals=3):
+        """ matrix : shape is (num_nodes, num_days). Integer arrays are
+                     stored as is, float arrays are stored as 32 bit
+                     floats rounded to decimals
+        """
+        if matrix.shape != (self.num_nodes, self.num_days):
+            errmsg = '"%s" matrix shape %s does not match %d nodes, %d days'
+            info = (key, str(matrix.shape), self.num_nodes, self.num_days)
+            raise ValueError, errmsg % info
+        if matrix.dtype.kind == 'f':
+            matrix = N.around(matrix, decimals).astype('<f4')
+            self.decimals[key] = decimals
+        self.data[key] = N.ascontiguousarray(matrix)
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def nodeIndexGrid(self):
+        node_index = N.empty(self.grid_shape, dtype='<i4')
+        node_index.fill(-1)
+        node_index[self.y, self.x] = N.arange(self.num_nodes)
+        return node_index
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def write(self, filepath):
+        """ writes the export, format is determined by the file extension
+
+        Returns: filepath
+        """
+        fmt = exportFormat(filepath)
+        dirpath = os.path.dirname(filepath)
+        if dirpath and not os.path.isdir(dirpath): os.makedirs(dirpath)
+
+        # the extension is preserved so NumPy does not append one
+        tmp_filepath = '%s.tmp%d.%s' % (filepath, os.getpid(), fmt)
+        try:
+            if fmt == 'json': self._writeJson_(tmp_filepath)
+            elif fmt == 'npz': self._writeNpz_(tmp_filepath)
+            else: self._writeHdf5_(tmp_filepath)
+            os.rename(tmp_filepath, filepath)
+        finally:
+            if os.path.exists(tmp_filepath): os.remove(tmp_filepath)
+        return filepath
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def _writeHdf5_(self, filepath):
+        import h5py
+        hdf5_file = h5py.File(filepath, 'w')
+        try:
+            hdf5_file.attrs['name'] = self.name
+            hdf5_file.attrs['group'] = self.group
+            hdf5_file.attrs['dates'] = self.json_dates
+            hdf5_file.create_dataset('days', data=N.array(self.days))
+            hdf5_file.create_dataset('nodes', data=N.array(self.nodes))
+            for key in ('lats', 'lons', 'y', 'x'):
+                hdf5_file.create_dataset(key, data=getattr(self, key))
+            hdf5_file.create_dataset('node_index', data=self.nodeIndexGrid(),
+                                     compression='gzip')
+            data_group = hdf5_file.create_group('data')
+            for key, matrix in self.data.items():
+                # small blocks of nodes keep single node reads fast
+                chunks = (min(16, self.num_nodes), self.num_days)
+                dataset = data_group.create_dataset(key, data=matrix,
+                                chunks=chunks, compression='gzip',
+                                shuffle=True)
+                if key in self.decimals:
+                    dataset.attrs['decimals'] = self.decimals[key]
+        finally:
+            hdf5_file.close()
+
+    def _writeJson_(self, filepath):
+        contents = [ '{"name":%s' % json.dumps(self.name),
+                     '"group":%s' % json.dumps(self.group),
+                     '"dates":%s' % self.json_dates,
+                     '"days":%s' % self._tightJson_(self.days),
+                     '"shape":%s' % self._tightJson_(self.grid_shape),
+                     '"nodes":%s' % self._tightJson_(self.nodes),
+                     '"lats":%s' % self._tightJson_(self.lats.tolist()),
+                     '"lons":%s' % self._tightJson_(self.lons.tolist()),
+                     '"y":%s' % self._tightJson_(self.y.tolist()),
+                     '"x":%s' % self._tightJson_(self.x.tolist()), ]
+        dtypes = dict([(key, matrix.dtype.str)
+                       for key, matrix in self.data.items()])
+        contents.append('"dtypes":%s' % self._tightJson_(dtypes))
+        data = [ ]
+        for key, matrix in sorted(self.data.items()):
+            if matrix.dtype.kind == 'f':
+                # round in double precision so values print as decimals
+                matrix = N.around(matrix.astype(float), self.decimals[key])
+                rows = matrix.tolist()
+                if N.isnan(matrix).any():
+                    rows = [[_jsonValue_(value) for value in row]
+                            for row in rows]
+            else: rows = matrix.tolist()
+            data.append('%s:%s' % (json.dumps(key), self._tightJson_(rows)))
+        contents.append('"data":{%s}}' % ','.join(data))
+
+        with open(filepath, 'w') as writer:
+            writer.write(','.join(contents))
+
+    def _writeNpz_(self, filepath):
+        arrays = { 'name':N.array(self.name), 'group':N.array(self.group),
+                   'dates':N.array(self.json_dates),
+                   'days':N.array(self.days), 'nodes':N.array(self.nodes),
+                   'lats':self.lats, 'lons':self.lons, 'y':self.y, 'x':self.x,
+                   'node_index':self.nodeIndexGrid() }
+        for key, matrix in self.data.items():
+            arrays['data.%s' % key] = matrix
+        N.savez_compressed(filepath, **arrays)
+
+    def _tightJson_(self, value):
+        return json.dumps(value, separators=(',',':'))
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+class ColumnarLookup(object):
+    """ Extracts the series at any node from a columnar export file in
+    constant time. Nodes may be identified by node key string (as used in
+    per node file names), by (y, x) grid indexes or by row number.
+
+    HDF5 files are read one row at a time, so only the requested node is
+    read from disk. JSON and NumPy files are loaded completely.
+    """
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.format = exportFormat(filepath)
+        self._hdf5_file = None
+        if self.format == 'json': self._loadJson_()
+        elif self.format == 'npz': self._loadNpz_()
+        else: self._loadHdf5_()
+        self.node_rows = dict([(node, row)
+                               for row, node in enumerate(self.nodes)])
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    @property
+    def data_keys(self): return tuple(sorted(self.data.keys()))
+
+    @property
+    def num_nodes(self): return len(self.nodes)
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def close(self):
+        if self._hdf5_file is not None:
+            self._hdf5_file.close()
+            self._hdf5_file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def nodeRow(self, node):
+        """ Returns: row number of the node or None when the node is not
+                     in the export
+        """
+        if isinstance(node, basestring): return self.node_rows.get(node, None)
+        if isinstance(node, (tuple, list)):
+            y, x = node
+            if not (0 <= y < self.node_index.shape[0]
+                    and 0 <= x < self.node_index.shape[1]): return None
+            row = int(self.node_index[y, x])
+            if row < 0: return None
+            return row
+        row = int(node)
+        if 0 <= row < self.num_nodes: return row
+        return None
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def series(self, node, key=None):
+        """ Returns: NumPy array with the series for one data key or a
+                     dictionary of arrays for all keys when key is None
+
+        Raises KeyError when the node is not in the export.
+        """
+        row = self.nodeRow(node)
+        if row is None: raise KeyError, 'node %s is not in export' % str(node)
+        if key is not None: return N.asarray(self.data[key][row])
+        return dict([(data_key, N.asarray(matrix[row]))
+                     for data_key, matrix in self.data.items()])
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def location(self, node):
+        """ Returns: (lon, lat) of the node """
+        row = self.nodeRow(node)
+        if row is None: raise KeyError, 'node %s is not in export' % str(node)
+        return float(self.lons[row]), float(self.lats[row])
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def _loadHdf5_(self):
+        import h5py
+        hdf5_file = h5py.File(self.filepath, 'r')
+        self._hdf5_file = hdf5_file
+        self.name = hdf5_file.attrs['name']
+        self.group = hdf5_file.attrs['group']
+        self.dates = json.loads(hdf5_file.attrs['dates'])
+        self.days = list(hdf5_file['days'][...])
+        self.nodes = list(hdf5_file['nodes'][...])
+        for key in ('lats', 'lons', 'y', 'x', 'node_index'):
+            setattr(self, key, hdf5_file[key][...])
+        self.data = dict(hdf5_file['data'].items())
+
+    def _loadJson_(self):
+        with open(self.filepath, 'r') as reader:
+            contents = json.load(reader)
+        self.name = contents['name']
+        self.group = contents['group']
+        self.dates = contents['dates']
+        self.days = contents['days']
+        self.nodes = [str(node) for node in contents['nodes']]
+        self.lats = N.array(contents['lats'])
+        self.lons = N.array(contents['lons'])
+        self.y = N.array(contents['y'])
+        self.x = N.array(contents['x'])
+        # the grid index is not stored in JSON, it is rebuilt from y, x
+        self.node_index = N.empty(contents['shape'], dtype='<i4')
+        self.node_index.fill(-1)
+        self.node_index[self.y, self.x] = N.arange(len(self.nodes))
+        self.data = { }
+        for key, rows in contents['data'].items():
+            dtype = N.dtype(str(contents['dtypes'][key]))
+            if dtype.kind == 'f':
+                self.data[key] = N.array(rows, dtype=float).astype(dtype)
+            else: self.data[key] = N.array(rows, dtype=dtype)
+
+    def _loadNpz_(self):
+        arrays = N.load(self.filepath)
+        try:
+            self.name = str(arrays['name'])
+            self.group = str(arrays['group'])
+            self.dates = json.loads(str(arrays['dates']))
+            self.days = list(arrays['days'])
+            self.nodes = list(arrays['nodes'])
+            for key in ('lats', 'lons', 'y', 'x', 'node_index'):
+                setattr(self, key, arrays[key])
+            self.data = dict([(key[5:], arrays[key]) for key in arrays.files
+                              if key.startswith('data.')])
+        finally:
+            arrays.close()
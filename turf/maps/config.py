@@ -13,6 +13,7 @@ MAP_CONFIG = ConfigObject('maps', None, 'groups')
 MAP_CONFIG.animate_command = '/opt/local/bin/convert -delay %d %s -loop 0 %s'
 MAP_CONFIG.subdirs = {
     'anim': ('%(region)s','%(year)s','animations'),
+    'cache': ('maps','cache'),
     'map': ('%(region)s','%(year)s','maps'),
     'thumb': ('%(region)s','%(year)s','thumbs'),
 }
@@ -204,6 +204,15 @@ class TurfMapFactoryMethods:
 
     # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
+    def turfMapCacheDirpath(self):
+        dirpath = self.config.dirpaths.get('map_cache', None)
+        if dirpath is None:
+            dirpath = os.path.join(self.config.dirpaths.project,
+                                   os.sep.join(self.maps.subdirs['cache']))
+        return dirpath
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
     def turfMapDirpath(self, data_type, date_or_year, region):
         return self.turfImageDirpath('map', data_type, date_or_year, region)
 
@@ -0,0 +1,103 @@
+""" Draws turf maps for a series of dates from a pool of worker processes.
+
+Everything that is the same on every map of a region, the Basemap, the
+projected node coordinates and the template images, is built in the
+parent process before the workers are forked, so every worker starts with
+them in its map cache. Each worker draws whole maps, one date at a time,
+and creates the thumbnail for each map it draws.
+"""
+
+import multiprocessing
+
+import PIL.Image
+
+from nrcc_viz.maps import finishMap, prepareMapResources
+
+from turf.maps.visual import drawScatterMap
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+# grid and options shared by all maps being drawn, shared with forked workers
+_RENDER_DATA_ = None
+
+def _initWorker_(render_data):
+    global _RENDER_DATA_
+    _RENDER_DATA_ = render_data
+
+def _drawMap_(job):
+    """ draws the map and thumbnail for one date, returns the map filepath """
+    data, date_options, thumb_filepath = job
+    lats, lons, map_options, thumbnail_shape = _RENDER_DATA_
+
+    options = dict(map_options)
+    options.update(date_options)
+    options['finish'] = False
+    options, _map_, fig, axes, fig1, xy_extremes = \
+        drawScatterMap(data, lats, lons, **options)
+    finishMap(fig, axes, fig1, **options)
+
+    if thumb_filepath is not None:
+        image = PIL.Image.open(options['outputfile'])
+        image.thumbnail(thumbnail_shape, PIL.Image.ANTIALIAS)
+        image.save(thumb_filepath, 'PNG', quality=100, optimize=True)
+    return options['outputfile']
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+class TurfMapRenderer(object):
+    """ Draws scatter maps of one grid for any number of dates.
+
+    Arguments:
+        lats, lons: 2D coordinates of the grid nodes
+        map_options: options common to all maps, e.g. from
+                     TurfMapFileFactory.mapOptions()
+        thumbnail_shape: size of thumbnail images
+        max_workers: maximum number of worker processes, defaults to
+                     the number of CPUs
+    """
+
+    def __init__(self, lats, lons, map_options, thumbnail_shape=(125,125),
+                       max_workers=None):
+        self.lats = lats
+        self.lons = lons
+        self.map_options = dict(map_options)
+        self.thumbnail_shape = thumbnail_shape
+        if max_workers is None or max_workers < 1:
+            max_workers = multiprocessing.cpu_count()
+        self.max_workers = max_workers
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def render(self, jobs):
+        """
+        Arguments:
+            jobs: sequence of (data, date_options, thumb_filepath) tuples,
+                  where date_options contains the map options that change
+                  with each date, at least "outputfile"; thumb_filepath
+                  may be None
+
+        Returns: iterator over the map filepaths, in the same order as jobs
+        """
+        global _RENDER_DATA_
+        jobs = list(jobs)
+        if len(jobs) == 0: return
+
+        prepareMapResources(self.lats, self.lons, **self.map_options)
+        render_data = (self.lats, self.lons, self.map_options,
+                       self.thumbnail_shape)
+        num_workers = min(self.max_workers, len(jobs))
+        if num_workers == 1:
+            _RENDER_DATA_ = render_data
+            try:
+                for job in jobs: yield _drawMap_(job)
+            finally: _RENDER_DATA_ = None
+            return
+
+        # fork after the map resources are built so workers inherit them
+        pool = multiprocessing.Pool(num_workers, _initWorker_, (render_data,))
+        try:
+            for filepath in pool.imap(_drawMap_, jobs, 1): yield filepath
+        finally:
+            pool.close()
+            pool.join()
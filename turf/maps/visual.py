@@ -2,7 +2,7 @@
 import os
 import numpy as N
 
-from nrcc_viz.maps import hiResMap, finishMap
+from nrcc_viz.maps import mapSetup, projectedGrid, finishMap
 from nrcc_viz.maps import addScatterToMap #, addMapText, addFigureText
 
 # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
@@ -16,23 +16,24 @@ def drawScatterMap(data, lats, lons, **map_options):
     levels = map_options['contourbounds'][1:]
     del map_options['contourbounds']
 
-    # create a map figure
-    options, _map_, map_fig, axes, xy_extremes, x, y, _grid_ = \
-        hiResMap(data, lats, lons, **map_options)
-    del x, y, _grid_
+    # create a map figure, markers are drawn at the grid nodes so there is
+    # no need for the interpolated grid
+    options, _map_, map_fig, axes, xy_extremes = \
+        mapSetup(map_options, lats, lons)
+    x, y = projectedGrid(_map_, lats, lons)
 
     # flatten the datasets so basemap scatter can handle them
-    map_lats = lats.flatten()
-    map_lons = lons.flatten()
+    map_x = x.flatten()
+    map_y = y.flatten()
     map_data = data.flatten()
 
     for level in levels:
         indexes = N.where(map_data == level)
         if len(indexes[0]) > 0:
             color = marker_colors[level]
-            fig = addScatterToMap(map_options, _map_, map_fig, 
-                                  map_data[indexes], map_lats[indexes],
-                                  map_lons[indexes], markercolor=color)
+            fig = addScatterToMap(map_options, _map_, map_fig,
+                                  map_data[indexes], x=map_x[indexes],
+                                  y=map_y[indexes], markercolor=color)
     if options.get('finish',True):
         finishMap(map_fig, axes, map_fig, **options)
     
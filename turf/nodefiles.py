@@ -0,0 +1,172 @@
+""" Writes one JSON file per grid node from a pool of worker processes.
+
+The data for every node is collected into (num_nodes, num_days) matrices
+before any files are written. Nodes are then split into contiguous blocks,
+one for each worker. Workers are forked after the matrices are built, so
+they share them with the parent instead of receiving copies.
+
+File contents are formatted by a NodeJsonEncoder, which compiles the JSON
+template and the number format for every value in a series into a single
+format string. Each file is written to a temporary name in the same
+directory and renamed when it is complete, so web clients never read a
+partial file.
+"""
+
+import os
+import multiprocessing
+
+import numpy as N
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+# unique placeholders used while compiling a template
+_LAT_ = '\x00lat\x00'
+_LON_ = '\x00lon\x00'
+_DATA_ = '\x00data\x00'
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+class NodeJsonEncoder(object):
+    """ Precompiled encoder for the JSON files of one model.
+
+    Arguments:
+        json_template: template with "%(lat)s", "%(lon)s" and "%(data)s"
+                       placeholders, all other fields already filled in
+        series_keys: key for each series in the "data" object, in the
+                     order that series are passed to encode()
+        num_days: number of values in each series
+        value_format: format for each value, e.g. "%d" for risk levels
+    """
+
+    def __init__(self, json_template, series_keys, num_days,
+                       value_format='%d'):
+        self.series_keys = tuple(series_keys)
+        self.num_days = num_days
+        self.value_format = value_format
+
+        values = ','.join((value_format,) * num_days)
+        data = ','.join(['"%s":[%s]' % (key, values)
+                         for key in self.series_keys])
+        template = json_template % { 'lat':_LAT_, 'lon':_LON_,
+                                     'data':_DATA_ }
+        # location fields may appear in either order
+        if template.index(_LON_) < template.index(_LAT_):
+            self.lon_first = True
+        else: self.lon_first = False
+        template = template.replace('%', '%%')
+        template = template.replace(_LAT_, '%s').replace(_LON_, '%s')
+        self.format = template.replace(_DATA_, '{%s}' % data)
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def encode(self, lon, lat, values):
+        """
+        Arguments:
+            lon, lat: location of the node
+            values: tuple with all values of every series, in order
+
+        Returns: JSON string
+        """
+        if self.lon_first: return self.format % ((lon, lat) + values)
+        return self.format % ((lat, lon) + values)
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+# data for the nodes being written, shared with forked workers
+_NODE_DATA_ = None
+
+def _initWorker_(node_data):
+    global _NODE_DATA_
+    _NODE_DATA_ = node_data
+
+def _writeNodeFiles_(block):
+    """ writes files for rows first thru last-1 and returns their count """
+    first, last = block
+    encoder, dirpath, filename, node_keys, lons, lats, series = _NODE_DATA_
+    # converting a block at a time is much faster than one row at a time
+    rows = [matrix[first:last].tolist() for matrix in series]
+    lons = lons[first:last].tolist()
+    lats = lats[first:last].tolist()
+    suffix = '.tmp%d' % os.getpid()
+
+    for indx, node in enumerate(node_keys[first:last]):
+        values = ()
+        for matrix in rows: values += tuple(matrix[indx])
+        filepath = os.path.join(dirpath, filename % {'node':node})
+        tmp_filepath = filepath + suffix
+        with open(tmp_filepath, 'w') as writer:
+            writer.write(encoder.encode(lons[indx], lats[indx], values))
+        os.rename(tmp_filepath, filepath)
+    return last - first
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+class NodeJsonFileWriter(object):
+    """ Writes a JSON file for each node in a set of series matrices.
+
+    Arguments:
+        dirpath: directory where the files are written
+        filename: template with a "%(node)s" placeholder for node key
+        max_workers: maximum number of worker processes, defaults to
+                     the number of CPUs
+        min_block: minimum number of nodes in each worker's block
+    """
+
+    def __init__(self, dirpath, filename, max_workers=None, min_block=256):
+        self.dirpath = dirpath
+        self.filename = filename
+        if max_workers is None or max_workers < 1:
+            max_workers = multiprocessing.cpu_count()
+        self.max_workers = max_workers
+        self.min_block = min_block
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def blocks(self, num_nodes):
+        """ Returns: list of (first, last) row ranges, one per worker """
+        num_workers = max(1, min(self.max_workers, num_nodes / self.min_block))
+        bounds = N.linspace(0, num_nodes, num_workers+1).astype(int)
+        return [ (bounds[indx], bounds[indx+1]) for indx in range(num_workers)
+                 if bounds[indx+1] > bounds[indx] ]
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def write(self, encoder, node_keys, lons, lats, series):
+        """
+        Arguments:
+            encoder: NodeJsonEncoder for the series
+            node_keys: key for each node, used in file names
+            lons, lats: location of each node
+            series: sequence of (num_nodes, num_days) matrices in the same
+                    order as encoder.series_keys
+
+        Returns: number of files written
+        """
+        global _NODE_DATA_
+        num_nodes = len(node_keys)
+        if num_nodes == 0: return 0
+        for matrix in series:
+            if matrix.shape != (num_nodes, encoder.num_days):
+                errmsg = 'series shape %s does not match %d nodes, %d days'
+                info = (str(matrix.shape), num_nodes, encoder.num_days)
+                raise ValueError, errmsg % info
+        if not os.path.isdir(self.dirpath): os.makedirs(self.dirpath)
+
+        node_data = (encoder, self.dirpath, self.filename, list(node_keys),
+                     N.asarray(lons), N.asarray(lats), tuple(series))
+        blocks = self.blocks(num_nodes)
+        if len(blocks) == 1:
+            _NODE_DATA_ = node_data
+            try: return _writeNodeFiles_(blocks[0])
+            finally: _NODE_DATA_ = None
+
+        # fork after the data is ready so workers inherit it
+        pool = multiprocessing.Pool(len(blocks), _initWorker_, (node_data,))
+        try:
+            return sum(pool.map(_writeNodeFiles_, blocks, 1))
+        finally:
+            pool.close()
+            pool.join()
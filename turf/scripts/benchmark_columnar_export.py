@@ -0,0 +1,190 @@
+#! /usr/bin/env python
+""" Compares writing one JSON file per grid node, the way the threat JSON
+generators do, with writing a single columnar export of the same data in
+each of the supported formats. Builds synthetic average and daily risk
+and threat index grids for a season, then reports the time, number of
+files and bytes for each approach. Every exported node is verified
+against its per node JSON file using ColumnarLookup, and the time to
+look up single nodes is reported.
+"""
+
+import os, sys
+import datetime
+import json
+import shutil
+import tempfile
+import time
+
+import numpy as N
+
+from turf.export import EXPORT_FORMATS, ColumnarExport, ColumnarLookup
+from turf.threats.config import THREATS
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+from optparse import OptionParser
+parser = OptionParser()
+parser.add_option('-d', action='store', type='int', dest='num_days',
+                  default=180)
+parser.add_option('-l', action='store', type='int', dest='lookups',
+                  default=1000, help='number of random node lookups to time')
+parser.add_option('-x', action='store', type='int', dest='num_lons',
+                  default=120)
+parser.add_option('-y', action='store', type='int', dest='num_lats',
+                  default=80)
+options, args = parser.parse_args()
+
+START_DATE = datetime.date(2018, 4, 1)
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+def directorySize(dirpath):
+    num_files = 0
+    num_bytes = 0
+    for filename in os.listdir(dirpath):
+        num_files += 1
+        num_bytes += os.path.getsize(os.path.join(dirpath, filename))
+    return num_files, num_bytes
+
+def nodeKey(lon, lat):
+    return '%d-%d' % (int(abs(lon) * 1000.), int(lat * 1000.))
+
+def syntheticGrids(shape, random):
+    num_days = shape[0]
+    lats, lons = N.meshgrid(N.linspace(39., 47., shape[1]),
+                            N.linspace(-80., -67., shape[2]), indexing='ij')
+    mask = random.uniform(size=shape[1:]) < 0.3
+    avg_index = random.uniform(0., 30., shape)
+    daily_index = random.uniform(0., 30., shape)
+    avg_risk = N.floor(avg_index / 10.)
+    daily_risk = N.floor(daily_index / 10.)
+    # a few nodes with missing risk are skipped, like the generators
+    missing = random.uniform(size=shape[1:]) < 0.01
+    avg_risk[:,missing] = N.nan
+    return lats, lons, mask, avg_risk, daily_risk, avg_index, daily_index
+
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+def writeNodeFiles(dirpath, node_y, node_x, lats, lons, avg_risk, daily_risk,
+                   json_dates):
+    params = { 'name':'anthrac', 'lat':'%(lat)s', 'lon':'%(lon)s',
+               'dates':json_dates,
+               'data':'{"average":[%(avg)s],"daily":[%(daily)s]}' }
+    json_template = THREATS.json_template % params
+    num_files = 0
+    for y, x in zip(node_y, node_x):
+        avg = avg_risk[:,y,x]
+        daily = daily_risk[:,y,x]
+        if N.isnan(avg).any() or N.isnan(daily).any(): continue
+        lat = N.round(lats[y,x],3)
+        lon = N.round(lons[y,x],3)
+        params = { 'lat':lat, 'lon':lon }
+        params['avg'] = ','.join(['%d' % value for value in avg])
+        params['daily'] = ','.join(['%d' % value for value in daily])
+        filepath = os.path.join(dirpath, '2018-%s-Anthracnose-Risk.json'
+                                         % nodeKey(lon, lat))
+        with open(filepath, 'w') as writer:
+            writer.write(json_template % params)
+        num_files += 1
+    return num_files
+
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+def columnarExport(node_y, node_x, lats, lons, avg_risk, daily_risk,
+                   avg_index, daily_index, json_dates, with_index):
+    valid = ~(N.isnan(avg_risk[:,node_y,node_x]).any(axis=0) |
+              N.isnan(daily_risk[:,node_y,node_x]).any(axis=0))
+    node_y = node_y[valid]
+    node_x = node_x[valid]
+    node_lats = N.round(lats[node_y,node_x],3)
+    node_lons = N.round(lons[node_y,node_x],3)
+    node_keys = [nodeKey(lon, lat) for lon, lat in zip(node_lons, node_lats)]
+
+    export = ColumnarExport('anthrac', 'threats', START_DATE,
+                            avg_risk.shape[0], json_dates)
+    export.setNodes(lats.shape, node_y, node_x, node_lats, node_lons,
+                    node_keys)
+    export.addData('average', avg_risk[:,node_y,node_x].T.astype('<i2'))
+    export.addData('daily', daily_risk[:,node_y,node_x].T.astype('<i2'))
+    if with_index:
+        export.addData('average_threat', avg_index[:,node_y,node_x].T, 2)
+        export.addData('daily_threat', daily_index[:,node_y,node_x].T, 2)
+    return export
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+random = N.random.RandomState(1234)
+shape = (options.num_days, options.num_lats, options.num_lons)
+lats, lons, mask, avg_risk, daily_risk, avg_index, daily_index = \
+    syntheticGrids(shape, random)
+node_y, node_x = N.where(mask == False)
+end_date = START_DATE + datetime.timedelta(days=options.num_days-1)
+json_dates = json.dumps({ 'seasonStart':START_DATE.timetuple()[:3],
+                          'seasonEnd':end_date.timetuple()[:3] },
+                        separators=(',',':'))
+
+work_dir = tempfile.mkdtemp()
+failures = 0
+try:
+    node_dir = os.path.join(work_dir, 'nodes')
+    os.makedirs(node_dir)
+    start = time.time()
+    num_files = writeNodeFiles(node_dir, node_y, node_x, lats, lons,
+                               avg_risk, daily_risk, json_dates)
+    node_time = time.time() - start
+    num_files, num_bytes = directorySize(node_dir)
+    print '\n%d nodes x %d days' % (num_files, options.num_days)
+    print '%-16s %8.3f seconds %7d files %11d bytes' % \
+          ('per node JSON', node_time, num_files, num_bytes)
+
+    # risk only has the same content as the per node files
+    for export_format, with_index in [ (export_format, with_index)
+                                       for with_index in (False, True)
+                                       for export_format in EXPORT_FORMATS ]:
+        filepath = os.path.join(work_dir, 'anthrac.%s' % export_format)
+        start = time.time()
+        export = columnarExport(node_y, node_x, lats, lons, avg_risk,
+                                daily_risk, avg_index, daily_index,
+                                json_dates, with_index)
+        export.write(filepath)
+        export_time = time.time() - start
+        if with_index: description = '%s risk+threat' % export_format
+        else: description = '%s risk' % export_format
+        print '%-16s %8.3f seconds %7d files %11d bytes' % \
+              (description, export_time, 1, os.path.getsize(filepath))
+
+        # every node in the export must match its per node file
+        start = time.time()
+        lookup = ColumnarLookup(filepath)
+        load_time = time.time() - start
+        mismatched = 0
+        for filename in os.listdir(node_dir):
+            with open(os.path.join(node_dir, filename)) as reader:
+                node_json = json.load(reader)
+            node = filename.split('-', 1)[1].rsplit('-', 2)[0]
+            series = lookup.series(node)
+            location = node_json['location']
+            if (list(series['average']) != node_json['data']['average']
+                or list(series['daily']) != node_json['data']['daily']
+                or lookup.location(node) != (location['lon'], location['lat'])):
+                mismatched += 1
+        if mismatched > 0 or lookup.num_nodes != num_files:
+            failures += 1
+            print '    FAILED : %d nodes do not match their JSON files' % mismatched
+
+        rows = random.randint(0, lookup.num_nodes, options.lookups)
+        indexes = [(lookup.y[row], lookup.x[row]) for row in rows]
+        start = time.time()
+        for node in indexes: lookup.series(node)
+        lookup_time = time.time() - start
+        lookup.close()
+        info = (load_time, 1000000. * lookup_time / options.lookups)
+        print '    load %.3f seconds, %.1f microseconds per node lookup' % info
+
+finally:
+    shutil.rmtree(work_dir)
+
+if failures > 0:
+    print '\n%d formats FAILED verification' % failures
+    sys.exit(1)
+print '\nall exports match the per node JSON files'
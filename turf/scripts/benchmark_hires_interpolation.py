@@ -0,0 +1,131 @@
+#! /usr/bin/env python
+""" Compares the way high resolution map grids used to be made for every
+map, Basemap interp() followed by maskoceans(), with the precomputed
+interpolation operator and ocean mask used by nrcc_viz.maps. Reports the
+one time cost of building the operator and mask, of loading them from
+the map cache directory, and the cost per map of each approach. Verifies
+that every interpolated grid is identical to the one interp() and
+maskoceans() produce.
+"""
+
+import os, sys
+import shutil
+import tempfile
+import time
+import warnings
+
+import numpy as N
+from mpl_toolkits.basemap import interp, maskoceans
+
+from nrcc_viz.maps import HIRES_FACTOR, clearMapCache, highResolutionGrid, \
+                          hiResCoordinates, interpolationOperator, oceanMask
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+from optparse import OptionParser
+parser = OptionParser()
+parser.add_option('-n', action='store', type='int', dest='num_maps',
+                  default=10)
+parser.add_option('-s', action='store', dest='shape_resolution', default='i',
+                  help='coastline resolution of the ocean mask')
+options, args = parser.parse_args()
+
+SPACING = 0.041667
+
+warnings.filterwarnings('ignore')
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+def oldHighResolutionGrid(lats, lons, grid, resolution):
+    """ the way highResolutionGrid used to work """
+    nlats = HIRES_FACTOR * lats.shape[0]
+    nlons = HIRES_FACTOR * lats.shape[1]
+    interp_lons = N.linspace(N.min(lons), N.max(lons),nlons)
+    interp_lats = N.linspace(N.min(lats), N.max(lats),nlats)
+    interp_lons, interp_lats = N.meshgrid(interp_lons, interp_lats)
+    interp_grid = interp(grid, lons[0], lats[:,0], interp_lons, interp_lats)
+    interp_grid = maskoceans(interp_lons, interp_lats, interp_grid,
+                             resolution=resolution, grid=1.25, inlands=False)
+    interp_grid[interp_grid == -999] = N.nan
+    return interp_grid
+
+def identical(old, new):
+    if not N.array_equal(N.ma.getmaskarray(old), N.ma.getmaskarray(new)):
+        return False
+    valid = ~N.ma.getmaskarray(old)
+    old = N.ma.getdata(old)[valid]
+    new = N.ma.getdata(new)[valid]
+    nans = N.isnan(old)
+    return N.array_equal(nans, N.isnan(new)) and \
+           N.array_equal(old[~nans], new[~nans])
+
+def fileSize(dirpath):
+    return sum([os.path.getsize(os.path.join(dirpath, filename))
+                for filename in os.listdir(dirpath)])
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+random = N.random.RandomState(1234)
+lats, lons = N.meshgrid(37.125 + N.arange(255) * SPACING,
+                        -82.75 + N.arange(384) * SPACING, indexing='ij')
+grids = random.uniform(0., 30., (options.num_maps,) + lats.shape)
+grids[:, random.uniform(size=lats.shape) < 0.02] = N.nan
+resolution = options.shape_resolution
+
+work_dir = tempfile.mkdtemp()
+map_options = { 'mask_coastlines':True, 'shape_resolution':resolution,
+                'map_cache_dir':work_dir }
+failures = 0
+try:
+    old_grids = [ ]
+    start = time.time()
+    for grid in grids:
+        old_grids.append(oldHighResolutionGrid(lats, lons, grid, resolution))
+    old_time = (time.time() - start) / options.num_maps
+
+    info = (lats.shape + tuple(N.array(lats.shape) * HIRES_FACTOR) +
+            (resolution,))
+    print '\n%d x %d grid to %d x %d, shape resolution %s' % info
+    print '%-36s %8.3f seconds per map' % ('interp + maskoceans', old_time)
+
+    # one time costs
+    clearMapCache()
+    start = time.time()
+    interpolationOperator(lats, lons, cache_dir=work_dir)
+    oceanMask(lats, lons, resolution, cache_dir=work_dir)
+    build_time = time.time() - start
+    info = ('build operator + mask, save', build_time,
+            fileSize(work_dir) / 1048576.)
+    print '%-36s %8.3f seconds, %.1f MB on disk' % info
+
+    clearMapCache()
+    start = time.time()
+    interpolationOperator(lats, lons, cache_dir=work_dir)
+    oceanMask(lats, lons, resolution, cache_dir=work_dir)
+    print '%-36s %8.3f seconds' % ('load operator + mask',
+                                   time.time() - start)
+
+    # per map cost once the operator is cached
+    hiResCoordinates(lats, lons)
+    new_grids = [ ]
+    start = time.time()
+    for grid in grids:
+        new_grids.append(highResolutionGrid(lats, lons, grid,
+                                            **map_options)[2])
+    new_time = (time.time() - start) / options.num_maps
+    print '%-36s %8.3f seconds per map' % ('sparse operator + cached mask',
+                                           new_time)
+
+    different = [indx for indx in range(options.num_maps)
+                 if not identical(old_grids[indx], new_grids[indx])]
+    if different:
+        failures += 1
+        print '    FAILED : %d grids differ' % len(different)
+
+finally:
+    shutil.rmtree(work_dir)
+
+if failures > 0:
+    print '\nFAILED verification'
+    sys.exit(1)
+print '\nall interpolated grids match interp() and maskoceans()'
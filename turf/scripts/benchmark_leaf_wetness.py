@@ -0,0 +1,103 @@
+#! /usr/bin/env python
+""" Compares the vectorized BasicDisease.leafWetness with the original
+loop over each hour of the slice. Verifies that both produce identical
+wetness arrays for a synthetic season of hourly data, including when the
+season is processed in slices that carry last_wet across the boundaries.
+"""
+
+import time
+
+import numpy as N
+
+from turf.threats.config import THREATS
+from turf.threats.disease import BasicDisease
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+from optparse import OptionParser
+parser = OptionParser()
+parser.add_option('-d', action='store', type='int', dest='num_days',
+                  default=61)
+parser.add_option('-i', action='store', type='int', dest='iterations',
+                  default=2)
+parser.add_option('-s', action='store', type='int', dest='slice_days',
+                  default=7)
+parser.add_option('-x', action='store', type='int', dest='num_lons',
+                  default=384)
+parser.add_option('-y', action='store', type='int', dest='num_lats',
+                  default=255)
+options, args = parser.parse_args()
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+def loopLeafWetness(config, tmp, dpt, pcpn):
+    """ original implementation, one hour per iteration """
+    tdd = tmp - dpt
+    pcpn = pcpn.copy()
+    pcpn[N.where(pcpn < config.min_precip)] = 0
+    wetness = N.zeros(pcpn.shape, dtype='<i2')
+    last_wet = N.zeros(pcpn.shape[1:], dtype='<i2')
+    for i in range(tdd.shape[0]):
+        pcpn_where = N.where(pcpn[i,:,:] > 0)
+        wetness[i][pcpn_where] = 1
+        tdd_where = N.where(tdd[i,:,:] < 3)
+        wetness[i][tdd_where] = 1
+        wetness[i][N.where(last_wet == 1)] = 1
+        last_wet.fill(0)
+        last_wet[pcpn_where] = 1
+        last_wet[tdd_where] = 1
+    return wetness
+
+def syntheticWeather(num_hours, grid_shape):
+    shape = (num_hours,) + grid_shape
+    tmp = N.random.uniform(5., 30., shape)
+    dpt = tmp - N.random.exponential(4., shape)
+    pcpn = N.random.exponential(0.02, shape)
+    pcpn[N.where(N.random.uniform(0., 1., shape) < 0.8)] = 0.
+    for data in (tmp, dpt, pcpn):
+        data[N.where(N.random.uniform(0., 1., shape) < 0.01)] = N.nan
+    return tmp, dpt, pcpn
+
+def timeIt(function, *args):
+    start = time.time()
+    for count in range(options.iterations):
+        result = function(*args)
+    return result, (time.time() - start) / options.iterations
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+N.random.seed(1234)
+grid_shape = (options.num_lats, options.num_lons)
+num_hours = options.num_days * 24
+print 'generating %d hours of synthetic weather for a %d x %d grid' % (
+      (num_hours,) + grid_shape)
+tmp, dpt, pcpn = syntheticWeather(num_hours, grid_shape)
+
+disease = BasicDisease(THREATS.bpatch, 'average')
+config = disease.config
+units = (config.units.tmp, config.units.pcpn)
+
+loop_wet, loop_time = timeIt(loopLeafWetness, config, tmp, dpt, pcpn)
+vector_wet, vector_time = \
+    timeIt(disease.leafWetness, tmp, dpt, pcpn, *units)
+
+# process the season in slices, carrying criteria across the boundaries
+slice_hours = options.slice_days * 24
+slices = [ ]
+last_wet = None
+for first in range(0, num_hours, slice_hours):
+    last = min(first + slice_hours, num_hours)
+    slices.append(disease.leafWetness(tmp[first:last], dpt[first:last],
+                          pcpn[first:last], *units, last_wet=last_wet))
+    last_wet = disease.wetnessCriteria(tmp[last-1:last], dpt[last-1:last],
+                                       pcpn[last-1:last], *units)[-1]
+sliced_wet = N.concatenate(slices, axis=0)
+
+print '\n%-12s %12s' % ('version', 'seconds')
+print '%-12s %12.4f' % ('loop', loop_time)
+print '%-12s %12.4f' % ('vectorized', vector_time)
+print '\nspeedup : %.1fx' % (loop_time / vector_time)
+print 'full season identical : %s' % N.array_equal(loop_wet, vector_wet)
+print '%d day slices identical : %s' % (options.slice_days,
+                                        N.array_equal(loop_wet, sliced_wet))
+print 'dtype : %s, %s' % (loop_wet.dtype, vector_wet.dtype)
@@ -0,0 +1,160 @@
+#! /usr/bin/env python
+""" Compares the way turf risk maps used to be drawn, a new Basemap and an
+interpolated high resolution grid for every map, with TurfMapRenderer,
+using one worker process and several. Draws maps of synthetic risk grids
+for a series of dates with each approach and verifies that every map is
+pixel for pixel identical to the map drawn the old way.
+
+Use -s to draw with a coastline resolution (e.g. "i") and ocean masking,
+which is what makes building a Basemap and interpolating so expensive.
+"""
+
+import os, sys
+import multiprocessing
+import shutil
+import tempfile
+import time
+import warnings
+
+import numpy as N
+import PIL.Image
+
+from nrcc_viz.maps import addScatterToMap, clearMapCache, finishMap, hiResMap
+
+from turf.maps.factory import TurfMapFileFactory
+from turf.maps.render import TurfMapRenderer
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+from optparse import OptionParser
+parser = OptionParser()
+parser.add_option('-n', action='store', type='int', dest='num_maps',
+                  default=8)
+parser.add_option('-s', action='store', dest='shape_resolution', default=None)
+parser.add_option('-t', action='store', dest='threat', default='anthrac')
+parser.add_option('-w', action='store', type='int', dest='max_workers',
+                  default=multiprocessing.cpu_count())
+options, args = parser.parse_args()
+
+SPACING = 0.041667
+
+warnings.filterwarnings('ignore')
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+def syntheticGrids(num_maps, random):
+    lats, lons = N.meshgrid(37.125 + N.arange(255) * SPACING,
+                            -82.75 + N.arange(384) * SPACING, indexing='ij')
+    shape = (num_maps,) + lats.shape
+    risk = N.floor(random.uniform(0., 3., shape))
+    # nodes in the ocean have no data
+    risk[:, (lons > -70.) & (lats < 41.)] = N.nan
+    return lats, lons, risk
+
+def mapJobs(dirpath, risk):
+    jobs = [ ]
+    for indx in range(risk.shape[0]):
+        date_str = '2018-05-%02d' % (indx + 1)
+        map_filepath = os.path.join(dirpath, '%s-map.png' % date_str)
+        thumb_filepath = os.path.join(dirpath, '%s-thumb.png' % date_str)
+        date_options = { 'outputfile':map_filepath, 'date':date_str,
+                         'title':'Risk Level\n%s' % date_str }
+        jobs.append((risk[indx], date_options, thumb_filepath))
+    return jobs
+
+def imageData(filepath):
+    return N.asarray(PIL.Image.open(filepath).convert('RGBA'))
+
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+def drawTheOldWay(lats, lons, map_options, thumbnail_shape, jobs):
+    """ one map at a time, same as the map scripts used to """
+    for data, date_options, thumb_filepath in jobs:
+        clearMapCache() # nothing was reused between maps
+        options = dict(map_options)
+        options.update(date_options)
+        marker_colors = options['markercolors']
+        levels = options['contourbounds'][1:]
+        del options['contourbounds']
+
+        options, _map_, map_fig, axes, xy_extremes, x, y, _grid_ = \
+            hiResMap(data, lats, lons, **options)
+        del x, y, _grid_
+
+        map_lats = lats.flatten()
+        map_lons = lons.flatten()
+        map_data = data.flatten()
+        for level in levels:
+            indexes = N.where(map_data == level)
+            if len(indexes[0]) > 0:
+                fig = addScatterToMap(options, _map_, map_fig,
+                                      map_data[indexes], map_lats[indexes],
+                                      map_lons[indexes],
+                                      markercolor=marker_colors[level])
+        finishMap(map_fig, axes, fig, **options)
+
+        image = PIL.Image.open(options['outputfile'])
+        image.thumbnail(thumbnail_shape, PIL.Image.ANTIALIAS)
+        image.save(thumb_filepath, 'PNG', quality=100, optimize=True)
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+random = N.random.RandomState(1234)
+lats, lons, risk = syntheticGrids(options.num_maps, random)
+
+map_factory = TurfMapFileFactory()
+map_options = map_factory.mapOptions(options.threat).attrs
+thumbnail_shape = map_factory.maps.thumbnail_shape
+if options.shape_resolution is not None:
+    map_options['shape_resolution'] = options.shape_resolution
+    map_options['mask_coastlines'] = True
+
+work_dir = tempfile.mkdtemp()
+map_options['map_cache_dir'] = os.path.join(work_dir, 'cache')
+failures = 0
+try:
+    old_dir = os.path.join(work_dir, 'old')
+    os.makedirs(old_dir)
+    old_jobs = mapJobs(old_dir, risk)
+    start = time.time()
+    drawTheOldWay(lats, lons, map_options, thumbnail_shape, old_jobs)
+    old_time = time.time() - start
+    print '\n%d maps, shape resolution %s' % (options.num_maps,
+                                              options.shape_resolution)
+    print '%-24s %8.2f seconds, %6.2f per map' % ('one map at a time',
+                                 old_time, old_time / options.num_maps)
+
+    worker_counts = sorted(set((1, options.max_workers)))
+    for max_workers in worker_counts:
+        clearMapCache()
+        new_dir = os.path.join(work_dir, 'renderer%d' % max_workers)
+        os.makedirs(new_dir)
+        jobs = mapJobs(new_dir, risk)
+        renderer = TurfMapRenderer(lats, lons, map_options, thumbnail_shape,
+                                   max_workers)
+        start = time.time()
+        filepaths = list(renderer.render(jobs))
+        new_time = time.time() - start
+        info = ('renderer, %d workers' % max_workers, new_time,
+                new_time / options.num_maps)
+        print '%-24s %8.2f seconds, %6.2f per map' % info
+
+        different = 0
+        for old_job, job in zip(old_jobs, jobs):
+            for key in ('outputfile',):
+                if not N.array_equal(imageData(old_job[1][key]),
+                                     imageData(job[1][key])):
+                    different += 1
+            if not N.array_equal(imageData(old_job[2]), imageData(job[2])):
+                different += 1
+        if different > 0 or len(filepaths) != len(jobs):
+            failures += 1
+            print '    FAILED : %d images differ' % different
+
+finally:
+    shutil.rmtree(work_dir)
+
+if failures > 0:
+    print '\n%d renderers FAILED verification' % failures
+    sys.exit(1)
+print '\nall maps match the maps drawn one at a time'
@@ -0,0 +1,198 @@
+#! /usr/bin/env python
+""" Compares the per node JSON file loop formerly used by the threat JSON
+generators with NodeJsonFileWriter, using one worker process and several.
+Builds synthetic average and daily risk grids for a season, writes one
+file per valid node with each approach and verifies that every file is
+byte for byte identical and that no temporary files are left behind.
+Also checks that the nodes of a sub-region found in a static file are
+the same nodes, with the same files, as the full region has inside the
+sub-region's bounding box.
+"""
+
+import os, sys
+import datetime
+import json
+import multiprocessing
+import shutil
+import tempfile
+import time
+
+import h5py
+import numpy as N
+
+from atmosci.hdf5.grid import Hdf5GridFileReader
+from turf.nodefiles import NodeJsonEncoder, NodeJsonFileWriter
+from turf.threats.config import THREATS
+from turf.threats.generators import regionNodeIndexes
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+from optparse import OptionParser
+parser = OptionParser()
+parser.add_option('-d', action='store', type='int', dest='num_days',
+                  default=180)
+parser.add_option('-w', action='store', type='int', dest='max_workers',
+                  default=multiprocessing.cpu_count())
+parser.add_option('-x', action='store', type='int', dest='num_lons',
+                  default=120)
+parser.add_option('-y', action='store', type='int', dest='num_lats',
+                  default=80)
+options, args = parser.parse_args()
+
+FILENAME = '2018-%(node)s-Anthracnose-Risk.json'
+START_DATE = datetime.date(2018, 4, 1)
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+def nodeKey(lon, lat):
+    return '%d-%d' % (int(abs(lon) * 1000.), int(lat * 1000.))
+
+def syntheticGrids(shape, random):
+    lats, lons = N.meshgrid(N.linspace(39., 47., shape[1]),
+                            N.linspace(-80., -67., shape[2]), indexing='ij')
+    mask = random.uniform(size=shape[1:]) < 0.3
+    avg_risk = N.floor(random.uniform(0., 4., shape))
+    daily_risk = N.floor(random.uniform(0., 4., shape))
+    # a few nodes with missing risk are skipped
+    missing = random.uniform(size=shape[1:]) < 0.01
+    avg_risk[:,missing] = N.nan
+    return lats, lons, mask, avg_risk, daily_risk
+
+def fileContents(dirpath):
+    contents = { }
+    for filename in os.listdir(dirpath):
+        with open(os.path.join(dirpath, filename)) as reader:
+            contents[filename] = reader.read()
+    return contents
+
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+def writeWithTemplates(dirpath, node_y, node_x, lats, lons, avg_risk,
+                       daily_risk, json_dates):
+    """ one node at a time, same as the generators used to """
+    params = { 'name':'anthrac', 'lat':'%(lat)s', 'lon':'%(lon)s',
+               'dates':json_dates,
+               'data':'{"average":[%(avg)s],"daily":[%(daily)s]}' }
+    json_template = THREATS.json_template % params
+    num_files = 0
+    for y, x in zip(node_y, node_x):
+        avg = avg_risk[:,y,x]
+        daily = daily_risk[:,y,x]
+        if len(N.where(N.isnan(avg))[0]) == 0 and \
+           len(N.where(N.isnan(daily))[0]) == 0:
+            lat = N.round(lats[y,x],3)
+            lon = N.round(lons[y,x],3)
+            params = { 'lat':lat, 'lon':lon }
+            params['avg'] = ','.join(['%d' % value for value in avg])
+            params['daily'] = ','.join(['%d' % value for value in daily])
+            filepath = os.path.join(dirpath, FILENAME % {'node':nodeKey(lon,lat)})
+            with open(filepath, 'w') as writer:
+                writer.write(json_template % params)
+            num_files += 1
+    return num_files
+
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+def writeWithWriter(dirpath, node_y, node_x, lats, lons, avg_risk,
+                    daily_risk, json_dates, max_workers):
+    valid = ~(N.isnan(avg_risk[:,node_y,node_x]).any(axis=0) |
+              N.isnan(daily_risk[:,node_y,node_x]).any(axis=0))
+    node_y = node_y[valid]
+    node_x = node_x[valid]
+    node_lats = N.round(lats[node_y,node_x],3)
+    node_lons = N.round(lons[node_y,node_x],3)
+    node_keys = [nodeKey(lon, lat) for lon, lat in zip(node_lons, node_lats)]
+    series = [ avg_risk[:,node_y,node_x].T.astype('<i2'),
+               daily_risk[:,node_y,node_x].T.astype('<i2') ]
+
+    params = { 'name':'anthrac', 'lat':'%(lat)s', 'lon':'%(lon)s',
+               'dates':json_dates, 'data':'%(data)s' }
+    encoder = NodeJsonEncoder(THREATS.json_template % params,
+                              ('average','daily'), avg_risk.shape[0])
+    writer = NodeJsonFileWriter(dirpath, FILENAME, max_workers)
+    return writer.write(encoder, node_keys, node_lons, node_lats, series)
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+random = N.random.RandomState(1234)
+shape = (options.num_days, options.num_lats, options.num_lons)
+lats, lons, mask, avg_risk, daily_risk = syntheticGrids(shape, random)
+node_y, node_x = N.where(mask == False)
+end_date = START_DATE + datetime.timedelta(days=options.num_days-1)
+json_dates = json.dumps({ 'seasonStart':START_DATE.timetuple()[:3],
+                          'seasonEnd':end_date.timetuple()[:3] },
+                        separators=(',',':'))
+json_dates = json_dates.replace('(','[').replace(')',']')
+
+work_dir = tempfile.mkdtemp()
+failures = 0
+try:
+    template_dir = os.path.join(work_dir, 'templates')
+    os.makedirs(template_dir)
+    start = time.time()
+    num_files = writeWithTemplates(template_dir, node_y, node_x, lats, lons,
+                                   avg_risk, daily_risk, json_dates)
+    template_time = time.time() - start
+    expected = fileContents(template_dir)
+    print '\n%d nodes x %d days' % (num_files, options.num_days)
+    print '%-24s %8.3f seconds' % ('one node at a time', template_time)
+
+    worker_counts = sorted(set((1, options.max_workers)))
+    for max_workers in worker_counts:
+        writer_dir = os.path.join(work_dir, 'writer%d' % max_workers)
+        start = time.time()
+        count = writeWithWriter(writer_dir, node_y, node_x, lats, lons,
+                                avg_risk, daily_risk, json_dates, max_workers)
+        writer_time = time.time() - start
+        print '%-24s %8.3f seconds' % ('writer, %d workers' % max_workers,
+                                       writer_time)
+        contents = fileContents(writer_dir)
+        if count != num_files or contents != expected:
+            failures += 1
+            different = [filename for filename in expected
+                         if contents.get(filename, None) != expected[filename]]
+            info = (len(different), len(contents))
+            print '    FAILED : %d files differ, %d files written' % info
+        elif len(os.listdir(writer_dir)) != num_files:
+            failures += 1
+            print '    FAILED : temporary files were left behind'
+
+    # sub-region of the static file, bounded by grid nodes
+    static_filepath = os.path.join(work_dir, 'static.h5')
+    with h5py.File(static_filepath, 'w') as static_file:
+        static_file.create_dataset('lat', data=lats)
+        static_file.create_dataset('lon', data=lons)
+        static_file.create_dataset('cus_mask', data=mask)
+    y1, x1 = options.num_lats / 4, options.num_lons / 3
+    y2, x2 = options.num_lats / 2, (options.num_lons * 2) / 3
+    bbox = (lons[y1,x1], lats[y1,x1], lons[y2,x2], lats[y2,x2])
+    static_reader = Hdf5GridFileReader(static_filepath)
+    sub_y, sub_x = regionNodeIndexes(static_reader, bbox)
+    static_reader.close()
+
+    inside = (node_y >= y1) & (node_y <= y2) & (node_x >= x1) & (node_x <= x2)
+    sub_dir = os.path.join(work_dir, 'subregion')
+    writeWithWriter(sub_dir, sub_y, sub_x, lats, lons, avg_risk, daily_risk,
+                    json_dates, 1)
+    contents = fileContents(sub_dir)
+    expected_files = [FILENAME % {'node':nodeKey(N.round(lons[y,x],3),
+                                                 N.round(lats[y,x],3))}
+                      for y, x in zip(node_y[inside], node_x[inside])]
+    expected_files = [name for name in expected_files if name in expected]
+    print '%-24s %8d nodes' % ('sub-region', len(sub_y))
+    if not ((sub_y == node_y[inside]).all() and
+            (sub_x == node_x[inside]).all()):
+        failures += 1
+        print '    FAILED : sub-region nodes are not the full region nodes'
+    elif sorted(contents) != sorted(expected_files) or \
+         any([contents[name] != expected[name] for name in contents]):
+        failures += 1
+        print '    FAILED : sub-region files differ from full region files'
+
+finally:
+    shutil.rmtree(work_dir)
+
+if failures > 0:
+    print '\n%d checks FAILED verification' % failures
+    sys.exit(1)
+print '\nall files match the files written one node at a time'
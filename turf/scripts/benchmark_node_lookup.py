@@ -0,0 +1,173 @@
+#! /usr/bin/env python
+""" Compares the way grid files used to find the node closest to a lon/lat
+point, a search of the whole grid for every point, with the node index
+from atmosci.utils.gridindex. Builds grid files for a regular lon/lat grid
+the size of the ACIS NE grid and for a Lambert Conformal style grid, then
+looks up random points one at a time and in a single batch. Verifies that
+every point finds the same node as the old search.
+"""
+
+import os, sys
+import shutil
+import tempfile
+import time
+
+import numpy as N
+
+from atmosci.hdf5.grid import Hdf5GridFileBuilder, Hdf5GridFileReader
+from atmosci.utils.gridindex import clearNodeIndexes
+from atmosci.utils.proximity import indexOfClosestNode
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+from optparse import OptionParser
+parser = OptionParser()
+parser.add_option('-n', action='store', type='int', dest='num_points',
+                  default=2000)
+parser.add_option('-o', action='store', type='int', dest='num_old',
+                  default=200, help='number of points for the old search')
+options, args = parser.parse_args()
+
+SPACING = 0.041667
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+def regularGrid():
+    return N.meshgrid(-82.75 + N.arange(384) * SPACING,
+                      37.125 + N.arange(255) * SPACING)
+
+def lambertStyleGrid():
+    # rows and columns of nodes that are rotated and curved
+    y, x = N.mgrid[0:300, 0:400].astype(float)
+    lons = -82.75 + (x * 0.035) + (y * 0.012) + ((x - 200.) ** 2) * 0.00001
+    lats = 37.125 + (y * 0.03) - (x * 0.008) + ((y - 150.) ** 2) * 0.00001
+    return lons, lats
+
+def oldIndexOfClosestNode(reader, target_lon, target_lat):
+    """ the way Hdf5GridFileMixin._indexOfClosestNode used to search """
+    lons = reader.lons
+    lats = reader.lats
+    indexes = N.where( (lons == target_lon) & (lats == target_lat) )
+    if len(indexes[0]) > 0:
+        return indexes[0][0], indexes[1][0]
+    radius = reader.node_search_radius
+    indexes = N.where( (lons >= (target_lon - radius)) &
+                       (lons <= (target_lon + radius)) &
+                       (lats >= (target_lat - radius)) &
+                       (lats <= (target_lat + radius)) )
+    distances = reader.distanceBetweenNodes(lons[indexes], lats[indexes],
+                                            target_lon, target_lat)
+    indx = N.where(distances == distances.min())[0][0]
+    return indexes[0][indx], indexes[1][indx]
+
+def proximityResult(reader, lon, lat, node_index=None):
+    """ node found by proximity.indexOfClosestNode, None when it raises
+    ValueError because no node is within the search radius
+    """
+    try:
+        return indexOfClosestNode(lon, lat, reader.lons, reader.lats,
+                                  reader.node_search_radius, node_index)
+    except ValueError:
+        return None
+
+def samePoint(reader, lon, lat, old, new):
+    """ different nodes are only acceptable when they are equally close """
+    if tuple(old) == tuple(new): return True
+    old_dist = reader.distanceBetweenNodes(reader.lons[old], reader.lats[old],
+                                           lon, lat)
+    new_dist = reader.distanceBetweenNodes(reader.lons[new], reader.lats[new],
+                                           lon, lat)
+    return abs(old_dist - new_dist) < 1e-6
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+random = N.random.RandomState(1234)
+work_dir = tempfile.mkdtemp()
+failures = 0
+try:
+    for grid_name, grid in (('regular', regularGrid),
+                            ('lambert style', lambertStyleGrid)):
+        lons, lats = grid()
+        filepath = os.path.join(work_dir, '%s.h5' % grid_name.split()[0])
+        builder = Hdf5GridFileBuilder(filepath, lons.astype('<f4'),
+                                      lats.astype('<f4'))
+        builder.close()
+
+        clearNodeIndexes()
+        reader = Hdf5GridFileReader(filepath)
+        # points inside the grid, some of them exactly on nodes
+        y = random.randint(1, lons.shape[0] - 1, options.num_points)
+        x = random.randint(1, lons.shape[1] - 1, options.num_points)
+        point_lons = reader.lons[y,x] + random.uniform(-0.02, 0.02, len(x))
+        point_lats = reader.lats[y,x] + random.uniform(-0.02, 0.02, len(y))
+        point_lons[::10] = reader.lons[y[::10],x[::10]]
+        point_lats[::10] = reader.lats[y[::10],x[::10]]
+        point_lons = point_lons.astype(float)
+        point_lats = point_lats.astype(float)
+
+        print '\n%s grid, %d x %d nodes' % ((grid_name,) + lons.shape)
+        num_old = min(options.num_old, options.num_points)
+        start = time.time()
+        old = [oldIndexOfClosestNode(reader, point_lons[indx],
+                                     point_lats[indx])
+               for indx in range(num_old)]
+        old_time = (time.time() - start) / num_old
+        print '%-28s %10.1f usec per point' % ('search whole grid',
+                                               old_time * 1e6)
+
+        start = time.time()
+        reader.nodeIndex()
+        print '%-28s %10.3f seconds' % ('build node index',
+                                        time.time() - start)
+
+        start = time.time()
+        new = [reader.ll2index(point_lons[indx], point_lats[indx])
+               for indx in range(options.num_points)]
+        new_time = (time.time() - start) / options.num_points
+        print '%-28s %10.1f usec per point' % ('node index, one at a time',
+                                               new_time * 1e6)
+
+        start = time.time()
+        batch_y, batch_x = reader.indexesOfClosestNodes(point_lons,
+                                                        point_lats)
+        batch_time = (time.time() - start) / options.num_points
+        print '%-28s %10.1f usec per point' % ('node index, one batch',
+                                               batch_time * 1e6)
+        # proximity.indexOfClosestNode with and without the node index,
+        # including points outside the grid that have no node in radius
+        radius = reader.node_search_radius
+        check_lons = list(point_lons[:num_old]) + \
+                     [lons.min() - radius * 3, lons.max() + radius * 3]
+        check_lats = list(point_lats[:num_old]) + \
+                     [lats.mean(), lats.mean()]
+        node_index = reader.nodeIndex()
+        for lon, lat in zip(check_lons, check_lats):
+            searched = proximityResult(reader, lon, lat)
+            indexed = proximityResult(reader, lon, lat, node_index)
+            if (searched is None) != (indexed is None) or \
+               (searched is not None and
+                not samePoint(reader, lon, lat, searched, indexed)):
+                failures += 1
+                print '    FAILED : proximity search differs at', (lon, lat)
+                break
+        reader.close()
+
+        different = 0
+        for indx in range(num_old):
+            lon, lat = point_lons[indx], point_lats[indx]
+            if not samePoint(reader, lon, lat, old[indx], new[indx]):
+                different += 1
+        batch = zip(batch_y, batch_x)
+        different += len([indx for indx in range(options.num_points)
+                          if tuple(batch[indx]) != tuple(new[indx])])
+        if different > 0:
+            failures += 1
+            print '    FAILED : %d nodes differ' % different
+
+finally:
+    shutil.rmtree(work_dir)
+
+if failures > 0:
+    print '\n%d grids FAILED verification' % failures
+    sys.exit(1)
+print '\nall points found the same nodes as a search of the whole grid'
@@ -0,0 +1,153 @@
+#! /usr/bin/env python
+""" Compares threat grid chunk layouts for the two access patterns that
+matter most : the nightly update that rewrites the last obs day plus the
+forecast days, and the JSON export that reads the season at every node.
+
+Builds a synthetic threat file with the original per-node layout, then
+uses ThreatGridChunkMigrator to produce a copy for each of the layouts
+in the chunk_layouts config. Verifies that migration keeps the data and
+the maximum shape of every dataset, and that keep_original leaves a copy
+of the original file.
+"""
+
+import os, sys
+import shutil
+import tempfile
+import time
+
+import h5py
+import numpy as N
+
+from turf.threats.factory import TurfThreatGridFileFactory
+from turf.threats.migrate import ThreatGridChunkMigrator
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+from optparse import OptionParser
+parser = OptionParser()
+parser.add_option('-d', action='store', type='int', dest='num_days',
+                  default=245)
+parser.add_option('-f', action='store', type='int', dest='fcast_days',
+                  default=7)
+parser.add_option('-l', action='store', dest='layouts',
+                  default='node,tiled,daily')
+parser.add_option('-x', action='store', type='int', dest='num_lons',
+                  default=280)
+parser.add_option('-y', action='store', type='int', dest='num_lats',
+                  default=240)
+options, args = parser.parse_args()
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+def buildSyntheticFile(filepath, num_days, num_lats, num_lons):
+    shape = (num_days, num_lats, num_lons)
+    hdf5_file = h5py.File(filepath, 'w')
+    threat = N.random.uniform(0., 2., shape)
+    # threat can grow, e.g. when a season is extended
+    dataset = hdf5_file.create_dataset('threat', data=threat,
+                      compression='gzip', chunks=(num_days,1,1),
+                      maxshape=(None, num_lats, num_lons))
+    dataset.attrs['missing'] = N.nan
+    risk = N.digitize(threat.ravel(), (0.4,1.5)).reshape(shape)
+    dataset = hdf5_file.create_dataset('risk', data=risk.astype('<i2'),
+                      compression='gzip', chunks=(num_days,1,1))
+    dataset.attrs['missing'] = -999
+    hdf5_file.close()
+
+def fileContents(filepath):
+    hdf5_file = h5py.File(filepath, 'r')
+    contents = dict([(name, (dataset[...], dataset.maxshape))
+                     for name, dataset in hdf5_file.items()])
+    hdf5_file.close()
+    return contents
+
+def sameContents(contents, filepath):
+    migrated = fileContents(filepath)
+    if sorted(migrated.keys()) != sorted(contents.keys()): return False
+    for name, (data, maxshape) in contents.items():
+        if migrated[name][1] != maxshape: return False
+        if not N.array_equal(migrated[name][0], data): return False
+    return True
+
+def timeDailyUpdate(filepath, first_day, num_days):
+    threat = N.random.uniform(0., 2., (num_days,) + grid_shape)
+    risk = N.digitize(threat.ravel(), (0.4,1.5)).reshape(threat.shape)
+    start = time.time()
+    hdf5_file = h5py.File(filepath, 'a')
+    hdf5_file['threat'][first_day:first_day+num_days] = threat
+    hdf5_file['risk'][first_day:first_day+num_days] = risk
+    hdf5_file.close()
+    return time.time() - start
+
+def timeExportRead(filepath, last_day):
+    start = time.time()
+    hdf5_file = h5py.File(filepath, 'r')
+    risk = hdf5_file['risk'][:last_day,:,:]
+    hdf5_file.close()
+    return time.time() - start
+
+def timeNodeReads(filepath, nodes):
+    start = time.time()
+    hdf5_file = h5py.File(filepath, 'r')
+    dataset = hdf5_file['risk']
+    for y, x in nodes: series = dataset[:, y, x]
+    hdf5_file.close()
+    return (time.time() - start) / len(nodes)
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+num_days = options.num_days
+fcast_days = options.fcast_days
+grid_shape = (options.num_lats, options.num_lons)
+layouts = options.layouts.split(',')
+
+factory = TurfThreatGridFileFactory()
+work_dir = tempfile.mkdtemp()
+base_filepath = os.path.join(work_dir, 'synthetic-threat-node.h5')
+print 'building synthetic %d x %d x %d threat file in %s' % ((num_days,) +
+                                                   grid_shape + (work_dir,))
+buildSyntheticFile(base_filepath, num_days, *grid_shape)
+failures = 0
+
+# daily update starts at mid-season : last obs day plus forecast days
+first_day = num_days / 2
+nodes = zip(N.random.randint(0, grid_shape[0], 50),
+            N.random.randint(0, grid_shape[1], 50))
+
+print '\n%-8s %-16s %10s %12s %12s %12s' % ('layout', 'chunks', 'size MB',
+                           'update sec', 'export sec', 'node msec')
+for layout in layouts:
+    filepath = base_filepath.replace('-node.h5', '-%s.h5' % layout)
+    if filepath != base_filepath:
+        shutil.copyfile(base_filepath, filepath)
+        contents = fileContents(filepath)
+        start = time.time()
+        migrator = ThreatGridChunkMigrator(factory, layout)
+        migrator.migrateFile(filepath, keep_original=True)
+        migrate_time = time.time() - start
+        backup_filepath = filepath.replace('.h5', '.original.h5')
+        if not sameContents(contents, filepath) or \
+           not sameContents(contents, backup_filepath):
+            failures += 1
+            print '%-8s FAILED : migrated or original data differs' % layout
+        os.remove(backup_filepath)
+    else: migrate_time = 0.
+
+    hdf5_file = h5py.File(filepath, 'r')
+    chunks = hdf5_file['risk'].chunks
+    hdf5_file.close()
+
+    update_time = timeDailyUpdate(filepath, first_day, fcast_days+1)
+    export_time = timeExportRead(filepath, first_day+fcast_days+1)
+    node_time = timeNodeReads(filepath, nodes) * 1000.
+    size = os.path.getsize(filepath) / (1024. * 1024.)
+    print '%-8s %-16s %10.2f %12.4f %12.4f %12.4f' % (layout, str(chunks),
+                              size, update_time, export_time, node_time)
+    if migrate_time > 0.:
+        print '%8s migration took %.2f sec' % (' ', migrate_time)
+
+shutil.rmtree(work_dir)
+if failures > 0:
+    print '\n%d layouts FAILED verification' % failures
+    sys.exit(1)
+print '\nmigrated files kept the data and maximum shape of every dataset'
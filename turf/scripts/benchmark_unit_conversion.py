@@ -0,0 +1,88 @@
+#! /usr/bin/env python
+""" Compares the way units used to be converted, evaluating the formula
+string in atmosci.units.FORMULAS every time, with the compiled converters
+from atmosci.units.unitConverter(). Converts a season of synthetic hourly
+temperature grids, as the threat models do, and verifies that the results
+match the old conversions.
+"""
+
+import os, sys
+import time
+
+import numpy as N
+
+from atmosci.units import FORMULAS, OPERATORS, CONVERTERS, UNIT_KEY_MAP, \
+                          convertUnits, sanitizeUnits
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+from optparse import OptionParser
+parser = OptionParser()
+parser.add_option('-d', action='store', type='int', dest='num_days',
+                  default=92)
+parser.add_option('-n', action='store', type='int', dest='num_trials',
+                  default=3)
+options, args = parser.parse_args()
+
+CONVERSIONS = (('K','C'), ('K','F'), ('C','F'), ('F','C'), ('K*100','F'),
+               ('in','mm'))
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+def oldConvertUnits(data, data_units, out_units):
+    """ the way atmosci.units.convertUnits used to convert arrays of floats """
+    from_units, from_scale = sanitizeUnits(data_units)
+    to_units, to_scale = sanitizeUnits(out_units)
+    if from_scale is not None: data /= float(from_scale)
+    from_units = UNIT_KEY_MAP.get(from_units, from_units)
+    to_units = UNIT_KEY_MAP.get(to_units, to_units)
+    operation, arg = FORMULAS['%s_to_%s' % (from_units, to_units)]
+    result = OPERATORS[operation](data, arg)
+    if to_scale is not None: result *= float(to_scale)
+    return result
+
+def bestTime(function, data, from_units, to_units):
+    best = None
+    for trial in range(options.num_trials):
+        _data_ = data.copy()
+        start = time.time()
+        result = function(_data_, from_units, to_units)
+        elapsed = time.time() - start
+        if best is None or elapsed < best: best = elapsed
+    return best, result
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+random = N.random.RandomState(1234)
+shape = (options.num_days * 24, 100, 120)
+season = random.uniform(250., 310., shape).astype('<f4')
+season[:, random.uniform(size=shape[1:]) < 0.02] = N.nan
+
+print '\n%d hourly grids of %d x %d nodes' % shape
+print '%-12s %10s %10s %10s %10s' % ('conversion', 'eval', 'compiled',
+                                     'in place', 'max diff')
+failures = 0
+for from_units, to_units in CONVERSIONS:
+    old_time, old = bestTime(oldConvertUnits, season, from_units, to_units)
+    CONVERTERS.clear()
+    new_time, new = bestTime(convertUnits, season, from_units, to_units)
+    def inPlace(data, from_units, to_units):
+        return convertUnits(data, from_units, to_units, inplace=True)
+    inplace_time, inplace = bestTime(inPlace, season, from_units, to_units)
+
+    valid = N.isfinite(old)
+    diff = max(N.abs(old[valid] - new[valid]).max(),
+               N.abs(old[valid] - inplace[valid]).max())
+    info = ('%s to %s' % (from_units, to_units), old_time, new_time,
+            inplace_time, diff)
+    print '%-12s %10.3f %10.3f %10.3f %10.2g' % info
+    if not (N.array_equal(valid, N.isfinite(new)) and
+            N.allclose(old[valid], new[valid], rtol=1e-6, atol=1e-3) and
+            N.allclose(old[valid], inplace[valid], rtol=1e-6, atol=1e-3)):
+        failures += 1
+        print '    FAILED : results differ'
+
+if failures > 0:
+    print '\n%d conversions FAILED verification' % failures
+    sys.exit(1)
+print '\nall conversions match the formulas they were compiled from'
@@ -0,0 +1,231 @@
+#! /usr/bin/env python
+""" Compares monthly temperature files stored as float64 with files that use
+the 16 bit scaled integer packing declared in turf.weather.config. Builds a
+synthetic season of monthly files for each format, then reports the size of
+the files and the time it takes SmartWeatherDataReader.weatherSlice to read
+TMP and DPT for the full season. Also writes packed data through every
+insert method of the real weather file builder and manager, and verifies
+that it reads back as the values that were written.
+"""
+
+import os, sys
+import datetime
+import shutil
+import tempfile
+import time
+
+import h5py
+import numpy as N
+
+from atmosci.hdf5.file import scaledDataPacker
+from atmosci.utils.timeutils import lastDayOfMonth
+
+from turf.weather.config import CONFIG
+from turf.weather.factory import TurfWeatherFileFactory
+from turf.weather.smart_grid import SmartWeatherDataReader
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+from optparse import OptionParser
+parser = OptionParser()
+parser.add_option('-i', action='store', type='int', dest='iterations',
+                  default=2)
+parser.add_option('-m', action='store', dest='months', default='3,10',
+       help='first and last month of the season (default="3,10")')
+parser.add_option('-x', action='store', type='int', dest='num_lons',
+                  default=96)
+parser.add_option('-y', action='store', type='int', dest='num_lats',
+                  default=64)
+parser.add_option('-Y', action='store', type='int', dest='year',
+                  default=2018)
+options, args = parser.parse_args()
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+class SyntheticWeatherReader(SmartWeatherDataReader):
+
+    def __init__(self, work_dir, grid_dimensions):
+        SmartWeatherDataReader.__init__(self, 'NE')
+        self.grid_dimensions = grid_dimensions
+        self.work_dir = work_dir
+
+    def weatherFilepath(self, weather, year, month, region='NE', **kwargs):
+        weather_key = self.weatherFileKey(weather)
+        filename = '%d%02d-%s.h5' % (year, month, weather_key)
+        return os.path.join(self.work_dir, filename)
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+def hourString(hour): return hour.strftime('%Y-%m-%d:%H')
+
+def syntheticData(year, month, lats):
+    num_hours = lastDayOfMonth(year, month) * 24
+    diurnal = N.sin(N.linspace(0., 2.*N.pi, 24, endpoint=False))
+    seasonal = 10. * N.sin(N.pi * (month - 3) / 7.)
+    data = { }
+    for name, base in (('TMP', 285.), ('DPT', 280.)):
+        grid = base + seasonal - (lats - lats.min())
+        hourly = grid + (8. * diurnal[:, N.newaxis, N.newaxis])
+        values = N.empty((num_hours,) + lats.shape, dtype=float)
+        for hour in range(num_hours):
+            values[hour] = hourly[hour % 24]
+        values += N.random.normal(0., 0.2, values.shape)
+        data[name] = N.around(values, 2)
+    return data
+
+def buildMonthFile(filepath, year, month, lons, lats, data, packed):
+    start_time = datetime.datetime(year, month, 1, 0)
+    end_time = datetime.datetime(year,month,lastDayOfMonth(year,month),23)
+
+    hdf5_file = h5py.File(filepath, 'w')
+    hdf5_file.attrs['timezone'] = 'UTC'
+    hdf5_file.attrs['start_time'] = hourString(start_time)
+    hdf5_file.attrs['end_time'] = hourString(end_time)
+    hdf5_file.attrs['filetype'] = 'temps'
+    hdf5_file.create_dataset('lon', data=lons)
+    hdf5_file.create_dataset('lat', data=lats)
+
+    for name in ('TMP','DPT'):
+        config = CONFIG.datasets[name]
+        values = data[name]
+        if packed:
+            pack = scaledDataPacker(config.dtype_packed, config.scale_factor,
+                                    config.add_offset, config.missing_packed)
+            values = pack(values)
+        dataset = hdf5_file.create_dataset(name, data=values,
+                            compression='gzip', chunks=(1,) + lats.shape,
+                            shuffle=packed and config.get('shuffle', False))
+        dataset.attrs['timezone'] = 'UTC'
+        dataset.attrs['start_time'] = hourString(start_time)
+        dataset.attrs['end_time'] = hourString(end_time)
+        dataset.attrs['units'] = config.units
+        if packed:
+            dataset.attrs['missing'] = config.missing_packed
+            dataset.attrs['scale_factor'] = config.scale_factor
+            dataset.attrs['add_offset'] = config.add_offset
+            dataset.attrs['unpack'] = '(float,N.nan)'
+        else: dataset.attrs['missing'] = N.nan
+    hdf5_file.close()
+
+def roundTripErrors(work_dir, year):
+    """ writes TMP through each insert method of a real WeatherFileManager
+    and returns the names of the methods whose data does not read back as
+    the values that were written (to the 0.01 K packing resolution)
+    """
+    factory = TurfWeatherFileFactory()
+    dims = factory.sourceConfig('acis').grid_dimensions['NE']
+    shape = (dims.lat, dims.lon)
+    lons, lats = N.meshgrid(N.linspace(-82.7, -66.9, shape[1]),
+                            N.linspace(37.2, 47.6, shape[0]))
+    filepath = os.path.join(work_dir, 'roundtrip-temps.h5')
+    builder = factory.weatherFileBuilder('temps', year, 5, 'UTC', 'acis',
+                                         'NE', lons, lats, 'w', filepath)
+    builder.build(lons=lons, lats=lats)
+    builder.close()
+
+    def hour(day, hour): return datetime.datetime(year, 5, day, hour)
+    def values(shape):
+        data = N.around(N.random.uniform(250., 310., shape), 2)
+        data.flat[::7] = N.nan
+        return data
+
+    # (method, first hour, data, (y, x) slice written)
+    y, x = 10, 20
+    inserts = (
+        ('insertTimeSlice', hour(1,0), values((3,) + shape), N.s_[:,:]),
+        ('updateReanalysis', hour(2,0), values((3,) + shape), N.s_[:,:]),
+        ('insertAtNode', hour(3,0), values((4,)), N.s_[y,x]),
+        ('insert3DSlice', hour(4,0), values((2,5,5)), N.s_[:5,:5]),
+    )
+    manager = factory.weatherFileManager('temps', year, 5, mode='a',
+                                         filepath=filepath)
+    for method, start_time, data, where in inserts:
+        if method == 'insertTimeSlice':
+            manager.insertTimeSlice('TMP', data, start_time)
+        elif method == 'updateReanalysis':
+            manager.updateReanalysis('TMP', start_time, data)
+        elif method == 'insertAtNode':
+            manager.insertAtNode('TMP', data, start_time, lons[y,x], lats[y,x])
+        else:
+            manager.insert3DSlice('TMP', data, start_time, lons[0,0],
+                                  lons[0,5], lats[0,0], lats[5,0])
+    manager.close()
+
+    reader = factory.weatherFileReader('temps', year, 5, filepath=filepath)
+    errors = [ ]
+    for method, start_time, data, where in inserts:
+        end_time = start_time + datetime.timedelta(hours=len(data)-1)
+        stored = reader.timeSlice('TMP', start_time, end_time)
+        stored = stored[(slice(None),) + where]
+        if not (N.isnan(stored) == N.isnan(data)).all() or \
+           N.nanmax(N.fabs(stored - data)) > 0.0051:
+            errors.append(method)
+    reader.close()
+    return errors
+
+def directorySize(dirpath):
+    return sum([os.path.getsize(os.path.join(dirpath, filename))
+                for filename in os.listdir(dirpath)])
+
+def timeWeatherSlice(reader, slice_start, slice_end, iterations):
+    start = time.time()
+    for count in range(iterations):
+        results = reader.weatherSlice(('TMP','DPT'), slice_start, slice_end)
+    return results, (time.time() - start) / iterations
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+year = options.year
+first_month, last_month = [int(month) for month in options.months.split(',')]
+grid_dimensions = (options.num_lats, options.num_lons)
+lons, lats = N.meshgrid(N.linspace(-82.7, -66.9, options.num_lons),
+                        N.linspace(37.2, 47.6, options.num_lats))
+
+work_dir = tempfile.mkdtemp()
+formats = ('float64', 'int16')
+for label in formats: os.makedirs(os.path.join(work_dir, label))
+
+N.random.seed(1234)
+print 'building synthetic files for %d-%02d thru %d-%02d' % (year,
+                                        first_month, year, last_month)
+for month in range(first_month, last_month+1):
+    data = syntheticData(year, month, lats)
+    filename = '%d%02d-temps.h5' % (year, month)
+    for label in formats:
+        filepath = os.path.join(work_dir, label, filename)
+        buildMonthFile(filepath, year, month, lons, lats, data,
+                       label == 'int16')
+
+slice_start = datetime.datetime(year, first_month, 1, 0)
+slice_end = datetime.datetime(year, last_month,
+                              lastDayOfMonth(year, last_month), 23)
+results = { }
+for label in formats:
+    dirpath = os.path.join(work_dir, label)
+    reader = SyntheticWeatherReader(dirpath, grid_dimensions)
+    data, elapsed = \
+        timeWeatherSlice(reader, slice_start, slice_end, options.iterations)
+    results[label] = (data, elapsed, directorySize(dirpath))
+
+print '\n%-8s %12s %16s' % ('format', 'size MB', 'weatherSlice sec')
+for label in formats:
+    data, elapsed, size = results[label]
+    print '%-8s %12.2f %16.4f' % (label, size / (1024.*1024.), elapsed)
+
+float_data = results['float64'][0]
+packed_data = results['int16'][0]
+for name in ('TMP','DPT'):
+    diff = N.nanmax(N.fabs(float_data[name][1] - packed_data[name][1]))
+    print '%s maximum difference after unpacking : %.5f' % (name, diff)
+
+float_size = results['float64'][2]
+float_time = results['float64'][1]
+print '\nsize reduction : %.1fx' % (float_size / float(results['int16'][2]))
+print 'read speedup   : %.1fx' % (float_time / results['int16'][1])
+
+errors = roundTripErrors(work_dir, year)
+shutil.rmtree(work_dir)
+if errors:
+    print '\nround trip through WeatherFileManager FAILED :', ', '.join(errors)
+    sys.exit(1)
+print '\nround trip through WeatherFileManager insert methods : ok'
@@ -0,0 +1,185 @@
+#! /usr/bin/env python
+""" Verifies that the vectorized timespan reductions in turf.common
+return the same results as the original loop over each time period.
+
+Random 1D, 2D and 3D arrays with scattered NaN and missing values are
+reduced using daily, overlapping (moving window) and sparse time periods
+with offsets that leave ragged times at both ends of the time axis.
+Also reports the time taken by each version for a season of hourly data.
+"""
+
+import sys
+import time
+import warnings
+
+import numpy as N
+
+from turf import common as funcs
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+from optparse import OptionParser
+parser = OptionParser()
+parser.add_option('-d', action='store', type='int', dest='num_days',
+                  default=61)
+parser.add_option('-s', action='store', type='int', dest='seed',
+                  default=1234)
+parser.add_option('-x', action='store', type='int', dest='num_lons',
+                  default=40)
+parser.add_option('-y', action='store', type='int', dest='num_lats',
+                  default=30)
+options, args = parser.parse_args()
+
+warnings.filterwarnings('ignore')
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# original implementations, one time period per loop iteration
+
+def loopReduction(function, data, timestep, timespan, start_indx, dtype,
+                  fill_value, missing=None):
+    if missing is not None and data.dtype.kind == 'f':
+        data = funcs.setMissingToNan(data.copy(), missing)
+    periods, result = funcs.createTimePeriodArray(data.shape, dtype,
+                             timestep, timespan, start_indx, fill_value)
+    for n, (start, end) in enumerate(periods):
+        if data.ndim == 3:
+            result[n,:,:] = function(data[start:end,:,:], axis=0)
+        elif data.ndim == 2:
+            result[:,n] = function(data[:,start:end], axis=1)
+        else: result[n] = function(data[start:end])
+    if missing is not None: return funcs.setNanToMissing(result, missing)
+    return result
+
+def loopCount(compare, data, threshold, timestep, timespan, start_indx,
+              dtype='<i2'):
+    def count(period_data, axis=None):
+        return N.sum(compare(period_data, threshold), axis=axis)
+    return loopReduction(count, data, timestep, timespan, start_indx,
+                         dtype, 0)
+
+REFERENCE = {
+    'calcTimespanAvg' : lambda data, step, span, offset, missing:
+        loopReduction(N.nanmean, data, step, span, offset, float, N.nan,
+                      missing),
+    'calcTimespanMax' : lambda data, step, span, offset, missing:
+        loopReduction(N.nanmax, data, step, span, offset, data.dtype,
+                      N.nan, missing),
+    'calcTimespanMin' : lambda data, step, span, offset, missing:
+        loopReduction(N.nanmin, data, step, span, offset, data.dtype,
+                      N.nan, missing),
+    'calcTimespanSum' : lambda data, step, span, offset, missing:
+        loopReduction(N.nansum, data, step, span, offset, data.dtype,
+                      N.nan, missing),
+}
+
+COUNTS = { 'countTimespanEQ' : N.equal, 'countTimespanGE' : N.greater_equal,
+           'countTimespanGT' : N.greater, 'countTimespanLE' : N.less_equal,
+           'countTimespanLT' : N.less,
+}
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+def randomData(shape, missing):
+    # rounded values so that the count thresholds see exact matches
+    data = N.around(N.random.uniform(0., 10., shape))
+    data[N.where(N.random.uniform(0., 1., shape) < 0.1)] = N.nan
+    if not N.isnan(missing):
+        data[N.where(N.random.uniform(0., 1., shape) < 0.05)] = missing
+    # one location that is missing for the entire time axis
+    if data.ndim == 3: data[:,0,0] = N.nan
+    elif data.ndim == 2: data[0,:] = N.nan
+    return data
+
+def sameResults(expected, result):
+    if expected.shape != result.shape: return False
+    if expected.dtype != result.dtype: return False
+    if expected.dtype.kind != 'f': return N.array_equal(expected, result)
+    expected_nans = N.isnan(expected)
+    if not N.array_equal(expected_nans, N.isnan(result)): return False
+    return N.allclose(expected[~expected_nans], result[~expected_nans],
+                      rtol=1e-12, atol=1e-12)
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+N.random.seed(options.seed)
+num_times = options.num_days * 24
+grid = (options.num_lats, options.num_lons)
+shapes = { 1 : (num_times+7,), 2 : (grid[0]*grid[1], num_times+7),
+           3 : (num_times+7,) + grid }
+# (timestep, timespan, start_indx) : daily, moving window, sparse, ragged
+periods = ( (24,24,0), (24,24,7), (1,7,0), (3,5,2), (24,6,12), (7,24,5),
+            (5,5,num_times) )
+
+failures = 0
+tests = 0
+for ndim in (1, 2, 3):
+    for missing in (N.nan, -999.):
+        data = randomData(shapes[ndim], missing)
+        for step, span, offset in periods:
+            for name, reference in REFERENCE.items():
+                expected = reference(data, step, span, offset, missing)
+                function = getattr(funcs, name)
+                result = function(data.copy(), step, span, offset, missing)
+                tests += 1
+                if not sameResults(expected, result):
+                    failures += 1
+                    print 'FAILED', name, ndim, (step, span, offset), missing
+
+            for name, compare in COUNTS.items():
+                expected = loopCount(compare, data, 5., step, span, offset)
+                function = getattr(funcs, name)
+                result = function(data, 5., step, span, offset)
+                tests += 1
+                if not sameResults(expected, result):
+                    failures += 1
+                    print 'FAILED', name, ndim, (step, span, offset)
+
+    # integer data keeps its type for max, min, sum and counts
+    int_data = N.random.randint(0, 3, shapes[ndim]).astype('<i2')
+    for step, span, offset in periods:
+        for name, reference in REFERENCE.items():
+            expected = reference(int_data, step, span, offset, None)
+            result = getattr(funcs, name)(int_data, step, span, offset)
+            tests += 1
+            if not sameResults(expected, result):
+                failures += 1
+                print 'FAILED', name, ndim, (step, span, offset), 'int'
+        expected = loopCount(N.equal, int_data, 2, step, span, offset)
+        result = funcs.countTimespanEQ(int_data, 2, step, span, offset)
+        tests += 1
+        if not sameResults(expected, result):
+            failures += 1
+            print 'FAILED countTimespanEQ', ndim, (step, span, offset), 'int'
+
+# too few times for even one period must still raise ValueError
+try:
+    funcs.calcTimespanAvg(N.zeros(10), 24, 24, 0)
+except ValueError:
+    pass
+else:
+    failures += 1
+    print 'FAILED : short time axis did not raise ValueError'
+tests += 1
+
+print '%d of %d comparisons matched the original loops' % (tests - failures,
+                                                            tests)
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+print '\n%-16s %-4s %-8s %10s %10s %8s' % ('function', 'dims', 'periods',
+                                'loop sec', 'numpy sec', 'speedup')
+for ndim in (1, 2, 3):
+    data = randomData(shapes[ndim], N.nan)
+    for step, span in ((24,24), (1,7), (1,24)):
+        for name in ('calcTimespanAvg','calcTimespanMax','calcTimespanSum'):
+            start = time.time()
+            REFERENCE[name](data, step, span, 0, N.nan)
+            loop_time = time.time() - start
+            start = time.time()
+            getattr(funcs, name)(data, step, span, 0, N.nan)
+            numpy_time = time.time() - start
+            print '%-16s %-4d %-8s %10.4f %10.4f %8.1f' % (name, ndim,
+                  '%d/%d' % (step, span), loop_time, numpy_time,
+                  loop_time / numpy_time)
+
+if failures > 0: sys.exit(1)
@@ -15,7 +15,7 @@ from atmosci.utils.timeutils import elapsedTime
 
 from turf.threats.factory import TurfThreatGridFileFactory
 from turf.maps.factory import TurfMapFileFactory
-from turf.maps.visual import drawScatterMap, finishMap
+from turf.maps.render import TurfMapRenderer
 
 
 # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
@@ -24,6 +24,8 @@ from optparse import OptionParser
 parser = OptionParser()
 
 parser.add_option('-r', action='store', dest='region', default='NE')
+parser.add_option('-w', action='store', type='int', dest='max_workers',
+                  default=None, help='maximum number of drawing processes')
 
 parser.add_option('-c', action='store_true', dest='contours', default=False)
 parser.add_option('-d', action='store_true', dest='dev_mode', default=False)
@@ -37,6 +39,7 @@ options, args = parser.parse_args()
 contours = options.contours
 debug = options.debug
 dev_mode = options.dev_mode
+max_workers = options.max_workers
 region_key = options.region
 verbose = options.verbose or debug
 
@@ -57,6 +60,9 @@ map_factory = TurfMapFileFactory()
 if dev_mode: map_factory.useDirpathsForMode('dev')
 no_data_config = map_factory.maps.no_threat
 thumbnail_shape = map_factory.maps.thumbnail_shape
+if max_workers is None:
+    max_workers = map_factory.project.get('max_workers', 0)
+map_cache_dir = map_factory.turfMapCacheDirpath()
 
 total_maps = 0
 
@@ -100,51 +106,45 @@ for threat_key in ('anthrac','bpatch','dspot','hstress','pblight'):
     map_options = map_factory.mapOptions(threat_key).attrs
     map_title_template = map_options['title'] % {'threat':threat_fullname, 'date':'%(date)s'}
 
+    # maps are drawn by a pool of processes after all of the data is read
+    map_options['map_cache_dir'] = map_cache_dir
+    renderer = TurfMapRenderer(lats, lons, map_options, thumbnail_shape,
+                               max_workers)
+    jobs = [ ]
+
     days = 0
     date = start_date
+    reader.open()
     while date <= end_date:
         # get filepath for this date
         file_date_str = date.strftime('%Y%m%d')
         map_filename = mapfile_template.replace('||DATE||', file_date_str)
         map_filepath = os.path.join(map_dirpath, map_filename)
-        map_options['outputfile'] = map_filepath
 
         # date-specific map options
         map_date_str = date.strftime('%Y-%m-%d')
-        map_options['date'] = map_date_str
-        map_options['title'] = map_title_template % {'date':map_date_str,}
-        if debug:
-            print '\ndrawing %s risk map for %s' % (threat_fullname, map_date_str)
-        map_options['finish'] = False
+        date_options = { 'outputfile':map_filepath, 'date':map_date_str,
+                         'title':map_title_template % {'date':map_date_str,} }
 
         # risk data the date
-        reader.open()
         risk = reader.dataForDate('risk', date)
-        reader.close()
         risk_count = len(N.where(risk >= 0)[0])
         if risk_count > 0:
-            options, _map_, fig, axes, fig1, xy_extremes = \
-                     drawScatterMap(risk, lats, lons, **map_options)
-            mapped = True
+            thumb_filename = thumbfile_template.replace('||DATE||', file_date_str)
+            thumb_filepath = os.path.join(thumb_dirpath, thumb_filename)
+            jobs.append((risk, date_options, thumb_filepath))
         else:
             index = reader._dateToIndex('risk', date)
             print 'No data for %s (index=%d)' % (date.strftime('%Y-%m-%d'), index)
-            mapped = False
-
-        if mapped:
-            finishMap(fig, axes, fig1, **options)
-            if debug: print '   ', map_filepath
-            elif verbose: print '   ', map_filename
-
-            thumb_filename = thumbfile_template.replace('||DATE||', file_date_str)
-            thumb_filepath = os.path.join(thumb_dirpath, thumb_filename)
-            image = PIL.Image.open(map_filepath)
-            image.thumbnail(thumbnail_shape, PIL.Image.ANTIALIAS)
-            image.save(thumb_filepath, 'PNG', quality=100, optimize=True)
-            if debug: print '   ', thumb_filepath
 
         date += ONE_DAY
         days += 1
+    reader.close()
+
+    for indx, map_filepath in enumerate(renderer.render(jobs)):
+        if debug: print '   ', map_filepath
+        elif verbose: print '   ', os.path.basename(map_filepath)
+        if debug: print '   ', jobs[indx][2]
 
     # turn annoying numpy warnings back on
     warnings.resetwarnings()
@@ -12,6 +12,7 @@ import json
 from atmosci.utils.timeutils import elapsedTime
 
 from turf.controls.factory import TurfControlsFactory
+from turf.export import ColumnarExport
 
 
 # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
@@ -26,10 +27,15 @@ parser.add_option('-d', action='store_true', dest='dev_mode', default=False)
 parser.add_option('-v', action='store_true', dest='verbose', default=False)
 parser.add_option('-z', action='store_true', dest='debug', default=False)
 
+parser.add_option('--export', action='store', dest='export_format',
+       default=None, help='write one columnar file per control in this '
+       'format (h5, json or npz) instead of a JSON file per node')
+
 options, args = parser.parse_args()
 
 debug = options.debug
 dev_mode = options.dev_mode
+export_format = options.export_format
 use_cicss_gdd = options.use_cicss_gdd
 verbose = options.verbose or debug
 
@@ -73,6 +79,44 @@ def resolveJsonDates(turf_dates, gdd_dates):
     return first_valid, last_valid, json_dates.replace('(','[').replace(')',']')
 
 
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+def exportControl(control, treatments, json_dates, start_date, gdd_data,
+                  lats, lons):
+    # nodes with valid GDD on every day, same test as the per node files
+    node_data = gdd_data[:,valid_y,valid_x]
+    valid = ~(node_data < 0).any(axis=0)
+    node_y = valid_y[valid]
+    node_x = valid_x[valid]
+    node_data = node_data[:,valid]
+    num_invalid = len(valid) - len(node_y)
+    if num_invalid > 0:
+        print 'ISSUE : %d nodes with negative GDD were not exported' % num_invalid
+
+    node_lats = N.round(lats[node_y,node_x],3)
+    node_lons = N.round(lons[node_y,node_x],3)
+    node_keys = [ factory.gridNodeToFilename((lon,lat))
+                  for lon, lat in zip(node_lons, node_lats) ]
+
+    export = ColumnarExport(control.name, 'controls', start_date,
+                            node_data.shape[0], json_dates)
+    export.setNodes(lats.shape, node_y, node_x, node_lats, node_lons,
+                    node_keys)
+
+    # treatment stage at every node on every day
+    for name, treatment in treatments:
+        stages = N.zeros(node_data.shape, dtype='<i2')
+        for index, threshold in enumerate(treatment.thresholds[1:]):
+            stages[node_data >= threshold] = index+1
+        export.addData(name, stages.T)
+
+    filepath = factory.exportFilepath(target_year, control, region,
+                                      export_format)
+    export.write(filepath)
+    if verbose: print 'exported %d nodes to %s' % (export.num_nodes, filepath)
+    return export.num_nodes
+
+
 # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
 #
 # MAIN PROGRAM
@@ -91,6 +135,8 @@ static_reader = factory.staticFileReader(source, region)
 cus_mask = static_reader.getData('cus_mask')
 indexes = N.where(cus_mask == False)
 valid_indexes = zip(indexes[0], indexes[1])
+valid_y = N.array(indexes[0])
+valid_x = N.array(indexes[1])
 del cus_mask, indexes
 static_reader.close()
 del static_reader
@@ -149,37 +195,42 @@ for control_key, control in factory.controls.items():
     gdd_reader.close()
     del gdd_reader
 
-    # create a json file for each valid grid node
-    json_fmt = '"%s":[%s]'
-    num_days = gdd_data.shape[0]
-    num_files = 0
-
-    for y, x in valid_indexes:
-        node_data = gdd_data[:,y,x]
-        if len(N.where(node_data < 0)[0]) == 0:
-            lat = N.round(lats[y,x],3)
-            lon = N.round(lons[y,x],3)
-            params = { 'lat':lat, 'lon':lon }
-            filename = json_filename % {'node':factory.gridNodeToFilename((lon,lat)),}
-            filepath = os.path.join(json_dirpath, filename)
-
-            control_json = [ ]
-            for name, treatment in treatments:
-                stages = N.zeros(num_days, dtype='<i2')
-                for index, threshold in enumerate(treatment.thresholds[1:]):
-                    where = N.where(node_data >= threshold)
-                    if len(where[0] > 0): stages[where] = index+1
-                control_json.append(json_fmt % (name, ','.join(['%d' % s for s in stages])))
-
-            params['data'] = '{%s}' % ','.join(control_json)
-
-            with open(filepath, 'w') as writer:
-                writer.write(json_template % params)
-
-            num_files += 1
-            if verbose: print num_files, filepath
-        else:
-            print 'ISSUE : All NAN node found at :', y, x, lons[y,x], lats[y,x]
+    if export_format:
+        num_files = exportControl(control, treatments, json_dates, start_date,
+                                  gdd_data, lats, lons)
+
+    else:
+        # create a json file for each valid grid node
+        json_fmt = '"%s":[%s]'
+        num_days = gdd_data.shape[0]
+        num_files = 0
+
+        for y, x in valid_indexes:
+            node_data = gdd_data[:,y,x]
+            if len(N.where(node_data < 0)[0]) == 0:
+                lat = N.round(lats[y,x],3)
+                lon = N.round(lons[y,x],3)
+                params = { 'lat':lat, 'lon':lon }
+                filename = json_filename % {'node':factory.gridNodeToFilename((lon,lat)),}
+                filepath = os.path.join(json_dirpath, filename)
+
+                control_json = [ ]
+                for name, treatment in treatments:
+                    stages = N.zeros(num_days, dtype='<i2')
+                    for index, threshold in enumerate(treatment.thresholds[1:]):
+                        where = N.where(node_data >= threshold)
+                        if len(where[0] > 0): stages[where] = index+1
+                    control_json.append(json_fmt % (name, ','.join(['%d' % s for s in stages])))
+
+                params['data'] = '{%s}' % ','.join(control_json)
+
+                with open(filepath, 'w') as writer:
+                    writer.write(json_template % params)
+
+                num_files += 1
+                if verbose: print num_files, filepath
+            else:
+                print 'ISSUE : All NAN node found at :', y, x, lons[y,x], lats[y,x]
 
     # turn annoying numpy warnings back on
     warnings.resetwarnings()
@@ -187,7 +238,8 @@ for control_key, control in factory.controls.items():
     total_files += num_files
 
     elapsed_time = elapsedTime(JSON_START_TIME, True)
-    msg = 'Generated %d json files for %d treatments of %s in %s'
+    if export_format: msg = 'Exported %d nodes for %d treatments of %s in %s'
+    else: msg = 'Generated %d json files for %d treatments of %s in %s'
     print msg % (total_files, len(treatments), control.fullname, elapsed_time)
 
 
@@ -199,13 +199,13 @@ if include_avg:
             if num_nans == avg.size:
                 print 'All NAN average @ node[%s,%d] (%.5f, %.5f)' % location
             else:
-                print '%d NANs in average @ node[%s,%d] (%.5f, %.5f)' % (num_nans,) + location
+                print '%d NANs in average @ node[%s,%d] (%.5f, %.5f)' % ((num_nans,) + location)
 
             num_nans = len(N.where(N.isnan(daily))[0])
             if num_nans == daily.size:
                 print 'All NAN daily @ node[%s,%d] (%.5f, %.5f)' % location
             else:
-                print '%d NANs in daily @ node[%s,%d] (%.5f, %.5f)' % (num_nans,) + location
+                print '%d NANs in daily @ node[%s,%d] (%.5f, %.5f)' % ((num_nans,) + location)
 
 else: # primarily used for Heat Stress
     for y, x in valid_indexes:
@@ -231,7 +231,7 @@ else: # primarily used for Heat Stress
             if num_nans == daily.size:
                 print 'All NAN daily @ node[%s,%d] (%.5f, %.5f)' % location
             else:
-                print '%d NANs in daily @ node[%s,%d] (%.5f, %.5f)' % (num_nans,) + location
+                print '%d NANs in daily @ node[%s,%d] (%.5f, %.5f)' % ((num_nans,) + location)
 
 
 threat_fullname = factory.threatName(threat)
@@ -23,8 +23,13 @@ parser.add_option('-s', action='store', dest='source', default='acis')
 
 parser.add_option('-d', action='store_true', dest='dev_mode', default=False)
 parser.add_option('-v', action='store_true', dest='verbose', default=False)
+parser.add_option('-w', action='store', type='int', dest='max_workers',
+       default=None, help='number of processes writing JSON files')
 parser.add_option('-z', action='store_true', dest='debug', default=False)
 
+parser.add_option('--export', action='store', dest='export_format',
+       default=None, help='write one columnar file per threat in this '
+       'format (h5, json or npz) instead of a JSON file per node')
 parser.add_option('--sub', action='store', dest='sub_region', default=None)
 
 options, args = parser.parse_args()
@@ -32,6 +37,8 @@ num_args = len(args)
 
 debug = options.debug
 dev_mode = options.dev_mode
+export_format = options.export_format
+max_workers = options.max_workers
 region = options.region
 source = options.source
 sub_region = options.sub_region
@@ -161,20 +168,21 @@ def generateComboJsonFiles(factory, threat, target_year, region_indexes):
 
         else:
             threat_name = factory.threatName(threat)
+            num_nans = len(N.where(N.isnan(avg))[0])
             if num_nans == avg.size:
                 location = (threat_name, y, x, lons[y,x], lats[y,x])
                 print '%s : all NAN average risk @ node[%s,%d] (%.5f, %.5f)' % location
-            else:
-                location = (threat_name, len(N.where(N.isnan(avg))[0]), y, x, lons[y,x], lats[y,x])
-                print '%s : %d NANs in average risk @ node[%s,%d] (%.5f, %.5f)' % (num_nans,) + location
+            elif num_nans > 0:
+                location = (threat_name, num_nans, y, x, lons[y,x], lats[y,x])
+                print '%s : %d NANs in average risk @ node[%s,%d] (%.5f, %.5f)' % location
 
+            num_nans = len(N.where(N.isnan(daily))[0])
             if num_nans == daily.size:
                 location = (threat_name, y, x, lons[y,x], lats[y,x])
                 print '%s : all NAN daily risk @ node[%s,%d] (%.5f, %.5f)' % location
-            else:
-                location = (threat_name, len(N.where(N.isnan(daily))[0]), y, x, lons[y,x], lats[y,x])
-                num_nans = len(N.where(N.isnan(daily))[0])
-                print '%s : %d NANs in daily risk @ node[%s,%d] (%.5f, %.5f)' % (num_nans,) + location
+            elif num_nans > 0:
+                location = (threat_name, num_nans, y, x, lons[y,x], lats[y,x])
+                print '%s : %d NANs in daily risk @ node[%s,%d] (%.5f, %.5f)' % location
 
     return num_files
 
@@ -271,17 +279,23 @@ if dev_mode: factory.useDirpathsForMode('dev')
 grand_total = 0
 
 # generate JSON files for threats that have both daily and average risk data
-generator = factory.riskFileGenerator('avg,daily', source, region, sub_region)
+generator = factory.riskFileGenerator('avg,daily', source, region, sub_region,
+                                      max_workers)
 
 for threat in ('anthrac','bpatch','dspot','pblight'):
     threat_fullname = factory.threatName(threat)
     JSON_START_TIME = datetime.datetime.now()
-    count = generator(threat, target_year, debug)
+    if export_format:
+        count = generator.exportColumnar(threat, target_year, export_format,
+                                         debug)
+    else: count = generator(threat, target_year, debug)
 
     if count > 0:
         elapsed_time = elapsedTime(JSON_START_TIME, True)
         info = (threat_fullname, count, elapsed_time)
-        print 'Generated JSON files for %s @ %d grid nodes in %s' % info
+        if export_format:
+            print 'Exported %s @ %d grid nodes in %s' % info
+        else: print 'Generated JSON files for %s @ %d grid nodes in %s' % info
         grand_total += count
 
     else:
@@ -290,15 +304,21 @@ for threat in ('anthrac','bpatch','dspot','pblight'):
 
 # generate JSON files for threats that have only daily risk data
 threat_fullname = factory.threatName('hstress')
-generator = factory.riskFileGenerator('daily', source, region, sub_region)
+generator = factory.riskFileGenerator('daily', source, region, sub_region,
+                                      max_workers)
 
 JSON_START_TIME = datetime.datetime.now()
-count = generator('hstress', 'daily', target_year, debug)
+if export_format:
+    count = generator.exportColumnar('hstress', 'daily', target_year,
+                                     export_format, debug)
+else: count = generator('hstress', 'daily', target_year, debug)
 
 if count > 0:
     elapsed_time = elapsedTime(JSON_START_TIME, True)
     info = (threat_fullname, count, elapsed_time)
-    print 'Generated JSON files for %s @ %d grid nodes in %s' % info
+    if export_format:
+        print 'Exported %s @ %d grid nodes in %s' % info
+    else: print 'Generated JSON files for %s @ %d grid nodes in %s' % info
     grand_total += count
 
 else:
@@ -306,5 +326,8 @@ else:
 
 
 elapsed_time = elapsedTime(SCRIPT_START_TIME, True)
-print '\nGenerated total of %d JSON files in %s' % (grand_total, elapsed_time)
+if export_format:
+    print '\nExported total of %d grid nodes in %s' % (grand_total, elapsed_time)
+else:
+    print '\nGenerated total of %d JSON files in %s' % (grand_total, elapsed_time)
 
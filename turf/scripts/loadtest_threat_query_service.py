@@ -0,0 +1,256 @@
+#! /usr/bin/env python
+""" Load test for the threat query service. Builds synthetic daily and
+average threat grid files for one threat in a temporary directory, starts
+a ThreatQueryServer for them and verifies point, bounding box and binary
+responses against the files, error responses and cache invalidation when
+a file changes. Then runs point queries from several client threads over
+keep-alive connections and reports request latency and throughput, first
+with an empty cache and then with cached responses.
+"""
+
+import os, sys
+import datetime
+import httplib
+import json
+import shutil
+import tempfile
+import threading
+import time
+import urllib
+
+import h5py
+import numpy as N
+
+from turf.threats.factory import THREAT_READERS, TurfThreatGridFileFactory
+from turf.threats.service import ThreatQueryServer
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+from optparse import OptionParser
+parser = OptionParser()
+parser.add_option('-c', action='store', type='int', dest='num_clients',
+                  default=4)
+parser.add_option('-d', action='store', type='int', dest='num_days',
+                  default=60, help='number of days with valid data')
+parser.add_option('-n', action='store', type='int', dest='num_requests',
+                  default=500, help='requests from each client')
+parser.add_option('-p', action='store', type='int', dest='num_points',
+                  default=400, help='number of distinct query locations')
+parser.add_option('-t', action='store', dest='threat', default='anthrac')
+options, args = parser.parse_args()
+
+PERIODS = ('daily', 'average')
+SPACING = 0.041667
+YEAR = 2018
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+def check(description, passed):
+    global failures
+    if not passed: failures += 1
+    print '%-60s %s' % (description, 'ok' if passed else 'FAILED')
+
+def buildSyntheticFile(factory, threat, period, random):
+    region = factory.sourceConfig('acis').grid_dimensions[factory.region]
+    lats, lons = N.meshgrid(37.125 + N.arange(region.lat) * SPACING,
+                            -82.75 + N.arange(region.lon) * SPACING,
+                            indexing='ij')
+    layout = factory.threatChunkLayout('tiled')
+    builder = factory.threatFileBuilder(threat, period, YEAR, 'acis',
+                                        lons, lats, chunk_layout=layout)
+    builder.build(lons=lons, lats=lats, chunk_layout=layout)
+    builder.close()
+
+    filepath = factory.threatGridFilepath(threat, period, YEAR)
+    hdf5_file = h5py.File(filepath, 'a')
+    index_dataset = [name for name in hdf5_file.keys()
+                     if name not in ('lat','lon','risk')][0]
+    start_date = datetime.date(*[int(part) for part in
+                     hdf5_file['risk'].attrs['start_date'].split('-')])
+    last_valid = start_date + datetime.timedelta(days=options.num_days-1)
+    shape = (options.num_days,) + lats.shape
+    threat_index = N.around(random.uniform(0., 2., shape), 2)
+    hdf5_file[index_dataset][:options.num_days] = threat_index
+    risk = N.digitize(threat_index.ravel(), (0.4,1.5)).reshape(shape)
+    hdf5_file['risk'][:options.num_days] = risk.astype('<i2')
+    for name in ('risk', index_dataset):
+        hdf5_file[name].attrs['last_valid_date'] = last_valid.isoformat()
+    hdf5_file.close()
+    return filepath, index_dataset, start_date, last_valid, lons, lats
+
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+def get(connection, path, args):
+    connection.request('GET', '%s?%s' % (path, urllib.urlencode(args)))
+    response = connection.getresponse()
+    return response.status, response.getheaders(), response.read()
+
+def runClient(port, path, points, latencies, errors):
+    connection = httplib.HTTPConnection('127.0.0.1', port)
+    try:
+        for lon, lat in points:
+            start = time.time()
+            status, headers, body = get(connection, path,
+                                        { 'lon':lon, 'lat':lat })
+            latencies.append(time.time() - start)
+            if status != 200: errors.append(status)
+    finally:
+        connection.close()
+
+def runLoad(port, path, client_points):
+    latencies = [ ]
+    errors = [ ]
+    clients = [threading.Thread(target=runClient,
+                                args=(port, path, points, latencies, errors))
+               for points in client_points]
+    start = time.time()
+    for client in clients: client.start()
+    for client in clients: client.join()
+    elapsed = time.time() - start
+    latencies = N.array(latencies) * 1000.
+    return elapsed, latencies, errors
+
+def reportLoad(description, elapsed, latencies, errors):
+    info = (description, len(latencies), len(latencies) / elapsed,
+            N.median(latencies), N.percentile(latencies, 95),
+            N.percentile(latencies, 99))
+    print '%-14s %6d requests %8.1f per sec, msec median %.2f, p95 %.2f, ' \
+          'p99 %.2f' % info
+    if errors: print '    %d requests failed' % len(errors)
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+failures = 0
+random = N.random.RandomState(1234)
+threat = options.threat
+
+work_dir = tempfile.mkdtemp()
+factory = TurfThreatGridFileFactory()
+factory.config.dirpaths.turf = work_dir
+factory.config.dirpaths.threats = work_dir
+
+try:
+    start = time.time()
+    files = { }
+    for period in PERIODS:
+        files[period] = buildSyntheticFile(factory, threat, period, random)
+    filepath, index_dataset, start_date, last_valid, lons, lats = \
+        files['daily']
+    print 'built synthetic %s files in %.1f seconds' % (threat,
+                                                        time.time() - start)
+
+    with ThreatQueryServer(factory) as server:
+        connection = httplib.HTTPConnection('127.0.0.1', server.port)
+        path = '/threats/%s/daily/%d/point' % (threat, YEAR)
+        hdf5_file = h5py.File(filepath, 'r')
+
+        # point queries return the node's series thru the last valid date
+        y, x = 100, 200
+        args = { 'lon':lons[y,x] + 0.01, 'lat':lats[y,x] - 0.01 }
+        status, headers, body = get(connection, path, args)
+        result = json.loads(body)
+        expected = hdf5_file['risk'][:options.num_days,y,x]
+        check('point query returns the series at the nearest node',
+              status == 200 and result['data'] == expected.tolist()
+              and (result['location']['y'], result['location']['x']) == (y,x)
+              and result['end'] == last_valid.isoformat())
+
+        args.update({ 'dataset':index_dataset, 'start':'2018-03-05',
+                      'end':'2018-03-09' })
+        status, headers, body = get(connection, path, args)
+        expected = hdf5_file[index_dataset][4:9,y,x]
+        check('point query for a date range of the threat index',
+              status == 200 and N.allclose(json.loads(body)['data'], expected))
+
+        args['format'] = 'bin'
+        status, headers, body = get(connection, path, args)
+        headers = dict(headers)
+        data = N.fromstring(body, dtype=headers['x-dtype'])
+        check('binary point response matches the file',
+              status == 200 and headers['x-shape'] == '5'
+              and N.allclose(data, expected))
+
+        bbox = '%s,%s,%s,%s' % (lons[50,60], lats[50,60],
+                                lons[70,90], lats[70,90])
+        bbox_path = path.replace('point', 'bbox')
+        status, headers, body = get(connection, bbox_path,
+                                    { 'bbox':bbox, 'end':'2018-03-10' })
+        result = json.loads(body)
+        expected = hdf5_file['risk'][:10,50:71,60:91]
+        check('bbox query returns every node in the box',
+              status == 200 and result['shape'] == [10, 21, 31]
+              and N.array_equal(result['data'], expected))
+
+        status, headers, body = get(connection, bbox_path,
+                                    { 'bbox':bbox, 'end':'2018-03-10',
+                                      'format':'bin' })
+        data = N.fromstring(body, dtype='<f4')
+        check('binary bbox response matches the file',
+              status == 200 and N.array_equal(data, expected.ravel()))
+        hdf5_file.close()
+
+        # errors
+        status = get(connection, path.replace(threat, 'unknown'),
+                     { 'lon':-76, 'lat':42 })[0]
+        check('unknown threat returns 404', status == 404)
+        status, headers, body = get(connection,
+                                    path.replace('/daily/', '/weekly/'),
+                                    { 'lon':-76, 'lat':42 })
+        check('unknown period returns 400 with a message',
+              status == 400 and 'weekly' in json.loads(body)['error'])
+        status = get(connection, path, { 'lon':-76, 'lat':42,
+                                         'start':'2018-13-01' })[0]
+        check('invalid date returns 400', status == 400)
+        status = get(connection, path, { 'lon':-120, 'lat':42 })[0]
+        check('location outside the grid returns 400', status == 400)
+
+        # a cached response is replaced when the file changes
+        args = { 'lon':lons[y,x], 'lat':lats[y,x] }
+        before = json.loads(get(connection, path, args)[2])['data']
+        hits = server.engine.hits
+        cached = json.loads(get(connection, path, args)[2])['data']
+        check('repeated query is answered from the cache',
+              cached == before and server.engine.hits == hits + 1)
+        # like the threat file managers, release the pooled reader first
+        THREAT_READERS.release(filepath)
+        hdf5_file = h5py.File(filepath, 'a')
+        hdf5_file['risk'][0,y,x] = (before[0] + 1) % 3
+        hdf5_file.close()
+        mtime = os.path.getmtime(filepath) + 1
+        os.utime(filepath, (mtime, mtime))
+        after = json.loads(get(connection, path, args)[2])['data']
+        check('cached response is replaced after the file changes',
+              after[0] == (before[0] + 1) % 3 and after[1:] == before[1:])
+        connection.close()
+
+        # load : clients query random nodes from a set of locations
+        ys = random.randint(0, lats.shape[0], options.num_points)
+        xs = random.randint(0, lats.shape[1], options.num_points)
+        locations = zip(lons[ys,xs].tolist(), lats[ys,xs].tolist())
+        client_points = [ ]
+        for client in range(options.num_clients):
+            indexes = random.randint(0, options.num_points,
+                                     options.num_requests)
+            client_points.append([locations[indx] for indx in indexes])
+
+        info = (options.num_clients, options.num_requests, options.num_points)
+        print '\n%d clients, %d point queries each at %d locations' % info
+        server.engine.clearCache()
+        for period in PERIODS:
+            period_path = '/threats/%s/%s/%d/point' % (threat, period, YEAR)
+            results = runLoad(server.port, period_path, client_points)
+            reportLoad('%s uncached' % period, *results)
+            if results[2]: failures += 1
+            results = runLoad(server.port, period_path, client_points)
+            reportLoad('%s cached' % period, *results)
+            if results[2]: failures += 1
+        engine = server.engine
+        print '%d cache hits, %d misses' % (engine.hits, engine.misses)
+
+finally:
+    shutil.rmtree(work_dir)
+
+if failures > 0:
+    print '\n%d checks FAILED' % failures
+    sys.exit(1)
+print '\nall checks passed'
@@ -0,0 +1,77 @@
+#! /usr/bin/env python
+
+import datetime
+SCRIPT_START_TIME = datetime.datetime.now()
+
+from atmosci.utils.timeutils import elapsedTime
+
+from turf.threats.factory import TurfThreatGridFileFactory
+from turf.threats.migrate import ThreatGridChunkMigrator
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+usage = '%prog layout [year] [options]'
+usage += '\n    layout is the name of an entry in the threat chunk_layouts'
+usage += '\n    config (node, tiled, daily) or a tuple like "(7,32,32)"'
+
+from optparse import OptionParser
+parser = OptionParser(usage)
+
+parser.add_option('-d', action='store_true', dest='dev_mode', default=False,
+       help='boolean: use development data paths (default=False)')
+
+parser.add_option('-k', action='store_true', dest='keep_original',
+       default=False,
+       help='boolean: keep the original file with ".original.h5" suffix')
+
+parser.add_option('-m', action='store', dest='models',
+       default='anthrac,bpatch,dspot,hstress,pblight',
+       help='list of models to migrate (default="anthrac,bpatch,dspot,hstress,pblight")')
+
+parser.add_option('-p', action='store', dest='periods', default='daily,average',
+       help='list of periods to migrate (default="daily,average")')
+
+parser.add_option('-z', action='store_true', dest='debug', default=False,
+       help='boolean: print debug output (default=False)')
+
+options, args = parser.parse_args()
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+debug = options.debug
+periods = options.periods.split(',')
+threat_models = options.models.split(',')
+
+chunk_layout = args[0]
+if chunk_layout.startswith('('): chunk_layout = eval(chunk_layout)
+
+if len(args) > 1: year = int(args[1])
+else: year = datetime.date.today().year
+
+factory = TurfThreatGridFileFactory()
+if options.dev_mode: factory.useDirpathsForMode('dev')
+
+migrate = ThreatGridChunkMigrator(factory, chunk_layout, debug)
+print 'migrating %d threat grid files to %s chunk layout' % (year,
+                                                  str(migrate.chunk_layout))
+
+for threat_key in threat_models:
+    if threat_key == 'hstress': threat_periods = ('daily',)
+    else: threat_periods = periods
+
+    for period_key in threat_periods:
+        if not factory.threatFileExists(threat_key, period_key, year):
+            info = (factory.threatName(threat_key), period_key)
+            print '    %s %s grid file does not exist' % info
+            continue
+
+        changes = migrate(threat_key, period_key, year, options.keep_original)
+        info = (factory.threatName(threat_key), period_key.title())
+        print '    migrated %s %s grid file' % info
+        for name, (old_chunks, new_chunks) in changes.items():
+            info = (name, str(old_chunks), str(new_chunks))
+            print '        %s : %s >> %s' % info
+
+elapsed_time = elapsedTime(SCRIPT_START_TIME, True)
+print '\nCompleted chunk layout migration in %s' % elapsed_time
@@ -0,0 +1,46 @@
+#! /usr/bin/env python
+""" Serves point and bounding box queries for threat risk directly from
+the yearly threat grid files. See turf.threats.service for the query
+format, e.g. :
+
+    http://127.0.0.1:8040/threats/anthrac/daily/2018/point?lon=-76.5&lat=42.45
+"""
+
+import os, sys
+
+from turf.threats.factory import TurfThreatGridFileFactory
+from turf.threats.service import ThreatQueryServer
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+from optparse import OptionParser
+parser = OptionParser()
+
+parser.add_option('-c', action='store', type='int', dest='cache_size',
+                  default=512, help='number of responses kept in the cache')
+parser.add_option('-p', action='store', type='int', dest='port',
+                  default=8040)
+parser.add_option('-r', action='store', dest='region', default=None)
+
+parser.add_option('-d', action='store_true', dest='dev_mode', default=False)
+parser.add_option('-v', action='store_true', dest='verbose', default=False)
+
+parser.add_option('--host', action='store', dest='host', default='127.0.0.1')
+
+options, args = parser.parse_args()
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+if options.region is not None:
+    factory = TurfThreatGridFileFactory(region=options.region)
+else: factory = TurfThreatGridFileFactory()
+if options.dev_mode: factory.useDirpathsForMode('dev')
+
+server = ThreatQueryServer(factory, options.host, options.port,
+                           options.cache_size, options.verbose)
+print 'serving %s threat queries at %s/threats/' % (factory.region,
+                                                    server.url)
+try:
+    server.serveForever()
+except KeyboardInterrupt:
+    print '\nstopped'
@@ -3,6 +3,7 @@
 import datetime
 SCRIPT_START_TIME = datetime.datetime.now()
 
+import sys
 import warnings
 
 import numpy as N
@@ -10,7 +11,10 @@ import numpy as N
 from atmosci.utils import tzutils
 from atmosci.utils.timeutils import elapsedTime, lastDayOfMonth
 
+from turf.threats.factory import THREAT_READERS
+from turf.threats.runner import ThreatModelJobRunner
 from turf.threats.smart_models import SmartThreatModelFactory
+from turf.weather.factory import WEATHER_READERS
 
 
 # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
@@ -43,9 +47,15 @@ usage += '\n\nno date args passed : update all days since perevious analysis.'
 from optparse import OptionParser
 parser = OptionParser(usage)
 
+parser.add_option('-c', action='store', dest='chunk_layout', default=None,
+       help='chunk layout for new threat files, see chunk_layouts config (default=None)')
+
 parser.add_option('-f', action='store', type=int, dest='fcast_days', default=7,
        help='Number of days in the forecast(default=7)')
 
+parser.add_option('-i', action='store_true', dest='incremental', default=False,
+       help='boolean: compute new reanalysis and forecast days in a single model run (default=False)')
+
 parser.add_option('-m', action='store', dest='models', default='anthrac,bpatch,dspot,hstress,pblight',
        help='list of models to run (default="anthrac,bpatch,dspot,hstress,pblight")')
 
@@ -55,6 +65,9 @@ parser.add_option('-d', action='store_true', dest='dev_mode', default=False,
 parser.add_option('-r', action='store_true', dest='replace_prev', default=False,
        help='boolean: replace previous analysis/forecast day (default=False)')
 
+parser.add_option('-w', action='store', type=int, dest='max_workers', default=None,
+       help='maximum number of worker processes, 0 = one per processor (default=project max_workers)')
+
 parser.add_option('-v', action='store_true', dest='verbose', default=False,
        help='boolean: print verbose output (default=False)')
 
@@ -63,9 +76,11 @@ parser.add_option('-z', action='store_true', dest='debug', default=False,
 
 options, args = parser.parse_args()
 
+chunk_layout = options.chunk_layout
 debug = options.debug
 dev_mode = options.dev_mode
 fcast_days = datetime.timedelta(options.fcast_days-1)
+incremental = options.incremental
 replace_prev = options.replace_prev
 threat_models = options.models.split(',')
 verbose = options.verbose or debug
@@ -122,8 +137,8 @@ def timeString(time_obj): return time_obj.strftime('%Y-%m-%d:%H')
 
 # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
 
-def runThreatModel(factory, threat_key, period_key, start_date, model_start_time,
-                   model_end_time, is_analysis, debug):
+def computeThreatModel(factory, threat_key, period_key, model_start_time,
+                       model_end_time, debug):
     # get the appropriate threat model
     model = factory.riskModel(threat_key, model_start_time.date(), period_key, debug)
 
@@ -164,13 +179,6 @@ def runThreatModel(factory, threat_key, period_key, start_date, model_start_time
         count = len(N.where(index < 0.)[0])
         print '    %6d nodes with index < 0.' % count
 
-    # update the threat index dataset
-    manager = factory.threatFileManager(threat_key, period_key, start_date.year)
-    if is_analysis:
-        index_end_date = manager.updateReanalysis(index_dataset, start_date, index)
-    else: index_end_date = manager.updateForecast(index_dataset, start_date, index)
-    manager.close()
-
     # run the model's risk calculator
     risk_level = model.riskLevel(index)
     
@@ -182,17 +190,60 @@ def runThreatModel(factory, threat_key, period_key, start_date, model_start_time
             print '    %6d nodes with risk level == %d' % (count, level)
         print ' '
 
-    # update the threat risk dateset
-    manager.open('a')
+    # turn annoying numpy warnings back on
+    warnings.resetwarnings()
+
+    return index_dataset, index, risk_level
+
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+def saveThreatModel(manager, index_dataset, start_date, index, risk_level, is_analysis):
+    # only the rows for days starting at start_date are written to the file
     if is_analysis:
+        index_end_date = manager.updateReanalysis(index_dataset, start_date, index)
         risk_end_date = manager.updateReanalysis('risk', start_date, risk_level)
-    else: risk_end_date = manager.updateForecast('risk', start_date, risk_level)
+    else:
+        index_end_date = manager.updateForecast(index_dataset, start_date, index)
+        risk_end_date = manager.updateForecast('risk', start_date, risk_level)
+    return index_end_date, risk_end_date
+
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+def runThreatModel(factory, threat_key, period_key, start_date, model_start_time,
+                   model_end_time, is_analysis, debug):
+    index_dataset, index, risk_level = \
+        computeThreatModel(factory, threat_key, period_key, model_start_time, model_end_time, debug)
+
+    # update the threat index and risk datasets
+    manager = factory.threatFileManager(threat_key, period_key, start_date.year)
+    end_dates = saveThreatModel(manager, index_dataset, start_date, index, risk_level, is_analysis)
     manager.close()
 
-    # turn annoying numpy warnings back on
-    warnings.resetwarnings()
+    return end_dates
 
-    return index_end_date, risk_end_date
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+def runIncrementalModel(factory, threat_key, period_key, start_date, obs_end_date,
+                        model_start_time, model_end_time, debug):
+    """ run the model once for all new reanalysis days and the forecast,
+    then split the results at obs_end_date. The padding hours in front of
+    start_date supply the trailing window that each model needs, so days
+    already in the file are neither recomputed nor rewritten.
+    """
+    index_dataset, index, risk_level = \
+        computeThreatModel(factory, threat_key, period_key, model_start_time, model_end_time, debug)
+
+    num_obs_days = (obs_end_date - start_date).days + 1
+    manager = factory.threatFileManager(threat_key, period_key, start_date.year)
+    obs_end_dates = saveThreatModel(manager, index_dataset, start_date,
+                                    index[:num_obs_days], risk_level[:num_obs_days], True)
+    if index.shape[0] > num_obs_days:
+        fcast_end_dates = saveThreatModel(manager, index_dataset, obs_end_date + ONE_DAY,
+                                index[num_obs_days:], risk_level[num_obs_days:], False)
+    else: fcast_end_dates = obs_end_dates
+    manager.close()
+
+    return obs_end_dates, fcast_end_dates
 
 
 # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
@@ -222,17 +273,44 @@ def updateReanalysis(factory, threat_key, period_key, start_date, end_date, verb
     return start_date, risk_end
 
 
-# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
-def updateTurfModelFiles(factory, threat_key, replace_prev, verbose, debug):
+def updateIncremental(factory, threat_key, period_key, start_date, end_date, common_fcast_end, max_fcast_time, verbose, debug):
+    start_time = modelDataStartTime(factory, threat_key, period_key, start_date)
+    fcast_end_time = max_fcast_time
+    while fcast_end_time > common_fcast_end: # most common case
+        fcast_end_time -= HOURS_IN_DAY
+    num_hours = tzutils.hoursInTimespan(start_time, fcast_end_time)
     threat_fullname = factory.threatName(threat_key)
+    period_name = period_key.title()
+    fcast_start = end_date + ONE_DAY
+
+    if verbose:
+        print '\n Incremental update of %s %s risk :' % (threat_fullname, period_name)
+        print '  reanalysis start date :', start_date
+        print '    forecast start date :', fcast_start
+        print '          weather start :', start_time
+        print '            weather end :', fcast_end_time
+        print '      num weather hours :', num_hours
+        print '    num reanalysis days :', (end_date - start_date).days + 1
+        print ' '
 
-    if threat_key == 'hstress': periods = ('daily',)
-    else: periods = ('daily', 'average')
-    num_periods = len(periods)
+    # run the model once and save the reanalysis and forecast rows
+    obs_end_dates, fcast_end_dates = runIncrementalModel(factory, threat_key, period_key, start_date, end_date, start_time, fcast_end_time, debug)
+    index_end, risk_end = obs_end_dates
+    reportUpdate('reanalysis', threat_fullname, period_name, start_date, index_end, risk_end)
+    index_end, risk_end = fcast_end_dates
+    reportUpdate('forecast', threat_fullname, period_name, fcast_start, index_end, risk_end)
+    if debug:
+        info = (num_hours, timeString(start_time), timeString(fcast_end_time))
+        print '        Processed %d weather hours : %s thru %s' % info
 
-    MODEL_START_TIME = datetime.datetime.now()
+    return start_date, fcast_start, risk_end
 
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+def modelTimeLimits(factory, threat_key, debug):
     common_obs_end = factory.commonObsEnd(threat_key, TODAY)
     max_obs_end = maxReanalysisEndTime(factory, threat_key)
     while max_obs_end > common_obs_end: # most common case
@@ -241,7 +319,7 @@ def updateTurfModelFiles(factory, threat_key, replace_prev, verbose, debug):
     max_obs_date = max_obs_start.date()
 
     if debug:
-        print '\nupdateTurfModelFiles debug info >>'
+        print '\nmodelTimeLimits debug info >>'
         print '     commonObsEnd :', common_obs_end
         print '      max_obs_end :', max_obs_end
         print '    max_obs_start :', max_obs_start
@@ -254,36 +332,72 @@ def updateTurfModelFiles(factory, threat_key, replace_prev, verbose, debug):
         print '   max_fcast_time :', max_fcast_time
         print '   commonFcastEnd :', common_fcast_end
 
-    print '\nProcessing %s risk :' % threat_fullname
+    return max_obs_date, common_fcast_end, max_fcast_time
 
-    period_count = 0
-    for period_key in periods:
-        PERIOD_START_TIME = datetime.datetime.now()
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
-        key_dates = updateTurfModelPeriod(threat_key, period_key, max_obs_date, common_fcast_end, max_fcast_time, verbose, debug)
-        # period_start, fcast_start, period_end = key_dates
+def modelPeriods(threat_key):
+    if threat_key == 'hstress': return ('daily',)
+    return ('daily', 'average')
 
-        elapsed_time = elapsedTime(PERIOD_START_TIME, True)
-        print '    Completed %s %s grid file update in %s' % (threat_fullname, period_key.title(), elapsed_time)
-        if verbose:
-            print '        data start = %s : fcast start = %s : data end = %s' % key_dates
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+def modelWeatherTimespan(factory, threat_key, period_key, time_limits):
+    """ weather needed to update an existing threat file, None for new files """
+    if not factory.threatFileExists(threat_key, period_key, TODAY.year): return None
 
-        period_count += 1
-        if period_count < num_periods: print ' '
+    last_obs_date = factory.threatDateAttribute(threat_key, period_key, TODAY.year, 'last_obs_date', 'risk')
+    if replace_prev: start_date = last_obs_date
+    else: start_date = last_obs_date + ONE_DAY
+    start_time = modelDataStartTime(factory, threat_key, period_key, start_date)
 
+    max_obs_date, common_fcast_end, max_fcast_time = time_limits
+    end_time = max_fcast_time
+    while end_time > common_fcast_end: end_time -= HOURS_IN_DAY
 
-    elapsed_time = elapsedTime(MODEL_START_TIME, True)
-    print '\nCompleted %s grid updates in %s' % (threat_fullname, elapsed_time)
+    return start_time, end_time
+
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+def printJobOutput(job):
+    if job.output: print job.output.rstrip()
+    if job.failed:
+        print '\n    %s %s update FAILED :' % job.key
+        print job.error
+
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+def updateTurfModelFiles(factory, threat_key, period_key):
+    """ one job : update a single threat file with reanalysis and forecast """
+    PERIOD_START_TIME = datetime.datetime.now()
+    threat_fullname = factory.threatName(threat_key)
+    print '\nProcessing %s %s risk :' % (threat_fullname, period_key.title())
+
+    max_obs_date, common_fcast_end, max_fcast_time = modelTimeLimits(factory, threat_key, debug)
+    key_dates = updateTurfModelPeriod(factory, threat_key, period_key, max_obs_date, common_fcast_end, max_fcast_time, verbose, debug)
+    # period_start, fcast_start, period_end = key_dates
+
+    elapsed_time = elapsedTime(PERIOD_START_TIME, True)
+    print '    Completed %s %s grid file update in %s' % (threat_fullname, period_key.title(), elapsed_time)
+    if verbose:
+        print '        data start = %s : fcast start = %s : data end = %s' % key_dates
+
+    if debug:
+        for name, pool in (('weather', WEATHER_READERS), ('threat', THREAT_READERS)):
+            info = (name, pool.opens, pool.hits)
+            print '    %s reader pool : %d file opens, %d reuses' % info
+
+    return key_dates
 
 
 # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
 
-def updateTurfModelPeriod(threat_key, period_key, max_obs_date, common_fcast_end, max_fcast_time, verbose, debug):
+def updateTurfModelPeriod(factory, threat_key, period_key, max_obs_date, common_fcast_end, max_fcast_time, verbose, debug):
     threat_fullname = factory.threatName(threat_key)
     period_name = period_key.title()
 
     if not factory.threatFileExists(threat_key, period_key, TODAY.year):
-        factory.buildThreatGridFile(threat_key, period_key, TODAY, 'acis')
+        factory.buildThreatGridFile(threat_key, period_key, TODAY, 'acis', chunk_layout)
 
     if replace_prev:
         start_date = end_date = factory.threatDateAttribute(threat_key, period_key, TODAY.year, 'last_obs_date', 'risk')
@@ -300,6 +414,10 @@ def updateTurfModelPeriod(threat_key, period_key, max_obs_date, common_fcast_end
             print '    last_obs_date :', last_obs_date
             print ' '
 
+        if last_obs_date < max_obs_date and incremental:
+            start_date = last_obs_date + ONE_DAY
+            return updateIncremental(factory, threat_key, period_key, start_date, max_obs_date, common_fcast_end, max_fcast_time, verbose, debug)
+
         if last_obs_date < max_obs_date:
             end_date = max_obs_date
             start_date = min(end_date, last_obs_date + ONE_DAY)
@@ -350,9 +468,37 @@ def updateTurfModelPeriod(threat_key, period_key, max_obs_date, common_fcast_end
 factory = SmartThreatModelFactory()
 if dev_mode: factory.useDirpathsForMode('dev')
 
+# read the weather needed by every model and period once, jobs get views into it
+timespans = [ ]
 for threat_key in threat_models:
-    updateTurfModelFiles(factory, threat_key, replace_prev, verbose, debug)
+    time_limits = modelTimeLimits(factory, threat_key, debug)
+    for period_key in modelPeriods(threat_key):
+        timespan = modelWeatherTimespan(factory, threat_key, period_key, time_limits)
+        if timespan is not None: timespans.append(timespan)
+
+if timespans:
+    weather_start = min([timespan[0] for timespan in timespans])
+    weather_end = max([timespan[1] for timespan in timespans])
+    try:
+        factory.loadWeatherBundle(threat_models, weather_start, weather_end)
+    except Exception as e:
+        print 'WARNING : unable to load shared weather, each model will read its own :', str(e)
+    else:
+        if verbose:
+            print 'loaded shared weather for %s thru %s' % (timeString(weather_start), timeString(weather_end))
+
+# each model period writes to a separate file, so they can run in parallel
+runner = ThreatModelJobRunner(factory, options.max_workers)
+for threat_key in threat_models:
+    for period_key in modelPeriods(threat_key):
+        runner.addJob((threat_key, period_key), updateTurfModelFiles, threat_key, period_key)
+if verbose:
+    print 'running %d model updates on %d worker processes' % (len(runner.jobs), runner.num_workers)
+
+runner.run(printJobOutput)
+print '\n%s' % runner.summary()
 
 elapsed_time = elapsedTime(SCRIPT_START_TIME, True)
 print '\nCompleted turf model updates in %s' % elapsed_time
 
+if runner.failures: sys.exit(1)
@@ -60,11 +60,24 @@ CONFIG.datasets.threat = {
     'view':('time','lat','lon'),
 }
 
+# chunk layouts for the 3D threat datasets ... an int is clipped to the
+# size of the dimension, None is the full dimension and a string is the
+# name of a builder attribute (i.e. 'num_days' is the days in the season)
+CONFIG.chunk_layouts = {
+    # full season at each node : fast per-node reads, slow daily updates
+    'node':('num_days',1,1),
+    # one week for a block of nodes : fast daily updates and slices
+    'tiled':(7,32,32),
+    # one day for the full grid : fastest daily updates
+    'daily':(1,None,None),
+}
+
 CONFIG.filenames = {
     'average':'%(year)s-%(threat)s-Average-Risk.h5',
     'daily':'%(year)s-%(threat)s-Daily-Risk.h5',
     'threats':'%(year)s-%(threat)s-Daily-Risk.h5',
     'threatjson':'%(year)s-%(node)s-%(threat)s-Risk.json',
+    'threatexport':'%(year)s-%(threat)s-Risk-Nodes.%(format)s',
 }
 
 CONFIG.filetypes.anthrac = {
@@ -104,6 +117,7 @@ CONFIG.filetypes.pblight = {
 
 CONFIG.subdir_paths.threats = ('%(region)s','%(year)d','grids')
 CONFIG.subdir_paths.turfjson = ('%(region)s','%(year)d','json','%(threat)s')
+CONFIG.subdir_paths.threatexport = ('%(region)s','%(year)d','export')
 
 
 # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
@@ -284,3 +298,25 @@ THREATS.pblight = {
     'weather':{'temps':('TMP',),'wetness':('RHUM',)},
 }
 
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# make sure weather data can be converted to the units each threat model
+# uses when the config is loaded instead of when the data is first read
+
+from atmosci.units import validateConversions
+from turf.weather.config import CONFIG as WEATHER_CONFIG
+
+def _threatUnitConversions_(threats, datasets):
+    conversions = [ ]
+    for threat in threats.values():
+        if not isinstance(threat, ConfigObject): continue
+        threat_units = threat.get('units', None)
+        if threat_units is None: continue
+        for key, units in threat_units.attritems():
+            dataset = datasets.get(key.upper(), None)
+            if dataset is not None and dataset.get('units',None) is not None:
+                conversions.append((dataset.units, units))
+    return conversions
+
+validateConversions(_threatUnitConversions_(THREATS, WEATHER_CONFIG.datasets))
+del WEATHER_CONFIG
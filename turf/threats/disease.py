@@ -110,8 +110,39 @@ class BasicDisease(object):
 
     # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
-    def leafWetness(self, temp, dewpt, pcpn, temp_units, pcpn_units):
+    def leafWetness(self, temp, dewpt, pcpn, temp_units, pcpn_units,
+                          last_wet=None):
+        """
+        Determine which hours have leaf wetness. Leaves are wet in hours
+        when wetness criteria are met and in the hour that follows.
+
+        Arguments:
+            temp: hourly temperatures.
+            dewpt: hourly dewpoint temperatures.
+            pcpn: hourly precipitation.
+            temp_units: units for temperature and dew point arrays.
+            pcpn_units: units for precipitation data.
+            last_wet: optional array with 1 where wetness criteria were
+                      met in the hour before the first hour in the data.
+                      Use the last hour of wetnessCriteria for the
+                      previous slice to carry wetness across slices.
 
+        NOTE: input arrays must have time as the first axis
+
+        Returns:
+            '<i2' NumPy array with 1 in each hour with leaf wetness.
+        """
+        criteria = self.wetnessCriteria(temp, dewpt, pcpn, temp_units,
+                                        pcpn_units)
+        return wetness.carryWetness(criteria, last_wet)
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def wetnessCriteria(self, temp, dewpt, pcpn, temp_units, pcpn_units):
+        """
+        Returns boolean NumPy array that is True in each hour where
+        either precipitation or dew point depression indicate wetness.
+        """
         # make sure that temperature and dew point units are correct
         tmp_units = self.config.units.tmp
         if temp_units == tmp_units:
@@ -122,42 +153,21 @@ class BasicDisease(object):
             dpt = convertUnits(dewpt, temp_units, tmp_units)
 
         # dew point depression is one proxy for leaf wetness
-        tdd = temp - dewpt
+        tdd = tmp - dpt
 
         # make sure that precip units are correct
         precip_units = self.config.units.pcpn
         if pcpn_units == precip_units: precip = pcpn
         else: precip = convertUnits(pcpn, pcpn_units, precip_units)
-        # adjustment for minimum effective precipitation
-        precip[N.where(precip < self.config.min_precip)] = 0
 
         # precipitation is the other proxy
-        # need a wetness array filled with zeros for the entire time span
-        wetness = N.zeros(pcpn.shape, dtype='<i2')
-        # array to track whether leaves were wet in a previous iteration
-        last_wet = N.zeros(pcpn.shape[1:], dtype='<i2')
-
-        # need to process one time period per iteration
-        for i in range(tdd.shape[0]):
-            # leaves are wet wherever precip is greater than zero
-            pcpn_where = N.where(pcpn[i,:,:] > 0)
-            wetness[i][pcpn_where] = 1
-
-            # also include nodes with dew point depression less than 3 degrees
-            tdd_where = N.where(tdd[i,:,:] < 3)
-            wetness[i][tdd_where] = 1
-        
-            # add nodes whereever leaves were wet on the previous day
-            wetness[i][N.where(last_wet == 1)] = 1
-
-            # track where only where wetness criteria wre met on this day
-            last_wet.fill(0) # reset last_wet array to zeros first
-            # track where precip criteria were met on this day
-            last_wet[pcpn_where] = 1
-            # track where dewpoint criteria were met on this day
-            last_wet[tdd_where] = 1
-
-        return wetness
+        # leaves are wet wherever precip is greater than zero and
+        # at nodes with dew point depression less than 3 degrees
+        with N.errstate(invalid='ignore'):
+            criteria = tdd < 3
+            # adjustment for minimum effective precipitation
+            criteria |= (precip > 0) & (precip >= self.config.min_precip)
+        return criteria
 
     # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
@@ -242,7 +242,7 @@ class DollarSpot(BasicDisease):
         if pcpn_units == 'in': precip = pcpn
         else: precip = convertUnits(pcpn, pcpn_units, 'in')
         # adjustment for minimum effective precipitation
-        precip[N.where(precip < self.config.min_precip)] = 0
+        precip = N.where(precip < self.config.min_precip, 0., precip)
 
         if tmp_units == 'C': tmp = temp
         else: tmp = convertUnits(temp, tmp_units, 'C')
@@ -270,6 +270,10 @@ class DollarSpot(BasicDisease):
         ndims = len(avg_temp.shape)
         if ndims == 3:
             solver = DollarSpot3D(self.period, self.debug)
+        elif ndims == 2:
+            solver = DollarSpot2D(self.period, self.debug)
+        elif ndims == 1:
+            solver = DollarSpot1D(self.period, self.debug)
         else:
             raise TypeError, '%dD arrays are not currently supported' % ndims
 
@@ -647,9 +651,12 @@ class DollarSpot3D(BasicDisease):
                        be converted for use in the calculations.
 
         Data argument types:
-            3D NumPy array : multiple days at multiple points
-            2D NumPy array : same day at multiple points
-            1D NumPy array : multiple days at single point
+            3D NumPy array : multiple days at multiple points (DollarSpot3D)
+                             shape = (days, y, x)
+            2D NumPy array : multiple days at multiple points (DollarSpot2D)
+                             shape = (points, days)
+            1D NumPy array : multiple days at single point (DollarSpot1D)
+                             shape = (days,)
 
         NOTE: input arrays must :
               1) have the same dimensions
@@ -665,6 +672,9 @@ class DollarSpot3D(BasicDisease):
         # capture avg_tmp for each consecutive day of rain
         if tmp_units == 'C': avgt = avg_temp
         else: avgt = convertUnits(avg_temp, tmp_units, 'C')
+        # all calculations use [day, y, x] arrays
+        avgt = self.toDayGrid(avgt)
+        rain_count = self.toDayGrid(rain_count)
         if self.debug:
             print '\n  in consecPcpnAvgt ...'
             print '             avgt shape :', avgt.shape
@@ -682,35 +692,81 @@ class DollarSpot3D(BasicDisease):
             for day in range(consec_rain.shape[0]):
                 print '    day :', day
                 for n in range(threshold,span+1):
-                    num_nodes = len(N.where(consec_rain[day,:,:] == n)[0])
+                    num_nodes = len(N.where(consec_rain[day] == n)[0])
                     print '      %d consec days rain : %d' % (n, num_nodes)
 
         # because consecutive rain is for the 5 previous days,
         # the result in consec_rain is 1 day too long
         consec_rain = consec_rain[1:,:,:]
+        num_days = consec_rain.shape[0]
         consec_avgt = N.zeros(consec_rain.shape, dtype=float)
-        consec_avgt[N.where(N.isnan(consec_rain))] = N.nan
-        avg_tmp_sum = N.zeros(consec_rain.shape[1:], dtype=float)
-
-        for rain_day in range(offset, consec_rain.shape[0]):
-            consec_days = 0
-            avg_tmp_sum.fill(0)
-            avg_tmp_sum[N.where(N.isnan(consec_rain[rain_day,:,:]))] = N.nan
-
-            # loop thru max previous days with rain
-            for day_num in range(span):
-                day = rain_day - day_num
-                if day < 0: break
-                count = day_num + 1
-                # look for nodes with rain
-                where = N.where(consec_rain[day,:,:] >= count)
-                if len(where[0]) > 0: # rain_found
-                    consec_days += 1
-                    avg_tmp_sum[where] += avgt[day][where]
-                    # must have a least 2 consecutive days of rain
-                    if consec_days > 1:
-                        consec_avgt[rain_day][where] = \
-                                    avg_tmp_sum[where] / consec_days
-
-        return consec_rain, consec_avgt
+        if num_days <= offset:
+            return self.fromDayGrid(consec_rain), self.fromDayGrid(consec_avgt)
+
+        # all rain days are processed together, one array operation per
+        # previous day (lag) in the span
+        rain_days = num_days - offset
+        avg_tmp_sum = N.zeros((rain_days,) + consec_rain.shape[1:], float)
+        # count of lags where rain was found at ANY node on each rain day
+        consec_days = N.zeros(rain_days, dtype=int)
+
+        for day_num in range(span):
+            # first rain day that has a day this many days before it
+            first = max(offset, day_num)
+            if first >= num_days: break
+            count = day_num + 1
+            # look for nodes with rain on the day that is day_num days
+            # before each rain day
+            days = slice(first - day_num, num_days - day_num)
+            rain_found = consec_rain[days] >= count
+            indexes = slice(first - offset, rain_days)
+            consec_days[indexes] += \
+                rain_found.reshape(rain_found.shape[0], -1).any(axis=1)
+            N.add(avg_tmp_sum[indexes], avgt[days], out=avg_tmp_sum[indexes],
+                  where=rain_found)
+            # must have a least 2 consecutive days of rain
+            divisor = consec_days[indexes][:,N.newaxis,N.newaxis]
+            N.copyto(consec_avgt[first:], avg_tmp_sum[indexes] / divisor,
+                     where=rain_found & (divisor > 1))
+
+        return self.fromDayGrid(consec_rain), self.fromDayGrid(consec_avgt)
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def fromDayGrid(self, data):
+        """ Returns data with the dimensions used by this solver """
+        return data
+
+    def toDayGrid(self, data):
+        """ Returns data as a 3D array with shape (days, y, x) """
+        return data
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+class DollarSpot2D(DollarSpot3D):
+    """ Consecutive days of rain for multiple points. Daily data arrays
+    have shape (points, days), the same as the daily reductions in
+    turf.common create from 2D hourly arrays.
+    """
+
+    def fromDayGrid(self, data):
+        return N.ascontiguousarray(data[:,:,0].T)
+
+    def toDayGrid(self, data):
+        return data.T[:,:,N.newaxis]
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+class DollarSpot1D(DollarSpot3D):
+    """ Consecutive days of rain at a single point. Daily data arrays
+    have shape (days,).
+    """
+
+    def fromDayGrid(self, data):
+        return data[:,0,0]
+
+    def toDayGrid(self, data):
+        return data[:,N.newaxis,N.newaxis]
 
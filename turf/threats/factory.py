@@ -6,6 +6,7 @@ ONE_HOUR = datetime.timedelta(hours=1)
 
 from atmosci.utils import tzutils
 
+from atmosci.hdf5.pool import readerPool
 from atmosci.seasonal.methods.access  import BasicFileAccessorMethods
 from atmosci.seasonal.methods.factory import BasicProjectFactoryMethods
 from atmosci.seasonal.methods.paths   import PathConstructionMethods
@@ -19,6 +20,9 @@ from turf.factory import TurfProjectFactoryMethods
 
 from turf.threats.config import CONFIG, THREATS
 
+# process-wide pool of threat file readers
+THREAT_READERS = readerPool(16)
+
 # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
 
 class TurfThreatGridFileFactory(TurfProjectFactoryMethods,
@@ -41,10 +45,14 @@ class TurfThreatGridFileFactory(TurfProjectFactoryMethods,
     # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
     def buildThreatGridFile(self, threat, period, threat_date,
-                                  source_key='acis'):
+                                  source_key='acis', chunk_layout=None):
+        build_args = { }
+        if chunk_layout is not None:
+            build_args['chunk_layout'] = self.threatChunkLayout(chunk_layout)
 
         builder = self.threatFileBuilder(threat, period, threat_date.year,
-                                         source_key, None, None, None)
+                                         source_key, None, None, None,
+                                         **build_args)
         region = self.regionConfig(self.region)
         source = self.sourceConfig(source_key)
         reader = self.staticFileReader(source, region)
@@ -54,7 +62,7 @@ class TurfThreatGridFileFactory(TurfProjectFactoryMethods,
         del reader
 
         # build all of the datasets
-        builder.build(lons=lons, lats=lats)
+        builder.build(lons=lons, lats=lats, **build_args)
         del lats, lons
         builder.close()
         return builder
@@ -122,10 +130,46 @@ class TurfThreatGridFileFactory(TurfProjectFactoryMethods,
 
     # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
+    def threatChunkLayout(self, layout):
+        """
+        Returns
+            chunk layout tuple for a layout name in the chunk_layouts
+            config OR the layout itself when it is already a tuple
+        """
+        if isinstance(layout, basestring):
+            chunk_layout = self.config.chunk_layouts.get(layout, None)
+            if chunk_layout is None:
+                errmsg = '"%s" is not a valid threat file chunk layout'
+                raise KeyError, errmsg % layout
+            return tuple(chunk_layout)
+        return tuple(layout)
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def pooledThreatReader(self, threat, period, year, filepath=None):
+        """
+        Returns a reader from the process-wide threat reader pool. The
+        reader is shared, so callers must NOT close it.
+        """
+        if filepath is None:
+            filepath = self.threatGridFilepath(threat, period, year)
+        if not os.path.isfile(filepath):
+            return self.threatFileReader(threat, period, year, filepath)
+
+        def openReader():
+            return self.threatFileReader(threat, period, year, filepath)
+        if isinstance(period, basestring): period_key = period
+        else: period_key = period.name
+        return THREAT_READERS.reader((threat, period_key, year), filepath,
+                                     openReader)
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
     def threatFileBuilder(self, threat, period, year, source, lons=None,
                               lats=None, filepath=None, **kwargs):
         if filepath is None:
             filepath = self.threatGridFilepath(threat, period, year)
+        THREAT_READERS.release(filepath)
         threat_config = self.threats[threat]
 
         Class = self.fileAccessorClass('threats', 'build')
@@ -148,6 +192,7 @@ class TurfThreatGridFileFactory(TurfProjectFactoryMethods,
             errmsg = '%s %s grid file does not exist :\n    %s'
             raise IOError, errmsg % (threat.upper(), period, filepath)
 
+        THREAT_READERS.release(filepath)
         Class = self.fileAccessorClass('threats', 'manage')
         return Class(filepath, mode)
 
@@ -208,6 +253,21 @@ class TurfThreatGridFileFactory(TurfProjectFactoryMethods,
 
     # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
+    def threatExportFilepath(self, threat_key, year, export_format='h5'):
+        """ path to the columnar export file for all nodes in the region """
+        dirpath = self.projectDirpath('threats', 'turf', 'project')
+        subdir_path = self.subdirPath('threatexport')
+        export_dirpath = os.path.join(dirpath, subdir_path) % \
+                         self._templateArgs(threat_key, year, 'dir')
+        if not os.path.exists(export_dirpath): os.makedirs(export_dirpath)
+
+        template_args = self._templateArgs(threat_key, year, 'file')
+        template_args['format'] = export_format
+        filename = self.filenameTemplate('threatexport') % template_args
+        return os.path.join(export_dirpath, filename)
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
     def threatJsonDirpath(self, threat_key, year, **kwargs):
         dirpath = self.projectDirpath('threats', 'turf', 'project')
         subdir_path = self.subdirPath('threatjson', 'turfjson')
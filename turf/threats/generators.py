@@ -4,33 +4,107 @@ import os, sys
 import numpy as N
 import json
 
+from turf.export import ColumnarExport
+from turf.nodefiles import NodeJsonEncoder, NodeJsonFileWriter
 from turf.threats.factory import TurfThreatGridFileFactory
 
 
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+def regionNodeIndexes(static_reader, bbox=None):
+    """ Returns: y and x indexes of the valid nodes in a static file,
+    only those inside bbox when it is given. Indexes always count from
+    the corner of the full grid, so they can be used with full grids of
+    risk, lat and lon.
+    """
+    if bbox is not None:
+        static_reader.setCoordinateBounds(bbox)
+        cus_mask = static_reader.getDataInBounds('cus_mask')
+        # subset indexes count from the corner of the bounding box
+        min_y, min_x = static_reader._index_bounds[:2]
+    else:
+        cus_mask = static_reader.getData('cus_mask')
+        min_y, min_x = 0, 0
+    node_y, node_x = N.where(cus_mask == False)
+    return node_y + min_y, node_x + min_x
+
 # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
 
 class JsonFileGenerator(object):
 
-    def __init__(self, factory, source, region, sub_region=None):
+    def __init__(self, factory, source, region, sub_region=None,
+                       max_workers=None):
         self.factory = factory
+        if max_workers is None:
+            max_workers = factory.project.get('max_workers', 0)
+        self.max_workers = max_workers
 
         # get the indexes of all valid grid nodes from region's static file 
         source = factory.sourceConfig(factory.config.project.source)
         static_reader = factory.staticFileReader(source, region)
         if sub_region is not None:
-            region_config = factory.regionConfig(sub_region)
-            static_reader.setCoordinateBounds(region_config.data)
-            cus_mask = static_reader.getDataInBounds('cus_mask')
-        else:
-            cus_mask = static_reader.getData('cus_mask')
-            indexes = N.where(cus_mask == False)
-        self.region_indexes = zip(indexes[0], indexes[1])
-        del cus_mask, indexes, source
+            bbox = factory.regionConfig(sub_region).data
+        else: bbox = None
+        self.node_y, self.node_x = regionNodeIndexes(static_reader, bbox)
+        self.region_indexes = zip(self.node_y, self.node_x)
+        del source
         static_reader.close()
         del static_reader
 
     # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
+    def columnarExport(self, threat, json_dates, data_start, risk_data,
+                             index_data, lats, lons):
+        """
+        Creates a columnar export for all nodes in the region that have
+        valid risk on every day.
+
+        Arguments:
+            risk_data: sequence of (key, risk grid) for each period
+            index_data: sequence of (key, threat index grid) for each period
+
+        Returns: ColumnarExport, number of nodes with missing risk
+        """
+        node_y, node_x, node_lons, node_lats, node_keys = \
+            self.validNodes([risk for key, risk in risk_data], lats, lons)
+
+        num_days = risk_data[0][1].shape[0]
+        export = ColumnarExport(threat, 'threats', data_start, num_days,
+                                json_dates)
+        export.setNodes(lats.shape, node_y, node_x, node_lats, node_lons,
+                        node_keys)
+        for key, risk in risk_data:
+            export.addData(key, risk[:,node_y,node_x].T.astype('<i2'))
+        for key, index in index_data:
+            export.addData(key, index[:,node_y,node_x].T, 2)
+
+        return export, len(self.node_y) - len(node_y)
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def indexDataset(self, threat):
+        """ name of the threat index dataset in the threat's grid files """
+        datasets = self.factory.config.filetypes[threat].datasets
+        return [name for name in datasets
+                if name not in ('lat','lon','risk')][0]
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def writeColumnarExport(self, export, threat, export_format, num_missing,
+                                  debug=False):
+        filepath = self.factory.threatExportFilepath(threat, self.target_year,
+                                                     export_format)
+        export.write(filepath)
+        if num_missing > 0:
+            info = (self.factory.threatName(threat), num_missing)
+            print '%s : %d nodes with NAN risk were not exported' % info
+        if debug:
+            info = (export.num_nodes, export.num_days, filepath)
+            print 'exported %d nodes x %d days to %s' % info
+        return export.num_nodes
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
     def jsonPathTemplates(self, threat, target_year):
         factory = self.factory
         # create templates for constructing json data file paths 
@@ -40,18 +114,140 @@ class JsonFileGenerator(object):
         filename = factory.threatJsonFilename(path_key, '%(node)s', target_year)
         return dirpath, filename
 
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def reportMissingRisk(self, threat, period, risk_grid, lats, lons):
+        """ prints the number of NaN at each node with missing risk """
+        threat_name = self.factory.threatName(threat)
+        num_nans = N.isnan(risk_grid[:,self.node_y,self.node_x]).sum(axis=0)
+        for node in N.where(num_nans > 0)[0]:
+            y = self.node_y[node]
+            x = self.node_x[node]
+            if num_nans[node] == risk_grid.shape[0]:
+                info = (threat_name, period, y, x, lons[y,x], lats[y,x])
+                msg = '%s : all NAN %s risk @ node[%d,%d] (%.5f, %.5f)'
+            else:
+                info = (threat_name, num_nans[node], period, y, x,
+                        lons[y,x], lats[y,x])
+                msg = '%s : %d NANs in %s risk @ node[%d,%d] (%.5f, %.5f)'
+            print msg % info
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def validNodes(self, risk_grids, lats, lons):
+        """
+        Selects the nodes in the region that have valid risk on every day
+        in all of the risk grids.
+
+        Returns: grid y and x indexes, rounded lon and lat, and node key
+                 for each valid node
+        """
+        node_y = self.node_y
+        node_x = self.node_x
+        valid = N.ones(node_y.shape, dtype=bool)
+        for risk in risk_grids:
+            valid &= ~N.isnan(risk[:,node_y,node_x]).any(axis=0)
+        node_y = node_y[valid]
+        node_x = node_x[valid]
+
+        node_lats = N.round(lats[node_y,node_x],3)
+        node_lons = N.round(lons[node_y,node_x],3)
+        node_keys = [ self.factory.gridNodeToFilename((lon,lat))
+                      for lon, lat in zip(node_lons, node_lats) ]
+        return node_y, node_x, node_lons, node_lats, node_keys
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def writeNodeFiles(self, threat, json_dates, risk_data, lats, lons):
+        """
+        Writes a JSON file for each node that has valid risk on every day,
+        using a pool of worker processes.
+
+        Arguments:
+            risk_data: sequence of (key, risk grid) for each period
+
+        Returns: number of files written
+        """
+        factory = self.factory
+        node_y, node_x, node_lons, node_lats, node_keys = \
+            self.validNodes([risk for key, risk in risk_data], lats, lons)
+
+        # risk levels are written as integers
+        series = [ risk[:,node_y,node_x].T.astype('<i2')
+                   for key, risk in risk_data ]
+        params = { 'name':threat, 'lat':'%(lat)s', 'lon':'%(lon)s',
+                   'dates':json_dates, 'data':'%(data)s' }
+        json_template = factory.threats.json_template % params
+        encoder = NodeJsonEncoder(json_template,
+                                  [key for key, risk in risk_data],
+                                  risk_data[0][1].shape[0])
+
+        json_dirpath, json_filename = \
+            self.jsonPathTemplates(threat, self.target_year)
+        writer = NodeJsonFileWriter(json_dirpath, json_filename,
+                                    self.max_workers)
+        return writer.write(encoder, node_keys, node_lons, node_lats, series)
+
 
 # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
 
 class CommonRiskJsonFileGenerator(JsonFileGenerator):
 
-    def __init__(self, factory, source, region, sub_region=None):
-        JsonFileGenerator.__init__(self, factory, source, region, sub_region)
+    def __init__(self, factory, source, region, sub_region=None,
+                       max_workers=None):
+        JsonFileGenerator.__init__(self, factory, source, region, sub_region,
+                                   max_workers)
 
 
     # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
     def __call__(self, threat, target_year, debug=False):
+        avg_dates, daily_dates = self.threatFileDates(threat, target_year,
+                                                      debug)
+        return self.generateJsonFiles(avg_dates, daily_dates, debug)
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def exportColumnar(self, threat, target_year, export_format='h5',
+                             debug=False):
+        """
+        Writes average and daily risk and threat index at all valid nodes
+        to a single columnar file instead of one JSON file per node.
+
+        Returns: number of nodes exported
+        """
+        avg_dates, daily_dates = self.threatFileDates(threat, target_year,
+                                                      debug)
+        data_start, data_end, json_dates = \
+            self.threatDates(avg_dates, daily_dates)
+        # no data available
+        if json_dates is None: return 0
+
+        avg_risk, daily_risk, lats, lons = \
+            self.threatRisk(data_start, data_end, debug)
+
+        index_dataset = self.indexDataset(threat)
+        self.avg_reader.open()
+        avg_index = self.avg_reader.timeSlice(index_dataset, data_start,
+                                              data_end)
+        self.avg_reader.close()
+        self.daily_reader.open()
+        daily_index = self.daily_reader.timeSlice(index_dataset, data_start,
+                                                  data_end)
+        self.daily_reader.close()
+
+        export, num_missing = \
+            self.columnarExport(threat, json_dates, data_start,
+                 (('average',avg_risk), ('daily',daily_risk)),
+                 (('average_%s' % index_dataset, avg_index),
+                  ('daily_%s' % index_dataset, daily_index)),
+                 lats, lons)
+        return self.writeColumnarExport(export, threat, export_format,
+                                        num_missing, debug)
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def threatFileDates(self, threat, target_year, debug=False):
         self.target_year = target_year
         self.threat = threat
 
@@ -74,13 +270,11 @@ class CommonRiskJsonFileGenerator(JsonFileGenerator):
             for key, value in daily_dates.items():
                 print '    %s : %s' % (key,value)
 
-        return self.generateJsonFiles(avg_dates, daily_dates, debug)
+        return avg_dates, daily_dates
     
     # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
     def generateJsonFiles(self, avg_dates, daily_dates, debug):
-        factory = self.factory
-        region_indexes = self.region_indexes
         threat = self.threat
         
         data_start, data_end, json_datestr = \
@@ -91,64 +285,15 @@ class CommonRiskJsonFileGenerator(JsonFileGenerator):
         # no data available
         if json_datestr is None: return 0
 
-        # create JSON content template
-        params = { 'name':threat, 'lat':'%(lat)s', 'lon':'%(lon)s', 
-                   'dates':json_datestr,
-                   'data':'{"average":[%(avg)s],"daily":[%(daily)s]}' }
-        json_template = factory.threats.json_template % params
-
-        # JSON file path templates
-        json_dirpath, json_filename = \
-            self.jsonPathTemplates(threat, self.target_year)
-
         # get risk data for both periods
         avg_risk, daily_risk, lats, lons = self.threatRisk(data_start, data_end, debug)
 
-        num_files = 0
-
-        for y, x in region_indexes:
-            avg = avg_risk[:,y,x]
-            daily = daily_risk[:,y,x]
-
+        # nodes with missing risk in either period are skipped
+        self.reportMissingRisk(threat, 'Average', avg_risk, lats, lons)
+        self.reportMissingRisk(threat, 'Daily', daily_risk, lats, lons)
 
-            if len(N.where(N.isnan(avg))[0]) == 0 and len(N.where(N.isnan(daily))[0]) == 0:
-                lat = N.round(lats[y,x],3)
-                lon = N.round(lons[y,x],3)
-                params = { 'lat':lat, 'lon':lon }
-                params['avg'] = ','.join(['%d' % value for value in avg])
-                params['daily'] = ','.join(['%d' % value for value in daily])
-
-                filename = json_filename % {'node':factory.gridNodeToFilename((lon,lat)),}
-                filepath = os.path.join(json_dirpath, filename)
-        
-                with open(filepath, 'w') as writer:
-                    writer.write(json_template % params)
-
-                num_files += 1
-
-            else:
-                threat_name = factory.threatName(threat)
-                if num_nans == avg.size:
-                    location = (threat_name, y, x, lons[y,x], lats[y,x])
-                    msg ='%s : all NAN Average risk @ node[%s,%d] (%.5f,%.5f)'
-                    print msg % info 
-                else:
-                    info = (threat_name, len(N.where(N.isnan(avg))[0]), y, x,
-                                lons[y,x], lats[y,x])
-                    msg = '%s : %d NANs in Average risk @ node[%s,%d] (%.5f %.5f)'
-                    print msg % info 
-
-                if num_nans == daily.size:
-                    info = (threat_name, y, x, lons[y,x], lats[y,x])
-                    msg = '%s : all NAN Daily risk @ node[%s,%d] (%.5f,%.5f)'
-                    print msg % info 
-                else:
-                    info = (threat_name, len(N.where(N.isnan(daily))[0]), y, x,
-                            lons[y,x], lats[y,x])
-                    msg = '%s : %d NANs in Daily risk @ node[%s,%d] (%.5f,%.5f)'
-                    print msg % info 
-
-        return num_files
+        return self.writeNodeFiles(threat, json_datestr,
+                   (('average',avg_risk), ('daily',daily_risk)), lats, lons)
 
     # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
@@ -215,14 +360,51 @@ class CommonRiskJsonFileGenerator(JsonFileGenerator):
 
 class PeriodRiskJsonGenerator(JsonFileGenerator):
 
-    def __init__(self, factory, period, source, region, sub_region=None):
-        JsonFileGenerator.__init__(self, factory, source, region, sub_region)
+    def __init__(self, factory, period, source, region, sub_region=None,
+                       max_workers=None):
+        JsonFileGenerator.__init__(self, factory, source, region, sub_region,
+                                   max_workers)
         self.period = period
 
     # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
     def __call__(self, threat, period, target_year, debug=False):
         if debug: print '\nPeriodRiskJsonGenerator'
+        date_dict = self.threatFileDates(threat, target_year, debug)
+        return self.generateJsonFiles(date_dict)
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def exportColumnar(self, threat, period, target_year, export_format='h5',
+                             debug=False):
+        """
+        Writes risk and threat index for the period at all valid nodes
+        to a single columnar file instead of one JSON file per node.
+
+        Returns: number of nodes exported
+        """
+        date_dict = self.threatFileDates(threat, target_year, debug)
+        data_start, data_end, json_dates = self.threatDates(date_dict)
+        # no data available
+        if json_dates is None: return 0
+
+        risk, lats, lons = self.threatRisk(data_start, data_end)
+        index_dataset = self.indexDataset(threat)
+        self.reader.open()
+        index = self.reader.timeSlice(index_dataset, data_start, data_end)
+        self.reader.close()
+
+        export, num_missing = \
+            self.columnarExport(threat, json_dates, data_start,
+                 ((self.period, risk),),
+                 (('%s_%s' % (self.period, index_dataset), index),),
+                 lats, lons)
+        return self.writeColumnarExport(export, threat, export_format,
+                                        num_missing, debug)
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def threatFileDates(self, threat, target_year, debug=False):
         self.target_year = target_year
         self.threat = threat
 
@@ -234,68 +416,26 @@ class PeriodRiskJsonGenerator(JsonFileGenerator):
             print '%s %s risk dates:' % (threat, self.period)
             for key, value in date_dict.items():
                 print '    %s : %s' % (key,value)
-
-        return self.generateJsonFiles(date_dict)
+        return date_dict
 
     # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
     def generateJsonFiles(self, date_dict):
-        factory = self.factory
-        region_indexes = self.region_indexes
         threat = self.threat
         
         data_start, data_end, json_datestr = self.threatDates(date_dict)
         # no data available
         if json_datestr is None: return 0
 
-        period = '"%s"' % self.period
-        data_template = '{' + period + ":[%(data)s]}"
-        params = { 'name':threat, 'lat':'%(lat)s', 'lon':'%(lon)s',
-                   'dates':json_datestr, 'data':data_template }
-        json_template = factory.threats.json_template % params
-
-        # JSON file path templates
-        json_dirpath, json_filename = \
-            self.jsonPathTemplates(threat, self.target_year)
-        
         # get risk data for period
         risk_data, lats, lons = self.threatRisk(data_start, data_end)
 
-        num_files = 0
-
-        for y, x in region_indexes:
-            risk = risk_data[:,y,x]
+        # nodes with missing risk are skipped
+        self.reportMissingRisk(threat, self.period.title(), risk_data,
+                               lats, lons)
 
-            if len(N.where(N.isnan(risk))[0]) == 0:
-                lat = N.round(lats[y,x],3)
-                lon = N.round(lons[y,x],3)
-                params = { 'lat':lat, 'lon':lon }
-                params['data'] = ','.join(['%d' % value for value in risk])
-    
-                node_str = factory.gridNodeToFilename((lon,lat))
-                filename = json_filename % {'node': node_str,}
-                filepath = os.path.join(json_dirpath, filename)
-        
-                with open(filepath, 'w') as writer:
-                    writer.write(json_template % params)
-
-                num_files += 1
-
-            else:
-                threat_name = factory.threatName(threat)
-                num_nans = len(N.where(N.isnan(risk))[0])
-                period = self.period.title()
-                if num_nans == risk.size:
-                    info = (threat_name, period, y, x, lons[y,x], lats[y,x])
-                    msg = '%s : all NAN %s risk @ node[%s,%d] (%.5f, %.5f)'
-                else:
-                    missing = len(N.where(N.isnan(risk))[0])
-                    info = (threat_name, period, missing, y, x,
-                            lons[y,x], lats[y,x])
-                    msg = '%s : %d NANs in %s risk @ node[%s,%d] (%.5f, %.5f)' 
-                print msg % info
-
-        return num_files
+        return self.writeNodeFiles(threat, json_datestr,
+                                   ((self.period, risk_data),), lats, lons)
 
     # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
@@ -341,10 +481,12 @@ class PeriodRiskJsonGenerator(JsonFileGenerator):
 
 class TurfThreatJsonGeneratorFactory(TurfThreatGridFileFactory):
 
-    def riskFileGenerator(self, period, source, region, sub_region=None):
+    def riskFileGenerator(self, period, source, region, sub_region=None,
+                                max_workers=None):
         if period in ('avg,daily','daily,avg'):
-            return CommonRiskJsonFileGenerator(self, source, region, sub_region)
+            return CommonRiskJsonFileGenerator(self, source, region,
+                                               sub_region, max_workers)
         else:
             return PeriodRiskJsonGenerator(self, period, source, region,
-                                           sub_region)
+                                           sub_region, max_workers)
 
@@ -63,6 +63,9 @@ class TurfThreatGridFileBuilder(TurfGridFileManagerMethods,
         reference_date = kwargs.get('reference_date', None)
         if reference_date is not None:
             attrs['reference_date'] = reference_date
+        chunk_layout = kwargs.get('chunk_layout', None)
+        if chunk_layout is not None:
+            attrs['chunk_layout'] = str(tuple(chunk_layout))
         return attrs
 
     # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
@@ -113,6 +116,10 @@ class TurfThreatGridFileBuilder(TurfGridFileManagerMethods,
     # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
     def _resolveDatasetChunks(self, dataset, shape, view, **kwargs):
+        layout = kwargs.get('chunk_layout', None)
+        if layout is not None:
+            chunks = self._resolveChunkLayout(layout, shape)
+            if chunks is not None: return chunks
         chunks = kwargs.get('chunks', None)
         if chunks is None: chunks = dataset.get('chunks', None)
         if chunks:
@@ -0,0 +1,149 @@
+
+import os
+import shutil
+
+import h5py
+
+from turf.threats.factory import THREAT_READERS
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+THREAT_DATASETS = ('risk', 'stress', 'threat')
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+class ThreatGridChunkMigrator(object):
+    """
+    Rewrites existing threat grid files so that the 3D threat datasets
+    use a new chunk layout. The layout is recorded in the file's
+    "chunk_layout" attribute and each dataset's "chunk_shape" attribute.
+
+    All other datasets and every attribute are copied unchanged. The new
+    file is built next to the original and then renamed over it, so
+    readers never see a partially migrated file or a missing one.
+    """
+
+    def __init__(self, factory, chunk_layout, debug=False):
+        self.factory = factory
+        self.chunk_layout = factory.threatChunkLayout(chunk_layout)
+        self.debug = debug
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def __call__(self, threat, period, year, keep_original=False):
+        filepath = self.factory.threatGridFilepath(threat, period, year)
+        if not os.path.isfile(filepath):
+            errmsg = '%s %s grid file does not exist :\n    %s'
+            raise IOError, errmsg % (threat.upper(), period, filepath)
+        return self.migrateFile(filepath, keep_original)
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def chunksForDataset(self, dataset):
+        """
+        Returns
+            chunk shape for the dataset when the layout applies to it,
+            otherwise None
+        """
+        shape = dataset.shape
+        if len(shape) != len(self.chunk_layout): return None
+
+        num_days = shape[0]
+        chunks = [ ]
+        for indx, dim in enumerate(self.chunk_layout):
+            if dim is None: size = shape[indx]
+            elif dim == 'num_days': size = num_days
+            elif isinstance(dim, basestring):
+                errmsg = '"%s" cannot be resolved in an existing file'
+                raise ValueError, errmsg % dim
+            else: size = int(dim)
+            chunks.append(max(1, min(size, shape[indx])))
+        return tuple(chunks)
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def migrateFile(self, filepath, keep_original=False):
+        """
+        Returns
+            dictionary of dataset name : (old chunks, new chunks)
+        """
+        THREAT_READERS.release(filepath)
+        new_filepath = filepath.replace('.h5', '.migrating.h5')
+        if os.path.exists(new_filepath): os.remove(new_filepath)
+
+        changes = { }
+        old_file = h5py.File(filepath, 'r')
+        new_file = h5py.File(new_filepath, 'w')
+        try:
+            for name, value in old_file.attrs.items():
+                new_file.attrs[name] = value
+
+            for name, _object in old_file.items():
+                if name in THREAT_DATASETS \
+                and isinstance(_object, h5py.Dataset):
+                    chunks = self.chunksForDataset(_object)
+                    if chunks is not None:
+                        self.rechunkDataset(_object, new_file, chunks)
+                        changes[name] = (_object.chunks, chunks)
+                        continue
+                old_file.copy(_object, new_file, name)
+
+            new_file.attrs['chunk_layout'] = str(self.chunk_layout)
+        except:
+            new_file.close()
+            old_file.close()
+            os.remove(new_filepath)
+            raise
+
+        new_file.close()
+        old_file.close()
+
+        if keep_original:
+            # link the backup name to the original so that filepath stays
+            # in place until the new file replaces it
+            backup_filepath = filepath.replace('.h5', '.original.h5')
+            if os.path.exists(backup_filepath): os.remove(backup_filepath)
+            try:
+                os.link(filepath, backup_filepath)
+            except (AttributeError, OSError): # no hard links available
+                shutil.copy2(filepath, backup_filepath)
+        os.rename(new_filepath, filepath)
+
+        if self.debug:
+            print 'migrated %s' % filepath
+            for name, (old_chunks, new_chunks) in changes.items():
+                info = (name, str(old_chunks), str(new_chunks))
+                print '    %s chunks : %s >> %s' % info
+
+        return changes
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def rechunkDataset(self, dataset, new_file, chunks):
+        create_args = { 'chunks':chunks, 'dtype':dataset.dtype,
+                        'maxshape':dataset.maxshape, }
+        if dataset.compression is not None:
+            create_args['compression'] = dataset.compression
+            create_args['compression_opts'] = dataset.compression_opts
+        if dataset.shuffle: create_args['shuffle'] = True
+        if dataset.fillvalue is not None:
+            create_args['fillvalue'] = dataset.fillvalue
+
+        new_dataset = \
+            new_file.create_dataset(dataset.name, dataset.shape, **create_args)
+
+        # copy in bands of rows that align with the new chunks so that
+        # each new chunk is compressed only once ... reading full bands
+        # also means each of the old per-node chunks is read only once
+        num_rows = dataset.shape[1]
+        step = chunks[1]
+        for start in range(0, num_rows, step):
+            end = min(start+step, num_rows)
+            new_dataset[:,start:end] = dataset[:,start:end]
+
+        for name, value in dataset.attrs.items():
+            new_dataset.attrs[name] = value
+        new_dataset.attrs['chunk_shape'] = str(chunks)
+        return new_dataset
+
@@ -0,0 +1,175 @@
+""" Runs threat model jobs in a pool of worker processes.
+
+Each job is a (model, period) update that writes to its own threat file,
+so jobs can run concurrently. Every worker process creates its own
+factory, and therefore its own weather and threat file handles.
+"""
+
+import sys
+import time
+import traceback
+import multiprocessing
+from cStringIO import StringIO
+
+from turf.threats.factory import THREAT_READERS
+from turf.weather.factory import WEATHER_READERS
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+# factory used by jobs in the current process
+_JOB_FACTORY_ = None
+
+def _initWorker_(factory_class, factory_kwargs, path_mode, weather_bundle):
+    global _JOB_FACTORY_
+    # readers inherited from the parent belong to the parent
+    WEATHER_READERS.forget()
+    THREAT_READERS.forget()
+    factory = factory_class(**factory_kwargs)
+    if path_mode != 'default': factory.useDirpathsForMode(path_mode)
+    # forked workers share the parent's read-only weather bundle
+    if weather_bundle is not None: factory.weather_bundle = weather_bundle
+    _JOB_FACTORY_ = factory
+
+def _runJob_(job):
+    job_key, function, args, capture_output = job
+    if capture_output:
+        stdout = sys.stdout
+        sys.stdout = StringIO()
+    start = time.time()
+    result = error = None
+    try:
+        if isinstance(function, basestring):
+            result = getattr(_JOB_FACTORY_, function)(*args)
+        else: result = function(_JOB_FACTORY_, *args)
+    except Exception:
+        error = traceback.format_exc()
+    elapsed = time.time() - start
+    if capture_output:
+        output = sys.stdout.getvalue()
+        sys.stdout = stdout
+    else: output = ''
+    return ThreatModelJob(job_key, result, error, elapsed, output)
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+class ThreatModelJob(object):
+    """ Results of a single job """
+
+    def __init__(self, job_key, result, error, elapsed, output):
+        self.key = job_key
+        self.result = result
+        self.error = error
+        self.elapsed = elapsed
+        self.output = output
+
+    @property
+    def failed(self): return self.error is not None
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+class ThreatModelJobRunner(object):
+    """ Schedules (model, period) jobs on a pool of worker processes.
+
+    A job is either the name of a factory method (e.g. 'runRiskModel')
+    or a module level function that takes the factory as its first
+    argument. Jobs run with the worker's own factory, which is created
+    from the class and path mode of the factory passed to the runner.
+    """
+
+    def __init__(self, factory, max_workers=None, factory_kwargs={ }):
+        self.factory = factory
+        self.factory_kwargs = factory_kwargs
+        if max_workers is None:
+            max_workers = factory.project.get('max_workers', 0)
+        if max_workers < 1: max_workers = multiprocessing.cpu_count()
+        self.max_workers = max_workers
+        self.jobs = [ ]
+        self.results = [ ]
+        self.elapsed = 0.
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def addJob(self, job_key, function, *args):
+        """
+        Arguments:
+            job_key: unique key for the job, e.g. (threat_key, period_key)
+            function: factory method name or module level function
+            args: arguments passed to the function
+        """
+        self.jobs.append((job_key, function, args))
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    @property
+    def failures(self):
+        return [job for job in self.results if job.failed]
+
+    @property
+    def num_workers(self):
+        return max(1, min(self.max_workers, len(self.jobs)))
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def run(self, jobDone=None):
+        """ Runs all jobs and returns a list of ThreatModelJob in the order
+        that they finished. When there is more than one worker, output
+        printed by a job is captured and returned with its results.
+
+        Arguments:
+            jobDone: optional function called with each ThreatModelJob
+                     as soon as it finishes
+        """
+        global _JOB_FACTORY_
+        start = time.time()
+        num_workers = self.num_workers
+        capture_output = num_workers > 1
+        jobs = [job + (capture_output,) for job in self.jobs]
+
+        if num_workers == 1:
+            _JOB_FACTORY_ = self.factory
+            results = (_runJob_(job) for job in jobs)
+            pool = None
+        else:
+            # never fork while the parent has open file handles
+            WEATHER_READERS.closeAll()
+            THREAT_READERS.closeAll()
+            path_mode = getattr(self.factory, 'path_mode', 'default')
+            bundle = getattr(self.factory, 'weather_bundle', None)
+            pool = multiprocessing.Pool(num_workers, _initWorker_,
+                                        (self.factory.__class__,
+                                         self.factory_kwargs, path_mode,
+                                         bundle))
+            results = pool.imap_unordered(_runJob_, jobs, 1)
+
+        try:
+            for job in results:
+                self.results.append(job)
+                if jobDone is not None: jobDone(job)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+            _JOB_FACTORY_ = None
+
+        self.elapsed = time.time() - start
+        return self.results
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def summary(self):
+        """ Returns a printable report with timing and status of each job """
+        lines = ['%-24s %8s %10s' % ('job', 'status', 'seconds')]
+        for job in sorted(self.results, key=lambda job: str(job.key)):
+            if isinstance(job.key, tuple): key = ' '.join(job.key)
+            else: key = str(job.key)
+            status = 'FAILED' if job.failed else 'ok'
+            lines.append('%-24s %8s %10.1f' % (key, status, job.elapsed))
+        job_time = sum([job.elapsed for job in self.results])
+        info = (len(self.results), self.num_workers, self.elapsed, job_time)
+        lines.append('%d jobs on %d workers in %.1f seconds (%.1f seconds'
+                     ' of job time)' % info)
+        for job in self.failures:
+            lines.append('\n%s failed :\n%s' % (str(job.key), job.error))
+        return '\n'.join(lines)
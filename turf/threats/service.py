@@ -0,0 +1,429 @@
+""" Small HTTP service that answers point and bounding box queries for
+threat risk and threat index data directly from the yearly threat grid
+files, without the per node JSON files.
+
+    /threats/<threat>/<period>/<year>/point?lon=-76.5&lat=42.45
+    /threats/<threat>/<period>/<year>/bbox?bbox=-77,42,-76,43
+
+Optional query arguments :
+    dataset : "risk" (default) or the threat index dataset in the file
+    start, end : first and last date, YYYY-MM-DD. Default is the whole
+                 season thru the last valid date
+    format : "json" (default) or "bin" for raw little endian float32
+             values with shape, dtype and dates in response headers
+
+Files are held open in the factory's threat reader pool. Responses are
+kept in a least recently used cache, and a cached response is discarded
+as soon as the modification time of its file changes.
+"""
+
+import os
+import json
+import threading
+import urlparse
+import BaseHTTPServer
+import SocketServer
+from collections import OrderedDict
+
+import numpy as N
+
+from atmosci.utils.timeutils import asDatetimeDate
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+QUERY_TYPES = ('point', 'bbox')
+RESPONSE_FORMATS = ('json', 'bin')
+# threats without a "periods" config, e.g. hstress, only have daily files
+DEFAULT_PERIODS = ('daily',)
+
+
+class ThreatQueryError(Exception):
+    """ query that cannot be answered, status is the HTTP status code """
+
+    def __init__(self, status, message):
+        Exception.__init__(self, message)
+        self.status = status
+
+
+def _jsonValues_(data, integer=False):
+    """ NaN is not valid JSON, missing values are returned as null """
+    missing = N.isnan(data)
+    if integer: values = N.where(missing, 0, data).astype(int).tolist()
+    else: values = data.tolist()
+    if not missing.any(): return values
+    if data.ndim == 1:
+        return [None if is_missing else value
+                for value, is_missing in zip(values, missing.tolist())]
+    return [_jsonValues_(subset, integer) for subset in data]
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+class ThreatQueryEngine(object):
+    """ Extracts query results from threat grid files and caches them.
+
+    Dataset dates and packing attributes are read once for each version
+    of a file, so an uncached query costs one hyperslab read.
+
+    Arguments:
+        factory: TurfThreatGridFileFactory used to locate and open files
+        cache_size: maximum number of responses kept in the cache
+    """
+
+    def __init__(self, factory, cache_size=512):
+        self.factory = factory
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._datasets = { }
+        self._filepaths = { }
+        # h5py is not thread safe, neither are the pool or the caches
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def clearCache(self):
+        with self._lock: self._cache.clear()
+
+    def threatPeriods(self, threat):
+        """ Returns: names of the periods configured for the threat """
+        periods = self.factory.threats[threat].get('periods', None)
+        if periods is None: return DEFAULT_PERIODS
+        return tuple(sorted(periods.keys()))
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def query(self, threat, period, year, query_type, args):
+        """
+        Arguments:
+            threat, period, year: identify the threat grid file
+            query_type: "point" or "bbox"
+            args: dictionary of query arguments
+
+        Returns: (content type, response body, response headers)
+
+        Raises ThreatQueryError when the query is not valid.
+        """
+        if threat not in self.factory.threats:
+            raise ThreatQueryError(404, 'Unknown threat "%s"' % threat)
+        periods = self.threatPeriods(threat)
+        if period not in periods:
+            errmsg = 'Unknown period "%s" for %s, must be one of %s'
+            raise ThreatQueryError(400, errmsg % (period, threat,
+                                                  ', '.join(periods)))
+        if query_type not in QUERY_TYPES:
+            errmsg = 'Unsupported query "%s", must be one of %s'
+            raise ThreatQueryError(404, errmsg % (query_type,
+                                                  ', '.join(QUERY_TYPES)))
+        try:
+            year = int(year)
+        except ValueError:
+            raise ThreatQueryError(400, 'Invalid year "%s"' % year)
+        response_format = args.get('format', 'json')
+        if response_format not in RESPONSE_FORMATS:
+            errmsg = 'Unsupported format "%s", must be one of %s'
+            raise ThreatQueryError(400, errmsg % (response_format,
+                                              ', '.join(RESPONSE_FORMATS)))
+
+        with self._lock:
+            filepath = self._filepath_(threat, period, year)
+            if not os.path.isfile(filepath):
+                errmsg = 'No %s %s data for %d' % (threat, period, year)
+                raise ThreatQueryError(404, errmsg)
+            mtime = os.path.getmtime(filepath)
+            reader = self.factory.pooledThreatReader(threat, period, year,
+                                                     filepath)
+            dataset_path = args.get('dataset', 'risk')
+            info = self._datasetInfo_(reader, filepath, mtime, dataset_path)
+            start, end = self._dateRange_(info, args)
+            if query_type == 'point':
+                selection = self._gridIndex_(reader,
+                                             self._coordinate_(args, 'lon'),
+                                             self._coordinate_(args, 'lat'))
+            else: selection = self._gridBox_(reader, args)
+
+            # nearby coordinates resolve to the same node and response
+            key = (filepath, dataset_path, selection, start, end,
+                   response_format)
+            entry = self._cache.get(key, None)
+            if entry is not None:
+                del self._cache[key]
+                if entry[0] == mtime:
+                    self._cache[key] = entry
+                    self.hits += 1
+                    return entry[1]
+
+            self.misses += 1
+            data, coords = self._extract_(reader, dataset_path, info, start,
+                                          end, selection)
+            result = { 'threat':threat, 'period':period, 'year':year,
+                       'dataset':dataset_path, 'start':start.isoformat(),
+                       'end':end.isoformat() }
+            response = self._respond_(result, data, info['integer'], coords,
+                                      response_format)
+            self._cache[key] = (mtime, response)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return response
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def _coordinate_(self, args, name):
+        value = args.get(name, None)
+        if value is None:
+            raise ThreatQueryError(400, 'Missing "%s" argument' % name)
+        try:
+            return float(value)
+        except ValueError:
+            errmsg = 'Invalid value for "%s" : %s'
+            raise ThreatQueryError(400, errmsg % (name, value))
+
+    def _gridBox_(self, reader, args):
+        bbox = args.get('bbox', '').split(',')
+        if len(bbox) != 4:
+            errmsg = '"bbox" must be min_lon,min_lat,max_lon,max_lat'
+            raise ThreatQueryError(400, errmsg)
+        bbox = dict(zip(('min_lon','min_lat','max_lon','max_lat'), bbox))
+        min_y, min_x = \
+            self._gridIndex_(reader, self._coordinate_(bbox, 'min_lon'),
+                             self._coordinate_(bbox, 'min_lat'))
+        max_y, max_x = \
+            self._gridIndex_(reader, self._coordinate_(bbox, 'max_lon'),
+                             self._coordinate_(bbox, 'max_lat'))
+        if min_y > max_y or min_x > max_x:
+            raise ThreatQueryError(400, 'Empty bounding box')
+        return (min_y, max_y+1, min_x, max_x+1)
+
+    def _gridIndex_(self, reader, lon, lat):
+        y, x = reader.ll2index(lon, lat)
+        if not (0 <= y < reader.lats.shape[0]
+                and 0 <= x < reader.lats.shape[1]):
+            errmsg = 'Location (%s, %s) is outside the grid'
+            raise ThreatQueryError(400, errmsg % (lon, lat))
+        return y, x
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def _dateRange_(self, info, args):
+        try:
+            start = args.get('start', None)
+            if start is None: start = info['first_valid_date']
+            else: start = asDatetimeDate(start)
+            end = args.get('end', None)
+            if end is None: end = info['last_valid_date']
+            else: end = asDatetimeDate(end)
+        except Exception:
+            raise ThreatQueryError(400, 'Dates must be formatted YYYY-MM-DD')
+        if start > end or start < info['start_date'] \
+        or end > info['end_date']:
+            errmsg = 'Dates must be between %s and %s'
+            info = (info['start_date'].isoformat(),
+                    info['end_date'].isoformat())
+            raise ThreatQueryError(400, errmsg % info)
+        return start, end
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def _datasetInfo_(self, reader, filepath, mtime, dataset_path):
+        """ Returns: dictionary with the dataset's dates and packing """
+        key = (filepath, dataset_path)
+        entry = self._datasets.get(key, None)
+        if entry is not None and entry[0] == mtime: return entry[1]
+
+        if dataset_path in ('lat', 'lon') \
+        or not reader.hasDataset(dataset_path):
+            errmsg = 'No dataset named "%s"' % dataset_path
+            raise ThreatQueryError(404, errmsg)
+        dataset = reader.getDataset(dataset_path)
+        info = reader.dateAttributes(dataset_path, True)
+        info.setdefault('first_valid_date', info['start_date'])
+        info.setdefault('last_valid_date', info['end_date'])
+        packed_dtype, packed_missing, multiplier, data_dtype, data_missing = \
+            reader._getPackParams(dataset)
+        info['missing'] = packed_missing
+        info['multiplier'] = multiplier
+        info['integer'] = N.dtype(data_dtype).kind in 'iu' and not multiplier
+        # holding the dataset would keep the file open after it is released
+        del dataset
+        self._datasets[key] = (mtime, info)
+        return info
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def _extract_(self, reader, dataset_path, info, start, end, selection):
+        dataset = reader.getDataset(dataset_path)
+        first = (start - info['start_date']).days
+        last = (end - info['start_date']).days + 1
+        if len(selection) == 2:
+            y, x = selection
+            # a hyperslab read touches only the chunks for one node
+            packed = dataset[first:last, y, x]
+            coords = { 'lon':round(float(reader.lons[y,x]),3),
+                       'lat':round(float(reader.lats[y,x]),3),
+                       'y':y, 'x':x }
+        else:
+            min_y, max_y, min_x, max_x = selection
+            packed = dataset[first:last, min_y:max_y, min_x:max_x]
+            coords = { 'lons':N.around(reader.lons[min_y,min_x:max_x],3),
+                       'lats':N.around(reader.lats[min_y:max_y,min_x],3),
+                       'y':(min_y, max_y), 'x':(min_x, max_x) }
+
+        # missing values are NaN in the response data
+        data = packed.astype(float)
+        missing = info['missing']
+        if missing is not None and not N.isnan(missing):
+            data[packed == missing] = N.nan
+        if info['multiplier']: data /= info['multiplier']
+        return data, coords
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def _filepath_(self, threat, period, year):
+        key = (threat, period, year)
+        filepath = self._filepaths.get(key, None)
+        if filepath is None:
+            filepath = self.factory.threatGridFilepath(threat, period, year)
+            self._filepaths[key] = filepath
+        return filepath
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def _respond_(self, result, data, integer, coords, response_format):
+        if response_format == 'bin':
+            headers = { 'X-Shape':','.join([str(dim) for dim in data.shape]),
+                        'X-Dtype':'<f4', 'X-Start-Date':result['start'],
+                        'X-End-Date':result['end'] }
+            for key in ('y', 'x'):
+                value = coords[key]
+                if isinstance(value, tuple):
+                    value = ','.join([str(index) for index in value])
+                headers['X-Grid-%s' % key.upper()] = str(value)
+            body = data.astype('<f4').tostring()
+            return 'application/octet-stream', body, headers
+
+        result['data'] = _jsonValues_(data, integer)
+        if 'lon' in coords: result['location'] = coords
+        else:
+            result['lons'] = coords['lons'].tolist()
+            result['lats'] = coords['lats'].tolist()
+            result['shape'] = data.shape
+        body = json.dumps(result, separators=(',',':'))
+        return 'application/json', body, { }
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+class ThreatQueryRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    # keep connections open between requests from the same client
+    protocol_version = 'HTTP/1.1'
+    # send each response in one write, without waiting for delayed acks
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        url = urlparse.urlparse(self.path)
+        parts = [part for part in url.path.split('/') if part]
+        args = dict(urlparse.parse_qsl(url.query))
+        try:
+            if len(parts) != 5 or parts[0] != 'threats':
+                errmsg = 'Queries must be /threats/threat/period/year/query'
+                raise ThreatQueryError(404, errmsg)
+            content_type, body, headers = \
+                self.server.engine.query(*(parts[1:] + [args,]))
+            self._send_(200, content_type, body, headers)
+        except ThreatQueryError as e:
+            body = json.dumps({ 'error':str(e) })
+            self._send_(e.status, 'application/json', body, { })
+        except Exception as e:
+            body = json.dumps({ 'error':'%s : %s' % (e.__class__.__name__,
+                                                     str(e)) })
+            self._send_(500, 'application/json', body, { })
+
+    def _send_(self, status, content_type, body, headers):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in headers.items(): self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            BaseHTTPServer.BaseHTTPRequestHandler.log_message(self, format,
+                                                              *args)
+
+
+class _ThreadedHTTPServer(SocketServer.ThreadingMixIn,
+                          BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+class ThreatQueryServer(object):
+    """ Serves threat queries at http://host:port/threats/ from a background
+    thread, or from the calling thread with serveForever(). Port 0 picks
+    any free port.
+
+    Usage:
+        with ThreatQueryServer(factory) as server:
+            requests.get(server.url + '/threats/anthrac/daily/2018/point',
+                         params={'lon':-76.5, 'lat':42.45})
+    """
+
+    def __init__(self, factory, host='127.0.0.1', port=0, cache_size=512,
+                       verbose=False):
+        self.engine = ThreatQueryEngine(factory, cache_size)
+        self.host = host
+        self.port = port
+        self.verbose = verbose
+        self._server = None
+        self._thread = None
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    @property
+    def url(self): return 'http://%s:%d' % (self.host, self.port)
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def _createServer_(self):
+        server = _ThreadedHTTPServer((self.host, self.port),
+                                     ThreatQueryRequestHandler)
+        server.engine = self.engine
+        server.verbose = self.verbose
+        self.port = server.server_address[1]
+        self._server = server
+        return server
+
+    def serveForever(self):
+        server = self._createServer_()
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+            self._server = None
+
+    def start(self):
+        server = self._createServer_()
+        self._thread = threading.Thread(target=server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
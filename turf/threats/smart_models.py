@@ -7,7 +7,7 @@ from atmosci.units import convertUnits
 from atmosci.utils import tzutils
 
 from turf.threats.factory import TurfThreatGridFileFactory
-from turf.weather.smart_grid import SmartWeatherDataReader
+from turf.weather.smart_grid import SmartWeatherBundle, SmartWeatherDataReader
 
 
 # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
@@ -119,6 +119,8 @@ class SmartThreatModelFactory(TurfThreatGridFileFactory):
         TurfThreatGridFileFactory.__init__(self, **kwargs)
 
         self.path_mode = 'default'
+        self._smart_weather_reader = None
+        self.weather_bundle = None
 
         self.riskModels = {
             'anthrac': anthracRiskModel,
@@ -172,8 +174,8 @@ class SmartThreatModelFactory(TurfThreatGridFileFactory):
 
         factory = self.smartWeatherReader()
         for weather_key, variables in weather.items():
-            reader = factory.weatherFileReader(weather_key, date.year,
-                                               date.month, 'NE')
+            reader = factory.pooledWeatherReader(weather_key, date.year,
+                                                 date.month, 'NE')
             for variable in variables:
                 var_end = reader.timeAttribute(variable, 'fcast_end_time')
                 if var_end is None:
@@ -190,8 +192,8 @@ class SmartThreatModelFactory(TurfThreatGridFileFactory):
 
         factory = self.smartWeatherReader()
         for weather_key, variables in weather.items():
-            reader = factory.weatherFileReader(weather_key, date.year,
-                                               date.month, 'NE')
+            reader = factory.pooledWeatherReader(weather_key, date.year,
+                                                 date.month, 'NE')
             for variable in variables:
                 var_end = reader.timeAttribute(variable, 'last_obs_time')
                 if var_end is None: return None
@@ -316,6 +318,25 @@ class SmartThreatModelFactory(TurfThreatGridFileFactory):
 
     # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
+    def loadWeatherBundle(self, threat_keys, start_time, end_time):
+        """
+        Read all weather variables needed by the threat models for the
+        timespan once. weatherSlice will then return views into the
+        bundle for any request that it covers.
+        """
+        variables = [ ]
+        for threat_key in threat_keys:
+            weather_vars = self.threatWeatherVariables(threat_key)
+            for variable in weather_vars.temps + weather_vars.wetness:
+                if variable not in variables: variables.append(variable)
+
+        bundle = SmartWeatherBundle(self.smartWeatherReader(), variables,
+                                    start_time, end_time)
+        self.weather_bundle = bundle
+        return bundle
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
     def numForecastDays(self): return self.config.project.fcast_days
 
     # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
@@ -357,18 +378,21 @@ class SmartThreatModelFactory(TurfThreatGridFileFactory):
     # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
     def seasonDateLimits(self, threat_key, period_key, year):
-        reader = self.threatFileReader(threat_key, period_key, year)
+        reader = self.pooledThreatReader(threat_key, period_key, year)
         start_date = reader.fileDateAttribute('start_date', None)
         end_date = reader.fileDateAttribute('end_date', None)
-        reader.close()
         return start_date, end_date
 
     # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
     def smartWeatherReader(self):
-        reader = SmartWeatherDataReader(self.region)
-        if self.path_mode != 'default':
-            reader.useDirpathsForMode(self.path_mode)
+        # weather file readers are pooled, so one smart reader is enough
+        reader = self._smart_weather_reader
+        if reader is None:
+            reader = SmartWeatherDataReader(self.region)
+            if self.path_mode != 'default':
+                reader.useDirpathsForMode(self.path_mode)
+            self._smart_weather_reader = reader
         return reader
 
     # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
@@ -407,17 +431,15 @@ class SmartThreatModelFactory(TurfThreatGridFileFactory):
 
     def threatDateAttribute(self, threat_key, period_key, year, attr,
                                   dataset='risk'):
-        reader = self.threatFileReader(threat_key, period_key, year)
-        date = reader.dateAttribute(dataset, attr, None)
-        reader.close()
-        return date
+        reader = self.pooledThreatReader(threat_key, period_key, year)
+        return reader.dateAttribute(dataset, attr, None)
 
     # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
     def threatDateAttributes(self, threat_key, period_key, year,
                                    dataset='risk'):
-        reader = self.threatFileReader(threat_key, period_key, year)
-        dates = (
+        reader = self.pooledThreatReader(threat_key, period_key, year)
+        return (
             reader.dateAttribute(dataset, 'start_date'),
             reader.dateAttribute(dataset, 'first_valid_date', None),
             reader.dateAttribute(dataset, 'rtma_end_date'),
@@ -427,8 +449,6 @@ class SmartThreatModelFactory(TurfThreatGridFileFactory):
             reader.dateAttribute(dataset, 'end_date'),
             reader.lastUpdate(dataset),
         )
-        reader.close()
-        return dates
  
     # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
@@ -587,6 +607,10 @@ class SmartThreatModelFactory(TurfThreatGridFileFactory):
     # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
     def weatherSlice(self, weather_vars, start_time, end_time):
+        bundle = self.weather_bundle
+        if bundle is not None \
+        and bundle.covers(weather_vars, start_time, end_time):
+            return bundle.weatherSlice(weather_vars, start_time, end_time)
         smart = self.smartWeatherReader()
         return smart.weatherSlice(weather_vars, start_time, end_time)
 
@@ -595,4 +619,6 @@ class SmartThreatModelFactory(TurfThreatGridFileFactory):
     def useDirpathsForMode(self, mode):
         TurfThreatGridFileFactory.useDirpathsForMode(self, mode)
         self.path_mode = mode
+        self._smart_weather_reader = None
+        self.weather_bundle = None
 
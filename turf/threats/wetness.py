@@ -5,7 +5,32 @@ from atmosci.units import convertUnits
 
 # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
-def leafWetness(precip, temp, dewpt, pcpn_units='in', temp_units='F'):
+def carryWetness(criteria, last_wet=None):
+    """
+    Leaves are wet in every hour when wetness criteria were met during
+    that hour or during the previous hour.
+
+    Arguments:
+      criteria: boolean NumPy array with time as the first axis. True
+                in each hour where wetness criteria were met.
+      last_wet: optional array with 1 (or True) where wetness criteria
+                were met in the hour before the first hour in criteria.
+                Pass criteria[-1] from the previous slice to carry
+                wetness across slice boundaries. Default is no carry.
+
+    Returns: '<i2' NumPy array with 1 in each hour with leaf wetness
+    """
+    wetness = criteria.astype('<i2')
+    # add nodes whereever leaves were wet in the previous hour
+    wetness[1:] |= criteria[:-1]
+    if last_wet is not None:
+        wetness[0][N.where(last_wet == 1)] = 1
+    return wetness
+
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+def leafWetness(precip, temp, dewpt, pcpn_units='in', temp_units='F',
+                last_wet=None):
     if pcpn_units == 'in': pcpn = precip
     else: pcpn = convertUnits(precip, pcpn_units, 'in')
 
@@ -17,36 +42,15 @@ def leafWetness(precip, temp, dewpt, pcpn_units='in', temp_units='F'):
         dpt = convertUnits(dewpt, temp_units, 'F')
         tdd = tmp - dpt
 
-    # need a wetness array filled with zeros for the entire time span
-    wetness = N.zeros(pcpn.shape, dtype='<i2')
-    # array to track whether leaves were wet in a previous iteration
-    last_wet = N.zeros(pcpn.shape[1:], dtype='<i2')
-
-    # need to process one time period per iteration
-    for i in range(tdd.shape[0]):
-        # leaves are wet wherever precip is greater than zero
-        pcpn_where = N.where(pcpn[i,:,:] > 0)
-        wetness[i][pcpn_where] = 1
-
-        # also include nodes with dew point depression less than 3 degrees
-        tdd_where = N.where(tdd[i,:,:] < 3)
-        wetness[i][tdd_where] = 1
-        
-        # add nodes whereever leaves were wet on the previous day
-        wetness[i][N.where(last_wet == 1)] = 1
-
-        # track where only where wetness criteria wre met on this day
-        last_wet.fill(0) # reset last_wet array to zeros first
-        # track where precip criteria were met on this day
-        last_wet[pcpn_where] = 1
-        # track where dewpoint criteria were met on this day
-        last_wet[tdd_where] = 1
-
-    return wetness
+    # leaves are wet wherever precip is greater than zero and
+    # at nodes with dew point depression less than 3 degrees
+    with N.errstate(invalid='ignore'):
+        criteria = (pcpn > 0) | (tdd < 3)
+    return carryWetness(criteria, last_wet)
 
 # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
-def leafWetnessFromTemps(temp, dewpt, temp_units='F'):
+def leafWetnessFromTemps(temp, dewpt, temp_units='F', last_wet=None):
     # use dewpoint depression as a prozy for leaf wetness
     if temp_units == 'F':
         tdd = temp - dewpt
@@ -55,49 +59,16 @@ def leafWetnessFromTemps(temp, dewpt, temp_units='F'):
         dpt = convertUnits(dewpt, temp_units, 'F')
         tdd = tmp - dpt
 
-    # need a wetness array filled with zeros for the entire time span
-    wetness = N.zeros(tdd.shape, dtype='<i2')
-    # array for track whether leaves were wet in a previous iteration
-    last_wet = N.zeros(tdd.shape[1:], dtype='<i2')
-
-    # need to process one time period per iteration
-    for i in range(tdd.shape[0]):
-        # leaves are wet at nodes with dew point depression less than 3 degrees
-        where = N.where(tdd[i,:,:] < 3)
-        wetness[i][where] = 1
-
-        # add nodes where leaves were wet on previous day
-        wetness[i][N.where(last_wet == 1)] = 1
-
-        # track only where dewpoint criteria were met on this day
-        last_wet.fill(0) # reset last_wet array to zeros first
-        last_wet[where] = 1
-
-    return wetness
+    # leaves are wet at nodes with dew point depression less than 3 degrees
+    with N.errstate(invalid='ignore'):
+        return carryWetness(tdd < 3, last_wet)
 
 # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
-def leafWetnessFromPrecip(precip, pcpn_units='in'):
+def leafWetnessFromPrecip(precip, pcpn_units='in', last_wet=None):
     if pcpn_units == 'in': pcpn = precip
     else: pcpn = convertUnits(precip, pcpn_units, 'in')
 
-    # need empty wetness array for entire time span
-    wetness = N.zeros(pcpn.shape, dtype='<i2')
-    # track whether leaves were wet in an iteration
-    last_wet = N.zeros(pcpn.shape[1:], dtype='<i2')
-
-    # need to process one time period per iteration
-    for i in range(pcpn.shape[0]):
-        # leaves are wet wherever precip greater than zero
-        where = N.where(pcpn[i,:,:] > 0)
-        wetness[i][where] = 1
-
-        # add nodes whereever leaves were wet on the previous day
-        wetness[i][N.where(last_wet == 1)] = 1
-
-        # track only where precip criteria were met on this day
-        last_wet.fill(0)  # reset last_wet array to zeros first
-        last_wet[where] = 1
-
-    return wetness
-
+    # leaves are wet wherever precip greater than zero
+    with N.errstate(invalid='ignore'):
+        return carryWetness(pcpn > 0, last_wet)
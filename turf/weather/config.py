@@ -23,18 +23,37 @@ CONFIG.project.pcpn = { 'fudge': 0.01, 'min': 0.01, 'replace': 0 }
 
 # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 # add weather datasets
+#
+# weather datasets are packed as 16 bit integers :
+#     packed = round((data - add_offset) / scale_factor)
+# with -32768 as the missing value. Readers unpack them to float with NaN
+# for missing. Input data is rounded to 2 decimal places before it is
+# stored, so a scale_factor of 0.01 does not lose any precision. The byte
+# shuffle filter improves gzip compression of the packed integers.
+# To use float32 instead, set dtype_packed = '<f4' and missing_packed = N.nan
+# and do not set scale_factor or add_offset.
 # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
 CONFIG.datasets.timegrid.copy('DPT', CONFIG.datasets)
+CONFIG.datasets.DPT.add_offset = 273.15
 CONFIG.datasets.DPT.description = 'Renalysis & forecast dewpoint temperature @ 2 meters'
+CONFIG.datasets.DPT.dtype_packed = '<i2'
 CONFIG.datasets.DPT.frequency = 1
+CONFIG.datasets.DPT.missing_packed = -32768
+CONFIG.datasets.DPT.scale_factor = 0.01
+CONFIG.datasets.DPT.shuffle = True
 CONFIG.datasets.DPT.source = 'RTMA & NDFD model data resampled to ACIS HiRes grid'
 CONFIG.datasets.DPT.timezone = 'UTC'
 CONFIG.datasets.DPT.units = 'K'
 
 CONFIG.datasets.timegrid.copy('PCPN', CONFIG.datasets)
+CONFIG.datasets.PCPN.add_offset = 0.
 CONFIG.datasets.PCPN.description = 'Renalysis & forecast precipitation @ surface'
+CONFIG.datasets.PCPN.dtype_packed = '<i2'
 CONFIG.datasets.PCPN.frequency = 1
+CONFIG.datasets.PCPN.missing_packed = -32768
+CONFIG.datasets.PCPN.scale_factor = 0.01
+CONFIG.datasets.PCPN.shuffle = True
 CONFIG.datasets.PCPN.source = 'RTMA & NDFD model data resampled to ACIS HiRes grid'
 CONFIG.datasets.PCPN.timezone = 'UTC'
 CONFIG.datasets.PCPN.units = 'in'
@@ -52,15 +71,25 @@ CONFIG.datasets.POP.timezone = 'UTC'
 CONFIG.datasets.POP.units = '%'
 
 CONFIG.datasets.timegrid.copy('RHUM', CONFIG.datasets)
+CONFIG.datasets.RHUM.add_offset = 0.
 CONFIG.datasets.RHUM.description = 'Renalysis & forecast precipitation (surface)'
+CONFIG.datasets.RHUM.dtype_packed = '<i2'
 CONFIG.datasets.RHUM.frequency = 1
+CONFIG.datasets.RHUM.missing_packed = -32768
+CONFIG.datasets.RHUM.scale_factor = 0.01
+CONFIG.datasets.RHUM.shuffle = True
 CONFIG.datasets.RHUM.source = 'RTMA & NDFD model data resampled to ACIS HiRes grid'
 CONFIG.datasets.RHUM.timezone = 'UTC'
 CONFIG.datasets.RHUM.units = '%'
 
 CONFIG.datasets.timegrid.copy('TMP', CONFIG.datasets)
+CONFIG.datasets.TMP.add_offset = 273.15
 CONFIG.datasets.TMP.description = 'Renalysis & forecast temperature @ 2 meters'
+CONFIG.datasets.TMP.dtype_packed = '<i2'
 CONFIG.datasets.TMP.frequency = 1
+CONFIG.datasets.TMP.missing_packed = -32768
+CONFIG.datasets.TMP.scale_factor = 0.01
+CONFIG.datasets.TMP.shuffle = True
 CONFIG.datasets.TMP.source = 'RTMA & NDFD model data resampled to ACIS HiRes grid'
 CONFIG.datasets.TMP.timezone = 'UTC'
 CONFIG.datasets.TMP.units = 'K'
@@ -5,6 +5,7 @@ import datetime
 from atmosci.utils import tzutils
 from atmosci.utils.timeutils import lastDayOfMonth
 
+from atmosci.hdf5.pool import readerPool
 from atmosci.seasonal.factory  import SeasonalStaticFileFactory
 
 from turf.factory import TurfProjectFactoryMethods
@@ -18,6 +19,9 @@ from turf.weather.grid import WeatherFileReader, \
 
 from turf.weather.config import CONFIG
 
+# process-wide pool of monthly weather file readers
+WEATHER_READERS = readerPool(16)
+
 
 # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
 
@@ -115,6 +119,7 @@ class TurfWeatherFileFactory(TurfProjectFactoryMethods,
                                  lats=None, mode='a', filepath=None):
         if filepath is None:
             filepath = self.weatherFilepath(weather, year, month, region)
+        WEATHER_READERS.release(filepath)
 
         Class = self.AccessClasses.weather.build
         weather_key = self.weatherFileKey(weather)
@@ -131,6 +136,7 @@ class TurfWeatherFileFactory(TurfProjectFactoryMethods,
             errmsg = '%d/%d %s grid file does not exist :\n    %s'
             raise IOError, errmsg % (year, month, weather.upper(), filepath)
 
+        WEATHER_READERS.release(filepath)
         Class = self.AccessClasses.weather.manage
         return Class(filepath, mode)
 
@@ -149,6 +155,24 @@ class TurfWeatherFileFactory(TurfProjectFactoryMethods,
 
     # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
+    def pooledWeatherReader(self, weather, year, month, region='NE'):
+        """
+        Returns a reader from the process-wide weather reader pool. The
+        reader is shared, so callers must NOT close it.
+        """
+        weather_key = self.weatherFileKey(weather)
+        filepath = self.weatherFilepath(weather_key, year, month, region)
+        if not os.path.isfile(filepath):
+            return self.weatherFileReader(weather_key, year, month, region)
+
+        def openReader():
+            return self.weatherFileReader(weather_key, year, month, region,
+                                          filepath)
+        return WEATHER_READERS.reader((weather_key, year, month), filepath,
+                                      openReader)
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
     def weatherFileTimespan(self, year, month, timezone='UTC'):
         """
         Returns tuple with start hour and end hour for the monthly file.
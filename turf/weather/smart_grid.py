@@ -93,15 +93,14 @@ class SmartWeatherDataMethods:
 
     def lastWeatherHour(self, weather, date_or_time):
         weather_key = self.weatherFileKey(weather)
-        reader = self.weatherFileReader(weather_key, date_or_time.year,
-                                        date_or_time.month, self.region)
+        reader = self.pooledWeatherReader(weather_key, date_or_time.year,
+                                          date_or_time.month, self.region)
         if weather == weather_key:
             if weather_key == 'temps':
                 hour = reader.timeAttribute('TMP', 'last_valid_time', None)
             elif weather_key == 'wetness':
                 hour = reader.timeAttribute('POP', 'last_valid_time', None)
         else: hour = reader.timeAttribute(weather, 'last_valid_time', None)
-        reader.close()
 
         return hour
 
@@ -126,6 +125,7 @@ class SmartWeatherDataMethods:
                 last_day = lastDayOfMonth(month_start)
                 month_end = month_start.replace(day=last_day, hour=23)
                 slices.append((month_start, month_end))
+                month += 1
             
             slices.append((end_time.replace(day=1, hour=0), end_time))
 
@@ -156,12 +156,12 @@ class SmartWeatherDataMethods:
 
             sindx = prev_indx
             eindx = sindx + tzutils.hoursInTimespan(first_hour, last_hour)
-            reader = self.weatherFileReader(variable, year, month, region)
+            reader = \
+                self.pooledWeatherReader(variable, year, month, self.region)
             data[sindx:eindx,:,:] = \
                 reader.timeSlice(variable, first_hour, last_hour)
             if sindx == 0: units = reader.datasetAttribute(variable, 'units')
             prev_indx = eindx
-            reader.close()
 
         # turn annoying numpy warnings back on
         warnings.resetwarnings()
@@ -178,11 +178,12 @@ class SmartWeatherDataMethods:
             weather_key = weather
             if weather == 'temps': variable = 'TMP'
             elif weather == 'wetness': variable = 'RHUM'
-        reader = self.weatherFileReader(weather_key, target_date_or_time.year,
-                                        target_date_or_time.month, self.region)
+        reader = self.pooledWeatherReader(weather_key,
+                                          target_date_or_time.year,
+                                          target_date_or_time.month,
+                                          self.region)
         fcast_start = reader.timeAttribute(variable, 'fcast_start_time', None)
         fcast_end = reader.timeAttribute(variable, 'fcast_end_time', None)
-        reader.close()
 
         return fcast_start, fcast_end
 
@@ -198,12 +199,11 @@ class SmartWeatherDataMethods:
             elif weather == 'wetness': variable = 'RHUM'
 
         # first check file for month at end of slice
-        reader = self.weatherFileReader(weather_key, slice_start.year,
-                                        slice_start.month, self.region)
+        reader = self.pooledWeatherReader(weather_key, slice_start.year,
+                                          slice_start.month, self.region)
         last_obs = reader.timeAttribute(variable, 'last_obs_time',
                        reader.timeAttribute(variable, 'rtma_end_time', None))
         file_end_time = reader.timeAttribute(variable, 'end_time')
-        reader.close()
 
         if last_obs is None: return -1, None
         if last_obs == file_end_time: return 0, last_obs 
@@ -235,10 +235,6 @@ class SmartWeatherDataMethods:
         warnings.filterwarnings('ignore',"Mean of empty slice")
         # MUST ALSO TURN OFF WARNING FILTERS AT END OF SCRIPT !!!!!
 
-        first_hour = slices[0][0]
-        reader = self.weatherFileReader(weather_key, first_hour.year,
-                                        first_hour.month, region)
-        prev_month = first_hour.month
         prev_indx = 0
         for first_hour, last_hour in slices:
             year = first_hour.year
@@ -246,11 +242,8 @@ class SmartWeatherDataMethods:
 
             sindx = prev_indx
             eindx = sindx + tzutils.hoursInTimespan(first_hour, last_hour)
-            if first_hour.month != prev_month:
-                if reader is not None: reader.close()
-                reader = \
-                    self.weatherFileReader(weather_key, year, month, region)
-                prev_month = first_hour.month
+            reader = \
+                self.pooledWeatherReader(weather_key, year, month, region)
 
             for variable in variables:
                 data[variable][sindx:eindx,:,:] = \
@@ -259,8 +252,6 @@ class SmartWeatherDataMethods:
                     units[variable] = reader.datasetAttribute(variable,'units')
 
             prev_indx = eindx
-        reader.close()
-
 
         # turn annoying numpy warnings back on
         warnings.resetwarnings()
@@ -274,14 +265,13 @@ class SmartWeatherDataMethods:
     # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
     def weatherTimeAttributes(self, weather_key, date):
-        reader = self.weatherFileReader(weather_key, date.year, date.month,
-                                        self.region)
-        if weather == 'temps':
+        reader = self.pooledWeatherReader(weather_key, date.year, date.month,
+                                          self.region)
+        if weather_key == 'temps':
             time_attrs = reader.timeAttributes('TMP')
-        elif weather == 'wetness':
+        elif weather_key == 'wetness':
             time_attrs = reader.timeAttributes('RHUM')
         else: time_attrs = reader.timeAttributes(weather_key)
-        reader.close()
 
         return time_attrs
 
@@ -303,3 +293,60 @@ class SmartWeatherDataReader(SmartWeatherDataMethods, TurfWeatherFileFactory):
         self.data_tzinfo = tzutils.asTzinfo(self.project.data_timezone)
         self.local_tzinfo = tzutils.asTzinfo(self.project.local_timezone)
 
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+class SmartWeatherBundle(object):
+    """ Weather grids for a fixed timespan that are read once and then
+    shared by every model and period in a run. Slices returned by
+    weatherSlice are read-only views into the bundle, no data is copied.
+    """
+
+    def __init__(self, reader, variables, start_time, end_time):
+        self.start_time = tzutils.tzaDatetime(start_time, reader.data_tzinfo)
+        self.end_time = tzutils.tzaDatetime(end_time, reader.data_tzinfo)
+        self.data = { }
+        self.units = { }
+
+        # variables in the same weather file are read together
+        weather_files = { }
+        for variable in variables:
+            weather_key = reader.weatherFileKey(variable)
+            weather_files.setdefault(weather_key, [ ]).append(variable)
+
+        for file_vars in weather_files.values():
+            weather = reader.weatherSlice(tuple(file_vars), self.start_time,
+                                          self.end_time)
+            for variable, (units, data) in weather.items():
+                # views are shared, models must never change them
+                data.flags.writeable = False
+                self.data[variable] = data
+                self.units[variable] = units
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def covers(self, variables, start_time, end_time):
+        for variable in variables:
+            if variable not in self.data: return False
+        start_time = tzutils.tzaDatetime(start_time, self.start_time.tzinfo)
+        end_time = tzutils.tzaDatetime(end_time, self.start_time.tzinfo)
+        return start_time >= self.start_time and end_time <= self.end_time
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def weatherSlice(self, variables, slice_start_time, slice_end_time):
+        """ Returns the same dictionary as SmartWeatherDataReader.weatherSlice
+        with a read-only view for each variable.
+        """
+        tzinfo = self.start_time.tzinfo
+        slice_start_time = tzutils.tzaDatetime(slice_start_time, tzinfo)
+        slice_end_time = tzutils.tzaDatetime(slice_end_time, tzinfo)
+        first = tzutils.hoursInTimespan(self.start_time, slice_start_time) - 1
+        last = first + tzutils.hoursInTimespan(slice_start_time, slice_end_time)
+
+        results = { }
+        for variable in variables:
+            results[variable] = \
+                (self.units[variable], self.data[variable][first:last])
+        return results